@@ -15,6 +15,7 @@ if str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
 
 from db.config import load_db_config  # type: ignore
+from db.migration_ops import connect_options  # type: ignore
 from db.models import Base  # type: ignore
 
 # this is the Alembic Config object, which provides
@@ -31,7 +32,8 @@ target_metadata = Base.metadata
 
 
 def get_url() -> str:
-    cfg = load_db_config()
+    # Callers such as db.rehearse point the migrations at another database
+    cfg = config.attributes.get("db_config") or load_db_config()
     return cfg.sqlalchemy_url
 
 
@@ -59,6 +61,8 @@ def run_migrations_online() -> None:
         configuration,
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
+        # DDL that cannot get its lock fails fast instead of stalling the queries queued behind it
+        connect_args={"options": connect_options()},
         future=True,
     )
 
@@ -68,6 +72,8 @@ def run_migrations_online() -> None:
             target_metadata=target_metadata,
             compare_type=True,
             compare_server_default=True,
+            # Committed one by one: a lock timeout fails only the migration that hit it
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
@@ -0,0 +1,38 @@
+"""
+Add indexes backing the failure mode / FMEA query language
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ("ix_fmeas_status", "fmeas", ["status"]),
+    ("ix_fmeas_created_at_id", "fmeas", ["created_at", "id"]),
+    ("ix_fmeas_updated_at_id", "fmeas", ["updated_at", "id"]),
+    ("ix_failure_modes_rpn_id", "failure_modes", ["rpn", "id"]),
+    ("ix_failure_modes_severity_detection", "failure_modes", ["severity", "detection"]),
+    ("ix_failure_modes_created_at_id", "failure_modes", ["created_at", "id"]),
+)
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside the migration transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,117 @@
+"""
+Add cold archive tables for superseded FMEA trees
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def _timestamps() -> list[sa.Column]:
+    return [
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    ]
+
+
+def upgrade() -> None:
+    op.add_column("fmeas", sa.Column("archived_at", sa.DateTime(timezone=True), nullable=True))
+
+    op.create_table(
+        "failure_modes_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("fmea_id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(length=255), nullable=False),
+        sa.Column("severity", sa.Integer(), nullable=False),
+        sa.Column("occurrence", sa.Integer(), nullable=False),
+        sa.Column("detection", sa.Integer(), nullable=False),
+        sa.Column("rpn", sa.Integer(), nullable=False),
+        *_timestamps(),
+    )
+    op.create_index("ix_failure_modes_archive_fmea_id", "failure_modes_archive", ["fmea_id"])
+
+    op.create_table(
+        "actions_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("failure_mode_id", sa.Integer(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("owner", sa.String(length=255), nullable=True),
+        sa.Column("due_date", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("status", sa.String(length=32), nullable=False),
+        sa.Column("notes", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("closed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_index("ix_actions_archive_failure_mode_id", "actions_archive", ["failure_mode_id"])
+
+    op.create_table(
+        "failure_causes_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("failure_mode_id", sa.Integer(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        *_timestamps(),
+    )
+    op.create_index("ix_failure_causes_archive_failure_mode_id", "failure_causes_archive", ["failure_mode_id"])
+
+    op.create_table(
+        "failure_effects_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("failure_mode_id", sa.Integer(), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("level", sa.String(length=32), nullable=True),
+        *_timestamps(),
+    )
+    op.create_index("ix_failure_effects_archive_failure_mode_id", "failure_effects_archive", ["failure_mode_id"])
+
+    op.create_table(
+        "controls_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("failure_mode_id", sa.Integer(), nullable=False),
+        sa.Column("type", sa.String(length=16), nullable=False),
+        sa.Column("description", sa.Text(), nullable=False),
+        sa.Column("method_ref", sa.String(length=255), nullable=True),
+        *_timestamps(),
+    )
+    op.create_index("ix_controls_archive_failure_mode_id", "controls_archive", ["failure_mode_id"])
+
+    op.execute(
+        """
+CREATE OR REPLACE FUNCTION fmeas_purge_archive() RETURNS trigger AS $$
+BEGIN
+  IF OLD.archived_at IS NOT NULL THEN
+    DELETE FROM actions_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM failure_causes_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM failure_effects_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM controls_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM failure_modes_archive WHERE fmea_id = OLD.id;
+  END IF;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql
+"""
+    )
+    op.execute(
+        """
+CREATE TRIGGER fmeas_purge_archive AFTER DELETE ON fmeas
+FOR EACH ROW EXECUTE FUNCTION fmeas_purge_archive()
+"""
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS fmeas_purge_archive ON fmeas")
+    op.execute("DROP FUNCTION IF EXISTS fmeas_purge_archive()")
+    for table in ("controls_archive", "failure_effects_archive", "failure_causes_archive", "actions_archive", "failure_modes_archive"):
+        op.drop_table(table)
+    op.drop_column("fmeas", "archived_at")
@@ -0,0 +1,41 @@
+"""
+Add audit_log for the change audit trail
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "audit_log",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("occurred_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("actor", sa.String(length=255), nullable=True),
+        sa.Column("action", sa.String(length=8), nullable=False),
+        sa.Column("table_name", sa.String(length=64), nullable=False),
+        sa.Column("row_id", sa.Integer(), nullable=False),
+        sa.Column("before", postgresql.JSONB(), nullable=True),
+        sa.Column("after", postgresql.JSONB(), nullable=True),
+        sa.CheckConstraint("action IN ('create','update','delete')", name="ck_audit_log_action_valid"),
+    )
+    op.create_index("ix_audit_log_table_row", "audit_log", ["table_name", "row_id", "occurred_at", "id"])
+    op.create_index("ix_audit_log_actor_occurred_at", "audit_log", ["actor", "occurred_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_audit_log_actor_occurred_at", table_name="audit_log")
+    op.drop_index("ix_audit_log_table_row", table_name="audit_log")
+    op.drop_table("audit_log")
@@ -0,0 +1,72 @@
+"""
+Add NOTIFY triggers feeding the change feed
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+TABLES = ("fmeas", "failure_modes", "actions", "failure_causes", "failure_effects", "controls")
+EVENTS = (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+CREATE OR REPLACE FUNCTION fmea_notify_changes() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('fmea.change_feed', true) = 'off' THEN
+    RETURN NULL;
+  END IF;
+  -- Rows whose FMEA or failure mode is gone were cascade-deleted; the parent's event covers them
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'fmea_id', c.id,
+                               'asset_id', c.asset_id, 'ids', json_build_array(c.id), 'count', 1) AS e
+      FROM changed_rows c
+    ) events;
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'fmea_id', f.id, 'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= 200 THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN fmeas f ON f.id = c.fmea_id
+      GROUP BY f.id, f.asset_id
+    ) events;
+  ELSE
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'fmea_id', f.id, 'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= 200 THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id JOIN fmeas f ON f.id = m.fmea_id
+      GROUP BY f.id, f.asset_id
+    ) events;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+    )
+    for table in TABLES:
+        for event, transition in EVENTS:
+            op.execute(
+                f"CREATE TRIGGER {table}_notify_{event.lower()} AFTER {event} ON {table} "
+                f"REFERENCING {transition} TABLE AS changed_rows "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION fmea_notify_changes()"
+            )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for event, _ in EVENTS:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_notify_{event.lower()} ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS fmea_notify_changes()")
@@ -0,0 +1,102 @@
+"""
+Add webhook subscriptions and the transactional outbox
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "webhook_subscriptions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("url", sa.Text(), nullable=False),
+        sa.Column("event_types", postgresql.ARRAY(sa.String(length=64)), nullable=False),
+        sa.Column("secret", sa.String(length=255), nullable=True),
+        sa.Column("is_active", sa.Boolean(), nullable=False, server_default=sa.text("true")),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+    )
+    op.create_table(
+        "webhook_outbox",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "subscription_id",
+            sa.Integer(),
+            sa.ForeignKey("webhook_subscriptions.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("event_type", sa.String(length=64), nullable=False),
+        sa.Column("entity_key", sa.String(length=64), nullable=False),
+        sa.Column("payload", postgresql.JSONB(), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="pending"),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("delivered_at", sa.DateTime(timezone=True), nullable=True),
+        sa.CheckConstraint("status IN ('pending','delivered','dead')", name="ck_webhook_outbox_status_valid"),
+    )
+    op.create_index(
+        "ix_webhook_outbox_due",
+        "webhook_outbox",
+        ["next_attempt_at", "id"],
+        postgresql_where=sa.text("status = 'pending'"),
+    )
+    op.create_index("ix_webhook_outbox_subscription_status", "webhook_outbox", ["subscription_id", "status", "id"])
+
+    op.execute(
+        """
+CREATE OR REPLACE FUNCTION webhook_enqueue_status_change() RETURNS trigger AS $$
+DECLARE
+  kind text := CASE TG_TABLE_NAME WHEN 'fmeas' THEN 'fmea' ELSE 'action' END;
+  event_type text := kind || '.' || NEW.status;
+  payload jsonb;
+BEGIN
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    payload := jsonb_build_object('fmea_id', NEW.id, 'asset_id', NEW.asset_id, 'version', NEW.version,
+                                  'approved_by', NEW.approved_by, 'updated_by', NEW.updated_by);
+  ELSE
+    SELECT jsonb_build_object('action_id', NEW.id, 'failure_mode_id', NEW.failure_mode_id, 'fmea_id', f.id,
+                              'asset_id', f.asset_id, 'owner', NEW.owner, 'closed_at', NEW.closed_at)
+      INTO payload
+      FROM failure_modes m JOIN fmeas f ON f.id = m.fmea_id
+     WHERE m.id = NEW.failure_mode_id;
+  END IF;
+  payload := payload || jsonb_build_object('event', event_type, 'from', OLD.status, 'to', NEW.status, 'changed_at', now());
+  INSERT INTO webhook_outbox (subscription_id, event_type, entity_key, payload)
+  SELECT s.id, event_type, kind || ':' || NEW.id, payload
+    FROM webhook_subscriptions s
+   WHERE s.is_active AND (event_type = ANY (s.event_types) OR kind || '.*' = ANY (s.event_types));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+    )
+    for table in ("fmeas", "actions"):
+        op.execute(
+            f"CREATE TRIGGER {table}_webhook_status AFTER UPDATE OF status ON {table} "
+            f"FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) "
+            f"EXECUTE FUNCTION webhook_enqueue_status_change()"
+        )
+
+
+def downgrade() -> None:
+    for table in ("fmeas", "actions"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_webhook_status ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS webhook_enqueue_status_change()")
+    op.drop_index("ix_webhook_outbox_subscription_status", table_name="webhook_outbox")
+    op.drop_index("ix_webhook_outbox_due", table_name="webhook_outbox")
+    op.drop_table("webhook_outbox")
+    op.drop_table("webhook_subscriptions")
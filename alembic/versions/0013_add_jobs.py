@@ -0,0 +1,54 @@
+"""
+Add the jobs table for the background job queue
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("params", postgresql.JSONB(), nullable=False, server_default=sa.text("'{}'::jsonb")),
+        sa.Column("status", sa.String(length=16), nullable=False, server_default="queued"),
+        sa.Column("progress_done", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("progress_total", sa.BigInteger(), nullable=True),
+        sa.Column("message", sa.Text(), nullable=True),
+        sa.Column("result", postgresql.JSONB(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("cancel_requested", sa.Boolean(), nullable=False, server_default=sa.text("false")),
+        sa.Column("attempts", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("worker", sa.String(length=255), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.Column("started_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("finished_at", sa.DateTime(timezone=True), nullable=True),
+        sa.CheckConstraint(
+            "status IN ('queued','running','succeeded','failed','cancelled')",
+            name="ck_jobs_status_valid",
+        ),
+    )
+    op.create_index("ix_jobs_queued", "jobs", ["id"], postgresql_where=sa.text("status = 'queued'"))
+    op.create_index(
+        "ix_jobs_running_heartbeat", "jobs", ["heartbeat_at"], postgresql_where=sa.text("status = 'running'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_running_heartbeat", table_name="jobs")
+    op.drop_index("ix_jobs_queued", table_name="jobs")
+    op.drop_table("jobs")
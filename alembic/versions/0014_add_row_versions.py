@@ -0,0 +1,34 @@
+"""
+Add row_version optimistic concurrency tokens to fmeas, failure_modes and actions
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+TABLES = ("fmeas", "failure_modes", "actions")
+ARCHIVE_TABLES = ("failure_modes_archive", "actions_archive")
+
+
+def upgrade() -> None:
+    # A constant default makes ADD COLUMN a catalog-only change: no table rewrite
+    for table in TABLES + ARCHIVE_TABLES:
+        op.add_column(table, sa.Column("row_version", sa.Integer(), nullable=False, server_default="1"))
+    # Archive tables carry the value over from the hot table and have no defaults
+    for table in ARCHIVE_TABLES:
+        op.alter_column(table, "row_version", server_default=None)
+
+
+def downgrade() -> None:
+    for table in TABLES + ARCHIVE_TABLES:
+        op.drop_column(table, "row_version")
@@ -0,0 +1,293 @@
+"""
+Add tenant_id with row-level security and tenant-prefixed indexes
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.migration_ops import (
+    add_foreign_key,
+    add_unique_constraint,
+    create_index_concurrently,
+    drop_index_concurrently,
+    with_lock_retry,
+)
+
+# revision identifiers, used by Alembic.
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+TENANT_ROLE = "fmea_tenant"
+CHILD_TABLES = ("actions", "failure_causes", "failure_effects", "controls")
+TABLES = ("fmeas", "failure_modes", *CHILD_TABLES, "audit_log", "webhook_subscriptions", "webhook_outbox", "jobs")
+ARCHIVE_TABLES = tuple(f"{t}_archive" for t in ("failure_modes", *CHILD_TABLES))
+
+# (name, table, columns) of the tenant-prefixed indexes and the ones they replace
+INDEXES = (
+    ("ix_fmeas_tenant_status", "fmeas", ["tenant_id", "status"]),
+    ("ix_fmeas_tenant_created_at_id", "fmeas", ["tenant_id", "created_at", "id"]),
+    ("ix_fmeas_tenant_updated_at_id", "fmeas", ["tenant_id", "updated_at", "id"]),
+    ("ix_failure_modes_tenant_fmea_id", "failure_modes", ["tenant_id", "fmea_id"]),
+    ("ix_failure_modes_tenant_rpn_id", "failure_modes", ["tenant_id", "rpn", "id"]),
+    ("ix_failure_modes_tenant_severity_detection", "failure_modes", ["tenant_id", "severity", "detection"]),
+    ("ix_failure_modes_tenant_created_at_id", "failure_modes", ["tenant_id", "created_at", "id"]),
+    *((f"ix_{t}_tenant_failure_mode_id", t, ["tenant_id", "failure_mode_id"]) for t in CHILD_TABLES),
+    ("ix_audit_log_tenant_actor_occurred_at", "audit_log", ["tenant_id", "actor", "occurred_at", "id"]),
+    ("ix_jobs_tenant_id", "jobs", ["tenant_id", "id"]),
+)
+OLD_INDEXES = (
+    ("ix_fmeas_asset_id", "fmeas", ["asset_id"]),
+    ("ix_fmeas_status", "fmeas", ["status"]),
+    ("ix_fmeas_created_at_id", "fmeas", ["created_at", "id"]),
+    ("ix_fmeas_updated_at_id", "fmeas", ["updated_at", "id"]),
+    ("ix_failure_modes_fmea_id", "failure_modes", ["fmea_id"]),
+    ("ix_failure_modes_rpn_id", "failure_modes", ["rpn", "id"]),
+    ("ix_failure_modes_severity_detection", "failure_modes", ["severity", "detection"]),
+    ("ix_failure_modes_created_at_id", "failure_modes", ["created_at", "id"]),
+    *((f"ix_{t}_failure_mode_id", t, ["failure_mode_id"]) for t in CHILD_TABLES),
+    ("ix_audit_log_actor_occurred_at", "audit_log", ["actor", "occurred_at", "id"]),
+)
+# (name, table, referent, local columns, remote columns)
+FOREIGN_KEYS = (
+    ("fk_failure_modes_tenant_fmea", "failure_modes", "fmeas", ["tenant_id", "fmea_id"], ["tenant_id", "id"]),
+    *(
+        (f"fk_{t}_tenant_failure_mode", t, "failure_modes", ["tenant_id", "failure_mode_id"], ["tenant_id", "id"])
+        for t in CHILD_TABLES
+    ),
+)
+OLD_FOREIGN_KEYS = (
+    ("fk_failure_modes_fmea_id_fmeas", "failure_modes", "fmeas", ["fmea_id"], ["id"]),
+    *((f"fk_{t}_failure_mode_id", t, "failure_modes", ["failure_mode_id"], ["id"]) for t in CHILD_TABLES),
+)
+
+CURRENT_TENANT_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_current_tenant() RETURNS text
+LANGUAGE sql STABLE PARALLEL SAFE
+AS $$ SELECT coalesce(nullif(current_setting('fmea.tenant_id', true), ''), 'default') $$
+"""
+TENANT_ROLE_DDL = f"""
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '{TENANT_ROLE}') THEN
+    CREATE ROLE {TENANT_ROLE} NOLOGIN;
+  END IF;
+  EXECUTE format('GRANT {TENANT_ROLE} TO %I', current_user);
+  EXECUTE format('GRANT USAGE ON SCHEMA %I TO {TENANT_ROLE}', current_schema());
+  EXECUTE format('GRANT USAGE ON ALL SEQUENCES IN SCHEMA %I TO {TENANT_ROLE}', current_schema());
+END
+$$
+"""
+
+NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_notify_changes() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('fmea.change_feed', true) = 'off' THEN
+    RETURN NULL;
+  END IF;
+  -- Rows whose FMEA or failure mode is gone were cascade-deleted; the parent's event covers them
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'tenant_id', c.tenant_id, 'fmea_id', c.id,
+                               'asset_id', c.asset_id, 'ids', json_build_array(c.id), 'count', 1) AS e
+      FROM changed_rows c
+    ) events;
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'tenant_id', f.tenant_id, 'fmea_id', f.id,
+                               'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= 200 THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN fmeas f ON f.id = c.fmea_id
+      GROUP BY f.id, f.tenant_id, f.asset_id
+    ) events;
+  ELSE
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'tenant_id', f.tenant_id, 'fmea_id', f.id,
+                               'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= 200 THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id JOIN fmeas f ON f.id = m.fmea_id
+      GROUP BY f.id, f.tenant_id, f.asset_id
+    ) events;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+OLD_NOTIFY_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_notify_changes() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('fmea.change_feed', true) = 'off' THEN
+    RETURN NULL;
+  END IF;
+  -- Rows whose FMEA or failure mode is gone were cascade-deleted; the parent's event covers them
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'fmea_id', c.id,
+                               'asset_id', c.asset_id, 'ids', json_build_array(c.id), 'count', 1) AS e
+      FROM changed_rows c
+    ) events;
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'fmea_id', f.id, 'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= 200 THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN fmeas f ON f.id = c.fmea_id
+      GROUP BY f.id, f.asset_id
+    ) events;
+  ELSE
+    PERFORM pg_notify('fmea_changes', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'fmea_id', f.id, 'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= 200 THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id JOIN fmeas f ON f.id = m.fmea_id
+      GROUP BY f.id, f.asset_id
+    ) events;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+WEBHOOK_FUNCTION = """
+CREATE OR REPLACE FUNCTION webhook_enqueue_status_change() RETURNS trigger AS $$
+DECLARE
+  kind text := CASE TG_TABLE_NAME WHEN 'fmeas' THEN 'fmea' ELSE 'action' END;
+  event_type text := kind || '.' || NEW.status;
+  payload jsonb;
+BEGIN
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    payload := jsonb_build_object('fmea_id', NEW.id, 'asset_id', NEW.asset_id, 'version', NEW.version,
+                                  'approved_by', NEW.approved_by, 'updated_by', NEW.updated_by);
+  ELSE
+    SELECT jsonb_build_object('action_id', NEW.id, 'failure_mode_id', NEW.failure_mode_id, 'fmea_id', f.id,
+                              'asset_id', f.asset_id, 'owner', NEW.owner, 'closed_at', NEW.closed_at)
+      INTO payload
+      FROM failure_modes m JOIN fmeas f ON f.id = m.fmea_id
+     WHERE m.id = NEW.failure_mode_id;
+  END IF;
+  payload := payload || jsonb_build_object('event', event_type, 'from', OLD.status, 'to', NEW.status, 'changed_at', now());
+  INSERT INTO webhook_outbox (tenant_id, subscription_id, event_type, entity_key, payload)
+  SELECT s.tenant_id, s.id, event_type, kind || ':' || NEW.id, payload
+    FROM webhook_subscriptions s
+   WHERE s.tenant_id = NEW.tenant_id AND s.is_active
+     AND (event_type = ANY (s.event_types) OR kind || '.*' = ANY (s.event_types));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+OLD_WEBHOOK_FUNCTION = """
+CREATE OR REPLACE FUNCTION webhook_enqueue_status_change() RETURNS trigger AS $$
+DECLARE
+  kind text := CASE TG_TABLE_NAME WHEN 'fmeas' THEN 'fmea' ELSE 'action' END;
+  event_type text := kind || '.' || NEW.status;
+  payload jsonb;
+BEGIN
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    payload := jsonb_build_object('fmea_id', NEW.id, 'asset_id', NEW.asset_id, 'version', NEW.version,
+                                  'approved_by', NEW.approved_by, 'updated_by', NEW.updated_by);
+  ELSE
+    SELECT jsonb_build_object('action_id', NEW.id, 'failure_mode_id', NEW.failure_mode_id, 'fmea_id', f.id,
+                              'asset_id', f.asset_id, 'owner', NEW.owner, 'closed_at', NEW.closed_at)
+      INTO payload
+      FROM failure_modes m JOIN fmeas f ON f.id = m.fmea_id
+     WHERE m.id = NEW.failure_mode_id;
+  END IF;
+  payload := payload || jsonb_build_object('event', event_type, 'from', OLD.status, 'to', NEW.status, 'changed_at', now());
+  INSERT INTO webhook_outbox (subscription_id, event_type, entity_key, payload)
+  SELECT s.id, event_type, kind || ':' || NEW.id, payload
+    FROM webhook_subscriptions s
+   WHERE s.is_active AND (event_type = ANY (s.event_types) OR kind || '.*' = ANY (s.event_types));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def _drop_constraint(table: str, name: str) -> None:
+    with_lock_retry(lambda: op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}"))
+
+
+def upgrade() -> None:
+    op.execute(CURRENT_TENANT_FUNCTION)
+    op.execute(TENANT_ROLE_DDL)
+
+    # Existing rows belong to the default tenant. A constant default keeps ADD COLUMN
+    # catalog-only; new rows then take the tenant of the writing transaction.
+    for table in TABLES + ARCHIVE_TABLES:
+        with_lock_retry(
+            lambda: op.add_column(
+                table,
+                sa.Column("tenant_id", sa.String(length=64), nullable=False, server_default="default"),
+                if_not_exists=True,
+            )
+        )
+    for table in TABLES:
+        op.alter_column(table, "tenant_id", server_default=sa.text("fmea_current_tenant()"))
+    # Archive tables carry the value over from the hot table and have no defaults
+    for table in ARCHIVE_TABLES:
+        op.alter_column(table, "tenant_id", server_default=None)
+
+    add_unique_constraint("uq_fmeas_tenant_asset_version", "fmeas", ["tenant_id", "asset_id", "version"])
+    add_unique_constraint("uq_fmeas_tenant_id", "fmeas", ["tenant_id", "id"])
+    add_unique_constraint("uq_failure_modes_tenant_id", "failure_modes", ["tenant_id", "id"])
+    for name, table, columns in INDEXES:
+        create_index_concurrently(name, table, columns)
+    for name, source, referent, local_cols, remote_cols in FOREIGN_KEYS:
+        add_foreign_key(name, source, referent, local_cols, remote_cols, ondelete="CASCADE")
+
+    for name, table, *_ in OLD_FOREIGN_KEYS:
+        _drop_constraint(table, name)
+    _drop_constraint("fmeas", "uq_fmea_asset_version")
+    for name, table, _ in OLD_INDEXES:
+        drop_index_concurrently(name, table)
+
+    op.execute(NOTIFY_FUNCTION)
+    op.execute(WEBHOOK_FUNCTION)
+
+    for table in TABLES + ARCHIVE_TABLES:
+        with_lock_retry(lambda: op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY"))
+        op.execute(f"DROP POLICY IF EXISTS tenant_isolation ON {table}")
+        op.execute(
+            f"CREATE POLICY tenant_isolation ON {table} TO {TENANT_ROLE} "
+            f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())"
+        )
+        op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON {table} TO {TENANT_ROLE}")
+
+
+def downgrade() -> None:
+    for table in TABLES + ARCHIVE_TABLES:
+        op.execute(f"DROP POLICY IF EXISTS tenant_isolation ON {table}")
+        op.execute(f"ALTER TABLE {table} DISABLE ROW LEVEL SECURITY")
+        op.execute(f"REVOKE ALL ON {table} FROM {TENANT_ROLE}")
+    op.execute(OLD_WEBHOOK_FUNCTION)
+    op.execute(OLD_NOTIFY_FUNCTION)
+
+    # Fails if two tenants hold the same asset version: merge or remove tenants first
+    add_unique_constraint("uq_fmea_asset_version", "fmeas", ["asset_id", "version"])
+    for name, table, columns in OLD_INDEXES:
+        create_index_concurrently(name, table, columns)
+    for name, source, referent, local_cols, remote_cols in OLD_FOREIGN_KEYS:
+        add_foreign_key(name, source, referent, local_cols, remote_cols, ondelete="CASCADE")
+
+    for name, table, *_ in FOREIGN_KEYS:
+        _drop_constraint(table, name)
+    for table, name in (
+        ("failure_modes", "uq_failure_modes_tenant_id"),
+        ("fmeas", "uq_fmeas_tenant_id"),
+        ("fmeas", "uq_fmeas_tenant_asset_version"),
+    ):
+        _drop_constraint(table, name)
+    for name, table, _ in INDEXES:
+        drop_index_concurrently(name, table)
+    for table in TABLES + ARCHIVE_TABLES:
+        op.drop_column(table, "tenant_id")
+    # The role is shared by every database of the cluster and is left in place
+    op.execute("DROP FUNCTION IF EXISTS fmea_current_tenant()")
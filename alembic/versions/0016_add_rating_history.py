@@ -0,0 +1,95 @@
+"""
+Add the append-only failure mode rating history
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.migration_ops import with_lock_retry
+
+# revision identifiers, used by Alembic.
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+TENANT_ROLE = "fmea_tenant"
+TABLE = "failure_mode_rating_history"
+
+RECORD_RATINGS_FUNCTION = """
+CREATE OR REPLACE FUNCTION failure_mode_record_ratings() RETURNS trigger AS $$
+BEGIN
+  IF TG_LEVEL = 'STATEMENT' THEN
+    INSERT INTO failure_mode_rating_history (tenant_id, failure_mode_id, severity, occurrence, detection, rpn)
+    SELECT n.tenant_id, n.id, n.severity, n.occurrence, n.detection, n.rpn FROM new_rows n;
+  ELSE
+    INSERT INTO failure_mode_rating_history (tenant_id, failure_mode_id, severity, occurrence, detection, rpn)
+    VALUES (NEW.tenant_id, NEW.id, NEW.severity, NEW.occurrence, NEW.detection, NEW.rpn);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+RECORD_RATINGS_TRIGGERS = (
+    "CREATE TRIGGER failure_modes_record_ratings_insert AFTER INSERT ON failure_modes "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION failure_mode_record_ratings()",
+    "CREATE TRIGGER failure_modes_record_ratings_update AFTER UPDATE OF severity, occurrence, detection "
+    "ON failure_modes FOR EACH ROW "
+    "WHEN ((OLD.severity, OLD.occurrence, OLD.detection) IS DISTINCT FROM (NEW.severity, NEW.occurrence, NEW.detection)) "
+    "EXECUTE FUNCTION failure_mode_record_ratings()",
+)
+# Current ratings as of each failure mode's creation, for those the trigger has not recorded yet;
+# in time order, so the BRIN ranges of the backfilled rows stay narrow
+BACKFILL = f"""
+INSERT INTO {TABLE} (tenant_id, failure_mode_id, severity, occurrence, detection, rpn, recorded_at)
+SELECT m.tenant_id, m.id, m.severity, m.occurrence, m.detection, m.rpn, m.created_at
+  FROM failure_modes m
+ WHERE NOT EXISTS (SELECT 1 FROM {TABLE} h WHERE h.failure_mode_id = m.id)
+ ORDER BY m.created_at, m.id
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        TABLE,
+        sa.Column("failure_mode_id", sa.Integer(), nullable=False),
+        sa.Column("id", sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column("tenant_id", sa.String(length=64), nullable=False, server_default=sa.text("fmea_current_tenant()")),
+        sa.Column("severity", sa.Integer(), nullable=False),
+        sa.Column("occurrence", sa.Integer(), nullable=False),
+        sa.Column("detection", sa.Integer(), nullable=False),
+        sa.Column("rpn", sa.Integer(), nullable=False),
+        sa.Column("recorded_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("failure_mode_id", "id"),
+    )
+    op.create_index(
+        "ix_failure_mode_rating_history_recorded_at", TABLE, ["recorded_at"],
+        postgresql_using="brin", postgresql_with={"autosummarize": "on"},
+    )
+    op.execute(f"ALTER TABLE {TABLE} ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        f"CREATE POLICY tenant_isolation ON {TABLE} TO {TENANT_ROLE} "
+        f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())"
+    )
+    op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON {TABLE} TO {TENANT_ROLE}")
+    op.execute(f"GRANT USAGE ON SEQUENCE {TABLE}_id_seq TO {TENANT_ROLE}")
+
+    op.execute(RECORD_RATINGS_FUNCTION)
+    for statement in RECORD_RATINGS_TRIGGERS:
+        with_lock_retry(lambda: op.execute(statement))
+    # Committed with the triggers in place first, so no rating change falls between
+    # the backfill and the triggers, and failure_modes is not locked while it runs
+    with op.get_context().autocommit_block():
+        op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    for trigger in ("failure_modes_record_ratings_update", "failure_modes_record_ratings_insert"):
+        with_lock_retry(lambda: op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON failure_modes"))
+    op.execute("DROP FUNCTION IF EXISTS failure_mode_record_ratings()")
+    op.drop_table(TABLE)
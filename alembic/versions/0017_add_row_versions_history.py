@@ -0,0 +1,143 @@
+"""
+Add validity ranges and *_versions tables for point-in-time reads
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+
+from db.migration_ops import with_lock_retry
+
+# revision identifiers, used by Alembic.
+revision = "0017"
+down_revision = "0016"
+branch_labels = None
+depends_on = None
+
+TENANT_ROLE = "fmea_tenant"
+CHILD_TABLES = ("actions", "failure_causes", "failure_effects", "controls")
+TABLES = ("fmeas", "failure_modes", *CHILD_TABLES)
+# Columns copied to the versions tables, by name (0017)
+COLUMNS = {
+    "fmeas": (
+        "id", "tenant_id", "asset_id", "title", "description", "version", "is_active", "created_at", "updated_at",
+        "status", "approved_by", "approved_at", "effective_date", "created_by", "updated_by", "supersedes_fmea_id",
+        "archived_at", "row_version", "valid_from",
+    ),
+    "failure_modes": (
+        "id", "tenant_id", "fmea_id", "name", "severity", "occurrence", "detection", "rpn", "created_at",
+        "row_version", "valid_from",
+    ),
+    "actions": (
+        "id", "tenant_id", "failure_mode_id", "description", "owner", "due_date", "status", "notes", "created_at",
+        "closed_at", "row_version", "valid_from",
+    ),
+    "failure_causes": ("id", "tenant_id", "failure_mode_id", "description", "created_at", "valid_from"),
+    "failure_effects": ("id", "tenant_id", "failure_mode_id", "description", "level", "created_at", "valid_from"),
+    "controls": ("id", "tenant_id", "failure_mode_id", "type", "description", "method_ref", "created_at", "valid_from"),
+}
+# GiST (key, valid) indexes besides the (id, valid) exclusion constraint
+KEYS = {"failure_modes": "fmea_id", **{table: "failure_mode_id" for table in CHILD_TABLES}}
+
+STAMP_VALID_FROM_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_stamp_valid_from() RETURNS trigger AS $$
+BEGIN
+  -- Never backwards: a transaction that started before the last writer's keeps its start
+  IF current_setting('fmea.versioning', true) IS DISTINCT FROM 'off' THEN
+    NEW.valid_from := greatest(now(), OLD.valid_from);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def record_versions_function(table: str) -> str:
+    names = ", ".join(COLUMNS[table])
+    old = ", ".join(f"o.{name}" for name in COLUMNS[table])
+    return f"""
+CREATE OR REPLACE FUNCTION {table}_record_versions() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('fmea.versioning', true) = 'off' THEN
+    RETURN NULL;
+  END IF;
+  INSERT INTO {table}_versions ({names}, valid)
+  SELECT {old}, tstzrange(o.valid_from, now()) FROM old_rows o WHERE o.valid_from < now();
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def triggers(table: str) -> list[str]:
+    return [
+        f"CREATE TRIGGER {table}_stamp_valid_from BEFORE UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION fmea_stamp_valid_from()",
+        *(
+            f"CREATE TRIGGER {table}_record_versions_{op_name.lower()} AFTER {op_name} ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION {table}_record_versions()"
+            for op_name in ("UPDATE", "DELETE")
+        ),
+    ]
+
+
+def upgrade() -> None:
+    # '-infinity' is a constant, so existing rows take it from the catalog without a table
+    # rewrite: their history before this migration is unknown, and reads bound them by
+    # created_at instead. Rows written from now on are stamped with their transaction's start.
+    for table in TABLES:
+        with_lock_retry(lambda: op.execute(
+            f"ALTER TABLE {table} ADD COLUMN valid_from timestamptz NOT NULL DEFAULT '-infinity'"
+        ))
+        with_lock_retry(lambda: op.execute(f"ALTER TABLE {table} ALTER COLUMN valid_from SET DEFAULT now()"))
+    for table in ("failure_modes", *CHILD_TABLES):
+        archive = f"{table}_archive"
+        with_lock_retry(lambda: op.execute(
+            f"ALTER TABLE {archive} ADD COLUMN valid_from timestamptz NOT NULL DEFAULT '-infinity'"
+        ))
+        op.execute(f"ALTER TABLE {archive} ALTER COLUMN valid_from DROP DEFAULT")
+
+    for table in TABLES:
+        versions = f"{table}_versions"
+        # Columns, types and NOT NULLs only: no defaults, generated columns, keys or indexes
+        op.execute(f"CREATE TABLE {versions} (LIKE {table})")
+        op.execute(f"ALTER TABLE {versions} ADD COLUMN valid tstzrange NOT NULL")
+        op.execute(
+            f"ALTER TABLE {versions} ADD CONSTRAINT ex_{versions}_id_valid "
+            f"EXCLUDE USING gist (int4range(id, id, '[]') WITH &&, valid WITH &&)"
+        )
+        if table in KEYS:
+            key = KEYS[table]
+            op.execute(
+                f"CREATE INDEX ix_{versions}_{key}_valid ON {versions} "
+                f"USING gist (int4range({key}, {key}, '[]'), valid)"
+            )
+        op.execute(f"ALTER TABLE {versions} ENABLE ROW LEVEL SECURITY")
+        op.execute(
+            f"CREATE POLICY tenant_isolation ON {versions} TO {TENANT_ROLE} "
+            f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())"
+        )
+        op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON {versions} TO {TENANT_ROLE}")
+    op.execute("CREATE INDEX ix_fmeas_versions_asset_id ON fmeas_versions (asset_id)")
+
+    op.execute(STAMP_VALID_FROM_FUNCTION)
+    for table in TABLES:
+        op.execute(record_versions_function(table))
+        for statement in triggers(table):
+            with_lock_retry(lambda: op.execute(statement))
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        for trigger in (f"{table}_record_versions_delete", f"{table}_record_versions_update", f"{table}_stamp_valid_from"):
+            with_lock_retry(lambda: op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+        op.execute(f"DROP FUNCTION IF EXISTS {table}_record_versions()")
+        op.execute(f"DROP TABLE IF EXISTS {table}_versions")
+    op.execute("DROP FUNCTION IF EXISTS fmea_stamp_valid_from()")
+    for table in ("failure_modes", *CHILD_TABLES):
+        with_lock_retry(lambda: op.execute(f"ALTER TABLE {table}_archive DROP COLUMN valid_from"))
+    for table in TABLES:
+        with_lock_retry(lambda: op.execute(f"ALTER TABLE {table} DROP COLUMN valid_from"))
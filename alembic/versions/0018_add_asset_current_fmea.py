@@ -0,0 +1,120 @@
+"""
+Add the trigger-maintained asset_current_fmea mapping
+
+Revision ID: 0018
+Revises: 0017
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.migration_ops import with_lock_retry
+
+# revision identifiers, used by Alembic.
+revision = "0018"
+down_revision = "0017"
+branch_labels = None
+depends_on = None
+
+TENANT_ROLE = "fmea_tenant"
+TABLE = "asset_current_fmea"
+
+SYNC_CURRENT_FMEA_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_sync_current(p_tenant text, p_asset text) RETURNS void AS $$
+DECLARE
+  current record;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtextextended('asset_current_fmea/' || p_tenant || '/' || p_asset, 0));
+  SELECT id, version INTO current FROM fmeas
+   WHERE tenant_id = p_tenant AND asset_id = p_asset AND status = 'approved' AND is_active
+   ORDER BY version DESC LIMIT 1;
+  IF NOT FOUND THEN
+    DELETE FROM asset_current_fmea WHERE tenant_id = p_tenant AND asset_id = p_asset;
+  ELSE
+    INSERT INTO asset_current_fmea AS m (tenant_id, asset_id, fmea_id, version)
+    VALUES (p_tenant, p_asset, current.id, current.version)
+    ON CONFLICT (tenant_id, asset_id) DO UPDATE SET fmea_id = excluded.fmea_id, version = excluded.version, updated_at = now()
+    WHERE (m.fmea_id, m.version) IS DISTINCT FROM (excluded.fmea_id, excluded.version);
+  END IF;
+END;
+$$ LANGUAGE plpgsql
+"""
+REFRESH_CURRENT_FMEA_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmeas_refresh_current() RETURNS trigger AS $$
+BEGIN
+  IF TG_LEVEL = 'ROW' THEN
+    PERFORM fmea_sync_current(OLD.tenant_id, OLD.asset_id);
+    IF (NEW.tenant_id, NEW.asset_id) IS DISTINCT FROM (OLD.tenant_id, OLD.asset_id) THEN
+      PERFORM fmea_sync_current(NEW.tenant_id, NEW.asset_id);
+    END IF;
+  ELSE
+    PERFORM fmea_sync_current(a.tenant_id, a.asset_id) FROM (
+      SELECT DISTINCT tenant_id, asset_id FROM changed_rows WHERE status = 'approved' AND is_active ORDER BY 1, 2
+    ) a;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+REFRESH_CURRENT_FMEA_TRIGGERS = (
+    "CREATE TRIGGER fmeas_refresh_current_insert AFTER INSERT ON fmeas "
+    "REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmeas_refresh_current()",
+    "CREATE TRIGGER fmeas_refresh_current_delete AFTER DELETE ON fmeas "
+    "REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmeas_refresh_current()",
+    "CREATE TRIGGER fmeas_refresh_current_update AFTER UPDATE OF status, is_active, version, asset_id "
+    "ON fmeas FOR EACH ROW "
+    "WHEN ((OLD.status, OLD.is_active, OLD.version, OLD.asset_id) IS DISTINCT FROM "
+    "(NEW.status, NEW.is_active, NEW.version, NEW.asset_id)) "
+    "EXECUTE FUNCTION fmeas_refresh_current()",
+)
+# Assets the triggers have not mapped yet, from their latest approved, active version
+BACKFILL = f"""
+INSERT INTO {TABLE} (tenant_id, asset_id, fmea_id, version)
+SELECT DISTINCT ON (tenant_id, asset_id) tenant_id, asset_id, id, version
+  FROM fmeas
+ WHERE status = 'approved' AND is_active
+ ORDER BY tenant_id, asset_id, version DESC
+ON CONFLICT (tenant_id, asset_id) DO NOTHING
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        TABLE,
+        sa.Column("tenant_id", sa.String(length=64), nullable=False, server_default=sa.text("fmea_current_tenant()")),
+        sa.Column("asset_id", sa.String(length=64), nullable=False),
+        sa.Column("fmea_id", sa.Integer(), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("tenant_id", "asset_id", name="pk_asset_current_fmea"),
+        sa.ForeignKeyConstraint(
+            ["tenant_id", "fmea_id"], ["fmeas.tenant_id", "fmeas.id"],
+            name="fk_asset_current_fmea_tenant_fmea", ondelete="CASCADE",
+        ),
+    )
+    op.create_index("ix_asset_current_fmea_fmea_id", TABLE, ["fmea_id"])
+    op.execute(f"ALTER TABLE {TABLE} ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        f"CREATE POLICY tenant_isolation ON {TABLE} TO {TENANT_ROLE} "
+        f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())"
+    )
+    op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON {TABLE} TO {TENANT_ROLE}")
+
+    op.execute(SYNC_CURRENT_FMEA_FUNCTION)
+    op.execute(REFRESH_CURRENT_FMEA_FUNCTION)
+    for statement in REFRESH_CURRENT_FMEA_TRIGGERS:
+        with_lock_retry(lambda: op.execute(statement))
+    # Committed with the triggers in place first, so no version change falls between the
+    # backfill and the triggers, and fmeas is not locked while it runs
+    with op.get_context().autocommit_block():
+        op.execute(BACKFILL)
+
+
+def downgrade() -> None:
+    for trigger in ("fmeas_refresh_current_update", "fmeas_refresh_current_delete", "fmeas_refresh_current_insert"):
+        with_lock_retry(lambda: op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON fmeas"))
+    op.execute("DROP FUNCTION IF EXISTS fmeas_refresh_current()")
+    op.execute("DROP FUNCTION IF EXISTS fmea_sync_current(text, text)")
+    op.drop_table(TABLE)
@@ -0,0 +1,279 @@
+"""
+Add the asset hierarchy (closure table) with trigger-maintained risk rollups
+
+Revision ID: 0019
+Revises: 0018
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.migration_ops import with_lock_retry
+
+# revision identifiers, used by Alembic.
+revision = "0019"
+down_revision = "0018"
+branch_labels = None
+depends_on = None
+
+TENANT_ROLE = "fmea_tenant"
+TABLES = ("assets", "asset_closure", "asset_rollups")
+
+HIGH_ACTION_PRIORITY_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_high_action_priority(s integer, o integer, d integer) RETURNS boolean
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT (s >= 9 AND (o >= 6 OR (o >= 4 AND d >= 2) OR (o >= 2 AND d >= 7)))
+      OR (s >= 7 AND (o >= 8 OR (o >= 6 AND d >= 2) OR (o >= 4 AND d >= 7)))
+      OR (s >= 4 AND o >= 8 AND d >= 5)
+$$
+"""
+REFRESH_ROLLUP_FUNCTION = """
+CREATE OR REPLACE FUNCTION asset_refresh_rollup(p_tenant text, p_asset text) RETURNS void AS $$
+DECLARE
+  node record;
+BEGIN
+  PERFORM 1 FROM asset_rollups r JOIN asset_closure c ON c.tenant_id = r.tenant_id AND c.ancestor_id = r.asset_id
+   WHERE c.tenant_id = p_tenant AND c.descendant_id = p_asset
+   ORDER BY c.depth DESC FOR UPDATE OF r;
+  IF NOT FOUND THEN
+    RETURN;  -- not in the hierarchy
+  END IF;
+  UPDATE asset_rollups r
+     SET own_max_rpn = s.max_rpn, own_high_ap_modes = s.high_ap_modes, own_open_actions = s.open_actions
+    FROM (
+      SELECT max(m.rpn) AS max_rpn,
+             count(m.id) FILTER (WHERE fmea_high_action_priority(m.severity, m.occurrence, m.detection)) AS high_ap_modes,
+             (SELECT count(*) FROM asset_current_fmea cc
+                JOIN failure_modes mm ON mm.fmea_id = cc.fmea_id
+                JOIN actions a ON a.failure_mode_id = mm.id
+               WHERE cc.tenant_id = p_tenant AND cc.asset_id = p_asset AND a.status IN ('open','in_progress')) AS open_actions
+        FROM asset_current_fmea c JOIN failure_modes m ON m.fmea_id = c.fmea_id
+       WHERE c.tenant_id = p_tenant AND c.asset_id = p_asset
+    ) s
+   WHERE r.tenant_id = p_tenant AND r.asset_id = p_asset;
+  FOR node IN
+    SELECT ancestor_id FROM asset_closure WHERE tenant_id = p_tenant AND descendant_id = p_asset ORDER BY depth
+  LOOP
+    UPDATE asset_rollups r
+       SET max_rpn = greatest(r.own_max_rpn, k.max_rpn),
+           high_ap_modes = r.own_high_ap_modes + coalesce(k.high_ap_modes, 0),
+           open_actions = r.own_open_actions + coalesce(k.open_actions, 0),
+           updated_at = now()
+      FROM (
+        SELECT max(cr.max_rpn) AS max_rpn, sum(cr.high_ap_modes) AS high_ap_modes, sum(cr.open_actions) AS open_actions
+          FROM assets child JOIN asset_rollups cr ON cr.tenant_id = child.tenant_id AND cr.asset_id = child.asset_id
+         WHERE child.tenant_id = p_tenant AND child.parent_asset_id = node.ancestor_id
+      ) k
+     WHERE r.tenant_id = p_tenant AND r.asset_id = node.ancestor_id;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql
+"""
+MAINTAIN_CLOSURE_FUNCTION = """
+CREATE OR REPLACE FUNCTION assets_maintain_closure() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO asset_closure (tenant_id, ancestor_id, descendant_id, depth)
+    SELECT NEW.tenant_id, NEW.asset_id, NEW.asset_id, 0
+    UNION ALL
+    SELECT tenant_id, ancestor_id, NEW.asset_id, depth + 1
+      FROM asset_closure WHERE tenant_id = NEW.tenant_id AND descendant_id = NEW.parent_asset_id;
+    INSERT INTO asset_rollups (tenant_id, asset_id) VALUES (NEW.tenant_id, NEW.asset_id);
+    -- A new leaf adds nothing to its ancestors until it has a current FMEA, which keeps bulk loads cheap
+    IF EXISTS (SELECT 1 FROM asset_current_fmea WHERE tenant_id = NEW.tenant_id AND asset_id = NEW.asset_id) THEN
+      PERFORM asset_refresh_rollup(NEW.tenant_id, NEW.asset_id);
+    END IF;
+  ELSIF TG_OP = 'UPDATE' THEN
+    IF EXISTS (SELECT 1 FROM asset_closure WHERE tenant_id = NEW.tenant_id
+                AND ancestor_id = NEW.asset_id AND descendant_id = NEW.parent_asset_id) THEN
+      RAISE EXCEPTION USING ERRCODE = 'check_violation',
+        MESSAGE = 'asset ' || NEW.asset_id || ' cannot move under its own subtree';
+    END IF;
+    -- Detach the subtree from its old ancestors, then attach it under the new parent
+    DELETE FROM asset_closure d USING asset_closure sub, asset_closure anc
+     WHERE sub.tenant_id = NEW.tenant_id AND sub.ancestor_id = NEW.asset_id
+       AND anc.tenant_id = NEW.tenant_id AND anc.descendant_id = NEW.asset_id AND anc.depth > 0
+       AND d.tenant_id = NEW.tenant_id AND d.ancestor_id = anc.ancestor_id AND d.descendant_id = sub.descendant_id;
+    INSERT INTO asset_closure (tenant_id, ancestor_id, descendant_id, depth)
+    SELECT NEW.tenant_id, anc.ancestor_id, sub.descendant_id, anc.depth + sub.depth + 1
+      FROM asset_closure anc, asset_closure sub
+     WHERE anc.tenant_id = NEW.tenant_id AND anc.descendant_id = NEW.parent_asset_id
+       AND sub.tenant_id = NEW.tenant_id AND sub.ancestor_id = NEW.asset_id;
+    IF OLD.parent_asset_id IS NOT NULL THEN
+      PERFORM asset_refresh_rollup(OLD.tenant_id, OLD.parent_asset_id);
+    END IF;
+    PERFORM asset_refresh_rollup(NEW.tenant_id, NEW.asset_id);
+  ELSIF OLD.parent_asset_id IS NOT NULL THEN
+    -- The node's closure and rollup rows went with it
+    PERFORM asset_refresh_rollup(OLD.tenant_id, OLD.parent_asset_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+CURRENT_FMEA_REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION asset_current_fmea_refresh_rollup() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM asset_refresh_rollup(OLD.tenant_id, OLD.asset_id);
+  ELSE
+    PERFORM asset_refresh_rollup(NEW.tenant_id, NEW.asset_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+RISK_REFRESH_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_risk_refresh_rollup() RETURNS trigger AS $$
+DECLARE
+  fmea_ids integer[];
+BEGIN
+  IF TG_LEVEL = 'ROW' AND TG_TABLE_NAME = 'failure_modes' THEN
+    fmea_ids := ARRAY[NEW.fmea_id];
+  ELSIF TG_LEVEL = 'ROW' THEN
+    fmea_ids := ARRAY(SELECT fmea_id FROM failure_modes WHERE id IN (OLD.failure_mode_id, NEW.failure_mode_id));
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    fmea_ids := ARRAY(SELECT DISTINCT fmea_id FROM changed_rows);
+  ELSE
+    fmea_ids := ARRAY(SELECT DISTINCT m.fmea_id FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id);
+  END IF;
+  -- Only current FMEAs count towards the rollups
+  PERFORM asset_refresh_rollup(c.tenant_id, c.asset_id) FROM (
+    SELECT tenant_id, asset_id FROM asset_current_fmea WHERE fmea_id = ANY (fmea_ids) ORDER BY 1, 2
+  ) c;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+ROLLUP_TRIGGERS = {
+    "assets": (
+        "CREATE TRIGGER assets_maintain_closure AFTER INSERT OR DELETE ON assets "
+        "FOR EACH ROW EXECUTE FUNCTION assets_maintain_closure()",
+        "CREATE TRIGGER assets_maintain_closure_move AFTER UPDATE OF parent_asset_id ON assets FOR EACH ROW "
+        "WHEN (OLD.parent_asset_id IS DISTINCT FROM NEW.parent_asset_id) EXECUTE FUNCTION assets_maintain_closure()",
+    ),
+    "asset_current_fmea": (
+        "CREATE TRIGGER asset_current_fmea_refresh_rollup AFTER INSERT OR UPDATE OR DELETE ON asset_current_fmea "
+        "FOR EACH ROW EXECUTE FUNCTION asset_current_fmea_refresh_rollup()",
+    ),
+    "failure_modes": (
+        *(
+            f"CREATE TRIGGER failure_modes_refresh_rollup_{op_name.lower()} AFTER {op_name} ON failure_modes "
+            f"REFERENCING {transition} TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmea_risk_refresh_rollup()"
+            for op_name, transition in (("INSERT", "NEW"), ("DELETE", "OLD"))
+        ),
+        "CREATE TRIGGER failure_modes_refresh_rollup_update AFTER UPDATE OF severity, occurrence, detection "
+        "ON failure_modes FOR EACH ROW "
+        "WHEN ((OLD.severity, OLD.occurrence, OLD.detection) IS DISTINCT FROM (NEW.severity, NEW.occurrence, NEW.detection)) "
+        "EXECUTE FUNCTION fmea_risk_refresh_rollup()",
+    ),
+    "actions": (
+        *(
+            f"CREATE TRIGGER actions_refresh_rollup_{op_name.lower()} AFTER {op_name} ON actions "
+            f"REFERENCING {transition} TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmea_risk_refresh_rollup()"
+            for op_name, transition in (("INSERT", "NEW"), ("DELETE", "OLD"))
+        ),
+        "CREATE TRIGGER actions_refresh_rollup_update AFTER UPDATE OF status, failure_mode_id ON actions FOR EACH ROW "
+        "WHEN ((OLD.status, OLD.failure_mode_id) IS DISTINCT FROM (NEW.status, NEW.failure_mode_id)) "
+        "EXECUTE FUNCTION fmea_risk_refresh_rollup()",
+    ),
+}
+TRIGGER_NAMES = {
+    "assets": ("assets_maintain_closure", "assets_maintain_closure_move"),
+    "asset_current_fmea": ("asset_current_fmea_refresh_rollup",),
+    "failure_modes": tuple(f"failure_modes_refresh_rollup_{op_name}" for op_name in ("insert", "delete", "update")),
+    "actions": tuple(f"actions_refresh_rollup_{op_name}" for op_name in ("insert", "delete", "update")),
+}
+
+
+def upgrade() -> None:
+    tenant_id = lambda: sa.Column(
+        "tenant_id", sa.String(length=64), nullable=False, server_default=sa.text("fmea_current_tenant()")
+    )
+    op.create_table(
+        "assets",
+        tenant_id(),
+        sa.Column("asset_id", sa.String(length=64), nullable=False),
+        sa.Column("parent_asset_id", sa.String(length=64), nullable=True),
+        sa.Column("name", sa.String(length=255), nullable=True),
+        sa.Column("level", sa.String(length=32), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("tenant_id", "asset_id", name="pk_assets"),
+        sa.ForeignKeyConstraint(
+            ["tenant_id", "parent_asset_id"], ["assets.tenant_id", "assets.asset_id"], name="fk_assets_tenant_parent",
+        ),
+        sa.CheckConstraint(
+            "level IS NULL OR level IN ('site','line','machine','component')", name="ck_assets_level_valid",
+        ),
+        sa.CheckConstraint("parent_asset_id IS DISTINCT FROM asset_id", name="ck_assets_not_own_parent"),
+    )
+    op.create_index("ix_assets_tenant_parent_asset_id", "assets", ["tenant_id", "parent_asset_id"])
+    op.create_table(
+        "asset_closure",
+        tenant_id(),
+        sa.Column("ancestor_id", sa.String(length=64), nullable=False),
+        sa.Column("descendant_id", sa.String(length=64), nullable=False),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("tenant_id", "ancestor_id", "descendant_id", name="pk_asset_closure"),
+        sa.ForeignKeyConstraint(
+            ["tenant_id", "ancestor_id"], ["assets.tenant_id", "assets.asset_id"],
+            name="fk_asset_closure_tenant_ancestor", ondelete="CASCADE",
+        ),
+        sa.ForeignKeyConstraint(
+            ["tenant_id", "descendant_id"], ["assets.tenant_id", "assets.asset_id"],
+            name="fk_asset_closure_tenant_descendant", ondelete="CASCADE",
+        ),
+    )
+    op.create_index(
+        "ix_asset_closure_tenant_descendant_depth", "asset_closure", ["tenant_id", "descendant_id", "depth"]
+    )
+    op.create_table(
+        "asset_rollups",
+        tenant_id(),
+        sa.Column("asset_id", sa.String(length=64), nullable=False),
+        sa.Column("own_max_rpn", sa.Integer(), nullable=True),
+        sa.Column("own_high_ap_modes", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("own_open_actions", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("max_rpn", sa.Integer(), nullable=True),
+        sa.Column("high_ap_modes", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("open_actions", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.text("now()")),
+        sa.PrimaryKeyConstraint("tenant_id", "asset_id", name="pk_asset_rollups"),
+        sa.ForeignKeyConstraint(
+            ["tenant_id", "asset_id"], ["assets.tenant_id", "assets.asset_id"],
+            name="fk_asset_rollups_tenant_asset", ondelete="CASCADE",
+        ),
+    )
+    for table in TABLES:
+        op.execute(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY")
+        op.execute(
+            f"CREATE POLICY tenant_isolation ON {table} TO {TENANT_ROLE} "
+            f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())"
+        )
+        op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON {table} TO {TENANT_ROLE}")
+
+    for function in (
+        HIGH_ACTION_PRIORITY_FUNCTION, REFRESH_ROLLUP_FUNCTION, MAINTAIN_CLOSURE_FUNCTION,
+        CURRENT_FMEA_REFRESH_FUNCTION, RISK_REFRESH_FUNCTION,
+    ):
+        op.execute(function)
+    # The hierarchy starts empty: rollups are made as assets are added, so nothing to backfill
+    for statements in ROLLUP_TRIGGERS.values():
+        for statement in statements:
+            with_lock_retry(lambda: op.execute(statement))
+
+
+def downgrade() -> None:
+    for table, triggers in TRIGGER_NAMES.items():
+        for trigger in triggers:
+            with_lock_retry(lambda: op.execute(f"DROP TRIGGER IF EXISTS {trigger} ON {table}"))
+    for function in (
+        "fmea_risk_refresh_rollup()", "asset_current_fmea_refresh_rollup()", "assets_maintain_closure()",
+        "asset_refresh_rollup(text, text)", "fmea_high_action_priority(integer, integer, integer)",
+    ):
+        op.execute(f"DROP FUNCTION IF EXISTS {function}")
+    for table in reversed(TABLES):
+        op.drop_table(table)
@@ -0,0 +1,88 @@
+"""
+Add pre-rendered fmea_documents, marked stale by trigger
+
+Revision ID: 0020
+Revises: 0019
+Create Date: 2026-10-19
+"""
+from __future__ import annotations
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.migration_ops import with_lock_retry
+
+# revision identifiers, used by Alembic.
+revision = "0020"
+down_revision = "0019"
+branch_labels = None
+depends_on = None
+
+TENANT_ROLE = "fmea_tenant"
+TABLE = "fmea_documents"
+TREE_TABLES = ("fmeas", "failure_modes", "actions", "failure_causes", "failure_effects", "controls")
+OPERATIONS = (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+
+INVALIDATE_DOCUMENTS_FUNCTION = """
+CREATE OR REPLACE FUNCTION fmea_invalidate_documents() RETURNS trigger AS $$
+DECLARE
+  fmea_ids integer[];
+BEGIN
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    fmea_ids := ARRAY(SELECT id FROM changed_rows);
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    fmea_ids := ARRAY(SELECT DISTINCT fmea_id FROM changed_rows);
+  ELSE
+    fmea_ids := ARRAY(SELECT DISTINCT m.fmea_id FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id);
+  END IF;
+  -- Deleted FMEAs are not found, and their documents went with them
+  INSERT INTO fmea_documents AS d (fmea_id, tenant_id, generation, stale_since)
+  SELECT id, tenant_id, 1, now() FROM fmeas WHERE id = ANY (fmea_ids) ORDER BY id
+  ON CONFLICT (fmea_id) DO UPDATE SET generation = d.generation + 1, stale_since = coalesce(d.stale_since, now());
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        TABLE,
+        sa.Column("fmea_id", sa.Integer(), nullable=False),
+        sa.Column("tenant_id", sa.String(length=64), nullable=False, server_default=sa.text("fmea_current_tenant()")),
+        sa.Column("generation", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("body", sa.LargeBinary(), nullable=True),
+        sa.Column("rendered_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("stale_since", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("fmea_id", name="pk_fmea_documents"),
+        sa.ForeignKeyConstraint(
+            ["tenant_id", "fmea_id"], ["fmeas.tenant_id", "fmeas.id"],
+            name="fk_fmea_documents_tenant_fmea", ondelete="CASCADE",
+        ),
+    )
+    op.execute(f"ALTER TABLE {TABLE} ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        f"CREATE POLICY tenant_isolation ON {TABLE} TO {TENANT_ROLE} "
+        f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())"
+    )
+    op.execute(f"GRANT SELECT, INSERT, UPDATE, DELETE ON {TABLE} TO {TENANT_ROLE}")
+
+    op.execute(INVALIDATE_DOCUMENTS_FUNCTION)
+    # No backfill: FMEAs without a document are rendered on their first read
+    for table in TREE_TABLES:
+        for operation, transition in OPERATIONS:
+            with_lock_retry(lambda: op.execute(
+                f"CREATE TRIGGER {table}_invalidate_documents_{operation.lower()} AFTER {operation} ON {table} "
+                f"REFERENCING {transition} TABLE AS changed_rows "
+                f"FOR EACH STATEMENT EXECUTE FUNCTION fmea_invalidate_documents()"
+            ))
+
+
+def downgrade() -> None:
+    for table in TREE_TABLES:
+        for operation, _ in OPERATIONS:
+            with_lock_retry(lambda: op.execute(
+                f"DROP TRIGGER IF EXISTS {table}_invalidate_documents_{operation.lower()} ON {table}"
+            ))
+    op.execute("DROP FUNCTION IF EXISTS fmea_invalidate_documents()")
+    op.drop_table(TABLE)
@@ -104,16 +104,73 @@ migrate_db() {
   (cd "$ROOT_DIR" && run_in_conda alembic upgrade head)
 }
 
+compose_shards_up() {
+  require_cmd podman-compose
+  ensure_podman_machine
+  echo "Starting shard databases with podman-compose..."
+  podman-compose -f "$DB_COMPOSE_FILE" --profile shards up -d
+}
+
+migrate_shards() {
+  update_conda_env
+  echo "Migrating every shard in DB_SHARDS and tagging its id sequences (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m db.sharding migrate)
+}
+
+rehearse_migrations() {
+  update_conda_env
+  echo "Rehearsing migrations on a seeded scratch database (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m db.rehearse "$@")
+}
+
+seed_db() {
+  update_conda_env
+  echo "Seeding synthetic fleet (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m db.seed "$@")
+}
+
 run_tests_api() {
   update_conda_env
   echo "Running API tests (in conda env '$CONDA_ENV_NAME')..."
   (cd "$ROOT_DIR" && run_in_conda pytest -q src/api/tests)
 }
 
+archive_db() {
+  update_conda_env
+  echo "Archiving superseded FMEAs (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m db.archival "$@")
+}
+
+run_webhooks() {
+  update_conda_env
+  echo "Starting webhook dispatcher (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m api.webhooks "$@")
+}
+
+run_jobs() {
+  update_conda_env
+  echo "Starting background job worker (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m api.jobs "$@")
+}
+
+run_benchmarks() {
+  update_conda_env
+  echo "Running micro-benchmarks (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m api.benchmarks "$@")
+}
+
+run_loadtest() {
+  update_conda_env
+  echo "Running API load test (in conda env '$CONDA_ENV_NAME')..."
+  (cd "$ROOT_DIR/src" && run_in_conda python -m api.loadtest "$@")
+}
+
 start_api() {
   update_conda_env
   echo "Starting API server (in conda env '$CONDA_ENV_NAME')..."
-  (cd "$ROOT_DIR" && run_in_conda uvicorn src.api.main:app --host 0.0.0.0 --port 8000 --reload)
+  # Per-statement and pool-wait limits for request traffic (workers and CLIs run without them)
+  (cd "$ROOT_DIR" && DB_STATEMENT_TIMEOUT_MS="${DB_STATEMENT_TIMEOUT_MS:-5000}" DB_POOL_TIMEOUT="${DB_POOL_TIMEOUT:-5}" \
+    run_in_conda uvicorn src.api.main:app --host 0.0.0.0 --port 8000 --reload)
 }
 
 usage() {
@@ -129,9 +186,23 @@ Commands:
   status        Show service status
   logs          Tail service logs
   migrate       Apply DB migrations (alembic upgrade head)
+  start:shards  Also start the shard containers (ports 5434, 5435) for a sharded fleet
+  migrate:shards
+                Migrate DB_NAME and every DB_SHARDS database, tagging ids per shard
+  migrate-rehearse [args]
+                Time each migration against a seeded scratch DB (e.g. --from 0007 --assets 20000 --hold 5)
+  seed [args]   Load a deterministic synthetic fleet (e.g. --assets 100000 --workers 8)
+  archive [args]
+                Move superseded FMEA trees to archive tables (e.g. --older-than-days 365)
   test:db       Run database tests (pytest src/db)
   test:api      Run API tests (pytest src/api/tests)
   api           Start API development server (uvicorn with reload)
+  webhooks [args]
+                Run the webhook dispatcher (e.g. --concurrency 8, --once)
+  jobs [args]   Run the background job worker (e.g. --threads 2, --once)
+  bench [args]  Run crud/serialization micro-benchmarks (--save-baseline, --compare)
+  loadtest [args]
+                Run end-to-end load scenarios (e.g. --launch --concurrency 8,32, --noisy-neighbour authoring)
   help          Show this help
 EOF
 }
@@ -156,6 +227,24 @@ case "$cmd" in
   migrate)
     migrate_db
     ;;
+  start:shards)
+    compose_shards_up
+    ;;
+  migrate:shards)
+    migrate_shards
+    ;;
+  migrate-rehearse)
+    shift
+    rehearse_migrations "$@"
+    ;;
+  seed)
+    shift
+    seed_db "$@"
+    ;;
+  archive)
+    shift
+    archive_db "$@"
+    ;;
   test:db)
     run_tests_db
     ;;
@@ -165,6 +254,22 @@ case "$cmd" in
   api)
     start_api
     ;;
+  webhooks)
+    shift
+    run_webhooks "$@"
+    ;;
+  jobs)
+    shift
+    run_jobs "$@"
+    ;;
+  bench)
+    shift
+    run_benchmarks "$@"
+    ;;
+  loadtest)
+    shift
+    run_loadtest "$@"
+    ;;
   help|--help|-h)
     usage
     ;;
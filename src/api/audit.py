@@ -0,0 +1,327 @@
+"""Change audit trail for the six FMEA tables.
+
+crud reports every create, update and delete through :func:`record` with the
+row's values before and after the change: the whole row for creates and
+deletes, only the changed columns for updates. A delete also records the rows
+it cascades to. The actor is the ``X-User`` request header, captured by
+:class:`AuditMiddleware`. ``FMEA_AUDIT_MODE`` selects how entries reach
+``audit_log``:
+
+``async`` (default)
+    Entries wait on the session until it commits (rolled back changes are
+    never recorded), then go to an in-memory buffer that a background thread
+    writes with ``COPY`` in batches. Writes pay no extra round trip. Entries
+    still buffered when the process dies are lost: normally at most
+    ``FLUSH_INTERVAL`` worth, more if the database was unreachable.
+``sync``
+    Each entry is inserted in the transaction of the change and commits or
+    rolls back with it, at the cost of one more statement per write (route
+    query budgets assume ``async``).
+``off``
+    Nothing is recorded.
+
+Writers that go around crud with Core statements either record their changes
+with :func:`record_created` (the clone job) or are exempt: ``db.seed`` loads
+fixture data, and ``db.archival`` moves rows to the archive tables unchanged.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import os
+import threading
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterable, Mapping, Optional
+
+from fastapi import HTTPException, Query
+from psycopg.types.json import Jsonb
+from sqlalchemy import Table, event, insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from db.models import DEFAULT_TENANT, AuditEntry
+from db.tenancy import session_tenant
+
+logger = logging.getLogger(__name__)
+
+MODE_ENV = "FMEA_AUDIT_MODE"
+MODES = ("off", "async", "sync")
+
+ACTOR_HEADER = b"x-user"
+
+# A batch is written when this many entries are buffered or FLUSH_INTERVAL has passed
+BATCH_SIZE = 1000
+FLUSH_INTERVAL = 0.2
+# Oldest entries are dropped beyond this (only reachable while the database is down)
+MAX_PENDING = 100_000
+
+_PENDING_KEY = "audit_pending"
+_COPY = "COPY audit_log (occurred_at, actor, action, table_name, row_id, before, after, tenant_id) FROM STDIN"
+
+_current_actor: ContextVar[Optional[str]] = ContextVar("fmea_audit_actor", default=None)
+
+
+def get_mode() -> str:
+    mode = os.getenv(MODE_ENV, "async").strip().lower()
+    return mode if mode in MODES else "async"
+
+
+@dataclass(frozen=True)
+class Change:
+    occurred_at: datetime
+    actor: Optional[str]
+    action: str
+    table_name: str
+    row_id: int
+    before: Optional[dict[str, Any]]
+    after: Optional[dict[str, Any]]
+    # The writer's connection is unscoped: the entry carries the tenant of the change
+    tenant_id: str = DEFAULT_TENANT
+
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def snapshot(table: Table, values: dict[str, Any]) -> dict[str, Any]:
+    """JSON-ready copy of a row's column values (missing columns are ``None``)."""
+    return {c.name: _json_value(values.get(c.name)) for c in table.columns}
+
+
+def diff(before: dict[str, Any], after: dict[str, Any]) -> tuple[dict[str, Any], dict[str, Any]]:
+    """The columns that differ between two snapshots, as (before, after)."""
+    changed = [name for name, value in after.items() if before.get(name) != value]
+    return {name: before.get(name) for name in changed}, {name: after[name] for name in changed}
+
+
+def record(
+    db: Session,
+    action: str,
+    table: Table,
+    row_id: int,
+    before: Optional[dict[str, Any]] = None,
+    after: Optional[dict[str, Any]] = None,
+) -> None:
+    """Record a change made in ``db``'s current transaction; call before committing."""
+    mode = get_mode()
+    if mode == "off":
+        return
+    change = Change(
+        datetime.now(timezone.utc), _current_actor.get(), action, table.name, row_id, before, after, session_tenant(db)
+    )
+    if mode == "sync":
+        db.execute(insert(AuditEntry.__table__).values(**asdict(change)))
+    else:
+        db.info.setdefault(_PENDING_KEY, []).append(change)
+
+
+def record_created(
+    conn: Connection, table: Table, rows: Iterable[Mapping[str, Any]], actor: Optional[str], tenant_id: str
+) -> None:
+    """Record rows a Core writer created in ``conn``'s transaction, as one multi-row insert.
+
+    Such writers have no session to hold entries until commit, so the entries
+    are written as in ``sync`` mode, whatever the mode (bar ``off``).
+    """
+    if get_mode() == "off":
+        return
+    now = datetime.now(timezone.utc)
+    entries = [
+        asdict(Change(now, actor, "create", table.name, row["id"], None, snapshot(table, row), tenant_id)) for row in rows
+    ]
+    if entries:
+        conn.execute(insert(AuditEntry.__table__), entries)
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_pending(session: Session) -> None:
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        get_writer().submit(changes)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _jsonb(value: Optional[dict[str, Any]]) -> Optional[Jsonb]:
+    return None if value is None else Jsonb(value)
+
+
+class AuditWriter:
+    """Buffers changes in memory and writes them to ``audit_log`` from a background thread."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        batch_size: int = BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_pending: int = MAX_PENDING,
+    ) -> None:
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.dropped = 0
+        self._pending: deque[Change] = deque()
+        self._cond = threading.Condition()
+        # Serializes batches so flush() returns only after everything before it is written
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def submit(self, changes: Iterable[Change]) -> None:
+        with self._cond:
+            self._pending.extend(changes)
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                for _ in range(overflow):
+                    self._pending.popleft()
+                self.dropped += overflow
+                logger.warning("audit buffer full, dropped %d oldest entries", overflow)
+            closed = self._closed
+            if not closed and self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                self._thread.start()
+            elif len(self._pending) >= self.batch_size:
+                self._cond.notify()
+        if closed:
+            # Late submissions (e.g. during shutdown) are written straight away
+            self.flush()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def flush(self) -> None:
+        """Write every buffered change now; buffered changes are kept if a batch fails."""
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    batch = [self._pending.popleft() for _ in range(min(len(self._pending), self.batch_size))]
+                if not batch:
+                    return
+                try:
+                    self._write(batch)
+                except Exception:
+                    with self._cond:
+                        self._pending.extendleft(reversed(batch))
+                    raise
+
+    def close(self) -> None:
+        """Stop the background thread and write what is left."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._pending) >= self.batch_size, self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("audit flush failed, %d entries buffered", self.pending())
+
+    def _write(self, batch: list[Change]) -> None:
+        connection = self.engine.raw_connection()
+        try:
+            with connection.cursor() as cursor, cursor.copy(_COPY) as copy:
+                for c in batch:
+                    copy.write_row(
+                        (c.occurred_at, c.actor, c.action, c.table_name, c.row_id, _jsonb(c.before), _jsonb(c.after), c.tenant_id)
+                    )
+            connection.commit()
+        finally:
+            connection.close()
+        self.written += len(batch)
+
+
+_writer: Optional[AuditWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> AuditWriter:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            from db.database import get_engine
+
+            _writer = AuditWriter(get_engine())
+        return _writer
+
+
+def shutdown() -> None:
+    """Flush and stop the process-wide writer (application shutdown)."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
+
+
+class AuditMiddleware:
+    """Pure ASGI middleware making the ``X-User`` header the actor of a request's changes."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        actor = next((value.decode("latin-1")[:255] for name, value in scope["headers"] if name == ACTOR_HEADER), None)
+        token = _current_actor.set(actor)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_actor.reset(token)
+
+
+@dataclass(frozen=True)
+class Page:
+    limit: int
+    # (occurred_at, id) of the last entry of the previous page
+    after: Optional[tuple[datetime, int]] = None
+
+
+def encode_cursor(row: dict[str, Any]) -> str:
+    payload = json.dumps([row["occurred_at"].isoformat(), row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        occurred_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(occurred_at), int(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("malformed cursor") from None
+
+
+def page(rows: list[dict], limit: int) -> tuple[list[dict], Optional[str]]:
+    """Trim the look-ahead row fetched by crud and build the next-page cursor."""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+def page_params(
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+) -> Page:
+    try:
+        return Page(limit=limit, after=None if cursor is None else decode_cursor(cursor))
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
@@ -0,0 +1,10 @@
+"""Micro-benchmarks for crud and serialization hot paths.
+
+Run against the configured Postgres (see ``src/db/.env.example``)::
+
+    cd src && python -m api.benchmarks --save-baseline
+    cd src && python -m api.benchmarks --compare
+
+All data is created inside a transaction that is rolled back at the end, so the
+suite can run against a development database without leaving rows behind.
+"""
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from db.database import get_engine, get_session_factory
+from db.models import Base
+from .cases import run_crud_cases, run_serialization_cases, seed
+from .runner import (
+    DEFAULT_BASELINE,
+    DEFAULT_OUTPUT,
+    DEFAULT_THRESHOLD,
+    compare,
+    format_table,
+    load_results,
+    save_results,
+)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m api.benchmarks", description="Run crud and serialization micro-benchmarks."
+    )
+    parser.add_argument("--iterations", type=int, default=200, help="timed iterations per crud benchmark")
+    parser.add_argument("--serialization-iterations", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=5000, help="rows used by list and serialization benchmarks")
+    parser.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this text")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="also write results to the baseline file")
+    parser.add_argument("--compare", action="store_true", help="fail if results regress against the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown, 0.10 = 10%%")
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    Base.metadata.create_all(bind=engine)
+    connection = engine.connect()
+    transaction = connection.begin()
+    db = get_session_factory()(bind=connection)
+    try:
+        data = seed(db, args.rows)
+        results = run_crud_cases(db, data, args.iterations, only=args.filter)
+        results += run_serialization_cases(db, data, args.serialization_iterations, only=args.filter)
+    finally:
+        db.close()
+        transaction.rollback()
+        connection.close()
+
+    baseline = load_results(args.baseline) if args.baseline.exists() else None
+    print(format_table(results, baseline))
+    save_results(results, args.output)
+    print(f"\nResults written to {args.output}")
+    if args.save_baseline:
+        # A filtered run only replaces the baselines of the benchmarks it ran
+        save_results(results, args.baseline, merge=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        if baseline is None:
+            print(f"No baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+            return 2
+        current = {r.name: {"median_s": r.median_s} for r in results}
+        regressions = compare(current, baseline, args.threshold)
+        for reg in regressions:
+            print(f"REGRESSION {reg.name}: {reg.baseline_s * 1e3:.3f}ms -> {reg.current_s * 1e3:.3f}ms ({reg.ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"No regressions above {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,346 @@
+from __future__ import annotations
+
+import itertools
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from db.models import FMEA, FailureMode, Action, FailureCause, FailureEffect, Control
+from .. import crud, export, schemas, serialization
+from .runner import BenchResult, measure
+
+ASSET_ID = "BENCH-ASSET"
+
+
+@dataclass
+class BenchData:
+    fmea_id: int
+    failure_mode_id: int
+    action_id: int
+    cause_id: int
+    effect_id: int
+    control_id: int
+    # Failure mode holding ``rows`` actions, used for list and serialization cases
+    wide_fmea_id: int
+    wide_failure_mode_id: int
+    rows: int
+
+
+def seed(db: Session, rows: int) -> BenchData:
+    """Insert the rows the benchmarks read and update (caller owns the transaction)."""
+    fmea = FMEA(asset_id=ASSET_ID, title="Benchmark FMEA", version=1)
+    wide = FMEA(asset_id=ASSET_ID, title="Benchmark FMEA (wide)", version=2)
+    db.add_all([fmea, wide])
+    db.flush()
+    fm = FailureMode(fmea_id=fmea.id, name="Benchmark failure mode", severity=7, occurrence=4, detection=5)
+    db.add(fm)
+    db.flush()
+    action = Action(failure_mode_id=fm.id, description="Benchmark action", owner="bench")
+    cause = FailureCause(failure_mode_id=fm.id, description="Benchmark cause")
+    effect = FailureEffect(failure_mode_id=fm.id, description="Benchmark effect", level="local")
+    control = Control(failure_mode_id=fm.id, type="detection", description="Benchmark control")
+    db.add_all([action, cause, effect, control])
+
+    db.execute(
+        insert(FailureMode),
+        [
+            {"fmea_id": wide.id, "name": f"Mode {i:06d}", "severity": 1 + i % 10, "occurrence": 1 + (i // 10) % 10, "detection": 1 + (i // 100) % 10}
+            for i in range(rows)
+        ],
+    )
+    wide_fm_id = db.scalar(select(FailureMode.id).where(FailureMode.fmea_id == wide.id).limit(1))
+    db.execute(
+        insert(Action),
+        [
+            {"failure_mode_id": wide_fm_id, "description": f"Action {i:06d}", "owner": "bench", "status": "open", "notes": "n" * 200}
+            for i in range(rows)
+        ],
+    )
+    db.flush()
+    return BenchData(
+        fmea_id=fmea.id,
+        failure_mode_id=fm.id,
+        action_id=action.id,
+        cause_id=cause.id,
+        effect_id=effect.id,
+        control_id=control.id,
+        wide_fmea_id=wide.id,
+        wide_failure_mode_id=wide_fm_id,
+        rows=rows,
+    )
+
+
+def count_round_trips(db: Session, fn: Callable[[], object]) -> int:
+    """Statements sent by one call of ``fn``, plus one per session commit."""
+    trips = 0
+
+    def on_statement(*args) -> None:
+        nonlocal trips
+        trips += 1
+
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", on_statement)
+    # Inside the benchmark transaction commits are no-ops; in production each is a COMMIT
+    event.listen(db, "after_commit", on_statement)
+    try:
+        fn()
+    finally:
+        event.remove(connection, "before_cursor_execute", on_statement)
+        event.remove(db, "after_commit", on_statement)
+    return trips
+
+
+def _write_case(
+    name: str, db: Session, fn: Callable[[], object], *, iterations: int, setup: Optional[Callable[[], None]] = None
+) -> BenchResult:
+    result = measure(name, fn, iterations=iterations, setup=setup)
+    if setup:
+        setup()
+    result.extra["round_trips"] = count_round_trips(db, fn)
+    return result
+
+
+def _delete_case(name: str, db: Session, model: type, values: dict, delete: Callable[[int], bool], iterations: int) -> BenchResult:
+    pending: list[int] = []
+
+    def setup() -> None:
+        pending.append(db.scalar(insert(model).values(**values).returning(model.id)))
+
+    return _write_case(name, db, lambda: delete(pending.pop()), iterations=iterations, setup=setup)
+
+
+def _run(cases: list[partial], only: str) -> list[BenchResult]:
+    """Run the cases whose name (each one's first argument) contains ``only``; the rest never start."""
+    return [case() for case in cases if only in case.args[0]]
+
+
+def run_crud_cases(db: Session, data: BenchData, iterations: int, only: str = "") -> list[BenchResult]:
+    counter = itertools.count()
+    fresh = db.expunge_all
+    fm_id = data.failure_mode_id
+    cases = [
+        partial(measure, "crud.get_fmea", lambda: crud.get_fmea(db, data.fmea_id), iterations=iterations, setup=fresh),
+        partial(measure, "crud.get_fmeas", lambda: crud.get_fmeas(db, limit=100), iterations=iterations, setup=fresh),
+        partial(measure, "crud.get_fmeas_by_asset_id", lambda: crud.get_fmeas_by_asset_id(db, ASSET_ID), iterations=iterations, setup=fresh),
+        partial(measure, "crud.get_failure_mode", lambda: crud.get_failure_mode(db, fm_id), iterations=iterations, setup=fresh),
+        partial(
+            measure,
+            "crud.get_failure_modes_by_fmea",
+            lambda: crud.get_failure_modes_by_fmea(db, data.wide_fmea_id),
+            iterations=iterations,
+            units=data.rows,
+            setup=fresh,
+        ),
+        partial(
+            measure,
+            "crud.get_actions_by_failure_mode",
+            lambda: crud.get_actions_by_failure_mode(db, data.wide_failure_mode_id),
+            iterations=iterations,
+            units=data.rows,
+            setup=fresh,
+        ),
+        partial(measure, "crud.get_causes_by_failure_mode", lambda: crud.get_causes_by_failure_mode(db, fm_id), iterations=iterations, setup=fresh),
+        partial(measure, "crud.get_effects_by_failure_mode", lambda: crud.get_effects_by_failure_mode(db, fm_id), iterations=iterations, setup=fresh),
+        partial(measure, "crud.get_controls_by_failure_mode", lambda: crud.get_controls_by_failure_mode(db, fm_id), iterations=iterations, setup=fresh),
+        partial(
+            _write_case,
+            "crud.create_fmea",
+            db,
+            lambda: crud.create_fmea(db, schemas.FMEACreate(asset_id=f"BENCH-NEW-{next(counter)}", title="New")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.create_failure_mode",
+            db,
+            lambda: crud.create_failure_mode(db, schemas.FailureModeCreate(fmea_id=data.fmea_id, name=f"New mode {next(counter)}")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.create_action",
+            db,
+            lambda: crud.create_action(db, schemas.ActionCreate(failure_mode_id=fm_id, description="New action")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.create_failure_cause",
+            db,
+            lambda: crud.create_failure_cause(db, schemas.FailureCauseCreate(failure_mode_id=fm_id, description="New cause")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.create_failure_effect",
+            db,
+            lambda: crud.create_failure_effect(db, schemas.FailureEffectCreate(failure_mode_id=fm_id, description="New effect")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.create_control",
+            db,
+            lambda: crud.create_control(db, schemas.ControlCreate(failure_mode_id=fm_id, type="prevention", description="New control")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.update_fmea",
+            db,
+            lambda: crud.update_fmea(db, data.fmea_id, schemas.FMEAUpdate(title=f"Title {next(counter)}")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.update_failure_mode",
+            db,
+            lambda: crud.update_failure_mode(db, fm_id, schemas.FailureModeUpdate(severity=1 + next(counter) % 10)),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.update_action",
+            db,
+            lambda: crud.update_action(db, data.action_id, schemas.ActionUpdate(owner=f"owner {next(counter)}")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.update_failure_cause",
+            db,
+            lambda: crud.update_failure_cause(db, data.cause_id, schemas.FailureCauseUpdate(description=f"Cause {next(counter)}")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.update_failure_effect",
+            db,
+            lambda: crud.update_failure_effect(db, data.effect_id, schemas.FailureEffectUpdate(description=f"Effect {next(counter)}")),
+            iterations=iterations,
+        ),
+        partial(
+            _write_case,
+            "crud.update_control",
+            db,
+            lambda: crud.update_control(db, data.control_id, schemas.ControlUpdate(description=f"Control {next(counter)}")),
+            iterations=iterations,
+        ),
+        partial(
+            _delete_case, "crud.delete_fmea", db, FMEA, {"asset_id": ASSET_ID, "title": "Deleted", "version": 0},
+            lambda i: crud.delete_fmea(db, i), iterations,
+        ),
+        partial(
+            _delete_case, "crud.delete_failure_mode", db, FailureMode, {"fmea_id": data.fmea_id, "name": "Deleted"},
+            lambda i: crud.delete_failure_mode(db, i), iterations,
+        ),
+        partial(
+            _delete_case, "crud.delete_action", db, Action, {"failure_mode_id": fm_id, "description": "Deleted"},
+            lambda i: crud.delete_action(db, i), iterations,
+        ),
+        partial(
+            _delete_case, "crud.delete_failure_cause", db, FailureCause, {"failure_mode_id": fm_id, "description": "Deleted"},
+            lambda i: crud.delete_failure_cause(db, i), iterations,
+        ),
+        partial(
+            _delete_case, "crud.delete_failure_effect", db, FailureEffect, {"failure_mode_id": fm_id, "description": "Deleted"},
+            lambda i: crud.delete_failure_effect(db, i), iterations,
+        ),
+        partial(
+            _delete_case, "crud.delete_control", db, Control, {"failure_mode_id": fm_id, "type": "detection", "description": "Deleted"},
+            lambda i: crud.delete_control(db, i), iterations,
+        ),
+    ]
+    return _run(cases, only)
+
+
+def run_serialization_cases(db: Session, data: BenchData, iterations: int, only: str = "") -> list[BenchResult]:
+    failure_modes = crud.get_failure_modes_by_fmea(db, data.wide_fmea_id)
+    actions = crud.get_actions_by_failure_mode(db, data.wide_failure_mode_id)
+    failure_mode_list = TypeAdapter(list[schemas.FailureMode])
+    action_list = TypeAdapter(list[schemas.Action])
+
+    def serialize(adapter: TypeAdapter, objects: list) -> bytes:
+        # Mirrors what FastAPI does for response_model=list[...] with from_attributes
+        return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+    failure_mode_rows = crud.get_failure_modes_by_fmea_rows(db, data.wide_fmea_id)
+    action_rows = crud.get_actions_by_failure_mode_rows(db, data.wide_failure_mode_id)
+
+    def list_failure_modes_orm() -> bytes:
+        return serialize(failure_mode_list, crud.get_failure_modes_by_fmea(db, data.wide_fmea_id))
+
+    def export_actions(stream) -> int:
+        schema, tables = export.read_tables(db, export.Dataset.actions, export.ExportFilters(asset_id=ASSET_ID, version=2))
+        return sum(len(part) for part in stream(schema, tables))
+
+    def list_failure_modes_rows() -> bytes:
+        return serialization.dump_rows(
+            schemas.FailureMode, crud.get_failure_modes_by_fmea_rows(db, data.wide_fmea_id)
+        )
+
+    cases = [
+        partial(
+            measure,
+            "serialize.failure_modes.from_attributes",
+            lambda: serialize(failure_mode_list, failure_modes),
+            iterations=iterations,
+            units=len(failure_modes),
+        ),
+        partial(
+            measure,
+            "serialize.actions.from_attributes",
+            lambda: serialize(action_list, actions),
+            iterations=iterations,
+            units=len(actions),
+        ),
+        partial(
+            measure,
+            "serialize.failure_modes.rows",
+            lambda: serialization.dump_rows(schemas.FailureMode, failure_mode_rows),
+            iterations=iterations,
+            units=len(failure_mode_rows),
+        ),
+        partial(
+            measure,
+            "serialize.actions.rows",
+            lambda: serialization.dump_rows(schemas.Action, action_rows),
+            iterations=iterations,
+            units=len(action_rows),
+        ),
+        # End to end: query plus encoding, as served by GET /failure-modes/by-fmea/{id}
+        partial(
+            measure,
+            "list.failure_modes_by_fmea.orm",
+            list_failure_modes_orm,
+            iterations=iterations,
+            units=len(failure_modes),
+            setup=db.expunge_all,
+        ),
+        partial(
+            measure,
+            "list.failure_modes_by_fmea.rows",
+            list_failure_modes_rows,
+            iterations=iterations,
+            units=len(failure_mode_rows),
+        ),
+        partial(
+            measure,
+            "export.actions.arrow",
+            lambda: export_actions(export.stream_arrow),
+            iterations=iterations,
+            units=len(action_rows),
+        ),
+        partial(
+            measure,
+            "export.actions.parquet",
+            lambda: export_actions(export.stream_parquet),
+            iterations=iterations,
+            units=len(action_rows),
+        ),
+    ]
+    return _run(cases, only)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DEFAULT_OUTPUT = RESULTS_DIR / "latest.json"
+DEFAULT_BASELINE = RESULTS_DIR / "baseline.json"
+DEFAULT_THRESHOLD = 0.10
+
+
+@dataclass
+class BenchResult:
+    name: str
+    iterations: int
+    median_s: float
+    mean_s: float
+    p95_s: float
+    min_s: float
+    # Units processed per iteration (rows serialized, rows fetched, ...)
+    units: int = 1
+    extra: dict = field(default_factory=dict)
+
+    @property
+    def units_per_s(self) -> float:
+        return self.units / self.median_s if self.median_s else 0.0
+
+
+@dataclass
+class Regression:
+    name: str
+    baseline_s: float
+    current_s: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current_s / self.baseline_s
+
+
+def measure(
+    name: str,
+    fn: Callable[[], object],
+    *,
+    iterations: int,
+    warmup: int = 3,
+    units: int = 1,
+    setup: Optional[Callable[[], None]] = None,
+) -> BenchResult:
+    """Time ``fn`` ``iterations`` times; ``setup`` runs untimed before each call."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+    timings = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    p95_index = min(len(timings) - 1, int(round(0.95 * (len(timings) - 1))))
+    return BenchResult(
+        name=name,
+        iterations=iterations,
+        median_s=statistics.median(timings),
+        mean_s=statistics.fmean(timings),
+        p95_s=timings[p95_index],
+        min_s=timings[0],
+        units=units,
+    )
+
+
+def to_document(results: list[BenchResult]) -> dict:
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": {
+            r.name: {**asdict(r), "units_per_s": r.units_per_s} for r in results
+        },
+    }
+
+
+def save_results(results: list[BenchResult], path: Path, merge: bool = False) -> None:
+    """Write ``results`` to ``path``; with ``merge``, benchmarks not among them keep their saved results."""
+    document = to_document(results)
+    if merge and path.exists():
+        document["results"] = {**load_results(path), **document["results"]}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(document, indent=2, sort_keys=True))
+
+
+def load_results(path: Path) -> dict:
+    return json.loads(path.read_text())["results"]
+
+
+def compare(current: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list[Regression]:
+    """Return benchmarks whose median slowed down by more than ``threshold``."""
+    regressions = []
+    for name, result in sorted(current.items()):
+        base = baseline.get(name)
+        if not base or not base["median_s"]:
+            continue
+        if result["median_s"] > base["median_s"] * (1 + threshold):
+            regressions.append(Regression(name, base["median_s"], result["median_s"]))
+    return regressions
+
+
+def format_table(results: list[BenchResult], baseline: Optional[dict] = None) -> str:
+    header = f"{'benchmark':<48} {'median':>10} {'p95':>10} {'units/s':>12} {'trips':>5} {'vs base':>8}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        delta = ""
+        if baseline and r.name in baseline and baseline[r.name]["median_s"]:
+            delta = f"{r.median_s / baseline[r.name]['median_s']:.2f}x"
+        lines.append(
+            f"{r.name:<48} {r.median_s * 1e3:>8.3f}ms {r.p95_s * 1e3:>8.3f}ms {r.units_per_s:>12.0f} "
+            f"{r.extra.get('round_trips', ''):>5} {delta:>8}"
+        )
+    return "\n".join(lines)
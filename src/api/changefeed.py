@@ -0,0 +1,234 @@
+"""Real-time change feed: Postgres ``NOTIFY`` fanned out to SSE and WebSocket clients.
+
+Statement-level triggers on the six FMEA tables publish one compact JSON event
+per (statement, FMEA) on ``db.models.CHANGE_CHANNEL`` when the writing
+transaction commits::
+
+    {"table": "failure_modes", "op": "update", "tenant_id": "default", "fmea_id": 12,
+     "asset_id": "PUMP-7", "ids": [88], "count": 1}
+
+Each worker holds a single ``LISTEN`` connection per shard (:class:`ChangeFeed`)
+however many clients are subscribed; the triggers notify on the shard that
+committed the change. A notification is parsed once, looked up in the
+asset and FMEA subscription indexes of its tenant, so clients only hear about
+their own tenant's changes, and its payload text is queued unchanged
+to every matching subscriber. ``ids`` is ``null`` when a statement touched
+more rows than fit in a notification; ``count`` is always set.
+
+A ``resync`` event tells a client that events may have been lost (its queue
+overflowed or the listener had to reconnect) and it should refetch.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Optional
+
+import psycopg
+from starlette.websockets import WebSocket
+
+from db.config import load_db_config, load_shard_configs
+from db.models import CHANGE_CHANNEL, DEFAULT_TENANT
+
+logger = logging.getLogger(__name__)
+
+# SSE comment / WebSocket message sent to idle clients so proxies keep the connection open
+HEARTBEAT_SECONDS = 15.0
+# Events queued per subscriber before it is told to resync instead
+QUEUE_SIZE = 256
+RECONNECT_SECONDS = 1.0
+# How long a new subscriber waits for the LISTEN connection before streaming anyway
+CONNECT_TIMEOUT_SECONDS = 5.0
+
+CHANGE = "change"
+RESYNC = "resync"
+
+
+@dataclass(frozen=True)
+class Topics:
+    tenant_id: str = DEFAULT_TENANT
+    asset_ids: frozenset[str] = frozenset()
+    fmea_ids: frozenset[int] = frozenset()
+
+
+def topics(asset_ids: Iterable[str], fmea_ids: Iterable[int], tenant_id: str = DEFAULT_TENANT) -> Topics:
+    result = Topics(tenant_id, frozenset(asset_ids), frozenset(fmea_ids))
+    if not result.asset_ids and not result.fmea_ids:
+        raise ValueError("subscribe to at least one asset_id or fmea_id")
+    return result
+
+
+class Subscription:
+    """One client's queue of ``(event, data)`` pairs; ``data`` is JSON text."""
+
+    def __init__(self, feed: ChangeFeed, topics: Topics) -> None:
+        self.feed = feed
+        self.topics = topics
+        self.queue: asyncio.Queue[tuple[str, str]] = asyncio.Queue(QUEUE_SIZE)
+
+    def push(self, event: str, data: str) -> None:
+        try:
+            self.queue.put_nowait((event, data))
+        except asyncio.QueueFull:
+            # A slow client gets one resync instead of an unbounded backlog
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((RESYNC, "{}"))
+
+    async def get(self) -> tuple[str, str]:
+        return await self.queue.get()
+
+    def close(self) -> None:
+        self.feed.unsubscribe(self)
+
+
+class ChangeFeed:
+    """The worker's ``LISTEN`` connections, one per database, and its subscribers (bound to one event loop)."""
+
+    def __init__(self, *conninfos: str) -> None:
+        self.conninfos = conninfos
+        self.loop = asyncio.get_running_loop()
+        # Keyed by (tenant_id, asset_id) and (tenant_id, fmea_id)
+        self._by_asset: dict[tuple[str, str], set[Subscription]] = defaultdict(set)
+        self._by_fmea: dict[tuple[str, int], set[Subscription]] = defaultdict(set)
+        self._subscribers: set[Subscription] = set()
+        self._connected = [asyncio.Event() for _ in conninfos]
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    async def subscribe(self, topics: Topics) -> Subscription:
+        subscription = Subscription(self, topics)
+        self._subscribers.add(subscription)
+        for asset_id in topics.asset_ids:
+            self._by_asset[topics.tenant_id, asset_id].add(subscription)
+        for fmea_id in topics.fmea_ids:
+            self._by_fmea[topics.tenant_id, fmea_id].add(subscription)
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._listen(conninfo, connected), name=f"change-feed-{n}")
+                for n, (conninfo, connected) in enumerate(zip(self.conninfos, self._connected))
+            ]
+        try:
+            # Changes committed after subscribe() returns are delivered
+            connected = asyncio.gather(*(event.wait() for event in self._connected))
+            await asyncio.wait_for(connected, CONNECT_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logger.warning("change feed not connected yet; subscriber will get a resync once it is")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        topics = subscription.topics
+        for index, keys in ((self._by_asset, topics.asset_ids), (self._by_fmea, topics.fmea_ids)):
+            for key in keys:
+                subscribers = index.get((topics.tenant_id, key))
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del index[topics.tenant_id, key]
+
+    def dispatch(self, payload: str) -> None:
+        event = json.loads(payload)
+        tenant_id = event["tenant_id"]
+        targets = self._by_fmea.get((tenant_id, event["fmea_id"]), set()) | self._by_asset.get(
+            (tenant_id, event["asset_id"]), set()
+        )
+        for subscription in targets:
+            subscription.push(CHANGE, payload)
+
+    async def close(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _listen(self, conninfo: str, connected: asyncio.Event) -> None:
+        reconnecting = False
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANGE_CHANNEL}")
+                    connected.set()
+                    if reconnecting:
+                        for subscription in list(self._subscribers):
+                            subscription.push(RESYNC, "{}")
+                    async for notify in conn.notifies():
+                        self.dispatch(notify.payload)
+            except (psycopg.Error, OSError) as exc:
+                logger.warning("change feed connection lost (%s); reconnecting", exc)
+            connected.clear()
+            reconnecting = True
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+
+_feed: Optional[ChangeFeed] = None
+
+
+def get_feed() -> ChangeFeed:
+    """The feed of the running event loop, i.e. of this worker."""
+    global _feed
+    if _feed is None or _feed.loop is not asyncio.get_running_loop():
+        primary = load_db_config()
+        _feed = ChangeFeed(*(config.conninfo for config in (primary, *load_shard_configs(primary))))
+    return _feed
+
+
+async def shutdown() -> None:
+    global _feed
+    feed, _feed = _feed, None
+    if feed is not None and feed.loop is asyncio.get_running_loop():
+        await feed.close()
+
+
+async def sse_frames(subscription: Subscription, heartbeat: float = HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+    """Server-Sent Events for ``subscription``; unsubscribes when the client goes away."""
+    try:
+        yield ": subscribed\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {data}\n\n"
+    finally:
+        subscription.close()
+
+
+async def _wait_closed(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+async def pump_websocket(websocket: WebSocket, subscription: Subscription, heartbeat: float = HEARTBEAT_SECONDS) -> None:
+    """Send ``{"event": ..., "data": ...}`` messages until the client disconnects."""
+    closed = asyncio.ensure_future(_wait_closed(websocket))
+    getter: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if getter is None:
+                getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait((getter, closed), timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED)
+            if closed in done:
+                return
+            if getter in done:
+                event, data = getter.result()
+                getter = None
+                await websocket.send_text(f'{{"event":"{event}","data":{data}}}')
+            else:
+                await websocket.send_text('{"event":"keep-alive","data":{}}')
+    finally:
+        closed.cancel()
+        if getter is not None:
+            getter.cancel()
+        subscription.close()
@@ -1,18 +1,203 @@
 from __future__ import annotations
 
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import select
+from sqlalchemy import (
+    ForeignKeyConstraint, Integer, Table, bindparam, case, delete, func, inspect, literal, select, true, tuple_, union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, array_agg, aggregate_order_by, insert as pg_insert
+
+from db.database import scatter, shard_count
+from db.models import (
+    ARCHIVE_TABLES, VERSION_TABLES, Asset, AssetCurrentFMEA, AssetRollup, AuditEntry, Base, FMEA, FMEADocument,
+    FailureMode, FailureModeRatingHistory, Action, FailureCause, FailureEffect, Control, Job, WebhookOutbox,
+    WebhookSubscription, key_range,
+)
+from . import audit, filters, ratings, schemas
+from .preconditions import Versions
+from .serialization import FieldSet, field_names, row_dicts
+
+
+@lru_cache(maxsize=None)
+def _row_columns(model: type[Base], schema: type[BaseModel], fields: FieldSet = None) -> tuple:
+    """Table columns backing the (selected) fields of a response schema, in schema order."""
+    return tuple(model.__table__.c[name] for name in field_names(schema, fields))
+
+
+def _select_rows(model: type[Base], schema: type[BaseModel], fields: FieldSet = None):
+    return select(*_row_columns(model, schema, fields))
+
+
+def _select_rows_with_archive(model: type[Base], schema: type[BaseModel], fields: FieldSet, column: str, value: int):
+    """Rows where ``column == value`` from the hot table and its archive, in one statement."""
+    names = field_names(schema, fields)
+    return union_all(*(
+        select(*(table.c[name] for name in names)).where(table.c[column] == value)
+        for table in (model.__table__, ARCHIVE_TABLES[model.__tablename__])
+    ))
+
+
+def _key_in(table: Table, key: str, values: list):
+    column = table.c[key]
+    if table.name.endswith("_versions") and isinstance(column.type, Integer):
+        # In the form of the versions table's GiST (key, valid) index, which cannot search
+        # an IN list; it does search a multirange of the ids
+        value = func.unnest(bindparam(None, values, type_=ARRAY(Integer))).column_valued("value")
+        return key_range(column).op("&&")(select(func.range_agg(key_range(value))).scalar_subquery())
+    return column.in_(values)
+
+
+def _select_as_of(model: type[Base], schema: type[BaseModel], key: str, values: list, as_of: datetime):
+    """Rows where ``key`` is one of ``values`` as they were at ``as_of``, in one statement.
+
+    Those are the hot (and archived) rows already current then, and the past
+    versions whose validity range contains it. Rows from before versioning
+    began are current from ``-infinity``, so ``created_at`` bounds them too.
+    """
+    names = field_names(schema)
+    current = [model.__table__]
+    if model.__tablename__ in ARCHIVE_TABLES:
+        current.append(ARCHIVE_TABLES[model.__tablename__])
+    versions = VERSION_TABLES[model.__tablename__]
+    return union_all(
+        *(
+            select(*(table.c[name] for name in names))
+            .where(_key_in(table, key, values), table.c.valid_from <= as_of, table.c.created_at <= as_of)
+            for table in current
+        ),
+        select(*(versions.c[name] for name in names))
+        .where(_key_in(versions, key, values), versions.c.valid.contains(as_of), versions.c.created_at <= as_of),
+    )
+
+
+def _create(db: Session, db_obj: Base) -> Base:
+    db.add(db_obj)
+    # The INSERT returns server defaults (ids, created_at, rpn), so the snapshot needs no query
+    db.flush()
+    table = db_obj.__table__
+    audit.record(db, "create", table, db_obj.id, after=audit.snapshot(table, inspect(db_obj).dict))
+    db.commit()
+    db.refresh(db_obj)
+    return db_obj
+
+
+def _update_returning(db: Session, model: type[Base], row_id: int, values: dict, if_match: Versions = None):
+    """Apply ``values`` and return the updated entity in one ``UPDATE ... RETURNING``.
+
+    The pre-update row is read in the same statement from a self-join, so the
+    audit entry gets both sides of the change without another round trip.
+    With ``if_match`` the update only applies to those row versions and needs
+    no lock (a concurrent writer bumps the version, so the recheck fails);
+    without it the self-join locks the row so the before image is the one
+    overwritten. ``None`` means no row matched. An empty update just reads the
+    row.
+    """
+    versioned = "row_version" in model.__table__.c
+    if not values:
+        stmt = select(model).where(model.id == row_id)
+        if if_match is not None:
+            stmt = stmt.where(model.row_version.in_(if_match))
+        db_obj = db.scalar(stmt, execution_options={"populate_existing": True})
+        db.commit()
+        return db_obj
+    table = model.__table__
+    old = select(table).where(table.c.id == row_id)
+    if if_match is None:
+        old = old.with_for_update()
+    old = old.subquery("old")
+    stmt = update(model).where(model.id == old.c.id)
+    if if_match is not None:
+        stmt = stmt.where(model.row_version.in_(if_match))
+    if versioned:
+        values = {**values, "row_version": model.row_version + 1}
+    stmt = stmt.values(**values).returning(model, *old.c)
+    row = db.execute(stmt, execution_options={"populate_existing": True}).one_or_none()
+    if row is None:
+        db.commit()
+        return None
+    db_obj = row[0]
+    before = audit.snapshot(table, dict(zip(table.c.keys(), row[1:])))
+    before, after = audit.diff(before, audit.snapshot(table, inspect(db_obj).dict))
+    # The version bump and validity stamp are bookkeeping, not part of the change
+    for bookkeeping in ("row_version", "valid_from"):
+        before.pop(bookkeeping, None)
+        after.pop(bookkeeping, None)
+    if after:
+        audit.record(db, "update", table, row_id, before=before, after=after)
+    db.commit()
+    return db_obj
+
+
+# Tables whose deletes are audited; rows that ON DELETE CASCADE removes get their own entries
+_AUDITED = (FMEA, FailureMode, Action, FailureCause, FailureEffect, Control)
+
+
+@lru_cache(maxsize=None)
+def _cascaded(table: Table) -> tuple[tuple[Table, ForeignKeyConstraint], ...]:
+    """Audited tables whose rows a delete from ``table`` cascades to, with their foreign key."""
+    return tuple(
+        (model.__table__, fk) for model in _AUDITED for fk in model.__table__.foreign_key_constraints
+        if fk.ondelete == "CASCADE" and fk.referred_table is table
+    )
+
+
+def _delete_returning(db: Session, model: type[Base], row_id: int, if_match: Versions = None) -> bool:
+    """Delete in one statement; ``False`` if no row (of those versions) matched.
+
+    The audited rows the foreign keys would cascade the delete to are deleted
+    by ``DELETE ... RETURNING`` CTEs of the same statement, so each is
+    recorded along with the parent.
+    """
+    table = model.__table__
+    stmt = delete(model).where(model.id == row_id)
+    if if_match is not None:
+        stmt = stmt.where(model.row_version.in_(if_match))
+    deleted = [(table, stmt.returning(*table.c).cte(f"deleted_{table.name}"))]
+    for parent, parent_rows in deleted:
+        for child, fk in _cascaded(parent):
+            key = tuple_(*fk.columns).in_(select(*(parent_rows.c[element.column.name] for element in fk.elements)))
+            deleted.append((child, delete(child).where(key).returning(*child.c).cte(f"deleted_{child.name}")))
+    rows = db.execute(union_all(*(
+        select(literal(child.name).label("table_name"), func.to_jsonb(child_rows.table_valued()).label("row"))
+        for child, child_rows in deleted
+    ))).all()
+    for table_name, row in rows:
+        child = Base.metadata.tables[table_name]
+        audit.record(db, "delete", child, row["id"], before=audit.snapshot(child, row))
+    db.commit()
+    return any(table_name == table.name for table_name, _ in rows)
+
+
+def _search_rows(db: Session, stmt, search: filters.Search, skip: int = 0) -> tuple[list[dict], Optional[str]]:
+    """A page of an :func:`filters.apply`-ed statement, merged from every shard."""
+    if shard_count(db) > 1 and skip:
+        # Each shard's rows up to the end of the page; the offset applies to the merged order
+        stmt = stmt.limit(skip + search.limit + 1)
+    else:
+        stmt, skip = stmt.offset(skip), 0
+    shard_rows = scatter(db, lambda conn: row_dicts(conn.execute(stmt)))
+    return filters.page(filters.merge(shard_rows, search)[skip:], search)
+
 
-from db.models import FMEA, FailureMode, Action, FailureCause, FailureEffect, Control
-from . import schemas
+def _first_row(db: Session, stmt) -> Optional[dict]:
+    rows = row_dicts(db.execute(stmt))
+    return rows[0] if rows else None
 
 
 def get_fmea(db: Session, fmea_id: int) -> Optional[FMEA]:
     return db.scalar(select(FMEA).where(FMEA.id == fmea_id))
 
 
+def get_fmea_row(db: Session, fmea_id: int, fields: FieldSet = None) -> Optional[dict]:
+    return _first_row(db, _select_rows(FMEA, schemas.FMEA, fields).where(FMEA.id == fmea_id))
+
+
 def get_fmeas(db: Session, skip: int = 0, limit: int = 100) -> list[FMEA]:
     return list(db.scalars(select(FMEA).offset(skip).limit(limit)).all())
 
@@ -21,193 +206,485 @@ def get_fmeas_by_asset_id(db: Session, asset_id: str) -> list[FMEA]:
     return list(db.scalars(select(FMEA).where(FMEA.asset_id == asset_id)).all())
 
 
-def create_fmea(db: Session, fmea: schemas.FMEACreate) -> FMEA:
-    db_fmea = FMEA(**fmea.model_dump())
-    db.add(db_fmea)
+def search_fmeas_rows(
+    db: Session, search: filters.Search, skip: int = 0, fields: FieldSet = None
+) -> tuple[list[dict], Optional[str]]:
+    stmt = filters.apply(_select_rows(FMEA, schemas.FMEA, fields), filters.FMEAS, search)
+    return _search_rows(db, stmt, search, skip)
+
+
+def get_fleet_summary(db: Session) -> dict:
+    """FMEA counts by status and failure mode RPN statistics, added up over every shard."""
+    by_status = select(FMEA.status, func.count().label("n")).group_by(FMEA.status).subquery()
+    stmt = select(
+        select(func.jsonb_object_agg(by_status.c.status, by_status.c.n)).scalar_subquery(),
+        func.count(FailureMode.id),
+        func.count(FailureMode.rpn),
+        func.sum(FailureMode.rpn),
+        func.max(FailureMode.rpn),
+    )
+    statuses, modes, rated, rpn_total, max_rpn = Counter(), 0, 0, 0, None
+    for shard_statuses, shard_modes, shard_rated, shard_total, shard_max in scatter(db, lambda conn: conn.execute(stmt).one()):
+        statuses.update(shard_statuses or {})
+        modes, rated, rpn_total = modes + shard_modes, rated + shard_rated, rpn_total + (shard_total or 0)
+        if shard_max is not None:
+            max_rpn = shard_max if max_rpn is None else max(max_rpn, shard_max)
+    return {
+        "fmeas": sum(statuses.values()),
+        "fmeas_by_status": dict(statuses),
+        "failure_modes": modes,
+        "max_rpn": max_rpn,
+        "mean_rpn": rpn_total / rated if rated else None,
+    }
+
+
+def get_fmeas_by_asset_id_rows(db: Session, asset_id: str, fields: FieldSet = None) -> list[dict]:
+    return row_dicts(db.execute(_select_rows(FMEA, schemas.FMEA, fields).where(FMEA.asset_id == asset_id)))
+
+
+_TREE_CHILDREN = (
+    ("actions", Action, schemas.Action),
+    ("causes", FailureCause, schemas.FailureCause),
+    ("effects", FailureEffect, schemas.FailureEffect),
+    ("controls", Control, schemas.Control),
+)
+
+
+def get_fmea_tree_as_of(db: Session, fmea_id: int, as_of: datetime) -> Optional[dict]:
+    """The FMEA, its failure modes and their children as they were at ``as_of``; one statement per table."""
+    fmea = _first_row(db, _select_as_of(FMEA, schemas.FMEA, "id", [fmea_id], as_of))
+    if fmea is None:
+        return None
+    modes = row_dicts(db.execute(_select_as_of(FailureMode, schemas.FailureMode, "fmea_id", [fmea_id], as_of).order_by("id")))
+    mode_ids = [mode["id"] for mode in modes]
+    children: dict[str, dict[int, list[dict]]] = {}
+    for field, model, schema in _TREE_CHILDREN:
+        children[field] = defaultdict(list)
+        if mode_ids:
+            for row in row_dicts(db.execute(_select_as_of(model, schema, "failure_mode_id", mode_ids, as_of).order_by("id"))):
+                children[field][row["failure_mode_id"]].append(row)
+    fmea["as_of"] = as_of
+    fmea["failure_modes"] = [{**mode, **{field: rows[mode["id"]] for field, rows in children.items()}} for mode in modes]
+    return fmea
+
+
+def get_fmea_document_row(db: Session, fmea_id: int, max_staleness: timedelta) -> Optional[dict]:
+    """The FMEA's tenant, its document's generation, the database's ``now()`` and, unless
+    stale for longer than ``max_staleness``, its body; one statement. ``None`` if there is
+    no such FMEA."""
+    document = FMEADocument
+    usable = document.body.is_not(None) & (
+        document.stale_since.is_(None) | (document.stale_since > func.now() - max_staleness)
+    )
+    stmt = (
+        select(
+            FMEA.tenant_id,
+            func.coalesce(document.generation, 0).label("generation"),
+            case((usable, document.body)).label("body"),
+            func.now().label("now"),
+        )
+        .select_from(FMEA)
+        .outerjoin(document, document.fmea_id == FMEA.id)
+        .where(FMEA.id == fmea_id)
+    )
+    return _first_row(db, stmt)
+
+
+def store_fmea_document(db: Session, fmea_id: int, tenant_id: str, generation: int, body: bytes) -> None:
+    """Store a rendered document, unless the tree was written to since ``generation`` was read."""
+    insert = pg_insert(FMEADocument).values(
+        fmea_id=fmea_id, tenant_id=tenant_id, generation=generation, body=body, rendered_at=func.now()
+    )
+    db.execute(insert.on_conflict_do_update(
+        constraint="pk_fmea_documents",
+        set_={"body": insert.excluded.body, "rendered_at": insert.excluded.rendered_at, "stale_since": None},
+        where=FMEADocument.generation == generation,
+    ))
     db.commit()
-    db.refresh(db_fmea)
-    return db_fmea
 
 
-def update_fmea(db: Session, fmea_id: int, fmea_update: schemas.FMEAUpdate) -> Optional[FMEA]:
-    db_fmea = get_fmea(db, fmea_id)
-    if db_fmea:
-        update_data = fmea_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_fmea, field, value)
-        db.commit()
-        db.refresh(db_fmea)
-    return db_fmea
+def get_effective_fmea_row(db: Session, asset_id: str, as_of: datetime) -> Optional[dict]:
+    """The approved version of ``asset_id``'s FMEA in effect at ``as_of``, in one statement.
+
+    Of the versions that were approved at ``as_of`` (by their state then), the
+    one whose ``effective_date`` (else ``approved_at``) came last before it.
+    """
+    snapshot = _select_as_of(FMEA, schemas.FMEA, "asset_id", [asset_id], as_of).subquery("snapshot")
+    effective = func.coalesce(snapshot.c.effective_date, snapshot.c.approved_at)
+    stmt = (
+        select(snapshot)
+        .where(snapshot.c.status == "approved", snapshot.c.approved_at <= as_of, effective <= as_of)
+        .order_by(effective.desc(), snapshot.c.version.desc())
+        .limit(1)
+    )
+    return _first_row(db, stmt)
+
+
+def get_current_fmeas_rows(db: Session, asset_ids: list[str], fields: FieldSet = None) -> list[dict]:
+    """The current FMEA of each of ``asset_ids`` that has one, through the maintained mapping; one statement."""
+    current = AssetCurrentFMEA
+    stmt = (
+        _select_rows(FMEA, schemas.FMEA, fields)
+        .join(current, (current.tenant_id == FMEA.tenant_id) & (current.fmea_id == FMEA.id))
+        .where(current.asset_id.in_(asset_ids))
+        .order_by(current.asset_id)
+    )
+    return row_dicts(db.execute(stmt))
+
+
+# The hierarchy is small next to the FMEAs under it, so every shard holds all of it and
+# rolls up its own FMEAs; hierarchy writes go to every shard and rollup reads merge them.
+# The writes run in the session's transaction on each shard: a conflict on one shard
+# raises before anything commits, and the caller's rollback undoes every shard.
+def upsert_asset(db: Session, asset_id: str, asset: schemas.AssetUpsert) -> dict:
+    """Create the asset or update it in place (moving its subtree to a new parent) on every shard."""
+    values = asset.model_dump()
+    insert = pg_insert(Asset).values(asset_id=asset_id, **values)
+    stmt = insert.on_conflict_do_update(
+        constraint="pk_assets", set_={name: insert.excluded[name] for name in values}
+    ).returning(*_row_columns(Asset, schemas.Asset))
+    rows = scatter(db, lambda conn: conn.execute(stmt).mappings().one())
+    db.commit()
+    return dict(rows[0])
 
 
-def delete_fmea(db: Session, fmea_id: int) -> bool:
-    db_fmea = get_fmea(db, fmea_id)
-    if db_fmea:
-        db.delete(db_fmea)
-        db.commit()
-        return True
-    return False
+def delete_asset(db: Session, asset_id: str) -> bool:
+    """Delete a leaf asset on every shard; its FMEAs stay, outside the hierarchy."""
+    stmt = delete(Asset).where(Asset.asset_id == asset_id).returning(Asset.asset_id)
+    deleted = scatter(db, lambda conn: conn.execute(stmt).first())
+    db.commit()
+    return deleted[0] is not None
+
+
+def _asset_rollup_rows(db: Session, criterion) -> list[dict]:
+    """Rollups of the assets matching ``criterion``, in ``asset_id`` order; one statement per shard."""
+    stmt = (
+        select(
+            Asset.asset_id, Asset.parent_asset_id, Asset.name, Asset.level,
+            AssetRollup.max_rpn, AssetRollup.high_ap_modes, AssetRollup.open_actions,
+        )
+        .join(AssetRollup, (AssetRollup.tenant_id == Asset.tenant_id) & (AssetRollup.asset_id == Asset.asset_id))
+        .where(criterion)
+        .order_by(Asset.asset_id)
+    )
+    merged: dict[str, dict] = {}
+    for shard_rows in scatter(db, lambda conn: row_dicts(conn.execute(stmt))):
+        for row in shard_rows:
+            total = merged.setdefault(row["asset_id"], row)
+            if total is row:
+                continue
+            if row["max_rpn"] is not None:
+                total["max_rpn"] = row["max_rpn"] if total["max_rpn"] is None else max(total["max_rpn"], row["max_rpn"])
+            total["high_ap_modes"] += row["high_ap_modes"]
+            total["open_actions"] += row["open_actions"]
+    return list(merged.values())
+
+
+def get_asset_rollup_row(db: Session, asset_id: str) -> Optional[dict]:
+    rows = _asset_rollup_rows(db, Asset.asset_id == asset_id)
+    return rows[0] if rows else None
+
+
+def get_asset_children_rollup_rows(db: Session, asset_id: str) -> list[dict]:
+    return _asset_rollup_rows(db, Asset.parent_asset_id == asset_id)
+
+
+def create_fmea(db: Session, fmea: schemas.FMEACreate) -> FMEA:
+    return _create(db, FMEA(**fmea.model_dump()))
+
+
+def update_fmea(db: Session, fmea_id: int, fmea_update: schemas.FMEAUpdate, if_match: Versions = None) -> Optional[FMEA]:
+    return _update_returning(db, FMEA, fmea_id, fmea_update.model_dump(exclude_unset=True), if_match)
+
+
+def delete_fmea(db: Session, fmea_id: int, if_match: Versions = None) -> bool:
+    return _delete_returning(db, FMEA, fmea_id, if_match)
 
 
 def get_failure_mode(db: Session, failure_mode_id: int) -> Optional[FailureMode]:
     return db.scalar(select(FailureMode).where(FailureMode.id == failure_mode_id))
 
 
+def get_failure_mode_row(db: Session, failure_mode_id: int, fields: FieldSet = None) -> Optional[dict]:
+    return _first_row(db, _select_rows_with_archive(FailureMode, schemas.FailureMode, fields, "id", failure_mode_id))
+
+
 def get_failure_modes_by_fmea(db: Session, fmea_id: int) -> list[FailureMode]:
     return list(db.scalars(select(FailureMode).where(FailureMode.fmea_id == fmea_id)).all())
 
 
-def create_failure_mode(db: Session, failure_mode: schemas.FailureModeCreate) -> FailureMode:
-    db_failure_mode = FailureMode(**failure_mode.model_dump())
-    db.add(db_failure_mode)
-    db.commit()
-    db.refresh(db_failure_mode)
-    return db_failure_mode
+def search_failure_modes_rows(
+    db: Session, search: filters.Search, fields: FieldSet = None
+) -> tuple[list[dict], Optional[str]]:
+    stmt = filters.apply(_select_rows(FailureMode, schemas.FailureMode, fields), filters.FAILURE_MODES, search)
+    return _search_rows(db, stmt, search)
 
 
-def update_failure_mode(db: Session, failure_mode_id: int, failure_mode_update: schemas.FailureModeUpdate) -> Optional[FailureMode]:
-    db_failure_mode = get_failure_mode(db, failure_mode_id)
-    if db_failure_mode:
-        update_data = failure_mode_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_failure_mode, field, value)
-        db.commit()
-        db.refresh(db_failure_mode)
-    return db_failure_mode
+def get_failure_modes_by_fmea_rows(db: Session, fmea_id: int, fields: FieldSet = None) -> list[dict]:
+    return row_dicts(db.execute(_select_rows_with_archive(FailureMode, schemas.FailureMode, fields, "fmea_id", fmea_id)))
 
 
-def delete_failure_mode(db: Session, failure_mode_id: int) -> bool:
-    db_failure_mode = get_failure_mode(db, failure_mode_id)
-    if db_failure_mode:
-        db.delete(db_failure_mode)
-        db.commit()
-        return True
-    return False
+def create_failure_mode(db: Session, failure_mode: schemas.FailureModeCreate) -> FailureMode:
+    return _create(db, FailureMode(**failure_mode.model_dump()))
+
+
+def update_failure_mode(db: Session, failure_mode_id: int, failure_mode_update: schemas.FailureModeUpdate, if_match: Versions = None) -> Optional[FailureMode]:
+    return _update_returning(db, FailureMode, failure_mode_id, failure_mode_update.model_dump(exclude_unset=True), if_match)
+
+
+def delete_failure_mode(db: Session, failure_mode_id: int, if_match: Versions = None) -> bool:
+    return _delete_returning(db, FailureMode, failure_mode_id, if_match)
+
+
+def _rating_buckets(window: ratings.Window, *columns):
+    """History rows of ``window`` grouped per ``date_bin`` bucket, oldest first."""
+    history = FailureModeRatingHistory
+    bucket = func.date_bin(window.every, history.recorded_at, ratings.BUCKET_ORIGIN).label("bucket")
+    stmt = select(bucket, func.count().label("changes"), *columns)
+    if window.since is not None:
+        stmt = stmt.where(history.recorded_at >= window.since)
+    if window.until is not None:
+        stmt = stmt.where(history.recorded_at < window.until)
+    # By label: the bucket expression's bind parameters would not match a repeated expression
+    return stmt.group_by("bucket").order_by("bucket")
+
+
+def get_rating_history_rows(db: Session, failure_mode_id: int, window: ratings.Window) -> Optional[list[dict]]:
+    """The failure mode's rating history per bucket; ``None`` if there is no such failure mode."""
+    history = FailureModeRatingHistory
+    buckets = _rating_buckets(
+        window,
+        func.min(history.rpn).label("min_rpn"),
+        func.max(history.rpn).label("max_rpn"),
+        array_agg(aggregate_order_by(history.rpn, history.id.desc()))[1].label("last_rpn"),
+    ).where(history.failure_mode_id == failure_mode_id).subquery("buckets")
+    # The history outlives archival, so an archived failure mode exists too
+    known = union_all(*(
+        select(table.c.id).where(table.c.id == failure_mode_id)
+        for table in (FailureMode.__table__, ARCHIVE_TABLES[FailureMode.__tablename__])
+    )).subquery("known")
+    # One statement: no row at all for a missing failure mode, one empty row for one without history
+    stmt = select(buckets).select_from(known).outerjoin(buckets, true()).order_by(buckets.c.bucket)
+    rows = row_dicts(db.execute(stmt))
+    if not rows:
+        return None
+    return [row for row in rows if row["bucket"] is not None]
+
+
+def get_rating_trend_rows(db: Session, window: ratings.Window) -> list[dict]:
+    """Ratings recorded across the fleet per bucket, added up over every shard."""
+    history = FailureModeRatingHistory
+    stmt = _rating_buckets(
+        window,
+        func.count(history.failure_mode_id.distinct()).label("failure_modes"),
+        func.sum(history.rpn).label("rpn_total"),
+        func.max(history.rpn).label("max_rpn"),
+    )
+    buckets: dict[datetime, dict] = {}
+    for shard_rows in scatter(db, lambda conn: row_dicts(conn.execute(stmt))):
+        for row in shard_rows:
+            # A failure mode lives on one shard, so per-shard distinct counts add up
+            merged = buckets.setdefault(row["bucket"], {**row, "changes": 0, "failure_modes": 0, "rpn_total": 0})
+            merged["changes"] += row["changes"]
+            merged["failure_modes"] += row["failure_modes"]
+            merged["rpn_total"] += row["rpn_total"]
+            merged["max_rpn"] = max(merged["max_rpn"], row["max_rpn"])
+    return [
+        {**{k: v for k, v in row.items() if k != "rpn_total"}, "mean_rpn": row["rpn_total"] / row["changes"]}
+        for _, row in sorted(buckets.items())
+    ]
 
 
 def get_actions_by_failure_mode(db: Session, failure_mode_id: int) -> list[Action]:
     return list(db.scalars(select(Action).where(Action.failure_mode_id == failure_mode_id)).all())
 
 
+def get_actions_by_failure_mode_rows(db: Session, failure_mode_id: int, fields: FieldSet = None) -> list[dict]:
+    return row_dicts(db.execute(_select_rows_with_archive(Action, schemas.Action, fields, "failure_mode_id", failure_mode_id)))
+
+
 def create_action(db: Session, action: schemas.ActionCreate) -> Action:
-    db_action = Action(**action.model_dump())
-    db.add(db_action)
-    db.commit()
-    db.refresh(db_action)
-    return db_action
+    return _create(db, Action(**action.model_dump()))
 
 
-def update_action(db: Session, action_id: int, action_update: schemas.ActionUpdate) -> Optional[Action]:
-    db_action = db.scalar(select(Action).where(Action.id == action_id))
-    if db_action:
-        update_data = action_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_action, field, value)
-        db.commit()
-        db.refresh(db_action)
-    return db_action
+def update_action(db: Session, action_id: int, action_update: schemas.ActionUpdate, if_match: Versions = None) -> Optional[Action]:
+    return _update_returning(db, Action, action_id, action_update.model_dump(exclude_unset=True), if_match)
 
 
-def delete_action(db: Session, action_id: int) -> bool:
-    db_action = db.scalar(select(Action).where(Action.id == action_id))
-    if db_action:
-        db.delete(db_action)
-        db.commit()
-        return True
-    return False
+def delete_action(db: Session, action_id: int, if_match: Versions = None) -> bool:
+    return _delete_returning(db, Action, action_id, if_match)
 
 
 def get_causes_by_failure_mode(db: Session, failure_mode_id: int) -> list[FailureCause]:
     return list(db.scalars(select(FailureCause).where(FailureCause.failure_mode_id == failure_mode_id)).all())
 
 
+def get_causes_by_failure_mode_rows(db: Session, failure_mode_id: int, fields: FieldSet = None) -> list[dict]:
+    return row_dicts(db.execute(_select_rows_with_archive(FailureCause, schemas.FailureCause, fields, "failure_mode_id", failure_mode_id)))
+
+
 def create_failure_cause(db: Session, cause: schemas.FailureCauseCreate) -> FailureCause:
-    db_cause = FailureCause(**cause.model_dump())
-    db.add(db_cause)
-    db.commit()
-    db.refresh(db_cause)
-    return db_cause
+    return _create(db, FailureCause(**cause.model_dump()))
 
 
 def update_failure_cause(db: Session, cause_id: int, cause_update: schemas.FailureCauseUpdate) -> Optional[FailureCause]:
-    db_cause = db.scalar(select(FailureCause).where(FailureCause.id == cause_id))
-    if db_cause:
-        update_data = cause_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_cause, field, value)
-        db.commit()
-        db.refresh(db_cause)
-    return db_cause
+    return _update_returning(db, FailureCause, cause_id, cause_update.model_dump(exclude_unset=True))
 
 
 def delete_failure_cause(db: Session, cause_id: int) -> bool:
-    db_cause = db.scalar(select(FailureCause).where(FailureCause.id == cause_id))
-    if db_cause:
-        db.delete(db_cause)
-        db.commit()
-        return True
-    return False
+    return _delete_returning(db, FailureCause, cause_id)
 
 
 def get_effects_by_failure_mode(db: Session, failure_mode_id: int) -> list[FailureEffect]:
     return list(db.scalars(select(FailureEffect).where(FailureEffect.failure_mode_id == failure_mode_id)).all())
 
 
+def get_effects_by_failure_mode_rows(db: Session, failure_mode_id: int, fields: FieldSet = None) -> list[dict]:
+    return row_dicts(db.execute(_select_rows_with_archive(FailureEffect, schemas.FailureEffect, fields, "failure_mode_id", failure_mode_id)))
+
+
 def create_failure_effect(db: Session, effect: schemas.FailureEffectCreate) -> FailureEffect:
-    db_effect = FailureEffect(**effect.model_dump())
-    db.add(db_effect)
-    db.commit()
-    db.refresh(db_effect)
-    return db_effect
+    return _create(db, FailureEffect(**effect.model_dump()))
 
 
 def update_failure_effect(db: Session, effect_id: int, effect_update: schemas.FailureEffectUpdate) -> Optional[FailureEffect]:
-    db_effect = db.scalar(select(FailureEffect).where(FailureEffect.id == effect_id))
-    if db_effect:
-        update_data = effect_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_effect, field, value)
-        db.commit()
-        db.refresh(db_effect)
-    return db_effect
+    return _update_returning(db, FailureEffect, effect_id, effect_update.model_dump(exclude_unset=True))
 
 
 def delete_failure_effect(db: Session, effect_id: int) -> bool:
-    db_effect = db.scalar(select(FailureEffect).where(FailureEffect.id == effect_id))
-    if db_effect:
-        db.delete(db_effect)
-        db.commit()
-        return True
-    return False
+    return _delete_returning(db, FailureEffect, effect_id)
 
 
 def get_controls_by_failure_mode(db: Session, failure_mode_id: int) -> list[Control]:
     return list(db.scalars(select(Control).where(Control.failure_mode_id == failure_mode_id)).all())
 
 
+def get_controls_by_failure_mode_rows(db: Session, failure_mode_id: int, fields: FieldSet = None) -> list[dict]:
+    return row_dicts(db.execute(_select_rows_with_archive(Control, schemas.Control, fields, "failure_mode_id", failure_mode_id)))
+
+
 def create_control(db: Session, control: schemas.ControlCreate) -> Control:
-    db_control = Control(**control.model_dump())
-    db.add(db_control)
-    db.commit()
-    db.refresh(db_control)
-    return db_control
+    return _create(db, Control(**control.model_dump()))
 
 
 def update_control(db: Session, control_id: int, control_update: schemas.ControlUpdate) -> Optional[Control]:
-    db_control = db.scalar(select(Control).where(Control.id == control_id))
-    if db_control:
-        update_data = control_update.model_dump(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(db_control, field, value)
-        db.commit()
-        db.refresh(db_control)
-    return db_control
+    return _update_returning(db, Control, control_id, control_update.model_dump(exclude_unset=True))
 
 
 def delete_control(db: Session, control_id: int) -> bool:
-    db_control = db.scalar(select(Control).where(Control.id == control_id))
-    if db_control:
-        db.delete(db_control)
-        db.commit()
-        return True
-    return False
\ No newline at end of file
+    return _delete_returning(db, Control, control_id)
+
+
+def _audit_page(stmt, page: audit.Page):
+    """Newest first on ``(occurred_at, id)``, plus one row to detect a next page."""
+    key = tuple_(AuditEntry.occurred_at, AuditEntry.id)
+    if page.after is not None:
+        stmt = stmt.where(key < tuple_(*page.after))
+    return stmt.order_by(AuditEntry.occurred_at.desc(), AuditEntry.id.desc()).limit(page.limit + 1)
+
+
+def get_audit_history_rows(db: Session, table_name: str, row_id: int, page: audit.Page) -> list[dict]:
+    stmt = _select_rows(AuditEntry, schemas.AuditEntry).where(
+        AuditEntry.table_name == table_name, AuditEntry.row_id == row_id
+    )
+    return row_dicts(db.execute(_audit_page(stmt, page)))
+
+
+def get_audit_by_actor_rows(
+    db: Session, actor: str, since: Optional[datetime], until: Optional[datetime], page: audit.Page
+) -> list[dict]:
+    stmt = _select_rows(AuditEntry, schemas.AuditEntry).where(AuditEntry.actor == actor)
+    if since is not None:
+        stmt = stmt.where(AuditEntry.occurred_at >= since)
+    if until is not None:
+        stmt = stmt.where(AuditEntry.occurred_at < until)
+    return row_dicts(db.execute(_audit_page(stmt, page)))
+
+
+def create_webhook_subscription(db: Session, subscription: schemas.WebhookSubscriptionCreate) -> WebhookSubscription:
+    """Create the subscription, copied under the same id to every shard, whose outbox trigger reads its own copy."""
+    values = subscription.model_dump()
+    db_subscription = WebhookSubscription(**values)
+    db.add(db_subscription)
+    if shard_count(db) > 1:
+        db.flush()
+        copy = pg_insert(WebhookSubscription).values(id=db_subscription.id, **values).on_conflict_do_nothing()
+        scatter(db, lambda conn: conn.execute(copy))
+    db.commit()
+    db.refresh(db_subscription)
+    return db_subscription
+
+
+def get_webhook_subscriptions_rows(db: Session) -> list[dict]:
+    return row_dicts(db.execute(_select_rows(WebhookSubscription, schemas.WebhookSubscription).order_by(WebhookSubscription.id)))
+
+
+def delete_webhook_subscription(db: Session, subscription_id: int) -> bool:
+    """Delete the subscription, with its outbox, on every shard."""
+    stmt = delete(WebhookSubscription).where(WebhookSubscription.id == subscription_id).returning(WebhookSubscription.id)
+    deleted = scatter(db, lambda conn: conn.execute(stmt).first())
+    db.commit()
+    return deleted[0] is not None
+
+
+def get_webhook_outbox_rows(db: Session, subscription_id: int, status: Optional[str], limit: int = 100) -> list[dict]:
+    """A subscription's newest outbox rows, merged from every shard's outbox."""
+    stmt = _select_rows(WebhookOutbox, schemas.WebhookOutboxEntry).where(WebhookOutbox.subscription_id == subscription_id)
+    if status is not None:
+        stmt = stmt.where(WebhookOutbox.status == status)
+    stmt = stmt.order_by(WebhookOutbox.id.desc()).limit(limit)
+    shard_rows = scatter(db, lambda conn: row_dicts(conn.execute(stmt)))
+    merged = sorted((row for rows in shard_rows for row in rows), key=lambda row: (row["created_at"], row["id"]), reverse=True)
+    return merged[:limit]
+
+
+def retry_dead_webhooks(db: Session, subscription_id: int) -> int:
+    """Put a subscription's dead events back in the queue, on every shard; returns how many."""
+    stmt = (
+        update(WebhookOutbox)
+        .where(WebhookOutbox.subscription_id == subscription_id, WebhookOutbox.status == "dead")
+        .values(status="pending", attempts=0, next_attempt_at=func.now(), last_error=None)
+        .returning(WebhookOutbox.id)
+    )
+    retried = scatter(db, lambda conn: len(conn.execute(stmt).all()))
+    db.commit()
+    return sum(retried)
+
+
+def create_job(db: Session, kind: str, params: dict) -> Job:
+    db_job = Job(kind=kind, params=params)
+    db.add(db_job)
+    db.commit()
+    db.refresh(db_job)
+    return db_job
+
+
+def get_job_row(db: Session, job_id: int) -> Optional[dict]:
+    return _first_row(db, _select_rows(Job, schemas.Job).where(Job.id == job_id))
+
+
+def get_jobs_rows(db: Session, status: Optional[str], kind: Optional[str], limit: int = 100) -> list[dict]:
+    stmt = _select_rows(Job, schemas.Job)
+    if status is not None:
+        stmt = stmt.where(Job.status == status)
+    if kind is not None:
+        stmt = stmt.where(Job.kind == kind)
+    return row_dicts(db.execute(stmt.order_by(Job.id.desc()).limit(limit)))
+
+
+def cancel_job(db: Session, job_id: int) -> Optional[dict]:
+    """Cancel a queued job, or ask a running one to stop; finished jobs are returned unchanged."""
+    queued = Job.status == "queued"
+    active = Job.status.in_(("queued", "running"))
+    row = db.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(
+            status=case((queued, "cancelled"), else_=Job.status),
+            finished_at=case((queued, func.now()), else_=Job.finished_at),
+            cancel_requested=Job.cancel_requested | active,
+        )
+        .returning(*_row_columns(Job, schemas.Job))
+    ).mappings().one_or_none()
+    db.commit()
+    return None if row is None else dict(row)
@@ -1,14 +1,31 @@
 from __future__ import annotations
 
+from fastapi import Request
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import Session
 
-from db.database import get_session_factory
+from db.database import get_session_factory, pool_wait
+from db.tenancy import scope_session
 
+from .loadcontrol import admission, overloaded, prepare_session
+from .tenancy import request_tenant
 
-def get_db() -> Session:
+
+def get_db(request: Request) -> Session:
+    admission.admit()
+    tenant_id = request_tenant(request)
     session_factory = get_session_factory()
     session = session_factory()
     try:
+        prepare_session(session, request)
+        scope_session(session, tenant_id)
+        waited = pool_wait()
+        try:
+            # Check out now, so the wait for a pooled connection is measured before any work
+            session.connection()
+        except PoolTimeoutError:
+            raise overloaded() from None
+        admission.observe(pool_wait() - waited)
         yield session
     finally:
-        session.close()
\ No newline at end of file
+        session.close()
@@ -0,0 +1,61 @@
+"""Pre-rendered FMEA tree documents for read-heavy clients.
+
+``GET /fmeas/{id}/tree`` without ``as_of`` is served from ``fmea_documents``:
+each FMEA's tree, stored as the exact JSON bytes of the response. A hit is one
+primary-key lookup whose body goes to the client as it is, without loading
+entities or validating anything.
+
+Triggers on the six FMEA tables mark an FMEA's document stale in the writing
+transaction and bump its ``generation`` (see ``db.models``); writers never
+render. The first read of a stale document renders the tree once, with the
+same reads as ``?as_of=``, and stores it only if the generation is still the
+one it read. A write committed while it rendered wins, and the next read
+renders again. The document's ``as_of`` is the time it was rendered, by the
+database's ``now()``: the tree has not changed since.
+
+``FMEA_DOCUMENT_MAX_STALENESS_MS`` lets reads keep serving a stale document
+for that long after the first write to it, which spares trees under a burst
+of edits a render per read. The default of 0 always serves the current tree.
+"""
+from __future__ import annotations
+
+import os
+from datetime import timedelta
+from typing import Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session
+
+from . import crud, schemas
+
+MAX_STALENESS_ENV = "FMEA_DOCUMENT_MAX_STALENESS_MS"
+
+_TREE = TypeAdapter(schemas.FMEATree)
+
+
+def max_staleness() -> timedelta:
+    return timedelta(milliseconds=float(os.getenv(MAX_STALENESS_ENV, "0")))
+
+
+def render(tree: dict) -> bytes:
+    """The JSON the tree endpoint's ``response_model`` would make of ``tree``."""
+    return _TREE.dump_json(_TREE.validate_python(tree))
+
+
+def read_tree_document(db: Session, fmea_id: int, staleness: Optional[timedelta] = None) -> Optional[bytes]:
+    """The FMEA's tree as JSON, from its document where usable; ``None`` if there is no such FMEA.
+
+    ``staleness`` overrides the configured :func:`max_staleness`.
+    """
+    row = crud.get_fmea_document_row(db, fmea_id, max_staleness() if staleness is None else staleness)
+    if row is None:
+        return None
+    if row["body"] is not None:
+        return row["body"]
+    # The database's clock, which stamped the rows' validity; the app server's may differ
+    tree = crud.get_fmea_tree_as_of(db, fmea_id, as_of=row["now"])
+    if tree is None:
+        return None
+    body = render(tree)
+    crud.store_fmea_document(db, fmea_id, tenant_id=row["tenant_id"], generation=row["generation"], body=body)
+    return body
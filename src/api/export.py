@@ -0,0 +1,211 @@
+"""Columnar (Arrow IPC / Parquet) extracts for analytics clients.
+
+Rows never pass through Python one value at a time: Postgres renders the
+extract with ``COPY (SELECT ...) TO STDOUT (FORMAT csv)``, the CSV messages
+are gathered into multi-megabyte chunks and Arrow's C++ CSV reader turns each
+chunk into a table with a fixed schema. Each chunk is written to the
+response as soon as it is converted, so memory stays flat regardless of the
+size of the extract.
+"""
+from __future__ import annotations
+
+import enum
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import psycopg
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from psycopg.pq import ExecStatus
+from sqlalchemy import Boolean, DateTime, Integer, Select, String, Text, select, text
+from sqlalchemy.orm import Session
+
+from db.models import Base, FMEA, FailureMode, Action, FailureCause, FailureEffect, Control
+
+# CSV bytes gathered before handing a chunk to Arrow; also the Parquet row group size driver
+CHUNK_BYTES = 8 * 1024 * 1024
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+
+class Dataset(str, enum.Enum):
+    failure_modes = "failure-modes"
+    actions = "actions"
+    controls = "controls"
+    causes = "causes"
+    effects = "effects"
+
+
+_MODELS: dict[Dataset, type[Base]] = {
+    Dataset.failure_modes: FailureMode,
+    Dataset.actions: Action,
+    Dataset.controls: Control,
+    Dataset.causes: FailureCause,
+    Dataset.effects: FailureEffect,
+}
+
+
+@dataclass(frozen=True)
+class ExportFilters:
+    asset_id: Optional[str] = None
+    status: Optional[str] = None  # FMEA lifecycle status
+    version: Optional[int] = None
+
+
+def _arrow_type(column) -> pa.DataType:
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int32()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(column.type, (String, Text)):
+        return pa.string()
+    raise TypeError(f"no Arrow type for column {column.name} ({column.type})")
+
+
+def build_query(dataset: Dataset, filters: ExportFilters) -> Select:
+    """Rows of ``dataset`` joined to the asset, version and status of their FMEA."""
+    model = _MODELS[dataset]
+    stmt = select(*model.__table__.c, FMEA.asset_id, FMEA.version.label("fmea_version"), FMEA.status.label("fmea_status"))
+    if model is FailureMode:
+        stmt = stmt.join(FMEA, FMEA.id == FailureMode.fmea_id)
+    else:
+        stmt = stmt.join(FailureMode, FailureMode.id == model.failure_mode_id).join(FMEA, FMEA.id == FailureMode.fmea_id)
+    if filters.asset_id is not None:
+        stmt = stmt.where(FMEA.asset_id == filters.asset_id)
+    if filters.status is not None:
+        stmt = stmt.where(FMEA.status == filters.status)
+    if filters.version is not None:
+        stmt = stmt.where(FMEA.version == filters.version)
+    return stmt.order_by(model.id)
+
+
+def arrow_schema(stmt: Select) -> pa.Schema:
+    return pa.schema([pa.field(c.name, _arrow_type(c)) for c in stmt.selected_columns])
+
+
+def _copy_out(connection: psycopg.Connection, statement: bytes) -> Iterator[memoryview]:
+    """Yield the data messages of a ``COPY ... TO STDOUT`` statement.
+
+    Reads straight from libpq with blocking ``PQgetCopyData`` calls. psycopg's
+    ``Copy`` iterator goes through its wait loop once per message, i.e. once
+    per row, which costs more than Postgres takes to produce the row.
+    """
+    pgconn = connection.pgconn
+    pgconn.send_query(statement)
+    result = pgconn.get_result()
+    if result.status != ExecStatus.COPY_OUT:
+        while pgconn.get_result() is not None:
+            pass
+        raise psycopg.errors.error_from_result(result, encoding=connection.info.encoding)
+
+    finished = False
+    try:
+        while True:
+            nbytes, data = pgconn.get_copy_data(0)
+            if nbytes < 0:
+                break
+            yield data
+        finished = True
+    finally:
+        if not finished:
+            # Abandoned mid-stream (client went away): stop the server side
+            connection.cancel_safe()
+            while pgconn.get_copy_data(0)[0] >= 0:
+                pass
+        results = []
+        while (result := pgconn.get_result()) is not None:
+            results.append(result)
+    if results[-1].status != ExecStatus.COMMAND_OK:
+        raise psycopg.errors.error_from_result(results[-1], encoding=connection.info.encoding)
+
+
+def _csv_chunks(db: Session, stmt: Select) -> Iterator[bytearray]:
+    # Timestamps are rendered with the session zone's offset; UTC keeps them unambiguous
+    db.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+    compiled = stmt.compile(dialect=db.get_bind().dialect)
+    connection = db.connection().connection.driver_connection
+    statement = psycopg.ClientCursor(connection).mogrify(f"COPY ({compiled}) TO STDOUT (FORMAT csv)", compiled.params)
+    chunk = bytearray()
+    # One COPY message per row; a quoted multi-line value still arrives in a single message
+    for data in _copy_out(connection, statement.encode(connection.info.encoding)):
+        chunk += data
+        if len(chunk) >= CHUNK_BYTES:
+            yield chunk
+            chunk = bytearray()
+    if chunk:
+        yield chunk
+
+
+def read_tables(db: Session, dataset: Dataset, filters: ExportFilters) -> tuple[pa.Schema, Iterator[pa.Table]]:
+    """The extract's schema and an iterator of one Arrow table per CSV chunk."""
+    stmt = build_query(dataset, filters)
+    schema = arrow_schema(stmt)
+    read_options = pa_csv.ReadOptions(column_names=schema.names)
+    convert_options = pa_csv.ConvertOptions(
+        column_types=schema,
+        true_values=["t"],
+        false_values=["f"],
+        # COPY writes NULL unquoted and empty strings quoted
+        null_values=[""],
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=False,
+    )
+
+    def tables() -> Iterator[pa.Table]:
+        for chunk in _csv_chunks(db, stmt):
+            yield pa_csv.read_csv(pa.py_buffer(chunk), read_options=read_options, convert_options=convert_options)
+
+    return schema, tables()
+
+
+class _Sink:
+    """Write-only file object whose contents are drained after each write."""
+
+    def __init__(self) -> None:
+        self._parts: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_arrow(schema: pa.Schema, tables: Iterator[pa.Table]) -> Iterator[bytes]:
+    sink = _Sink()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for table in tables:
+            writer.write_table(table)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_parquet(schema: pa.Schema, tables: Iterator[pa.Table]) -> Iterator[bytes]:
+    sink = _Sink()
+    # One row group per chunk
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for table in tables:
+            writer.write_table(table)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,429 @@
+"""Filter/sort query language for list endpoints.
+
+A query is a boolean filter followed by an optional sort::
+
+    severity>=8 and detection>=7 and fmea.status=approved order by rpn desc
+
+Supported syntax: comparisons ``= != < <= > >=``, ``field in (a, b)``,
+``field is [not] null``, ``and``/``or``/``not`` and parentheses. Values are
+numbers, bare words or quoted strings and are coerced to the column's type.
+
+Query text is parsed once (``parse`` is cached) and compiled against a
+:class:`Resource`, which whitelists the fields a client may reference and the
+joins they need. Sorting is limited to fields backed by a ``(field, id)``
+index in :data:`INDEX_CATALOG`, so every page is an index range scan; pages
+are chained with an opaque keyset cursor rather than ``OFFSET``.
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import heapq
+import json
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Optional, Union
+
+from fastapi import HTTPException, Query
+from sqlalchemy import Boolean, DateTime, Integer, Select, and_, not_, or_, tuple_
+from sqlalchemy.sql.elements import ColumnElement
+
+from db.models import FMEA, FailureMode
+
+# Sort fields per table and the composite index serving each as ``(tenant_id, field, id)``;
+# row-level security pins tenant_id, so a page is a range scan within one tenant
+INDEX_CATALOG: dict[str, dict[str, str]] = {
+    "fmeas": {
+        "id": "uq_fmeas_tenant_id",
+        "created_at": "ix_fmeas_tenant_created_at_id",
+        "updated_at": "ix_fmeas_tenant_updated_at_id",
+    },
+    "failure_modes": {
+        "id": "uq_failure_modes_tenant_id",
+        "rpn": "ix_failure_modes_tenant_rpn_id",
+        "created_at": "ix_failure_modes_tenant_created_at_id",
+    },
+}
+
+SORT_KEY = "__sort"
+ID_KEY = "__id"
+
+_KEYWORDS = {"and", "or", "not", "in", "is", "null", "order", "by", "asc", "desc"}
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<op><=|>=|!=|=|<|>)
+      | (?P<punct>[(),])
+      | '(?P<squote>(?:[^'\\]|\\.)*)'
+      | "(?P<dquote>(?:[^"\\]|\\.)*)"
+      | (?P<word>[\w.:+-]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+class FilterError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Comparison:
+    field: str
+    op: str
+    values: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class IsNull:
+    field: str
+    negated: bool
+
+
+@dataclass(frozen=True)
+class Not:
+    operand: "Node"
+
+
+@dataclass(frozen=True)
+class BoolOp:
+    op: str  # "and" | "or"
+    operands: tuple["Node", ...]
+
+
+Node = Union[Comparison, IsNull, Not, BoolOp]
+
+
+@dataclass(frozen=True)
+class ParsedQuery:
+    where: Optional[Node]
+    sort_field: str = "id"
+    descending: bool = False
+
+
+@dataclass(frozen=True)
+class _Token:
+    kind: str  # op | punct | string | word | keyword
+    text: str
+
+
+def _tokenize(text: str) -> list[_Token]:
+    tokens = []
+    position = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise FilterError(f"unexpected character at position {position}: {text[position:position + 10]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind in ("squote", "dquote"):
+            tokens.append(_Token("string", re.sub(r"\\(.)", r"\1", value)))
+        elif kind == "word" and value.lower() in _KEYWORDS:
+            tokens.append(_Token("keyword", value.lower()))
+        else:
+            tokens.append(_Token(kind, value))
+    return tokens
+
+
+class _Parser:
+    def __init__(self, tokens: list[_Token]) -> None:
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, kind: str, text: Optional[str] = None) -> bool:
+        if self.position >= len(self.tokens):
+            return False
+        token = self.tokens[self.position]
+        return token.kind == kind and (text is None or token.text == text)
+
+    def take(self, kind: str, text: Optional[str] = None) -> str:
+        if not self.peek(kind, text):
+            found = self.tokens[self.position].text if self.position < len(self.tokens) else "end of query"
+            raise FilterError(f"expected {text or kind}, found {found!r}")
+        self.position += 1
+        return self.tokens[self.position - 1].text
+
+    def query(self) -> ParsedQuery:
+        where = None if self.peek("keyword", "order") or not self.tokens else self.disjunction()
+        sort_field, descending = "id", False
+        if self.peek("keyword", "order"):
+            self.take("keyword", "order")
+            self.take("keyword", "by")
+            sort_field = self.take("word")
+            if self.peek("keyword", "asc") or self.peek("keyword", "desc"):
+                descending = self.take("keyword") == "desc"
+            if self.peek("punct", ","):
+                raise FilterError("only one sort field is supported")
+        if self.position != len(self.tokens):
+            raise FilterError(f"unexpected {self.tokens[self.position].text!r}")
+        return ParsedQuery(where=where, sort_field=sort_field, descending=descending)
+
+    def disjunction(self) -> Node:
+        operands = [self.conjunction()]
+        while self.peek("keyword", "or"):
+            self.take("keyword", "or")
+            operands.append(self.conjunction())
+        return operands[0] if len(operands) == 1 else BoolOp("or", tuple(operands))
+
+    def conjunction(self) -> Node:
+        operands = [self.unary()]
+        while self.peek("keyword", "and"):
+            self.take("keyword", "and")
+            operands.append(self.unary())
+        return operands[0] if len(operands) == 1 else BoolOp("and", tuple(operands))
+
+    def unary(self) -> Node:
+        if self.peek("keyword", "not"):
+            self.take("keyword", "not")
+            return Not(self.unary())
+        if self.peek("punct", "("):
+            self.take("punct", "(")
+            node = self.disjunction()
+            self.take("punct", ")")
+            return node
+        return self.predicate()
+
+    def predicate(self) -> Node:
+        field = self.take("word")
+        if self.peek("keyword", "is"):
+            self.take("keyword", "is")
+            negated = self.peek("keyword", "not")
+            if negated:
+                self.take("keyword", "not")
+            self.take("keyword", "null")
+            return IsNull(field, negated)
+        if self.peek("keyword", "in"):
+            self.take("keyword", "in")
+            self.take("punct", "(")
+            values = [self.value()]
+            while self.peek("punct", ","):
+                self.take("punct", ",")
+                values.append(self.value())
+            self.take("punct", ")")
+            return Comparison(field, "in", tuple(values))
+        return Comparison(field, self.take("op"), (self.value(),))
+
+    def value(self) -> str:
+        if self.peek("string"):
+            return self.take("string")
+        return self.take("word")
+
+
+@lru_cache(maxsize=1024)
+def parse(text: str) -> ParsedQuery:
+    """Parse query text into an immutable AST (cached per distinct text)."""
+    if len(text) > 2000:
+        raise FilterError("query is too long")
+    return _Parser(_tokenize(text)).query()
+
+
+@dataclass(frozen=True, eq=False)
+class Resource:
+    """Fields a query may reference on one list endpoint."""
+
+    name: str
+    table: str
+    id_column: ColumnElement
+    fields: dict[str, ColumnElement]
+    # Field prefix -> (joined entity, ON clause)
+    joins: dict[str, tuple[Any, ColumnElement]]
+
+
+FMEAS = Resource(
+    name="fmeas",
+    table="fmeas",
+    id_column=FMEA.id,
+    fields={
+        name: FMEA.__table__.c[name]
+        for name in (
+            "id", "asset_id", "title", "version", "is_active", "status", "approved_by", "approved_at",
+            "effective_date", "created_by", "updated_by", "supersedes_fmea_id", "created_at", "updated_at",
+            "archived_at",
+        )
+    },
+    joins={},
+)
+
+FAILURE_MODES = Resource(
+    name="failure_modes",
+    table="failure_modes",
+    id_column=FailureMode.id,
+    fields={
+        **{
+            name: FailureMode.__table__.c[name]
+            for name in ("id", "fmea_id", "name", "severity", "occurrence", "detection", "rpn", "created_at")
+        },
+        **{f"fmea.{name}": FMEA.__table__.c[name] for name in ("asset_id", "version", "is_active", "status")},
+    },
+    joins={"fmea": (FMEA, FMEA.id == FailureMode.fmea_id)},
+)
+
+
+def _coerce(column: ColumnElement, field: str, value: str) -> Any:
+    try:
+        if isinstance(column.type, Boolean):
+            if value.lower() not in ("true", "false"):
+                raise ValueError(value)
+            return value.lower() == "true"
+        if isinstance(column.type, Integer):
+            return int(value)
+        if isinstance(column.type, DateTime):
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise FilterError(f"invalid value for {field}: {value!r}") from None
+    return value
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    criteria: Optional[ColumnElement]
+    joins: tuple[str, ...]
+    sort_column: ColumnElement
+    descending: bool
+    # Ties the cursor to the query text it was issued for
+    fingerprint: str
+
+
+def _column(resource: Resource, field: str, joins: set[str]) -> ColumnElement:
+    column = resource.fields.get(field)
+    if column is None:
+        raise FilterError(f"unknown field {field!r}; available: {', '.join(resource.fields)}")
+    if "." in field:
+        joins.add(field.split(".", 1)[0])
+    return column
+
+
+def _compile_node(node: Node, resource: Resource, joins: set[str]) -> ColumnElement:
+    if isinstance(node, BoolOp):
+        operands = [_compile_node(operand, resource, joins) for operand in node.operands]
+        return and_(*operands) if node.op == "and" else or_(*operands)
+    if isinstance(node, Not):
+        return not_(_compile_node(node.operand, resource, joins))
+    column = _column(resource, node.field, joins)
+    if isinstance(node, IsNull):
+        return column.is_not(None) if node.negated else column.is_(None)
+    values = [_coerce(column, node.field, value) for value in node.values]
+    if node.op == "in":
+        return column.in_(values)
+    if isinstance(column.type, Boolean) and node.op not in ("=", "!="):
+        raise FilterError(f"{node.field} only supports = and !=")
+    value = values[0]
+    return {
+        "=": column == value,
+        "!=": column != value,
+        "<": column < value,
+        "<=": column <= value,
+        ">": column > value,
+        ">=": column >= value,
+    }[node.op]
+
+
+@lru_cache(maxsize=1024)
+def compile_query(resource: Resource, text: str) -> CompiledQuery:
+    """Compile query text to SQLAlchemy criteria over ``resource`` (cached)."""
+    query = parse(text)
+    joins: set[str] = set()
+    criteria = None if query.where is None else _compile_node(query.where, resource, joins)
+    sortable = INDEX_CATALOG[resource.table]
+    if query.sort_field not in sortable:
+        raise FilterError(f"cannot sort by {query.sort_field!r}; sortable fields: {', '.join(sortable)}")
+    fingerprint = hashlib.blake2b(f"{resource.name}\0{text}".encode(), digest_size=6).hexdigest()
+    return CompiledQuery(
+        criteria=criteria,
+        joins=tuple(sorted(joins)),
+        sort_column=resource.fields[query.sort_field],
+        descending=query.descending,
+        fingerprint=fingerprint,
+    )
+
+
+def encode_cursor(compiled: CompiledQuery, sort_value: Any, row_id: int) -> str:
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([compiled.fingerprint, sort_value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(compiled: CompiledQuery, cursor: str) -> tuple[Any, int]:
+    try:
+        fingerprint, sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise FilterError("malformed cursor") from None
+    if fingerprint != compiled.fingerprint:
+        raise FilterError("cursor was issued for a different query")
+    if isinstance(compiled.sort_column.type, DateTime):
+        sort_value = datetime.fromisoformat(sort_value)
+    return sort_value, int(row_id)
+
+
+@dataclass(frozen=True)
+class Search:
+    query: CompiledQuery
+    limit: int
+    # (sort value, id) of the last row of the previous page
+    after: Optional[tuple[Any, int]] = None
+
+
+class SearchParams:
+    """Dependency reading ``?q=``, ``?cursor=`` and ``?limit=`` for ``resource``."""
+
+    def __init__(self, resource: Resource) -> None:
+        self.resource = resource
+
+    def __call__(
+        self,
+        q: str = Query("", description="Filter and sort, e.g. 'severity>=8 and detection>=7 order by rpn desc'"),
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+        limit: int = Query(100, ge=1, le=1000),
+    ) -> Search:
+        try:
+            compiled = compile_query(self.resource, q)
+            after = None if cursor is None else decode_cursor(compiled, cursor)
+        except FilterError as exc:
+            raise HTTPException(status_code=422, detail=str(exc)) from exc
+        return Search(query=compiled, limit=limit, after=after)
+
+
+def apply(stmt: Select, resource: Resource, search: Search) -> Select:
+    """Filter, order and page ``stmt``; one extra row is fetched to detect a next page."""
+    compiled = search.query
+    for prefix in compiled.joins:
+        target, onclause = resource.joins[prefix]
+        stmt = stmt.join(target, onclause)
+    if compiled.criteria is not None:
+        stmt = stmt.where(compiled.criteria)
+    if search.after is not None:
+        key, after = tuple_(compiled.sort_column, resource.id_column), tuple_(*search.after)
+        stmt = stmt.where(key < after if compiled.descending else key > after)
+    if compiled.descending:
+        stmt = stmt.order_by(compiled.sort_column.desc(), resource.id_column.desc())
+    else:
+        stmt = stmt.order_by(compiled.sort_column, resource.id_column)
+    columns = (compiled.sort_column.label(SORT_KEY), resource.id_column.label(ID_KEY))
+    return stmt.add_columns(*columns).limit(search.limit + 1)
+
+
+def merge(shard_rows: list[list[dict]], search: Search) -> list[dict]:
+    """Interleave per-shard results of an :func:`apply`-ed statement in the query's order."""
+    if len(shard_rows) == 1:
+        return shard_rows[0]
+
+    def key(row: dict) -> tuple:
+        # Postgres sorts NULLs last ascending (first descending), after every value
+        value = row[SORT_KEY]
+        return value is None, value, row[ID_KEY]
+
+    return list(heapq.merge(*shard_rows, key=key, reverse=search.query.descending))
+
+
+def page(rows: list[dict], search: Search) -> tuple[list[dict], Optional[str]]:
+    """Strip the paging columns from ``rows`` and build the next-page cursor."""
+    next_cursor = None
+    if len(rows) > search.limit:
+        rows = rows[:search.limit]
+        next_cursor = encode_cursor(search.query, rows[-1][SORT_KEY], rows[-1][ID_KEY])
+    for row in rows:
+        del row[SORT_KEY], row[ID_KEY]
+    return rows, next_cursor
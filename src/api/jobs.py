@@ -0,0 +1,548 @@
+"""Background jobs for operations too slow to run inside a request.
+
+The API only queues a row in ``jobs`` and answers ``202 Accepted`` with the
+job's URL; clients poll ``GET /jobs/{id}`` for progress and the result. Kinds:
+
+``clone``
+    Copy an FMEA tree into a new draft version of the same asset (one
+    transaction; set-based ``INSERT ... SELECT`` per table, each copied row
+    recorded in the audit log with ``created_by`` as the actor).
+``export``
+    Write an Arrow or Parquet extract to ``FMEA_JOB_RESULTS_DIR``, served by
+    ``GET /jobs/{id}/result``. The API reads the file from the path the worker
+    wrote, so both must see the same directory (a shared volume when they run
+    on different hosts); a missing file answers ``410``.
+``archive``
+    Run :func:`db.archival.archive_superseded`.
+
+:class:`Worker` runs them::
+
+    cd src && python -m api.jobs --threads 2
+
+Each worker thread claims the oldest queued job with ``FOR UPDATE SKIP
+LOCKED``, so any number of workers can share the queue. Running jobs are kept
+alive by a heartbeat; a job whose worker stopped heartbeating for
+``STALE_AFTER`` is queued again (or failed after ``MAX_ATTEMPTS``).
+
+A job runs in the tenant that queued it: the worker connection itself sees
+every tenant, and each job scopes its own transactions (:mod:`db.tenancy`).
+
+On a sharded fleet (:mod:`db.sharding`) the queue and the audit log stay on
+the primary, while jobs reach the trees where they live: a clone runs on its
+source FMEA's shard, an export reads every shard in turn and an archive run
+archives each shard.
+
+Finished jobs are deleted ``KEEP_FINISHED`` after they finish, together with
+their result files.
+
+Cancellation is cooperative: ``POST /jobs/{id}/cancel`` cancels a queued job
+outright and flags a running one, which stops at its next progress report.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Callable, Literal, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy import and_, case, delete, func, insert, literal, select, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from db.archival import DEFAULT_AGE, DEFAULT_BATCH_SIZE, ArchiveReport, archive_superseded
+from db.models import ARCHIVE_TABLES, DEFAULT_TENANT, FMEA, Action, Control, FailureCause, FailureEffect, FailureMode, Job
+from db.sharding import Router
+from db.tenancy import scope, scope_session
+from . import audit, crud
+from .export import ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE, Dataset, ExportFilters, read_tables, stream_arrow, stream_parquet
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DIR_ENV = "FMEA_JOB_RESULTS_DIR"
+
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+STALE_AFTER = timedelta(minutes=2)
+# Finished jobs, and their result files, are deleted this long after they finish
+KEEP_FINISHED = timedelta(days=7)
+# Progress reports closer together than this are not written (nor checked for cancellation)
+PROGRESS_INTERVAL = 0.5
+
+_jobs = Job.__table__
+
+
+class JobError(Exception):
+    """An expected failure; its message becomes the job's error."""
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobContext:
+    """What a running job uses to report progress, notice cancellation and reach the shards.
+
+    ``engine`` holds the queue (the primary); ``engines`` are every shard's,
+    the primary first, and default to the primary alone.
+    """
+
+    def __init__(
+        self, engine: Engine, job_id: int, tenant_id: str = DEFAULT_TENANT, engines: Sequence[Engine] = ()
+    ) -> None:
+        self.engine = engine
+        self.engines = tuple(engines) or (engine,)
+        self.job_id = job_id
+        self.tenant_id = tenant_id
+        self._reported = 0.0
+
+    def engine_for(self, row_id: int) -> Engine:
+        """The engine of the shard that holds the row (tree) with id ``row_id``."""
+        return self.engines[Router(len(self.engines)).for_id(row_id)]
+
+    def progress(self, done: int, total: Optional[int] = None, message: Optional[str] = None, force: bool = False) -> None:
+        """Record progress; raises :class:`JobCancelled` if a cancel was requested."""
+        now = time.monotonic()
+        if not force and now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        values: dict[str, Any] = {"progress_done": done, "heartbeat_at": func.now()}
+        if total is not None:
+            values["progress_total"] = total
+        if message is not None:
+            values["message"] = message
+        with self.engine.begin() as conn:
+            cancel = conn.scalar(
+                update(_jobs).where(_jobs.c.id == self.job_id).values(**values).returning(_jobs.c.cancel_requested)
+            )
+        if cancel:
+            raise JobCancelled()
+
+
+# --- kinds -------------------------------------------------------------------
+
+
+class CloneParams(BaseModel):
+    fmea_id: int
+    title: Optional[str] = None
+    created_by: Optional[str] = None
+
+
+class ExportParams(BaseModel):
+    dataset: Dataset
+    format: Literal["arrow", "parquet"] = "parquet"
+    asset_id: Optional[str] = None
+    status: Optional[str] = None
+    version: Optional[int] = None
+
+
+class ArchiveParams(BaseModel):
+    older_than_days: float = Field(DEFAULT_AGE.days, ge=0)
+    batch_size: int = Field(DEFAULT_BATCH_SIZE, ge=1)
+
+
+# Children of a failure mode, copied after the failure modes themselves
+_CHILD_TABLES = (Action.__table__, FailureCause.__table__, FailureEffect.__table__, Control.__table__)
+
+
+def _insert_audited(conn: Connection, audit_conn: Connection, stmt, table, ctx: JobContext, actor: Optional[str]) -> int:
+    """Run an ``INSERT`` into ``table``, record its rows in the audit log and return how many there were."""
+    rows = conn.execute(stmt.returning(*table.columns)).mappings().all()
+    audit.record_created(audit_conn, table, rows, actor, ctx.tenant_id)
+    return len(rows)
+
+
+def _copy_children(
+    conn: Connection,
+    audit_conn: Connection,
+    ctx: JobContext,
+    actor: Optional[str],
+    child,
+    source_child,
+    source_modes,
+    new_fmea_id: int,
+    old_fmea_id: int,
+) -> int:
+    """Copy one child table, re-pointing rows at the clone's failure mode of the same name."""
+    new_modes = FailureMode.__table__.alias("new_modes")
+    names = [c.name for c in child.columns if c.name not in ("id", "failure_mode_id", "created_at", "row_version", "valid_from")]
+    rows = (
+        select(new_modes.c.id, *(source_child.c[n] for n in names))
+        .select_from(
+            source_child.join(source_modes, source_modes.c.id == source_child.c.failure_mode_id).join(
+                new_modes, and_(new_modes.c.fmea_id == new_fmea_id, new_modes.c.name == source_modes.c.name)
+            )
+        )
+        .where(source_modes.c.fmea_id == old_fmea_id)
+        .order_by(source_child.c.id)
+    )
+    return _insert_audited(conn, audit_conn, insert(child).from_select(["failure_mode_id", *names], rows), child, ctx, actor)
+
+
+def run_clone(ctx: JobContext, params: CloneParams) -> dict[str, Any]:
+    steps = 2 + len(_CHILD_TABLES)
+    copied: dict[str, int] = {}
+    engine = ctx.engine_for(params.fmea_id)
+    with ExitStack() as stack:
+        # The audit log is on the primary: off it, the entries commit right after the clone does
+        audit_conn = stack.enter_context(ctx.engine.begin())
+        conn = audit_conn if engine is ctx.engine else stack.enter_context(engine.begin())
+        scope(conn, ctx.tenant_id)
+        source = conn.execute(select(FMEA.__table__).where(FMEA.id == params.fmea_id)).mappings().one_or_none()
+        if source is None:
+            raise JobError(f"FMEA {params.fmea_id} not found")
+        # Archived trees are cloned from the cold tables
+        tables = {
+            t.name: ARCHIVE_TABLES[t.name] if source["archived_at"] is not None else t
+            for t in (FailureMode.__table__, *_CHILD_TABLES)
+        }
+        version = select(func.max(FMEA.version) + 1).where(FMEA.asset_id == source["asset_id"]).scalar_subquery()
+        new_fmea = conn.execute(
+            insert(FMEA.__table__)
+            .values(
+                asset_id=source["asset_id"],
+                title=params.title or source["title"],
+                description=source["description"],
+                version=version,
+                is_active=source["is_active"],
+                status="draft",
+                created_by=params.created_by,
+                supersedes_fmea_id=source["id"],
+            )
+            .returning(*FMEA.__table__.columns)
+        ).mappings().one()
+        new_id = new_fmea["id"]
+        audit.record_created(audit_conn, FMEA.__table__, [new_fmea], params.created_by, ctx.tenant_id)
+        ctx.progress(1, steps, "fmeas", force=True)
+
+        modes = tables["failure_modes"]
+        mode_names = ["name", "severity", "occurrence", "detection"]
+        copied["failure_modes"] = _insert_audited(
+            conn,
+            audit_conn,
+            insert(FailureMode.__table__).from_select(
+                ["fmea_id", *mode_names],
+                select(literal(new_id), *(modes.c[n] for n in mode_names))
+                .where(modes.c.fmea_id == source["id"])
+                .order_by(modes.c.id),
+            ),
+            FailureMode.__table__,
+            ctx,
+            params.created_by,
+        )
+        ctx.progress(2, steps, "failure_modes", force=True)
+
+        for step, child in enumerate(_CHILD_TABLES, start=3):
+            copied[child.name] = _copy_children(
+                conn, audit_conn, ctx, params.created_by, child, tables[child.name], modes, new_id, source["id"]
+            )
+            ctx.progress(step, steps, child.name, force=True)
+    return {"fmea_id": new_id, "copied": copied}
+
+
+def results_dir() -> str:
+    path = os.getenv(RESULTS_DIR_ENV) or os.path.join(tempfile.gettempdir(), "fmea-jobs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def run_export(ctx: JobContext, params: ExportParams) -> dict[str, Any]:
+    filename = f"{params.dataset.value}.{params.format}"
+    path = os.path.join(results_dir(), f"job-{ctx.job_id}-{filename}")
+    partial = path + ".part"
+    filters = ExportFilters(asset_id=params.asset_id, status=params.status, version=params.version)
+    stream = stream_arrow if params.format == "arrow" else stream_parquet
+    rows = 0
+
+    with ExitStack() as stack:
+        # One shard after another, each read lazily as the file is written
+        shards = []
+        for engine in ctx.engines:
+            db = stack.enter_context(Session(engine))
+            scope_session(db, ctx.tenant_id)
+            shards.append(read_tables(db, params.dataset, filters))
+        schema = shards[0][0]
+
+        def counted():
+            nonlocal rows
+            for table in itertools.chain.from_iterable(tables for _, tables in shards):
+                rows += table.num_rows
+                ctx.progress(rows, message="rows written")
+                yield table
+
+        try:
+            with open(partial, "wb") as out:
+                for chunk in stream(schema, counted()):
+                    out.write(chunk)
+        except BaseException:
+            os.unlink(partial)
+            raise
+    os.replace(partial, path)
+    return {
+        "path": path,
+        "filename": filename,
+        "media_type": ARROW_MEDIA_TYPE if params.format == "arrow" else PARQUET_MEDIA_TYPE,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+    }
+
+
+def run_archive(ctx: JobContext, params: ArchiveParams) -> dict[str, Any]:
+    total = ArchiveReport()
+
+    def progress(report: ArchiveReport) -> None:
+        # Batches are committed as they go, so a cancelled run keeps what it archived
+        rows = sum(total.rows.values()) + sum(report.rows.values())
+        ctx.progress(total.fmeas + report.fmeas, message=f"{rows} rows archived")
+
+    for engine in ctx.engines:
+        report = archive_superseded(
+            engine,
+            older_than=timedelta(days=params.older_than_days),
+            batch_size=params.batch_size,
+            progress=progress,
+            tenant_id=ctx.tenant_id,
+        )
+        total.batches += report.batches
+        total.fmeas += report.fmeas
+        total.add(report.rows)
+    return {"batches": total.batches, "fmeas": total.fmeas, "rows": total.rows}
+
+
+@dataclass(frozen=True)
+class Kind:
+    params: type[BaseModel]
+    run: Callable[[JobContext, Any], dict[str, Any]]
+
+
+KINDS: dict[str, Kind] = {
+    "clone": Kind(CloneParams, run_clone),
+    "export": Kind(ExportParams, run_export),
+    "archive": Kind(ArchiveParams, run_archive),
+}
+
+
+def validate_params(kind: str, params: dict[str, Any]) -> dict[str, Any]:
+    """Normalized parameters for a new job; raises ValueError if they are not valid."""
+    if kind not in KINDS:
+        raise ValueError(f"unknown job kind {kind!r}; expected one of {', '.join(KINDS)}")
+    try:
+        return KINDS[kind].params.model_validate(params).model_dump(mode="json")
+    except ValidationError as exc:
+        raise ValueError(f"invalid {kind} parameters: {exc.errors(include_url=False)}") from None
+
+
+def enqueue(db: Session, response: Response, kind: str, params: dict) -> Job:
+    """Queue a job and point the client at it (shared by routes that start jobs)."""
+    try:
+        params = validate_params(kind, params)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    job = crud.create_job(db, kind=kind, params=params)
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return job
+
+
+# --- queue -------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Claimed:
+    id: int
+    kind: str
+    params: dict[str, Any]
+    attempts: int
+    tenant_id: str
+
+
+def claim(conn: Connection, worker: str) -> Optional[Claimed]:
+    """Mark the oldest queued job as running on ``worker``."""
+    next_job = (
+        select(_jobs.c.id)
+        .where(_jobs.c.status == "queued")
+        .order_by(_jobs.c.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .cte("next_job")
+    )
+    stmt = (
+        update(_jobs)
+        .where(_jobs.c.id == next_job.c.id)
+        .values(
+            status="running",
+            worker=worker,
+            attempts=_jobs.c.attempts + 1,
+            started_at=func.now(),
+            heartbeat_at=func.now(),
+        )
+        .returning(_jobs.c.id, _jobs.c.kind, _jobs.c.params, _jobs.c.attempts, _jobs.c.tenant_id)
+    )
+    row = conn.execute(stmt).mappings().one_or_none()
+    return None if row is None else Claimed(**row)
+
+
+def finish(conn: Connection, job_id: int, worker: str, status: str, result=None, error: Optional[str] = None) -> None:
+    # A job that was reaped and claimed by another worker is no longer ours to settle
+    conn.execute(
+        update(_jobs)
+        .where(_jobs.c.id == job_id, _jobs.c.status == "running", _jobs.c.worker == worker)
+        .values(status=status, result=result, error=error, finished_at=func.now(), heartbeat_at=None)
+    )
+
+
+def heartbeat(conn: Connection, job_ids: list[int]) -> None:
+    conn.execute(update(_jobs).where(_jobs.c.id.in_(job_ids), _jobs.c.status == "running").values(heartbeat_at=func.now()))
+
+
+def reap(conn: Connection, stale_after: timedelta = STALE_AFTER) -> int:
+    """Requeue (or fail, after ``MAX_ATTEMPTS``) running jobs whose worker went silent."""
+    retry = and_(_jobs.c.attempts < MAX_ATTEMPTS, _jobs.c.cancel_requested.is_(False))
+    stmt = (
+        update(_jobs)
+        .where(_jobs.c.status == "running", _jobs.c.heartbeat_at < func.now() - stale_after)
+        .values(
+            status=case((retry, "queued"), else_="failed"),
+            error=case((retry, _jobs.c.error), else_="worker stopped responding"),
+            finished_at=case((retry, None), else_=func.now()),
+            worker=None,
+            heartbeat_at=None,
+        )
+    )
+    return conn.execute(stmt).rowcount
+
+
+def expire(conn: Connection, keep: timedelta = KEEP_FINISHED) -> int:
+    """Delete jobs finished more than ``keep`` ago, with their result files."""
+    stmt = (
+        delete(_jobs)
+        .where(_jobs.c.status.in_(("succeeded", "failed", "cancelled")), _jobs.c.finished_at < func.now() - keep)
+        .returning(_jobs.c.result)
+    )
+    results = conn.execute(stmt).scalars().all()
+    for result in results:
+        if result and "path" in result:
+            try:
+                os.remove(result["path"])
+            except FileNotFoundError:
+                pass
+    return len(results)
+
+
+class Worker:
+    """Runs queued jobs on ``threads`` threads until stopped.
+
+    ``engine`` holds the queue; ``engines`` are every shard's (see :class:`JobContext`).
+    """
+
+    def __init__(
+        self, engine: Engine, threads: int = 1, name: Optional[str] = None, engines: Sequence[Engine] = ()
+    ) -> None:
+        self.engine = engine
+        self.engines = tuple(engines) or (engine,)
+        self.threads = threads
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self._running: set[int] = set()
+        self._lock = threading.Lock()
+
+    def run_once(self) -> Optional[int]:
+        """Run the next queued job to completion; its id, or ``None`` if the queue was empty."""
+        with self.engine.begin() as conn:
+            job = claim(conn, self.name)
+        if job is None:
+            return None
+        with self._lock:
+            self._running.add(job.id)
+        logger.info("job %d (%s) started", job.id, job.kind)
+        status, result, error = "succeeded", None, None
+        try:
+            kind = KINDS[job.kind]
+            result = kind.run(JobContext(self.engine, job.id, job.tenant_id, self.engines), kind.params.model_validate(job.params))
+        except JobCancelled:
+            status = "cancelled"
+        except JobError as exc:
+            status, error = "failed", str(exc)
+        except Exception as exc:
+            logger.exception("job %d (%s) failed", job.id, job.kind)
+            status, error = "failed", f"{type(exc).__name__}: {exc}"
+        finally:
+            with self._lock:
+                self._running.discard(job.id)
+        with self.engine.begin() as conn:
+            finish(conn, job.id, self.name, status, result, error)
+        logger.info("job %d (%s) %s", job.id, job.kind, status)
+        return job.id
+
+    def _loop(self, stop: threading.Event) -> None:
+        while not stop.is_set():
+            try:
+                ran = self.run_once()
+            except Exception:
+                logger.exception("job worker cycle failed")
+                ran = None
+            if ran is None:
+                stop.wait(POLL_SECONDS)
+
+    def run(self, stop: Optional[threading.Event] = None) -> None:
+        stop = stop or threading.Event()
+        workers = [
+            threading.Thread(target=self._loop, args=(stop,), name=f"job-worker-{n}", daemon=True)
+            for n in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        try:
+            # This thread keeps the running jobs alive, recovers those of dead workers and expires old ones
+            while not stop.wait(HEARTBEAT_SECONDS):
+                try:
+                    with self._lock:
+                        running = list(self._running)
+                    with self.engine.begin() as conn:
+                        if running:
+                            heartbeat(conn, running)
+                        if reaped := reap(conn):
+                            logger.warning("requeued or failed %d jobs of unresponsive workers", reaped)
+                        if expired := expire(conn):
+                            logger.info("deleted %d expired jobs", expired)
+                except Exception:
+                    logger.exception("job heartbeat failed")
+        finally:
+            # Running jobs finish before the worker exits
+            stop.set()
+            for thread in workers:
+                thread.join()
+
+
+def main(argv: list[str] | None = None) -> int:
+    from db.database import get_engine, get_engines
+
+    parser = argparse.ArgumentParser(prog="python -m api.jobs", description="Run queued background jobs.")
+    parser.add_argument("--threads", type=int, default=1, help="jobs run at the same time")
+    parser.add_argument("--once", action="store_true", help="run the next queued job (if any) and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    worker = Worker(get_engine(), threads=args.threads, engines=get_engines())
+    if args.once:
+        job_id = worker.run_once()
+        print("no queued jobs" if job_id is None else f"ran job {job_id}")
+        return 0
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Keeping slow or abandoned requests from starving the connection pool.
+
+Statement timeouts
+    ``DB_STATEMENT_TIMEOUT_MS`` is the default for every statement, sent when
+    a connection is opened. A route that needs a different budget declares
+    it::
+
+        @router.get("/{dataset}.parquet")
+        @query_budget(2)
+        @statement_timeout(120_000)
+        def export_parquet(...): ...
+
+    and :func:`api.database.get_db` applies it to each transaction of the
+    request's session (:func:`db.database.set_local`, one ``set_config``
+    statement per transaction together with the tenant settings, counted
+    against query budgets). A statement that runs out of time answers
+    ``503``.
+Load shedding
+    ``get_db`` checks out the session's connection up front and times how
+    long it queued for an idle one (:class:`db.database.TimedQueuePool`;
+    opening a connection and the pre-ping do not count). When a wait exceeds ``FMEA_ADMISSION_MAX_WAIT_MS`` the pool is
+    saturated, and new requests are turned away with ``503`` and
+    ``Retry-After`` for ``SHED_SECONDS`` instead of queueing behind it. A
+    checkout that hits ``DB_POOL_TIMEOUT`` answers the same way.
+Cancellation on disconnect
+    :class:`CancelOnDisconnectMiddleware` watches for the client going away
+    while a request is being served and sends Postgres a cancel request for
+    the statement the request's session is running, so an abandoned export
+    or search frees its connection right away.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Callable, Optional, TypeVar
+
+import psycopg
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from db.database import get_config, set_local
+from .metrics import DB_POOL_WAIT, REQUESTS_SHED
+
+logger = logging.getLogger(__name__)
+
+MAX_WAIT_ENV = "FMEA_ADMISSION_MAX_WAIT_MS"
+# How long new requests are refused once a pool wait went over the limit
+SHED_SECONDS = 1
+
+_TIMEOUT_ATTR = "__statement_timeout__"
+_REQUEST_KEY = "request_queries"
+
+F = TypeVar("F", bound=Callable)
+
+
+def statement_timeout(milliseconds: int) -> Callable[[F], F]:
+    """Declare the route's ``statement_timeout`` (0 disables it)."""
+
+    def decorator(endpoint: F) -> F:
+        setattr(endpoint, _TIMEOUT_ATTR, milliseconds)
+        return endpoint
+
+    return decorator
+
+
+def route_statement_timeout(scope) -> Optional[int]:
+    return getattr(scope.get("endpoint"), _TIMEOUT_ATTR, None)
+
+
+def overloaded(detail: str = "Server busy, retry shortly") -> HTTPException:
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(SHED_SECONDS)})
+
+
+class Admission:
+    """Sheds load for a moment whenever a pool checkout waited too long."""
+
+    def __init__(self, max_wait: float) -> None:
+        self.max_wait = max_wait
+        self._shed_until = 0.0
+
+    def admit(self) -> None:
+        if time.monotonic() < self._shed_until:
+            REQUESTS_SHED.inc()
+            raise overloaded()
+
+    def observe(self, waited: float) -> None:
+        DB_POOL_WAIT.observe(waited)
+        if waited > self.max_wait:
+            self._shed_until = max(self._shed_until, time.monotonic() + SHED_SECONDS)
+            logger.warning("pool checkout took %.0f ms; shedding new requests for %ds", waited * 1000, SHED_SECONDS)
+
+
+admission = Admission(float(os.getenv(MAX_WAIT_ENV, "250")) / 1000)
+
+
+class RequestQueries:
+    """The connection a request's session is currently running statements on."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._connection: Optional[psycopg.Connection] = None
+
+    def attach(self, connection: psycopg.Connection) -> None:
+        with self._lock:
+            self._connection = connection
+
+    def detach(self) -> None:
+        # Past this point the connection may serve another request: never cancel it
+        with self._lock:
+            self._connection = None
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._connection.cancel_safe()
+
+
+_current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("fmea_request_queries", default=None)
+
+
+def prepare_session(session: Session, request: Request) -> None:
+    """Tie ``session`` to the request: its statement timeout and its cancellation."""
+    timeout = route_statement_timeout(request.scope)
+    if timeout is not None and timeout != get_config().statement_timeout_ms:
+        set_local(session, "statement_timeout", int(timeout))
+    queries = _current_queries.get()
+    if queries is not None:
+        session.info[_REQUEST_KEY] = queries
+
+
+@event.listens_for(Session, "after_begin")
+def _after_begin(session: Session, transaction, connection) -> None:
+    queries = session.info.get(_REQUEST_KEY)
+    if queries is not None:
+        queries.attach(connection.connection.driver_connection)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(session: Session, transaction) -> None:
+    queries = session.info.get(_REQUEST_KEY)
+    if queries is not None and transaction.parent is None:
+        queries.detach()
+
+
+class CancelOnDisconnectMiddleware:
+    """Pure ASGI middleware cancelling a request's running statement when its client disconnects.
+
+    The server's ``receive`` is read by a pump task for the whole request, so
+    a disconnect is seen even while a sync endpoint is blocked on the database
+    and never reads from the client itself.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        messages: asyncio.Queue = asyncio.Queue()
+        finished = disconnected = False
+
+        async def pump() -> None:
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    disconnected = True
+                    if not finished:
+                        await asyncio.to_thread(queries.cancel)
+                    return
+
+        async def receive_wrapper():
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_wrapper(message) -> None:
+            nonlocal finished
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished = True
+            await send(message)
+
+        token = _current_queries.set(queries)
+        reader = asyncio.ensure_future(pump())
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            finished = True
+            reader.cancel()
+            _current_queries.reset(token)
+
+
+async def statement_canceled_handler(request: Request, exc: OperationalError):
+    """503 for statements stopped by ``statement_timeout`` (or a disconnect); other errors stay 500s."""
+    if not isinstance(exc.orig, psycopg.errors.QueryCanceled):
+        raise exc
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Query exceeded its time budget"},
+        headers={"Retry-After": str(SHED_SECONDS)},
+    )
@@ -0,0 +1,17 @@
+"""End-to-end load tests for the FMEA Tracker API.
+
+Scenarios mirror production traffic (dashboard polling, authoring bursts,
+version creation) and are driven by an async HTTP client at a configurable
+concurrency::
+
+    cd src && python -m api.loadtest --launch --scenario dashboard --concurrency 8,32 --duration 20
+
+Each run reports latency percentiles, throughput and error rates per request
+label, plus Postgres-side statistics (pg_stat_database deltas and the API's
+own per-route SQL counters from /metrics).
+
+``--noisy-neighbour authoring`` checks tenant isolation under load: each
+scenario runs for ``--tenant`` alone, then again while a second tenant runs
+the noisy scenario against the same deployment, and the report compares the
+quiet tenant's p95 and confirms it never saw the other tenant's rows.
+"""
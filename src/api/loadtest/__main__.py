@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import uuid
+from contextlib import nullcontext
+
+import httpx
+
+from db.models import DEFAULT_TENANT
+from ..tenancy import TENANT_HEADER
+from .harness import (
+    cleanup,
+    format_noisy_report,
+    format_report,
+    launch_app,
+    run_noisy_neighbour,
+    run_scenario,
+    summarize_throughput,
+)
+from .scenarios import SCENARIOS, ScenarioState
+
+
+def _client(base_url: str, tenant_id: str, connections: int, timeout: float) -> httpx.AsyncClient:
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    return httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout, headers={TENANT_HEADER: tenant_id})
+
+
+async def run_noisy(args: argparse.Namespace, base_url: str) -> None:
+    """Each ``--scenario`` for ``--tenant`` alone, then next to another tenant running ``--noisy-neighbour``."""
+    async with _client(base_url, args.tenant, max(args.concurrency), args.timeout) as quiet, _client(
+        base_url, f"noisy-{uuid.uuid4().hex[:8]}", args.noisy_concurrency, args.timeout
+    ) as noisy:
+        noisy_state = ScenarioState(run_id=uuid.uuid4().hex[:8], tenant_id=noisy.headers[TENANT_HEADER])
+        noisy_scenario = SCENARIOS[args.noisy_neighbour]
+        await noisy_scenario.setup(noisy, noisy_state)
+        try:
+            for name in args.scenario:
+                scenario = SCENARIOS[name]
+                state = ScenarioState(run_id=uuid.uuid4().hex[:8], tenant_id=args.tenant)
+                await scenario.setup(quiet, state)
+                try:
+                    for concurrency in args.concurrency:
+                        report = await run_noisy_neighbour(
+                            quiet,
+                            noisy,
+                            scenario,
+                            noisy_scenario,
+                            state,
+                            noisy_state,
+                            concurrency=concurrency,
+                            noisy_concurrency=args.noisy_concurrency,
+                            duration_s=args.duration,
+                            seed=args.seed,
+                        )
+                        print(format_noisy_report(report), end="\n\n")
+                finally:
+                    if args.cleanup:
+                        await asyncio.to_thread(cleanup, state)
+        finally:
+            if args.cleanup:
+                await asyncio.to_thread(cleanup, noisy_state)
+
+
+async def run(args: argparse.Namespace, base_url: str) -> None:
+    async with _client(base_url, args.tenant, max(args.concurrency), args.timeout) as client:
+        for name in args.scenario:
+            scenario = SCENARIOS[name]
+            state = ScenarioState(run_id=uuid.uuid4().hex[:8], tenant_id=args.tenant)
+            await scenario.setup(client, state)
+            reports = []
+            try:
+                for concurrency in args.concurrency:
+                    report = await run_scenario(
+                        client,
+                        scenario,
+                        state,
+                        concurrency=concurrency,
+                        duration_s=args.duration,
+                        seed=args.seed,
+                    )
+                    reports.append(report)
+                    print(format_report(report), end="\n\n")
+                if len(reports) > 1:
+                    print(f"{name}: {summarize_throughput(reports)}\n")
+            finally:
+                if args.cleanup:
+                    await asyncio.to_thread(cleanup, state)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m api.loadtest", description="Run end-to-end API load scenarios.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default: all")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda v: [int(x) for x in v.split(",")],
+        default=[8],
+        help="comma-separated worker counts; several values sweep for max throughput",
+    )
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per scenario and concurrency level")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--launch", action="store_true", help="start the API locally with uvicorn for the run")
+    parser.add_argument("--port", type=int, default=8765, help="port used with --launch")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers used with --launch")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="tenant the scenarios act for (X-Tenant-ID)")
+    parser.add_argument(
+        "--noisy-neighbour",
+        choices=sorted(SCENARIOS),
+        help="also run this scenario for a second tenant and compare the first tenant's latency alone and next to it",
+    )
+    parser.add_argument("--noisy-concurrency", type=int, default=32, help="workers of the noisy tenant")
+    parser.add_argument("--no-cleanup", dest="cleanup", action="store_false", help="keep the rows created by the run")
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or list(SCENARIOS)
+
+    server = launch_app(args.port, args.workers) if args.launch else nullcontext(args.base_url)
+    with server as base_url:
+        asyncio.run(run_noisy(args, base_url) if args.noisy_neighbour else run(args, base_url))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
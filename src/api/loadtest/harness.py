@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator, Optional
+
+import httpx
+from sqlalchemy import text
+
+from db.database import get_engine
+from .scenarios import Scenario, ScenarioState
+
+SRC_DIR = Path(__file__).resolve().parents[2]
+
+PG_STAT_COLUMNS = (
+    "xact_commit",
+    "xact_rollback",
+    "blks_read",
+    "blks_hit",
+    "tup_returned",
+    "tup_fetched",
+    "tup_inserted",
+    "tup_updated",
+    "tup_deleted",
+)
+
+
+@dataclass
+class LabelStats:
+    label: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def percentile(self, pct: float) -> float:
+        return percentile(self.latencies, pct)
+
+
+@dataclass
+class ScenarioReport:
+    scenario: str
+    concurrency: int
+    elapsed_s: float
+    operations: int
+    labels: dict[str, LabelStats]
+    db_stats: dict[str, int]
+    sql_statements: Optional[float]
+
+    @property
+    def requests(self) -> int:
+        return sum(s.count for s in self.labels.values())
+
+    @property
+    def errors(self) -> int:
+        return sum(s.errors for s in self.labels.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.requests if self.requests else 0.0
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile with linear interpolation between closest ranks."""
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def pg_stat_snapshot() -> dict[str, int]:
+    columns = ", ".join(PG_STAT_COLUMNS)
+    with get_engine().connect() as conn:
+        row = conn.execute(
+            text(f"SELECT {columns} FROM pg_stat_database WHERE datname = current_database()")
+        ).mappings().one()
+    return {k: int(v or 0) for k, v in row.items()}
+
+
+async def scrape_sql_statements(client: httpx.AsyncClient) -> Optional[float]:
+    """Sum of fmea_db_queries_total across routes, or None if /metrics is unavailable."""
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return None
+    if not response.is_success:
+        return None
+    total = 0.0
+    for line in response.text.splitlines():
+        if line.startswith("fmea_db_queries_total{") and 'route="/metrics"' not in line:
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    state: ScenarioState,
+    *,
+    concurrency: int,
+    duration_s: Optional[float] = None,
+    operations: Optional[int] = None,
+    seed: int = 0,
+    until: Optional[asyncio.Event] = None,
+) -> ScenarioReport:
+    """Drive ``scenario`` with ``concurrency`` workers until the duration or operation count is reached (or ``until`` is set)."""
+    if duration_s is None and operations is None and until is None:
+        raise ValueError("either duration_s, operations or until is required")
+    labels: dict[str, LabelStats] = {}
+    remaining = operations
+    deadline = None
+
+    def record(label: str, response: Optional[httpx.Response], elapsed: float) -> None:
+        stats = labels.setdefault(label, LabelStats(label))
+        stats.latencies.append(elapsed)
+        if response is None or response.status_code >= 400:
+            stats.errors += 1
+
+    async def worker(worker_id: int) -> None:
+        nonlocal remaining
+        rng = random.Random(f"{seed}-{worker_id}")
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            if until is not None and until.is_set():
+                return
+            if remaining is not None:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            start = time.perf_counter()
+            try:
+                results = await scenario.operation(client, state, rng)
+            except httpx.HTTPError:
+                record("<transport error>", None, time.perf_counter() - start)
+                continue
+            for label, response in results:
+                record(label, response, response.elapsed.total_seconds())
+
+    db_before = await asyncio.to_thread(pg_stat_snapshot)
+    sql_before = await scrape_sql_statements(client)
+    started = time.perf_counter()
+    if duration_s is not None:
+        deadline = started + duration_s
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    sql_after = await scrape_sql_statements(client)
+    db_after = await asyncio.to_thread(pg_stat_snapshot)
+
+    return ScenarioReport(
+        scenario=scenario.name,
+        concurrency=concurrency,
+        elapsed_s=elapsed,
+        operations=(operations - max(remaining or 0, 0)) if operations is not None else 0,
+        labels=labels,
+        db_stats={k: db_after[k] - db_before[k] for k in PG_STAT_COLUMNS},
+        sql_statements=(sql_after - sql_before) if sql_before is not None and sql_after is not None else None,
+    )
+
+
+def format_report(report: ScenarioReport) -> str:
+    lines = [
+        f"== {report.scenario} @ concurrency {report.concurrency}: "
+        f"{report.requests} requests in {report.elapsed_s:.1f}s, "
+        f"{report.throughput:.1f} req/s, error rate {report.error_rate:.2%}",
+        f"{'request':<42} {'count':>7} {'err':>5} {'p50':>9} {'p95':>9} {'p99':>9}",
+    ]
+    for stats in sorted(report.labels.values(), key=lambda s: s.label):
+        lines.append(
+            f"{stats.label:<42} {stats.count:>7} {stats.errors:>5} "
+            f"{stats.percentile(50) * 1e3:>7.1f}ms {stats.percentile(95) * 1e3:>7.1f}ms {stats.percentile(99) * 1e3:>7.1f}ms"
+        )
+    db = report.db_stats
+    hit_ratio = db["blks_hit"] / (db["blks_hit"] + db["blks_read"]) if db["blks_hit"] + db["blks_read"] else 1.0
+    lines.append(
+        f"db: commits={db['xact_commit']} rollbacks={db['xact_rollback']} "
+        f"rows fetched={db['tup_fetched']} inserted={db['tup_inserted']} updated={db['tup_updated']} "
+        f"cache hit={hit_ratio:.2%}"
+    )
+    if report.sql_statements is not None and report.requests:
+        lines.append(f"sql: {report.sql_statements:.0f} statements, {report.sql_statements / report.requests:.2f} per request")
+    return "\n".join(lines)
+
+
+def summarize_throughput(reports: list[ScenarioReport]) -> str:
+    best = max(reports, key=lambda r: r.throughput)
+    p95s = [statistics.fmean(s.percentile(95) for s in r.labels.values()) for r in reports if r.labels]
+    return (
+        f"max throughput {best.throughput:.1f} req/s at concurrency {best.concurrency}"
+        + (f" (mean p95 across sweep {statistics.fmean(p95s) * 1e3:.1f}ms)" if p95s else "")
+    )
+
+
+def overall_percentile(report: ScenarioReport, pct: float) -> float:
+    return percentile([v for s in report.labels.values() for v in s.latencies], pct)
+
+
+@dataclass
+class NoisyNeighbourReport:
+    quiet_alone: ScenarioReport
+    quiet_contended: ScenarioReport
+    noisy: ScenarioReport
+    # Noisy tenant rows the quiet tenant could read (must be 0)
+    leaks: int
+
+    @property
+    def p95_ratio(self) -> float:
+        alone = overall_percentile(self.quiet_alone, 95)
+        return overall_percentile(self.quiet_contended, 95) / alone if alone else 0.0
+
+
+async def count_leaks(quiet: httpx.AsyncClient, noisy_state: ScenarioState, sample: int = 20) -> int:
+    """Noisy-tenant FMEAs visible to the quiet tenant, by id and through list queries."""
+    leaks = 0
+    for fmea_id in noisy_state.fmea_ids[:sample]:
+        if (await quiet.get(f"/fmeas/{fmea_id}")).status_code != 404:
+            leaks += 1
+    for asset_id in list(noisy_state.latest_versions)[:sample]:
+        leaks += len((await quiet.get("/fmeas/", params={"q": f"asset_id={asset_id}"})).json())
+    return leaks
+
+
+async def run_noisy_neighbour(
+    quiet: httpx.AsyncClient,
+    noisy: httpx.AsyncClient,
+    quiet_scenario: Scenario,
+    noisy_scenario: Scenario,
+    quiet_state: ScenarioState,
+    noisy_state: ScenarioState,
+    *,
+    concurrency: int,
+    noisy_concurrency: int,
+    duration_s: Optional[float] = None,
+    operations: Optional[int] = None,
+    seed: int = 0,
+) -> NoisyNeighbourReport:
+    """Run the quiet tenant's scenario alone, then again while another tenant hammers the same deployment.
+
+    Both tenants share the API's connection pool and the tables; with
+    tenant-prefixed indexes the quiet tenant's latency should barely move.
+    """
+    alone = await run_scenario(
+        quiet, quiet_scenario, quiet_state, concurrency=concurrency, duration_s=duration_s, operations=operations, seed=seed
+    )
+    done = asyncio.Event()
+    noisy_run = asyncio.ensure_future(
+        run_scenario(noisy, noisy_scenario, noisy_state, concurrency=noisy_concurrency, seed=seed, until=done)
+    )
+    try:
+        contended = await run_scenario(
+            quiet, quiet_scenario, quiet_state, concurrency=concurrency, duration_s=duration_s, operations=operations, seed=seed
+        )
+    finally:
+        done.set()
+        noisy_report = await noisy_run
+    return NoisyNeighbourReport(alone, contended, noisy_report, await count_leaks(quiet, noisy_state))
+
+
+def format_noisy_report(report: NoisyNeighbourReport) -> str:
+    alone, contended, noisy = report.quiet_alone, report.quiet_contended, report.noisy
+    return "\n".join(
+        [
+            f"== noisy neighbour: {alone.scenario} @ {alone.concurrency} next to "
+            f"{noisy.scenario} @ {noisy.concurrency} ({noisy.throughput:.1f} req/s, error rate {noisy.error_rate:.2%})",
+            f"quiet p95 alone {overall_percentile(alone, 95) * 1e3:.1f}ms, "
+            f"with neighbour {overall_percentile(contended, 95) * 1e3:.1f}ms ({report.p95_ratio:.2f}x); "
+            f"throughput {alone.throughput:.1f} -> {contended.throughput:.1f} req/s",
+            f"isolation: {'OK' if report.leaks == 0 else f'{report.leaks} rows of the other tenant visible'}",
+        ]
+    )
+
+
+@contextlib.contextmanager
+def launch_app(port: int, workers: int = 1, timeout_s: float = 30.0) -> Iterator[str]:
+    """Start the API with uvicorn in a subprocess and yield its base URL."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=SRC_DIR,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout_s
+        while True:
+            try:
+                if httpx.get(f"{base_url}/").is_success:
+                    break
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("API server failed to start")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def cleanup(state: ScenarioState) -> int:
+    """Delete every FMEA (and, by cascade, its children) created by this run."""
+    with get_engine().begin() as conn:
+        result = conn.execute(
+            text("DELETE FROM fmeas WHERE tenant_id = :tenant AND asset_id LIKE :prefix"),
+            {"tenant": state.tenant_id, "prefix": f"{state.asset_prefix}-%"},
+        )
+    return result.rowcount
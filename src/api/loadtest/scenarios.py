@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+import httpx
+
+from db.models import DEFAULT_TENANT
+
+# An operation issues one or more requests and returns (label, response) pairs
+Operation = Callable[[httpx.AsyncClient, "ScenarioState", random.Random], Awaitable[list[tuple[str, httpx.Response]]]]
+Setup = Callable[[httpx.AsyncClient, "ScenarioState"], Awaitable[None]]
+
+
+@dataclass
+class ScenarioState:
+    run_id: str
+    # Tenant the run's requests act for; the client sends it as X-Tenant-ID
+    tenant_id: str = DEFAULT_TENANT
+    # Size of the data set created by the scenario setup
+    seed_fmeas: int = 20
+    seed_modes_per_fmea: int = 25
+    fmea_ids: list[int] = field(default_factory=list)
+    failure_mode_ids: list[int] = field(default_factory=list)
+    # Latest FMEA id per asset, used by the versioning scenario
+    latest_versions: dict[str, tuple[int, int]] = field(default_factory=dict)
+    counter: int = 0
+
+    def next_id(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    @property
+    def asset_prefix(self) -> str:
+        return f"LOAD-{self.run_id}"
+
+
+@dataclass
+class Scenario:
+    name: str
+    description: str
+    setup: Setup
+    operation: Operation
+
+
+def _check(response: httpx.Response) -> httpx.Response:
+    response.raise_for_status()
+    return response
+
+
+async def seed_fmeas(client: httpx.AsyncClient, state: ScenarioState) -> None:
+    for i in range(state.seed_fmeas):
+        asset_id = f"{state.asset_prefix}-{i:04d}"
+        fmea = _check(await client.post("/fmeas/", json={"asset_id": asset_id, "title": f"Load FMEA {i}"})).json()
+        state.fmea_ids.append(fmea["id"])
+        state.latest_versions[asset_id] = (fmea["id"], fmea["version"])
+        for j in range(state.seed_modes_per_fmea):
+            fm = _check(
+                await client.post(
+                    "/failure-modes/",
+                    json={
+                        "fmea_id": fmea["id"],
+                        "name": f"Mode {j}",
+                        "severity": 1 + j % 10,
+                        "occurrence": 1 + (j * 3) % 10,
+                        "detection": 1 + (j * 7) % 10,
+                    },
+                )
+            ).json()
+            state.failure_mode_ids.append(fm["id"])
+
+
+async def dashboard_poll(client: httpx.AsyncClient, state: ScenarioState, rng: random.Random):
+    fmea_id = rng.choice(state.fmea_ids)
+    return [
+        ("GET /fmeas/{fmea_id}", await client.get(f"/fmeas/{fmea_id}")),
+        ("GET /failure-modes/by-fmea/{fmea_id}", await client.get(f"/failure-modes/by-fmea/{fmea_id}")),
+    ]
+
+
+async def authoring_burst(client: httpx.AsyncClient, state: ScenarioState, rng: random.Random):
+    fmea_id = rng.choice(state.fmea_ids)
+    results = []
+    response = await client.post(
+        "/failure-modes/",
+        json={
+            "fmea_id": fmea_id,
+            "name": f"Authored mode {state.next_id()}",
+            "severity": rng.randint(1, 10),
+            "occurrence": rng.randint(1, 10),
+            "detection": rng.randint(1, 10),
+        },
+    )
+    results.append(("POST /failure-modes/", response))
+    if response.is_success:
+        failure_mode_id = response.json()["id"]
+        for _ in range(rng.randint(1, 3)):
+            results.append(
+                (
+                    "POST /actions/",
+                    await client.post(
+                        "/actions/",
+                        json={"failure_mode_id": failure_mode_id, "description": "Authored action", "owner": "load"},
+                    ),
+                )
+            )
+    return results
+
+
+async def version_creation(client: httpx.AsyncClient, state: ScenarioState, rng: random.Random):
+    asset_id = rng.choice(list(state.latest_versions))
+    prior_id, prior_version = state.latest_versions[asset_id]
+    # Reserve the version number before awaiting so concurrent workers don't collide
+    state.latest_versions[asset_id] = (prior_id, prior_version + 1)
+    created = await client.post(
+        "/fmeas/",
+        json={
+            "asset_id": asset_id,
+            "title": f"{asset_id} v{prior_version + 1}",
+            "version": prior_version + 1,
+            "status": "draft",
+            "supersedes_fmea_id": prior_id,
+        },
+    )
+    results = [("POST /fmeas/", created)]
+    if created.is_success:
+        state.latest_versions[asset_id] = (created.json()["id"], prior_version + 1)
+        results.append(("PUT /fmeas/{fmea_id}", await client.put(f"/fmeas/{prior_id}", json={"status": "superseded"})))
+    return results
+
+
+async def mixed(client: httpx.AsyncClient, state: ScenarioState, rng: random.Random):
+    # Roughly the production mix: mostly reads, some authoring, rare versioning
+    roll = rng.random()
+    if roll < 0.80:
+        return await dashboard_poll(client, state, rng)
+    if roll < 0.98:
+        return await authoring_burst(client, state, rng)
+    return await version_creation(client, state, rng)
+
+
+SCENARIOS: dict[str, Scenario] = {
+    s.name: s
+    for s in (
+        Scenario("dashboard", "Dashboards polling an FMEA and its failure modes", seed_fmeas, dashboard_poll),
+        Scenario("authoring", "Bursts of failure mode and action creation", seed_fmeas, authoring_burst),
+        Scenario("versioning", "New FMEA versions superseding the previous one", seed_fmeas, version_creation),
+        Scenario("mixed", "80% dashboard, 18% authoring, 2% versioning", seed_fmeas, mixed),
+    )
+}
@@ -1,21 +1,55 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from sqlalchemy.exc import OperationalError
+
+from db.database import get_engines
+
+from . import audit, changefeed, loadcontrol, metrics, querybudget
+from .routers import assets, fmeas, failure_modes, actions, failure_causes, failure_effects, controls, export, events, jobs, webhooks
+from .routers import audit as audit_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await changefeed.shutdown()
+    # Write audit entries still buffered in memory
+    audit.shutdown()
 
-from .routers import fmeas, failure_modes, actions, failure_causes, failure_effects, controls
 
 app = FastAPI(
     title="FMEA Tracker API",
     description="API for managing Failure Mode and Effects Analysis (FMEA) data",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+for engine in get_engines():
+    metrics.instrument_engine(engine)
+    querybudget.instrument_engine(engine)
+app.add_middleware(querybudget.QueryBudgetMiddleware)
+app.add_middleware(audit.AuditMiddleware)
+app.add_middleware(loadcontrol.CancelOnDisconnectMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+app.add_exception_handler(OperationalError, loadcontrol.statement_canceled_handler)
+
 app.include_router(fmeas.router)
+app.include_router(assets.router)
 app.include_router(failure_modes.router)
 app.include_router(actions.router)
 app.include_router(failure_causes.router)
 app.include_router(failure_effects.router)
 app.include_router(controls.router)
+app.include_router(export.router)
+app.include_router(audit_router.router)
+app.include_router(events.router)
+app.include_router(webhooks.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
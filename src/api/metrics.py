@@ -0,0 +1,177 @@
+"""Prometheus metrics for HTTP routes and the SQL they issue.
+
+Request metrics are labelled by route template (``/fmeas/{fmea_id}``) rather
+than the raw path so label cardinality stays bounded. SQL statements are
+attributed to the route that is currently being served through a context
+variable that the middleware sets for the lifetime of each request.
+"""
+from __future__ import annotations
+
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+REGISTRY = CollectorRegistry()
+
+HTTP_REQUESTS = Counter(
+    "fmea_http_requests_total",
+    "HTTP requests by route, method and status code.",
+    ["method", "route", "status"],
+    registry=REGISTRY,
+)
+HTTP_LATENCY = Histogram(
+    "fmea_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ["method", "route"],
+    registry=REGISTRY,
+)
+HTTP_IN_FLIGHT = Gauge(
+    "fmea_http_requests_in_flight",
+    "HTTP requests currently being served by method.",
+    ["method"],
+    registry=REGISTRY,
+)
+DB_QUERIES = Counter(
+    "fmea_db_queries_total",
+    "SQL statements executed by route.",
+    ["method", "route"],
+    registry=REGISTRY,
+)
+DB_QUERY_LATENCY = Histogram(
+    "fmea_db_query_duration_seconds",
+    "SQL statement execution time by route.",
+    ["method", "route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    registry=REGISTRY,
+)
+DB_POOL_WAIT = Histogram(
+    "fmea_db_pool_wait_seconds",
+    "Time requests waited to check out a pooled connection.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+    registry=REGISTRY,
+)
+REQUESTS_SHED = Counter(
+    "fmea_http_requests_shed_total",
+    "Requests turned away with 503 because the connection pool was saturated.",
+    registry=REGISTRY,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "fmea_db_queries_per_request",
+    "Number of SQL statements issued per request by route.",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 100),
+    registry=REGISTRY,
+)
+
+
+
+@dataclass
+class RequestStats:
+    method: str
+    scope: dict
+    queries: int = 0
+    sql_seconds: float = 0.0
+
+    @property
+    def route(self) -> str:
+        # The router writes the matched route into the (shared) scope before the
+        # endpoint runs, so SQL issued by the endpoint already sees the template.
+        return route_template(self.scope)
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("fmea_current_request", default=None)
+
+
+def current_request_stats() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+def route_template(scope) -> str:
+    route = scope.get("route")
+    if route is None:
+        return UNMATCHED_ROUTE
+    return route if isinstance(route, str) else getattr(route, "path", UNMATCHED_ROUTE)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route HTTP and SQL metrics."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        stats = RequestStats(method=method, scope=scope)
+        token = _current_request.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = stats.route
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+            DB_QUERIES_PER_REQUEST.labels(method, route).observe(stats.queries)
+            in_flight.dec()
+            _current_request.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("fmea_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info["fmea_query_start"].pop()
+    stats = _current_request.get()
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = stats.route
+    stats.queries += 1
+    stats.sql_seconds += elapsed
+    DB_QUERIES.labels(stats.method, route).inc()
+    DB_QUERY_LATENCY.labels(stats.method, route).observe(elapsed)
+
+
+def _handle_error(context) -> None:
+    # Failed statements never reach after_cursor_execute; drop their start time.
+    conn = context.connection
+    if conn is not None and conn.info.get("fmea_query_start"):
+        conn.info["fmea_query_start"].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach SQL timing listeners to an engine (idempotent)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics() -> Response:
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
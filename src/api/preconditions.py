@@ -0,0 +1,53 @@
+"""Optimistic concurrency for FMEAs, failure modes and actions.
+
+Each of those rows carries a ``row_version`` that every update increments.
+Single-row reads and writes return it as a strong ``ETag`` (``"3"``). A client
+sends it back in ``If-Match`` on ``PUT``/``DELETE``, and crud adds
+``row_version IN (...)`` to the ``WHERE`` of the one ``UPDATE``/``DELETE``
+statement, so no row lock is held between reading and writing. A write that
+matches no row because the token is stale (or the row is gone) answers ``412
+Precondition Failed``; the client refetches and retries.
+
+Requests without ``If-Match`` (or with ``If-Match: *``) keep last-write-wins.
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import Header, HTTPException, Response
+
+# Parsed If-Match: the acceptable row versions, or None for no precondition
+Versions = Optional[tuple[int, ...]]
+
+
+def etag(row_version: int) -> str:
+    return f'"{row_version}"'
+
+
+def set_etag(response: Response, row_version: Optional[int]) -> None:
+    if row_version is not None:
+        response.headers["ETag"] = etag(row_version)
+
+
+def parse_if_match(value: Optional[str]) -> Versions:
+    """Row versions named by an ``If-Match`` header (weak or foreign tags never match)."""
+    if value is None or value.strip() == "*":
+        return None
+    versions = []
+    for tag in value.split(","):
+        tag = tag.strip()
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return tuple(versions)
+
+
+def if_match(value: Optional[str] = Header(None, alias="If-Match")) -> Versions:
+    versions = parse_if_match(value)
+    if versions == ():
+        # Nothing it names can be current, so there is no need to ask the database
+        raise precondition_failed()
+    return versions
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(status_code=412, detail="Precondition Failed: the resource has changed; refetch it and retry")
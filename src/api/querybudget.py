@@ -0,0 +1,149 @@
+"""Per-route SQL query budgets and N+1 detection for dev/test runs.
+
+Routes declare how many SQL statements a single request may issue::
+
+    @router.get("/{fmea_id}", response_model=schemas.FMEA)
+    @query_budget(2)
+    def read_fmea(...): ...
+
+Every statement counts, including the ``set_config`` that starts each of the
+session's transactions (tenant scope and statement timeout, see
+``db.database.set_local``): a single read in one transaction costs 2.
+
+When ``FMEA_QUERY_BUDGET_MODE`` is ``warn`` or ``enforce`` every statement is
+traced together with the ``crud`` function that issued it. A request that goes
+over its budget logs the offending statement patterns; in ``enforce`` mode it
+also fails with :class:`QueryBudgetExceeded`. The default mode is ``off``,
+which costs one context-variable lookup per statement.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Optional, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+MODE_ENV = "FMEA_QUERY_BUDGET_MODE"
+MODES = ("off", "warn", "enforce")
+
+_BUDGET_ATTR = "__query_budget__"
+_CRUD_MODULE_SUFFIX = ".crud"
+_PARAM_LIST = re.compile(r"\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+F = TypeVar("F", bound=Callable)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(max_queries: int) -> Callable[[F], F]:
+    """Declare the maximum number of SQL statements a route may issue."""
+
+    def decorator(endpoint: F) -> F:
+        setattr(endpoint, _BUDGET_ATTR, max_queries)
+        return endpoint
+
+    return decorator
+
+
+def get_mode() -> str:
+    mode = os.getenv(MODE_ENV, "off").strip().lower()
+    return mode if mode in MODES else "off"
+
+
+@dataclass
+class QueryTrace:
+    statements: list[tuple[str, str]] = field(default_factory=list)
+
+    def patterns(self) -> Counter:
+        return Counter(statement for _, statement in self.statements)
+
+    def by_crud_call(self) -> Counter:
+        return Counter(caller for caller, _ in self.statements)
+
+
+_current_trace: ContextVar[Optional[QueryTrace]] = ContextVar("fmea_query_trace", default=None)
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse a SQL statement to a pattern shared by all its executions."""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return _PARAM_LIST.sub("(?)", statement)
+
+
+def _crud_caller() -> str:
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_globals.get("__name__", "").endswith(_CRUD_MODULE_SUFFIX):
+            return f"crud.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<outside crud>"
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.statements.append((_crud_caller(), normalize_statement(statement)))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach the statement tracer to an engine (idempotent)."""
+    if not event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def format_report(method: str, path: str, budget: int, trace: QueryTrace) -> str:
+    lines = [f"{method} {path} issued {len(trace.statements)} SQL statements (budget {budget})"]
+    for caller, count in trace.by_crud_call().most_common():
+        lines.append(f"  {caller}: {count}")
+    for statement, count in trace.patterns().most_common():
+        marker = "  N+1? " if count > 1 else "  "
+        lines.append(f"{marker}{count}x {statement}")
+    return "\n".join(lines)
+
+
+class QueryBudgetMiddleware:
+    """Pure ASGI middleware checking each request against its route budget."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        mode = get_mode()
+        if scope["type"] != "http" or mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        trace = QueryTrace()
+        token = _current_trace.set(trace)
+
+        async def send_wrapper(message) -> None:
+            if message["type"] == "http.response.start":
+                self._check(scope, trace, mode)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+
+    @staticmethod
+    def _check(scope, trace: QueryTrace, mode: str) -> None:
+        budget = getattr(scope.get("endpoint"), _BUDGET_ATTR, None)
+        if budget is None or len(trace.statements) <= budget:
+            return
+        report = format_report(scope["method"], scope["path"], budget, trace)
+        logger.warning(report)
+        if mode == "enforce":
+            raise QueryBudgetExceeded(report)
@@ -0,0 +1,45 @@
+"""Failure mode rating history and RPN trends.
+
+Every rating a failure mode has had is kept in ``failure_mode_rating_history``:
+a trigger on ``failure_modes`` appends a row when one is created and whenever
+its severity, occurrence or detection change, in the writing transaction (see
+``db.models``). The table is only ever appended to, so rows sit on disk in
+time order and a BRIN index on ``recorded_at`` narrows a time range to a few
+block ranges at a fraction of a B-tree's write cost.
+
+Reads group the history into fixed-width buckets with ``date_bin``::
+
+    GET /failure-modes/42/history?every=P1D&since=2026-01-01T00:00:00Z
+    GET /failure-modes/trend?every=P7D
+
+``every`` is an ISO 8601 duration (or seconds) without months or years;
+buckets are aligned to :data:`BUCKET_ORIGIN`, so weekly buckets start on
+Mondays at midnight UTC. Empty buckets are left out.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, Query
+
+BUCKET_ORIGIN = datetime(2000, 1, 3, tzinfo=timezone.utc)
+DEFAULT_BUCKET = timedelta(days=7)
+
+
+@dataclass(frozen=True)
+class Window:
+    every: timedelta
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+
+def window_params(
+    every: timedelta = Query(DEFAULT_BUCKET, description="Bucket width, e.g. P1D or P7D"),
+    since: Optional[datetime] = Query(None, description="Only ratings recorded at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only ratings recorded before this time"),
+) -> Window:
+    if every <= timedelta(0):
+        raise HTTPException(status_code=422, detail="every must be a positive duration")
+    return Window(every=every, since=since, until=until)
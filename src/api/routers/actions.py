@@ -2,49 +2,68 @@ from __future__ import annotations
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import schemas, crud
+from ..querybudget import query_budget
+from ..preconditions import Versions, if_match, precondition_failed, set_etag
+from .. import schemas, crud, serialization
 
 router = APIRouter(prefix="/actions", tags=["actions"])
 
 
 @router.post("/", response_model=schemas.Action)
+@query_budget(4)
 def create_action(
     action: schemas.ActionCreate,
+    response: Response,
     db: Annotated[Session, Depends(get_db)]
 ):
-    return crud.create_action(db=db, action=action)
+    db_action = crud.create_action(db=db, action=action)
+    set_etag(response, db_action.row_version)
+    return db_action
 
 
 @router.put("/{action_id}", response_model=schemas.Action)
+@query_budget(2)
 def update_action(
     action_id: int,
     action_update: schemas.ActionUpdate,
-    db: Annotated[Session, Depends(get_db)]
+    response: Response,
+    db: Annotated[Session, Depends(get_db)],
+    versions: Annotated[Versions, Depends(if_match)]
 ):
-    db_action = crud.update_action(db, action_id=action_id, action_update=action_update)
+    db_action = crud.update_action(db, action_id=action_id, action_update=action_update, if_match=versions)
     if db_action is None:
+        if versions is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Action not found")
+    set_etag(response, db_action.row_version)
     return db_action
 
 
 @router.delete("/{action_id}")
+@query_budget(2)
 def delete_action(
     action_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    versions: Annotated[Versions, Depends(if_match)]
 ):
-    success = crud.delete_action(db, action_id=action_id)
+    success = crud.delete_action(db, action_id=action_id, if_match=versions)
     if not success:
+        if versions is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Action not found")
     return {"message": "Action deleted successfully"}
 
 
 @router.get("/by-failure-mode/{failure_mode_id}", response_model=list[schemas.Action])
+@query_budget(2)
 def read_actions_by_failure_mode(
     failure_mode_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.Action))]
 ):
-    return crud.get_actions_by_failure_mode(db, failure_mode_id=failure_mode_id)
\ No newline at end of file
+    rows = crud.get_actions_by_failure_mode_rows(db, failure_mode_id=failure_mode_id, fields=fields)
+    return serialization.json_rows(schemas.Action, rows, fields)
\ No newline at end of file
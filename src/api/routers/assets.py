@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..querybudget import query_budget
+from .. import schemas, crud, serialization
+
+router = APIRouter(prefix="/assets", tags=["assets"])
+
+# Assets per batch lookup; a page of the asset portal
+MAX_ASSET_IDS = 1000
+
+_IDS = Query(description="Asset ids, comma-separated or repeated")
+
+
+# The latest approved, active FMEA version of each asset; assets without one are left out
+@router.get("/current-fmea", response_model=list[schemas.FMEA])
+@query_budget(2)
+def read_current_fmeas(
+    ids: Annotated[list[str], _IDS],
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FMEA))]
+):
+    asset_ids = list(dict.fromkeys(asset_id for value in ids for asset_id in value.split(",") if asset_id))
+    if not asset_ids or len(asset_ids) > MAX_ASSET_IDS:
+        raise HTTPException(status_code=422, detail=f"ids must name 1 to {MAX_ASSET_IDS} assets")
+    rows = crud.get_current_fmeas_rows(db, asset_ids=asset_ids, fields=fields)
+    return serialization.json_rows(schemas.FMEA, rows, fields)
+
+
+def _conflict(db: Session, exc: IntegrityError) -> HTTPException:
+    # A missing parent, a move under the asset's own subtree, or a delete of a non-leaf
+    db.rollback()
+    return HTTPException(status_code=409, detail=exc.orig.diag.message_primary)
+
+
+@router.put("/{asset_id}", response_model=schemas.Asset)
+@query_budget(2)
+def upsert_asset(asset_id: str, asset: schemas.AssetUpsert, db: Annotated[Session, Depends(get_db)]):
+    try:
+        return crud.upsert_asset(db, asset_id=asset_id, asset=asset)
+    except IntegrityError as exc:
+        raise _conflict(db, exc) from exc
+
+
+@router.delete("/{asset_id}")
+@query_budget(2)
+def delete_asset(asset_id: str, db: Annotated[Session, Depends(get_db)]):
+    try:
+        success = crud.delete_asset(db, asset_id=asset_id)
+    except IntegrityError as exc:
+        raise _conflict(db, exc) from exc
+    if not success:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return {"message": "Asset deleted successfully"}
+
+
+# Served from the maintained rollups: one row, however large the subtree
+@router.get("/{asset_id}/rollup", response_model=schemas.AssetRollup)
+@query_budget(2)
+def read_asset_rollup(asset_id: str, db: Annotated[Session, Depends(get_db)]):
+    row = crud.get_asset_rollup_row(db, asset_id=asset_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return row
+
+
+@router.get("/{asset_id}/children", response_model=list[schemas.AssetRollup])
+@query_budget(2)
+def read_asset_children(asset_id: str, db: Annotated[Session, Depends(get_db)]):
+    return crud.get_asset_children_rollup_rows(db, asset_id=asset_id)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import enum
+from datetime import datetime
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..querybudget import query_budget
+from .. import audit, crud, schemas, serialization
+
+router = APIRouter(prefix="/audit", tags=["audit"])
+
+
+class Entity(str, enum.Enum):
+    """Audited resources by their URL prefix; the member name is the table name."""
+
+    fmeas = "fmeas"
+    failure_modes = "failure-modes"
+    actions = "actions"
+    failure_causes = "failure-causes"
+    failure_effects = "failure-effects"
+    controls = "controls"
+
+
+@router.get("/", response_model=list[schemas.AuditEntry])
+@query_budget(2)
+def read_changes_by_actor(
+    actor: str,
+    db: Annotated[Session, Depends(get_db)],
+    page: Annotated[audit.Page, Depends(audit.page_params)],
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+):
+    rows = crud.get_audit_by_actor_rows(db, actor=actor, since=since, until=until, page=page)
+    rows, next_cursor = audit.page(rows, page.limit)
+    return serialization.json_page(schemas.AuditEntry, rows, next_cursor)
+
+
+@router.get("/{entity}/{row_id}", response_model=list[schemas.AuditEntry])
+@query_budget(2)
+def read_history(
+    entity: Entity,
+    row_id: int,
+    db: Annotated[Session, Depends(get_db)],
+    page: Annotated[audit.Page, Depends(audit.page_params)]
+):
+    rows = crud.get_audit_history_rows(db, table_name=entity.name, row_id=row_id, page=page)
+    rows, next_cursor = audit.page(rows, page.limit)
+    return serialization.json_page(schemas.AuditEntry, rows, next_cursor)
@@ -6,12 +6,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import schemas, crud
+from ..querybudget import query_budget
+from .. import schemas, crud, serialization
 
 router = APIRouter(prefix="/controls", tags=["controls"])
 
 
 @router.post("/", response_model=schemas.Control)
+@query_budget(4)
 def create_control(
     control: schemas.ControlCreate,
     db: Annotated[Session, Depends(get_db)]
@@ -20,6 +22,7 @@ def create_control(
 
 
 @router.put("/{control_id}", response_model=schemas.Control)
+@query_budget(2)
 def update_control(
     control_id: int,
     control_update: schemas.ControlUpdate,
@@ -32,6 +35,7 @@ def update_control(
 
 
 @router.delete("/{control_id}")
+@query_budget(2)
 def delete_control(
     control_id: int,
     db: Annotated[Session, Depends(get_db)]
@@ -43,8 +47,11 @@ def delete_control(
 
 
 @router.get("/by-failure-mode/{failure_mode_id}", response_model=list[schemas.Control])
+@query_budget(2)
 def read_controls_by_failure_mode(
     failure_mode_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.Control))]
 ):
-    return crud.get_controls_by_failure_mode(db, failure_mode_id=failure_mode_id)
\ No newline at end of file
+    rows = crud.get_controls_by_failure_mode_rows(db, failure_mode_id=failure_mode_id, fields=fields)
+    return serialization.json_rows(schemas.Control, rows, fields)
\ No newline at end of file
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Annotated
+
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, status
+from fastapi.responses import StreamingResponse
+
+from ..querybudget import query_budget
+from .. import changefeed
+from ..tenancy import connection_tenant, request_tenant
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+_ASSET_ID = Query(default_factory=list, alias="asset_id", description="Asset to follow (repeatable)")
+_FMEA_ID = Query(default_factory=list, alias="fmea_id", description="FMEA to follow (repeatable)")
+
+
+@router.get("/stream", response_class=StreamingResponse)
+@query_budget(0)
+async def stream_events(
+    request: Request,
+    asset_ids: Annotated[list[str], _ASSET_ID],
+    fmea_ids: Annotated[list[int], _FMEA_ID]
+):
+    tenant_id = request_tenant(request)
+    try:
+        topics = changefeed.topics(asset_ids, fmea_ids, tenant_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+    subscription = await changefeed.get_feed().subscribe(topics)
+    return StreamingResponse(
+        changefeed.sse_frames(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    asset_ids: Annotated[list[str], _ASSET_ID],
+    fmea_ids: Annotated[list[int], _FMEA_ID]
+):
+    try:
+        topics = changefeed.topics(asset_ids, fmea_ids, connection_tenant(websocket))
+    except ValueError as exc:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(exc))
+        return
+    # Subscribe before accepting, so changes committed once the client is connected are delivered
+    subscription = await changefeed.get_feed().subscribe(topics)
+    await websocket.accept()
+    await changefeed.pump_websocket(websocket, subscription)
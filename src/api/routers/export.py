@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..querybudget import query_budget
+from ..loadcontrol import statement_timeout
+from ..export import ARROW_MEDIA_TYPE, PARQUET_MEDIA_TYPE, Dataset, ExportFilters, read_tables, stream_arrow, stream_parquet
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+# One COPY streams the whole extract; anything bigger belongs in an export job (POST /jobs/)
+EXPORT_STATEMENT_TIMEOUT_MS = 120_000
+
+
+def _filters(asset_id: Optional[str] = None, status: Optional[str] = None, version: Optional[int] = None) -> ExportFilters:
+    return ExportFilters(asset_id=asset_id, status=status, version=version)
+
+
+def _attachment(filename: str) -> dict[str, str]:
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
+
+
+@router.get("/{dataset}.arrow", response_class=StreamingResponse)
+@query_budget(2)
+@statement_timeout(EXPORT_STATEMENT_TIMEOUT_MS)
+def export_arrow(
+    dataset: Dataset,
+    filters: Annotated[ExportFilters, Depends(_filters)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    schema, tables = read_tables(db, dataset, filters)
+    return StreamingResponse(
+        stream_arrow(schema, tables), media_type=ARROW_MEDIA_TYPE, headers=_attachment(f"{dataset.value}.arrow")
+    )
+
+
+@router.get("/{dataset}.parquet", response_class=StreamingResponse)
+@query_budget(2)
+@statement_timeout(EXPORT_STATEMENT_TIMEOUT_MS)
+def export_parquet(
+    dataset: Dataset,
+    filters: Annotated[ExportFilters, Depends(_filters)],
+    db: Annotated[Session, Depends(get_db)]
+):
+    schema, tables = read_tables(db, dataset, filters)
+    return StreamingResponse(
+        stream_parquet(schema, tables), media_type=PARQUET_MEDIA_TYPE, headers=_attachment(f"{dataset.value}.parquet")
+    )
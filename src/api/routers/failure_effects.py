@@ -6,12 +6,14 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import schemas, crud
+from ..querybudget import query_budget
+from .. import schemas, crud, serialization
 
 router = APIRouter(prefix="/failure-effects", tags=["failure_effects"])
 
 
 @router.post("/", response_model=schemas.FailureEffect)
+@query_budget(4)
 def create_failure_effect(
     effect: schemas.FailureEffectCreate,
     db: Annotated[Session, Depends(get_db)]
@@ -20,6 +22,7 @@ def create_failure_effect(
 
 
 @router.put("/{effect_id}", response_model=schemas.FailureEffect)
+@query_budget(2)
 def update_failure_effect(
     effect_id: int,
     effect_update: schemas.FailureEffectUpdate,
@@ -32,6 +35,7 @@ def update_failure_effect(
 
 
 @router.delete("/{effect_id}")
+@query_budget(2)
 def delete_failure_effect(
     effect_id: int,
     db: Annotated[Session, Depends(get_db)]
@@ -43,8 +47,11 @@ def delete_failure_effect(
 
 
 @router.get("/by-failure-mode/{failure_mode_id}", response_model=list[schemas.FailureEffect])
+@query_budget(2)
 def read_effects_by_failure_mode(
     failure_mode_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FailureEffect))]
 ):
-    return crud.get_effects_by_failure_mode(db, failure_mode_id=failure_mode_id)
\ No newline at end of file
+    rows = crud.get_effects_by_failure_mode_rows(db, failure_mode_id=failure_mode_id, fields=fields)
+    return serialization.json_rows(schemas.FailureEffect, rows, fields)
\ No newline at end of file
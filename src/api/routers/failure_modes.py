@@ -2,60 +2,116 @@ from __future__ import annotations
 
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import schemas, crud
+from ..querybudget import query_budget
+from ..preconditions import Versions, if_match, precondition_failed, set_etag
+from .. import schemas, crud, filters, ratings, serialization
 
 router = APIRouter(prefix="/failure-modes", tags=["failure_modes"])
 
 
 @router.post("/", response_model=schemas.FailureMode)
+@query_budget(4)
 def create_failure_mode(
     failure_mode: schemas.FailureModeCreate,
+    response: Response,
     db: Annotated[Session, Depends(get_db)]
 ):
-    return crud.create_failure_mode(db=db, failure_mode=failure_mode)
+    db_failure_mode = crud.create_failure_mode(db=db, failure_mode=failure_mode)
+    set_etag(response, db_failure_mode.row_version)
+    return db_failure_mode
+
+
+@router.get("/", response_model=list[schemas.FailureMode])
+@query_budget(2)
+def read_failure_modes(
+    db: Annotated[Session, Depends(get_db)],
+    search: Annotated[filters.Search, Depends(filters.SearchParams(filters.FAILURE_MODES))],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FailureMode))]
+):
+    rows, next_cursor = crud.search_failure_modes_rows(db, search, fields=fields)
+    return serialization.json_page(schemas.FailureMode, rows, next_cursor, fields)
+
+
+@router.get("/trend", response_model=list[schemas.RatingTrendBucket])
+@query_budget(2)
+def read_rating_trend(
+    db: Annotated[Session, Depends(get_db)],
+    window: Annotated[ratings.Window, Depends(ratings.window_params)]
+):
+    return crud.get_rating_trend_rows(db, window)
 
 
 @router.get("/{failure_mode_id}", response_model=schemas.FailureMode)
+@query_budget(2)
 def read_failure_mode(
     failure_mode_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FailureMode))]
 ):
-    db_failure_mode = crud.get_failure_mode(db, failure_mode_id=failure_mode_id)
-    if db_failure_mode is None:
+    row = crud.get_failure_mode_row(db, failure_mode_id=failure_mode_id, fields=fields)
+    if row is None:
         raise HTTPException(status_code=404, detail="Failure mode not found")
-    return db_failure_mode
+    response = serialization.json_row(schemas.FailureMode, row, fields)
+    set_etag(response, row.get("row_version"))
+    return response
 
 
 @router.put("/{failure_mode_id}", response_model=schemas.FailureMode)
+@query_budget(2)
 def update_failure_mode(
     failure_mode_id: int,
     failure_mode_update: schemas.FailureModeUpdate,
-    db: Annotated[Session, Depends(get_db)]
+    response: Response,
+    db: Annotated[Session, Depends(get_db)],
+    versions: Annotated[Versions, Depends(if_match)]
 ):
-    db_failure_mode = crud.update_failure_mode(db, failure_mode_id=failure_mode_id, failure_mode_update=failure_mode_update)
+    db_failure_mode = crud.update_failure_mode(db, failure_mode_id=failure_mode_id, failure_mode_update=failure_mode_update, if_match=versions)
     if db_failure_mode is None:
+        if versions is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Failure mode not found")
+    set_etag(response, db_failure_mode.row_version)
     return db_failure_mode
 
 
 @router.delete("/{failure_mode_id}")
+@query_budget(2)
 def delete_failure_mode(
     failure_mode_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    versions: Annotated[Versions, Depends(if_match)]
 ):
-    success = crud.delete_failure_mode(db, failure_mode_id=failure_mode_id)
+    success = crud.delete_failure_mode(db, failure_mode_id=failure_mode_id, if_match=versions)
     if not success:
+        if versions is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Failure mode not found")
     return {"message": "Failure mode deleted successfully"}
 
 
 @router.get("/by-fmea/{fmea_id}", response_model=list[schemas.FailureMode])
+@query_budget(2)
 def read_failure_modes_by_fmea(
     fmea_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FailureMode))]
 ):
-    return crud.get_failure_modes_by_fmea(db, fmea_id=fmea_id)
\ No newline at end of file
+    rows = crud.get_failure_modes_by_fmea_rows(db, fmea_id=fmea_id, fields=fields)
+    return serialization.json_rows(schemas.FailureMode, rows, fields)
+
+
+@router.get("/{failure_mode_id}/history", response_model=list[schemas.RatingHistoryBucket])
+@query_budget(2)
+def read_rating_history(
+    failure_mode_id: int,
+    db: Annotated[Session, Depends(get_db)],
+    window: Annotated[ratings.Window, Depends(ratings.window_params)]
+):
+    rows = crud.get_rating_history_rows(db, failure_mode_id, window)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Failure mode not found")
+    return rows
@@ -1,70 +1,145 @@
 from __future__ import annotations
 
-from typing import Annotated
+from datetime import datetime, timezone
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 
 from ..database import get_db
-from .. import schemas, crud
+from ..querybudget import query_budget
+from ..preconditions import Versions, if_match, precondition_failed, set_etag
+from .. import schemas, crud, documents, filters, jobs, serialization
 
 router = APIRouter(prefix="/fmeas", tags=["fmeas"])
 
+AsOf = Annotated[Optional[datetime], Query(description="Point in time to read at; now if omitted")]
+
 
 @router.post("/", response_model=schemas.FMEA)
+@query_budget(4)
 def create_fmea(
     fmea: schemas.FMEACreate,
+    response: Response,
     db: Annotated[Session, Depends(get_db)]
 ):
-    return crud.create_fmea(db=db, fmea=fmea)
+    db_fmea = crud.create_fmea(db=db, fmea=fmea)
+    set_etag(response, db_fmea.row_version)
+    return db_fmea
 
 
 @router.get("/", response_model=list[schemas.FMEA])
+@query_budget(2)
 def read_fmeas(
     db: Annotated[Session, Depends(get_db)],
-    skip: int = 0,
-    limit: int = 100
+    search: Annotated[filters.Search, Depends(filters.SearchParams(filters.FMEAS))],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FMEA))],
+    skip: Annotated[int, Query(ge=0, description="Rows to skip; not with cursor")] = 0
 ):
-    return crud.get_fmeas(db, skip=skip, limit=limit)
+    if skip and search.after is not None:
+        # The cursor already says where the page starts; an offset on top of it skips rows
+        raise HTTPException(status_code=422, detail="skip cannot be combined with cursor")
+    rows, next_cursor = crud.search_fmeas_rows(db, search, skip=skip, fields=fields)
+    return serialization.json_page(schemas.FMEA, rows, next_cursor, fields)
+
+
+@router.get("/summary", response_model=schemas.FleetSummary)
+@query_budget(2)
+def read_fleet_summary(db: Annotated[Session, Depends(get_db)]):
+    return crud.get_fleet_summary(db)
 
 
 @router.get("/{fmea_id}", response_model=schemas.FMEA)
+@query_budget(2)
 def read_fmea(
     fmea_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FMEA))]
 ):
-    db_fmea = crud.get_fmea(db, fmea_id=fmea_id)
-    if db_fmea is None:
+    row = crud.get_fmea_row(db, fmea_id=fmea_id, fields=fields)
+    if row is None:
         raise HTTPException(status_code=404, detail="FMEA not found")
-    return db_fmea
+    response = serialization.json_row(schemas.FMEA, row, fields)
+    set_etag(response, row.get("row_version"))
+    return response
 
 
 @router.put("/{fmea_id}", response_model=schemas.FMEA)
+@query_budget(2)
 def update_fmea(
     fmea_id: int,
     fmea_update: schemas.FMEAUpdate,
-    db: Annotated[Session, Depends(get_db)]
+    response: Response,
+    db: Annotated[Session, Depends(get_db)],
+    versions: Annotated[Versions, Depends(if_match)]
 ):
-    db_fmea = crud.update_fmea(db, fmea_id=fmea_id, fmea_update=fmea_update)
+    db_fmea = crud.update_fmea(db, fmea_id=fmea_id, fmea_update=fmea_update, if_match=versions)
     if db_fmea is None:
+        if versions is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="FMEA not found")
+    set_etag(response, db_fmea.row_version)
     return db_fmea
 
 
 @router.delete("/{fmea_id}")
+@query_budget(2)
 def delete_fmea(
     fmea_id: int,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    versions: Annotated[Versions, Depends(if_match)]
 ):
-    success = crud.delete_fmea(db, fmea_id=fmea_id)
+    success = crud.delete_fmea(db, fmea_id=fmea_id, if_match=versions)
     if not success:
+        if versions is not None:
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="FMEA not found")
     return {"message": "FMEA deleted successfully"}
 
 
+# The current tree comes from its pre-rendered document: one statement, or eight when
+# it has to be rendered again (see api.documents)
+@router.get("/{fmea_id}/tree", response_model=schemas.FMEATree)
+@query_budget(9)
+def read_fmea_tree(fmea_id: int, db: Annotated[Session, Depends(get_db)], as_of: AsOf = None):
+    if as_of is None:
+        body = documents.read_tree_document(db, fmea_id=fmea_id)
+        if body is None:
+            raise HTTPException(status_code=404, detail="FMEA not found")
+        return Response(content=body, media_type="application/json")
+    tree = crud.get_fmea_tree_as_of(db, fmea_id=fmea_id, as_of=as_of)
+    if tree is None:
+        raise HTTPException(status_code=404, detail="FMEA not found")
+    return tree
+
+
+@router.post("/{fmea_id}/clone", response_model=schemas.Job, status_code=202)
+@query_budget(4)
+def clone_fmea(
+    fmea_id: int,
+    response: Response,
+    db: Annotated[Session, Depends(get_db)],
+    title: Optional[str] = None,
+    created_by: Optional[str] = None
+):
+    return jobs.enqueue(db, response, "clone", {"fmea_id": fmea_id, "title": title, "created_by": created_by})
+
+
 @router.get("/by-asset/{asset_id}", response_model=list[schemas.FMEA])
+@query_budget(2)
 def read_fmeas_by_asset(
     asset_id: str,
-    db: Annotated[Session, Depends(get_db)]
+    db: Annotated[Session, Depends(get_db)],
+    fields: Annotated[serialization.FieldSet, Depends(serialization.Fields(schemas.FMEA))]
 ):
-    return crud.get_fmeas_by_asset_id(db, asset_id=asset_id)
\ No newline at end of file
+    rows = crud.get_fmeas_by_asset_id_rows(db, asset_id=asset_id, fields=fields)
+    return serialization.json_rows(schemas.FMEA, rows, fields)
+
+
+@router.get("/by-asset/{asset_id}/effective", response_model=schemas.FMEA)
+@query_budget(2)
+def read_effective_fmea(asset_id: str, db: Annotated[Session, Depends(get_db)], as_of: AsOf = None):
+    row = crud.get_effective_fmea_row(db, asset_id=asset_id, as_of=as_of or datetime.now(timezone.utc))
+    if row is None:
+        raise HTTPException(status_code=404, detail="No approved FMEA in effect")
+    return row
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..querybudget import query_budget
+from .. import schemas, crud, jobs, serialization
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+
+@router.post("/", response_model=schemas.Job, status_code=202)
+@query_budget(4)
+def create_job(
+    job: schemas.JobCreate,
+    response: Response,
+    db: Annotated[Session, Depends(get_db)]
+):
+    return jobs.enqueue(db, response, job.kind, job.params)
+
+
+@router.get("/", response_model=list[schemas.Job])
+@query_budget(2)
+def read_jobs(
+    db: Annotated[Session, Depends(get_db)],
+    status: Optional[JobStatus] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    return serialization.json_rows(schemas.Job, crud.get_jobs_rows(db, status=status, kind=kind, limit=limit))
+
+
+@router.get("/{job_id}", response_model=schemas.Job)
+@query_budget(2)
+def read_job(
+    job_id: int,
+    db: Annotated[Session, Depends(get_db)]
+):
+    row = crud.get_job_row(db, job_id=job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialization.json_row(schemas.Job, row)
+
+
+@router.post("/{job_id}/cancel", response_model=schemas.Job)
+@query_budget(2)
+def cancel_job(
+    job_id: int,
+    db: Annotated[Session, Depends(get_db)]
+):
+    row = crud.cancel_job(db, job_id=job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return serialization.json_row(schemas.Job, row)
+
+
+@router.get("/{job_id}/result")
+@query_budget(2)
+def read_job_result(
+    job_id: int,
+    db: Annotated[Session, Depends(get_db)]
+):
+    row = crud.get_job_row(db, job_id=job_id)
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if row["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {row['status']}")
+    result = row["result"] or {}
+    if "path" not in result:
+        return result
+    # Written by the worker under its FMEA_JOB_RESULTS_DIR, which the API has to share
+    if not os.path.exists(result["path"]):
+        raise HTTPException(status_code=410, detail="Job result file is no longer available")
+    return FileResponse(result["path"], media_type=result["media_type"], filename=result["filename"])
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from typing import Annotated, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..querybudget import query_budget
+from .. import schemas, crud, serialization, webhooks
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+
+
+@router.post("/", response_model=schemas.WebhookSubscription)
+@query_budget(4)
+def create_webhook_subscription(
+    subscription: schemas.WebhookSubscriptionCreate,
+    db: Annotated[Session, Depends(get_db)]
+):
+    invalid = [event_type for event_type in subscription.event_types if not webhooks.EVENT_TYPE.match(event_type)]
+    if invalid or not subscription.event_types:
+        raise HTTPException(
+            status_code=422,
+            detail=f"invalid event types: {', '.join(invalid) or '(none)'}; expected e.g. fmea.approved, action.closed, fmea.*",
+        )
+    return crud.create_webhook_subscription(db=db, subscription=subscription)
+
+
+@router.get("/", response_model=list[schemas.WebhookSubscription])
+@query_budget(2)
+def read_webhook_subscriptions(db: Annotated[Session, Depends(get_db)]):
+    return serialization.json_rows(schemas.WebhookSubscription, crud.get_webhook_subscriptions_rows(db))
+
+
+@router.delete("/{subscription_id}")
+@query_budget(2)
+def delete_webhook_subscription(
+    subscription_id: int,
+    db: Annotated[Session, Depends(get_db)]
+):
+    if not crud.delete_webhook_subscription(db, subscription_id=subscription_id):
+        raise HTTPException(status_code=404, detail="Webhook subscription not found")
+    return {"message": "Webhook subscription deleted successfully"}
+
+
+@router.get("/{subscription_id}/outbox", response_model=list[schemas.WebhookOutboxEntry])
+@query_budget(2)
+def read_webhook_outbox(
+    subscription_id: int,
+    db: Annotated[Session, Depends(get_db)],
+    status: Optional[Literal["pending", "delivered", "dead"]] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    rows = crud.get_webhook_outbox_rows(db, subscription_id=subscription_id, status=status, limit=limit)
+    return serialization.json_rows(schemas.WebhookOutboxEntry, rows)
+
+
+@router.post("/{subscription_id}/retry-dead")
+@query_budget(2)
+def retry_dead_webhooks(
+    subscription_id: int,
+    db: Annotated[Session, Depends(get_db)]
+):
+    return {"requeued": crud.retry_dead_webhooks(db, subscription_id=subscription_id)}
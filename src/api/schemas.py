@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Any, Optional
 
 from pydantic import BaseModel, ConfigDict
 
@@ -43,6 +43,16 @@ class FMEA(FMEABase):
     id: int
     created_at: datetime
     updated_at: datetime
+    archived_at: Optional[datetime] = None
+    row_version: int
+
+
+class FleetSummary(BaseModel):
+    fmeas: int
+    fmeas_by_status: dict[str, int]
+    failure_modes: int
+    max_rpn: Optional[int] = None
+    mean_rpn: Optional[float] = None
 
 
 class FailureModeBase(BaseModel):
@@ -70,6 +80,24 @@ class FailureMode(FailureModeBase):
     id: int
     rpn: int
     created_at: datetime
+    row_version: int
+
+
+class RatingHistoryBucket(BaseModel):
+    bucket: datetime
+    changes: int
+    min_rpn: int
+    max_rpn: int
+    # Rating in force at the end of the bucket
+    last_rpn: int
+
+
+class RatingTrendBucket(BaseModel):
+    bucket: datetime
+    changes: int
+    failure_modes: int
+    mean_rpn: float
+    max_rpn: int
 
 
 class ActionBase(BaseModel):
@@ -100,6 +128,7 @@ class Action(ActionBase):
     id: int
     created_at: datetime
     closed_at: Optional[datetime] = None
+    row_version: int
 
 
 class FailureCauseBase(BaseModel):
@@ -165,4 +194,112 @@ class Control(ControlBase):
     model_config = ConfigDict(from_attributes=True)
     
     id: int
-    created_at: datetime
\ No newline at end of file
+    created_at: datetime
+
+
+class FailureModeTree(FailureMode):
+    actions: list[Action] = []
+    causes: list[FailureCause] = []
+    effects: list[FailureEffect] = []
+    controls: list[Control] = []
+
+
+class FMEATree(FMEA):
+    """An FMEA with its failure modes and their children, as they were at ``as_of``."""
+
+    as_of: datetime
+    failure_modes: list[FailureModeTree] = []
+
+
+class AssetUpsert(BaseModel):
+    parent_asset_id: Optional[str] = None
+    name: Optional[str] = None
+    level: Optional[str] = None
+
+
+class Asset(AssetUpsert):
+    model_config = ConfigDict(from_attributes=True)
+
+    asset_id: str
+    created_at: datetime
+
+
+class AssetRollup(BaseModel):
+    """Risk over an asset's subtree, from the current FMEA of each asset in it."""
+
+    asset_id: str
+    parent_asset_id: Optional[str] = None
+    name: Optional[str] = None
+    level: Optional[str] = None
+    max_rpn: Optional[int] = None
+    high_ap_modes: int
+    open_actions: int
+
+
+class AuditEntry(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    occurred_at: datetime
+    actor: Optional[str] = None
+    action: str
+    table_name: str
+    row_id: int
+    before: Optional[dict[str, Any]] = None
+    after: Optional[dict[str, Any]] = None
+
+
+class WebhookSubscriptionCreate(BaseModel):
+    url: str
+    event_types: list[str]
+    secret: Optional[str] = None
+    is_active: bool = True
+
+
+class WebhookSubscription(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    url: str
+    event_types: list[str]
+    is_active: bool
+    created_at: datetime
+
+
+class WebhookOutboxEntry(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    subscription_id: int
+    event_type: str
+    payload: dict[str, Any]
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    delivered_at: Optional[datetime] = None
+
+
+class JobCreate(BaseModel):
+    kind: str
+    params: dict[str, Any] = {}
+
+
+class Job(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    params: dict[str, Any]
+    status: str
+    progress_done: int
+    progress_total: Optional[int] = None
+    message: Optional[str] = None
+    result: Optional[dict[str, Any]] = None
+    error: Optional[str] = None
+    cancel_requested: bool
+    attempts: int
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
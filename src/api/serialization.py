@@ -0,0 +1,107 @@
+"""Fast JSON encoding for large list responses.
+
+List endpoints select plain column tuples instead of ORM entities and encode
+them with a precompiled ``TypeAdapter`` over a ``TypedDict`` mirror of the
+response schema. The database already guarantees the shape and types of
+these rows, so validation is skipped entirely; serialization still goes
+through pydantic-core, so the JSON is byte-for-byte what the ``response_model``
+path would produce.
+
+``?fields=`` narrows both ends: crud selects only the requested columns, so
+large ``Text`` columns that are not asked for never leave the database, and
+the encoder is a row type built for that field set and cached.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Iterable, Optional
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy.engine import Result
+from typing_extensions import TypedDict
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Fields selected with ``?fields=``, in schema order; ``None`` means every field
+FieldSet = Optional[tuple[str, ...]]
+
+
+def parse_fields(schema: type[BaseModel], fields: Optional[str]) -> FieldSet:
+    """Validate a comma-separated ``?fields=`` value against ``schema``."""
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    if not requested:
+        raise ValueError("fields must name at least one field")
+    unknown = requested - schema.model_fields.keys()
+    if unknown:
+        raise ValueError(
+            f"unknown fields: {', '.join(sorted(unknown))}; "
+            f"available: {', '.join(schema.model_fields)}"
+        )
+    # Canonical order, so equal field sets share one cached row type
+    return tuple(name for name in schema.model_fields if name in requested)
+
+
+class Fields:
+    """Dependency reading ``?fields=`` for endpoints returning ``schema``."""
+
+    def __init__(self, schema: type[BaseModel]) -> None:
+        self.schema = schema
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(None, description="Comma-separated list of fields to return"),
+    ) -> FieldSet:
+        try:
+            return parse_fields(self.schema, fields)
+        except ValueError as exc:
+            raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+
+def field_names(schema: type[BaseModel], fields: FieldSet = None) -> tuple[str, ...]:
+    return tuple(schema.model_fields) if fields is None else fields
+
+
+@lru_cache(maxsize=None)
+def row_type(schema: type[BaseModel], fields: FieldSet = None) -> type:
+    """A ``TypedDict`` with the selected fields (in schema order) of ``schema``."""
+    annotations = {name: schema.model_fields[name].annotation for name in field_names(schema, fields)}
+    return TypedDict(f"{schema.__name__}Row", annotations)
+
+
+@lru_cache(maxsize=None)
+def list_adapter(schema: type[BaseModel], fields: FieldSet = None) -> TypeAdapter:
+    return TypeAdapter(list[row_type(schema, fields)])
+
+
+@lru_cache(maxsize=None)
+def item_adapter(schema: type[BaseModel], fields: FieldSet = None) -> TypeAdapter:
+    return TypeAdapter(row_type(schema, fields))
+
+
+def row_dicts(result: Result) -> list[dict]:
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
+
+
+def dump_rows(schema: type[BaseModel], rows: Iterable[dict], fields: FieldSet = None) -> bytes:
+    return list_adapter(schema, fields).dump_json(list(rows))
+
+
+def json_rows(schema: type[BaseModel], rows: Iterable[dict], fields: FieldSet = None) -> Response:
+    """Encode rows shaped like ``schema`` straight to a JSON response."""
+    return Response(content=dump_rows(schema, rows, fields), media_type="application/json")
+
+
+def json_page(schema: type[BaseModel], rows: Iterable[dict], next_cursor: Optional[str], fields: FieldSet = None) -> Response:
+    """``json_rows`` plus an ``X-Next-Cursor`` header when another page exists."""
+    response = json_rows(schema, rows, fields)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+
+def json_row(schema: type[BaseModel], row: dict, fields: FieldSet = None) -> Response:
+    return Response(content=item_adapter(schema, fields).dump_json(row), media_type="application/json")
@@ -0,0 +1,29 @@
+"""The tenant (plant) a request acts for.
+
+Clients name it in the ``X-Tenant-ID`` header; :func:`api.database.get_db`
+scopes the request's session to it (see :mod:`db.tenancy`), so every query
+the request runs sees and writes only that tenant's rows. Requests without
+the header act for ``DEFAULT_TENANT``, which is where a single-plant
+deployment keeps its data.
+"""
+from __future__ import annotations
+
+from fastapi import HTTPException, Request
+from starlette.requests import HTTPConnection
+
+from db.tenancy import DEFAULT_TENANT, validate_tenant_id
+
+TENANT_HEADER = "X-Tenant-ID"
+
+
+def connection_tenant(connection: HTTPConnection) -> str:
+    """The tenant named by a request's or WebSocket's header; ``ValueError`` when it is malformed."""
+    value = connection.headers.get(TENANT_HEADER)
+    return DEFAULT_TENANT if value is None else validate_tenant_id(value)
+
+
+def request_tenant(request: Request) -> str:
+    try:
+        return connection_tenant(request)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid {TENANT_HEADER}: {exc}") from None
@@ -6,6 +6,7 @@ from pathlib import Path
 from typing import Iterator
 
 import pytest
+from fastapi import Request
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
@@ -15,11 +16,17 @@ SRC_PATH = REPO_ROOT / "src"
 if str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
 
+# Fail any request that issues more SQL statements than its route budget allows
+os.environ.setdefault("FMEA_QUERY_BUDGET_MODE", "enforce")
+
 from db.config import load_db_config
 from db.database import get_engine, get_session_factory
 from db.models import Base
+from db.tenancy import scope_session
+from .. import audit
 from ..main import app
 from ..database import get_db
+from ..tenancy import request_tenant
 
 
 @pytest.fixture(scope="session", autouse=True)
@@ -35,6 +42,8 @@ def engine() -> Iterator:
     try:
         yield engine
     finally:
+        # Write buffered audit entries before their table goes away
+        audit.shutdown()
         # Drop all tables after the session to leave a clean DB
         Base.metadata.drop_all(bind=engine)
 
@@ -59,7 +68,9 @@ def db_session(engine) -> Iterator[Session]:
 
 
 def override_get_db(db_session):
-    def _override():
+    def _override(request: Request):
+        # Scoped like get_db does, so API tests run under the tenant's row-level security
+        scope_session(db_session, request_tenant(request))
         yield db_session
     return _override
 
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+from db.archival import archive_batch
+
+
+def test_archived_tree_stays_readable(client: TestClient, db_session):
+    fmea = client.post("/fmeas/", json={"asset_id": "ARCHIVE-API-001", "title": "Old", "version": 1}).json()
+    fm = client.post("/failure-modes/", json={"fmea_id": fmea["id"], "name": "Cracked housing", "severity": 8}).json()
+    action = client.post("/actions/", json={"failure_mode_id": fm["id"], "description": "Inspect"}).json()
+    client.put(f"/fmeas/{fmea['id']}", json={"status": "superseded"})
+
+    archive_batch(db_session.connection(), datetime.now(timezone.utc) + timedelta(minutes=1))
+
+    assert client.get(f"/fmeas/{fmea['id']}").json()["archived_at"] is not None
+    assert client.get(f"/failure-modes/by-fmea/{fmea['id']}").json() == [fm]
+    assert client.get(f"/failure-modes/{fm['id']}").json() == fm
+    assert client.get(f"/failure-modes/{fm['id']}/history").status_code == 200
+    assert [a["id"] for a in client.get(f"/actions/by-failure-mode/{fm['id']}").json()] == [action["id"]]
+
+    # Archived rows are read-only
+    assert client.put(f"/failure-modes/{fm['id']}", json={"name": "Edited"}).status_code == 404
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _current(client: TestClient, *ids: str) -> dict[str, int]:
+    response = client.get("/assets/current-fmea", params={"ids": list(ids)})
+    assert response.status_code == 200
+    return {row["asset_id"]: row["version"] for row in response.json()}
+
+
+def test_current_fmea_follows_status_activity_and_version(client: TestClient):
+    v1 = client.post("/fmeas/", json={"asset_id": "ASSET-CUR-1", "title": "v1", "status": "approved"}).json()
+    v2 = client.post("/fmeas/", json={"asset_id": "ASSET-CUR-1", "title": "v2", "version": 2}).json()
+    client.post("/fmeas/", json={"asset_id": "ASSET-CUR-2", "title": "draft only"})
+    assert _current(client, "ASSET-CUR-1,ASSET-CUR-2", "ASSET-CUR-3") == {"ASSET-CUR-1": 1}
+
+    client.put(f"/fmeas/{v2['id']}", json={"status": "approved"})
+    assert _current(client, "ASSET-CUR-1") == {"ASSET-CUR-1": 2}
+    fields = client.get("/assets/current-fmea", params={"ids": "ASSET-CUR-1", "fields": "id,asset_id"})
+    assert fields.json() == [{"id": v2["id"], "asset_id": "ASSET-CUR-1"}]
+    client.put(f"/fmeas/{v2['id']}", json={"is_active": False})
+    assert _current(client, "ASSET-CUR-1") == {"ASSET-CUR-1": 1}
+    client.delete(f"/fmeas/{v1['id']}")
+    assert _current(client, "ASSET-CUR-1") == {}
+    assert client.get("/assets/current-fmea", params={"ids": ","}).status_code == 422
+
+
+def _rollup(client: TestClient, asset_id: str) -> tuple:
+    row = client.get(f"/assets/{asset_id}/rollup").json()
+    return row["max_rpn"], row["high_ap_modes"], row["open_actions"]
+
+
+def _approved_fmea(client: TestClient, asset_id: str, severity: int, occurrence: int, detection: int) -> dict:
+    fmea = client.post("/fmeas/", json={"asset_id": asset_id, "title": asset_id, "status": "approved"}).json()
+    return client.post("/failure-modes/", json={
+        "fmea_id": fmea["id"], "name": "Wear", "severity": severity, "occurrence": occurrence, "detection": detection,
+    }).json()
+
+
+def test_rollups_follow_ratings_actions_and_moves(client: TestClient):
+    for asset_id, parent, level in (
+        ("ROLL-SITE", None, "site"), ("ROLL-LINE", "ROLL-SITE", "line"), ("ROLL-M1", "ROLL-LINE", "machine"),
+        ("ROLL-M2", "ROLL-LINE", "machine"), ("ROLL-C1", "ROLL-M1", "component"),
+    ):
+        response = client.put(f"/assets/{asset_id}", json={"parent_asset_id": parent, "level": level})
+        assert response.status_code == 200 and response.json()["asset_id"] == asset_id
+
+    machine_mode = _approved_fmea(client, "ROLL-M1", severity=9, occurrence=6, detection=3)
+    client.post("/actions/", json={"failure_mode_id": machine_mode["id"], "description": "Inspect"})
+    component_mode = _approved_fmea(client, "ROLL-C1", severity=5, occurrence=3, detection=2)
+    assert _rollup(client, "ROLL-SITE") == (162, 1, 1)
+
+    client.put(f"/failure-modes/{component_mode['id']}", json={"severity": 8, "occurrence": 8, "detection": 5})
+    assert _rollup(client, "ROLL-SITE") == (320, 2, 1)
+    action = client.post("/actions/", json={"failure_mode_id": component_mode["id"], "description": "Redesign"}).json()
+    client.put(f"/actions/{action['id']}", json={"status": "closed"})
+    assert _rollup(client, "ROLL-M1") == (320, 2, 1)
+
+    client.put("/assets/ROLL-C1", json={"parent_asset_id": "ROLL-M2", "level": "component"})
+    children = client.get("/assets/ROLL-LINE/children").json()
+    assert [(row["asset_id"], row["max_rpn"], row["high_ap_modes"]) for row in children] == [
+        ("ROLL-M1", 162, 1), ("ROLL-M2", 320, 1),
+    ]
+    assert _rollup(client, "ROLL-SITE") == (320, 2, 1)
+
+    client.put(f"/fmeas/{machine_mode['fmea_id']}", json={"status": "draft"})
+    assert _rollup(client, "ROLL-SITE") == (320, 1, 0)
+    assert client.delete("/assets/ROLL-C1").status_code == 200
+    assert _rollup(client, "ROLL-SITE") == (None, 0, 0)
+    assert client.get("/assets/ROLL-C1/rollup").status_code == 404
+
+
+# A conflict rolls back the test's whole transaction, so one per test
+@pytest.mark.parametrize("method, path, body", [
+    ("put", "/assets/ROLL-SITE", {"parent_asset_id": "ROLL-M1"}),
+    ("put", "/assets/ROLL-M2", {"parent_asset_id": "ROLL-NONE"}),
+    ("put", "/assets/ROLL-SELF", {"parent_asset_id": "ROLL-SELF"}),
+    ("delete", "/assets/ROLL-LINE", None),
+])
+def test_hierarchy_conflicts(client: TestClient, method: str, path: str, body):
+    for asset_id, parent in (("ROLL-SITE", None), ("ROLL-LINE", "ROLL-SITE"), ("ROLL-M1", "ROLL-LINE")):
+        client.put(f"/assets/{asset_id}", json={"parent_asset_id": parent})
+    response = client.request(method, path, json=body)
+    assert response.status_code == 409 and response.json()["detail"]
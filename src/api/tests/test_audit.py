@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, select
+
+from db.models import AuditEntry
+from .. import audit, crud, schemas
+
+
+def test_history_records_actor_and_values(client: TestClient):
+    actor = f"auditor-{uuid.uuid4().hex[:8]}"
+    headers = {"X-User": actor}
+    fmea = client.post("/fmeas/", json={"asset_id": "AUDIT-001", "title": "Audited", "version": 1}, headers=headers).json()
+    fm = client.post(
+        "/failure-modes/", json={"fmea_id": fmea["id"], "name": "Seal leak", "severity": 5}, headers=headers
+    ).json()
+    client.put(f"/failure-modes/{fm['id']}", json={"severity": 8, "name": "Seal leak"}, headers=headers)
+    client.delete(f"/failure-modes/{fm['id']}", headers=headers)
+    audit.get_writer().flush()
+
+    history = client.get(f"/audit/failure-modes/{fm['id']}").json()
+    assert [entry["action"] for entry in history] == ["delete", "update", "create"]
+    assert all(entry["actor"] == actor and entry["table_name"] == "failure_modes" for entry in history)
+    deleted, updated, created = history
+    assert created["before"] is None and created["after"]["rpn"] == 50
+    # Only changed columns, including the generated rpn
+    assert updated["before"] == {"severity": 5, "rpn": 50}
+    assert updated["after"] == {"severity": 8, "rpn": 80}
+    assert deleted["before"]["severity"] == 8 and deleted["after"] is None
+
+    first = client.get("/audit/", params={"actor": actor, "limit": 3})
+    assert [entry["action"] for entry in first.json()] == ["delete", "update", "create"]
+    rest = client.get("/audit/", params={"actor": actor, "cursor": first.headers["X-Next-Cursor"]})
+    assert [(entry["table_name"], entry["action"]) for entry in rest.json()] == [("fmeas", "create")]
+    assert "X-Next-Cursor" not in rest.headers
+
+    future = client.get("/audit/", params={"actor": actor, "since": datetime.now(timezone.utc).isoformat()})
+    assert future.json() == []
+    assert client.get("/audit/", params={"actor": actor, "cursor": "garbage"}).status_code == 422
+
+
+def test_cascaded_deletes_are_recorded(client: TestClient):
+    actor = f"auditor-{uuid.uuid4().hex[:8]}"
+    headers = {"X-User": actor}
+    fmea = client.post("/fmeas/", json={"asset_id": "AUDIT-002", "title": "Cascade", "version": 1}, headers=headers).json()
+    fm = client.post("/failure-modes/", json={"fmea_id": fmea["id"], "name": "Bearing wear"}, headers=headers).json()
+    action = client.post(
+        "/actions/", json={"failure_mode_id": fm["id"], "description": "Regrease"}, headers=headers
+    ).json()
+    assert client.delete(f"/fmeas/{fmea['id']}", headers=headers).status_code == 200
+    audit.get_writer().flush()
+
+    history = client.get(f"/audit/failure-modes/{fm['id']}").json()
+    assert [entry["action"] for entry in history] == ["delete", "create"]
+    assert history[0]["actor"] == actor and history[0]["before"]["name"] == "Bearing wear"
+    history = client.get(f"/audit/actions/{action['id']}").json()
+    assert [entry["action"] for entry in history] == ["delete", "create"]
+    assert history[0]["before"]["description"] == "Regrease"
+
+
+def test_sync_mode_writes_in_the_same_transaction(db_session, monkeypatch):
+    monkeypatch.setenv(audit.MODE_ENV, "sync")
+    fmea = crud.create_fmea(db_session, schemas.FMEACreate(asset_id="AUDIT-SYNC", title="Sync"))
+    crud.update_fmea(db_session, fmea.id, schemas.FMEAUpdate(title="Sync"))  # no change, no entry
+
+    entries = db_session.scalars(select(AuditEntry).where(AuditEntry.table_name == "fmeas", AuditEntry.row_id == fmea.id)).all()
+    assert [(e.action, e.after["title"]) for e in entries] == [("create", "Sync")]
+
+
+def test_writer_copies_batches(engine):
+    actor = f"writer-{uuid.uuid4().hex[:8]}"
+    writer = audit.AuditWriter(engine, batch_size=7)
+    now = datetime.now(timezone.utc)
+    writer.submit(
+        audit.Change(now, actor, "update", "controls", i, {"description": "a"}, {"description": f"b{i}"})
+        for i in range(20)
+    )
+    writer.close()
+    assert writer.written == 20 and writer.pending() == 0
+
+    with engine.begin() as conn:
+        rows = conn.execute(select(AuditEntry.row_id, AuditEntry.after).where(AuditEntry.actor == actor)).all()
+        conn.execute(delete(AuditEntry).where(AuditEntry.actor == actor))
+    assert sorted(rows) == [(i, {"description": f"b{i}"}) for i in range(20)]
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from .. import crud, schemas
+from ..benchmarks.cases import count_round_trips, run_crud_cases, run_serialization_cases, seed
+from ..benchmarks.runner import compare, load_results, measure, save_results
+
+
+def test_benchmark_suite_runs_against_real_db(db_session, tmp_path):
+    data = seed(db_session, rows=50)
+    results = run_crud_cases(db_session, data, iterations=1)
+    results += run_serialization_cases(db_session, data, iterations=1)
+
+    names = {r.name for r in results}
+    assert {"crud.get_fmea", "crud.create_action", "crud.update_control"} <= names
+    assert "serialize.failure_modes.from_attributes" in names
+    assert all(r.median_s > 0 for r in results)
+
+    path = tmp_path / "results.json"
+    save_results(results, path)
+    assert set(load_results(path)) == names
+
+
+def test_writes_take_one_statement_plus_commit(db_session):
+    data = seed(db_session, rows=1)
+    results = {r.name: r for r in run_crud_cases(db_session, data, iterations=1)}
+    for name in ("crud.update_fmea", "crud.update_failure_mode", "crud.delete_action", "crud.delete_control"):
+        assert results[name].extra["round_trips"] == 2, name
+
+    assert count_round_trips(db_session, lambda: crud.update_action(db_session, 0, schemas.ActionUpdate(owner="x"))) == 2
+    assert count_round_trips(db_session, lambda: crud.delete_action(db_session, 0)) == 2
+
+
+def test_compare_flags_regressions_above_threshold():
+    baseline = {"fast": {"median_s": 0.010}, "slow": {"median_s": 0.010}, "gone": {"median_s": 0.010}}
+    current = {"fast": {"median_s": 0.0105}, "slow": {"median_s": 0.0125}, "new": {"median_s": 1.0}}
+
+    regressions = compare(current, baseline, threshold=0.10)
+    assert [r.name for r in regressions] == ["slow"]
+    assert round(regressions[0].ratio, 2) == 1.25
+
+
+def test_measure_reports_units_per_second():
+    result = measure("noop", lambda: None, iterations=5, warmup=0, units=100)
+    assert result.iterations == 5
+    assert result.min_s <= result.median_s <= result.p95_s
+    assert result.units_per_s > 0
+
+
+def test_filtered_runs_only_run_and_save_matching_cases(db_session, tmp_path):
+    data = seed(db_session, rows=1)
+    results = run_crud_cases(db_session, data, iterations=1, only="delete_action")
+    results += run_serialization_cases(db_session, data, iterations=1, only="delete_action")
+    assert [r.name for r in results] == ["crud.delete_action"]
+
+    path = tmp_path / "baseline.json"
+    save_results([measure("kept", lambda: None, iterations=1, warmup=0)], path)
+    save_results(results, path, merge=True)
+    assert set(load_results(path)) == {"kept", "crud.delete_action"}
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+from starlette.websockets import WebSocketDisconnect
+
+from db.config import load_db_config
+from db.models import FMEA, FailureMode
+from .. import changefeed
+
+
+def _write_fmea(engine, asset_id: str) -> int:
+    with engine.begin() as conn:
+        fmea_id = conn.scalar(insert(FMEA).values(asset_id=asset_id, title="Feed", version=1).returning(FMEA.id))
+        conn.execute(insert(FailureMode).values([{"fmea_id": fmea_id, "name": f"Mode {i}"} for i in range(3)]))
+    return fmea_id
+
+
+def _delete_fmea(engine, fmea_id: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(delete(FMEA).where(FMEA.id == fmea_id))
+
+
+def test_websocket_receives_changes_for_its_asset(client: TestClient, engine):
+    asset_id = f"FEED-{uuid.uuid4().hex[:8]}"
+    with client.websocket_connect(f"/events/ws?asset_id={asset_id}") as ws:
+        other_id = _write_fmea(engine, f"OTHER-{uuid.uuid4().hex[:8]}")
+        fmea_id = _write_fmea(engine, asset_id)
+        first, second = ws.receive_json(), ws.receive_json()
+    _delete_fmea(engine, fmea_id)
+    _delete_fmea(engine, other_id)
+
+    assert first == {
+        "event": "change",
+        "data": {"table": "fmeas", "op": "insert", "tenant_id": "default", "fmea_id": fmea_id, "asset_id": asset_id, "ids": [fmea_id], "count": 1},
+    }
+    # One event for the three-row INSERT
+    assert second["data"]["table"] == "failure_modes" and second["data"]["count"] == 3
+    assert second["data"]["fmea_id"] == fmea_id
+
+
+def test_subscribing_requires_a_topic(client: TestClient):
+    assert client.get("/events/stream").status_code == 422
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/events/ws") as ws:
+            ws.receive_json()
+
+
+def test_sse_frames_and_shared_listener(engine):
+    asset_id = f"SSE-{uuid.uuid4().hex[:8]}"
+
+    async def run():
+        feed = changefeed.ChangeFeed(load_db_config().conninfo)
+        try:
+            by_asset = await feed.subscribe(changefeed.topics([asset_id], []))
+            fmea_id = await asyncio.to_thread(_write_fmea, engine, asset_id)
+            by_fmea = await feed.subscribe(changefeed.topics([], [fmea_id]))
+            frames = changefeed.sse_frames(by_asset)
+            received = [await asyncio.wait_for(anext(frames), 5) for _ in range(3)]
+            await asyncio.to_thread(_delete_fmea, engine, fmea_id)
+            deleted = await asyncio.wait_for(by_fmea.get(), 5)
+            await frames.aclose()
+            return fmea_id, received, deleted, feed.subscribers
+        finally:
+            await feed.close()
+
+    fmea_id, received, deleted, subscribers = asyncio.run(run())
+    assert received[0] == ": subscribed\n\n"
+    assert received[1].startswith("event: change\ndata: ")
+    assert json.loads(received[2].split("data: ", 1)[1])["table"] == "failure_modes"
+    # Cascaded child deletes are covered by the FMEA's own event
+    assert deleted[0] == "change" and json.loads(deleted[1])["ids"] == [fmea_id]
+    assert subscribers == 1
+
+
+def test_slow_subscriber_gets_resync(monkeypatch):
+    monkeypatch.setattr(changefeed, "QUEUE_SIZE", 2)
+
+    async def run():
+        feed = changefeed.ChangeFeed("")
+        subscription = changefeed.Subscription(feed, changefeed.topics(["A"], []))
+        for i in range(3):
+            subscription.push(changefeed.CHANGE, str(i))
+        return [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+
+    assert asyncio.run(run()) == [(changefeed.RESYNC, "{}")]
@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.testclient import TestClient
+
+from .. import export
+
+
+def _seed(client: TestClient) -> None:
+    for version, status in ((1, "approved"), (2, "draft")):
+        fmea_id = client.post(
+            "/fmeas/", json={"asset_id": "EXP-ASSET-001", "title": f"Export v{version}", "version": version}
+        ).json()["id"]
+        client.put(f"/fmeas/{fmea_id}", json={"status": status})
+        for i in range(3):
+            fm_id = client.post(
+                "/failure-modes/",
+                json={"fmea_id": fmea_id, "name": f"Mode {i}", "severity": 2, "occurrence": 3, "detection": i + 1},
+            ).json()["id"]
+            client.post("/actions/", json={"failure_mode_id": fm_id, "description": "Line one\nline, \"two\"", "notes": ""})
+
+
+def test_export_arrow_filters_and_types(client: TestClient):
+    _seed(client)
+
+    response = client.get("/export/failure-modes.arrow", params={"asset_id": "EXP-ASSET-001", "version": 2})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == export.ARROW_MEDIA_TYPE
+    table = pa.ipc.open_stream(response.content).read_all()
+
+    assert table.num_rows == 3
+    assert table.schema.field("rpn").type == pa.int32()
+    assert table.schema.field("created_at").type == pa.timestamp("us", tz="UTC")
+    assert table.column("rpn").to_pylist() == [6, 12, 18]
+    assert set(table.column("fmea_version").to_pylist()) == {2}
+    assert set(table.column("fmea_status").to_pylist()) == {"draft"}
+
+
+def test_export_parquet_round_trips_text_and_nulls(client: TestClient):
+    _seed(client)
+
+    response = client.get("/export/actions.parquet", params={"asset_id": "EXP-ASSET-001", "status": "approved"})
+    assert response.status_code == 200
+    assert 'filename="actions.parquet"' in response.headers["content-disposition"]
+    table = pq.read_table(io.BytesIO(response.content))
+
+    assert table.num_rows == 3
+    rows = table.to_pylist()
+    assert rows[0]["description"] == "Line one\nline, \"two\""
+    assert rows[0]["notes"] == ""
+    assert rows[0]["owner"] is None
+    assert rows[0]["status"] == "open"
+
+
+def test_export_empty_and_unknown_dataset(client: TestClient):
+    response = client.get("/export/controls.arrow", params={"asset_id": "NO-SUCH-ASSET"})
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == 0
+    assert pq.read_table(io.BytesIO(client.get("/export/effects.parquet", params={"asset_id": "NO-SUCH-ASSET"}).content)).num_rows == 0
+    assert client.get("/export/widgets.arrow").status_code == 422
+
+
+def test_abandoned_copy_leaves_connection_usable(db_session):
+    connection = db_session.connection().connection.driver_connection
+
+    rows = export._copy_out(connection, b"COPY (SELECT generate_series(1, 100000)) TO STDOUT")
+    assert bytes(next(rows)) == b"1\n"
+    rows.close()
+
+    connection.rollback()
+    assert connection.execute("SELECT 1").fetchone() == (1,)
@@ -111,4 +111,22 @@ def test_read_failure_modes_by_fmea(client: TestClient, test_fmea_id: int):
     data = response.json()
     assert isinstance(data, list)
     assert len(data) >= 1
-    assert all(item["fmea_id"] == test_fmea_id for item in data)
\ No newline at end of file
+    assert all(item["fmea_id"] == test_fmea_id for item in data)
+
+
+def test_rating_history_and_fleet_trend(client: TestClient, test_fmea_id: int):
+    created = client.post("/failure-modes/", json={"fmea_id": test_fmea_id, "name": "History mode", "severity": 2})
+    failure_mode_id = created.json()["id"]
+    client.put(f"/failure-modes/{failure_mode_id}", json={"severity": 9})
+    client.put(f"/failure-modes/{failure_mode_id}", json={"name": "History mode renamed"})
+    client.put(f"/failure-modes/{failure_mode_id}", json={"occurrence": 3})
+
+    response = client.get(f"/failure-modes/{failure_mode_id}/history", params={"every": "P1D"})
+    assert response.status_code == 200
+    assert [(b["changes"], b["min_rpn"], b["max_rpn"], b["last_rpn"]) for b in response.json()] == [(3, 20, 270, 270)]
+    assert client.get(f"/failure-modes/{failure_mode_id}/history", params={"since": "2999-01-01T00:00:00Z"}).json() == []
+    assert client.get("/failure-modes/999999/history").status_code == 404
+
+    trend = client.get("/failure-modes/trend", params={"every": "PT1H"}).json()
+    assert sum(b["changes"] for b in trend) >= 3 and max(b["max_rpn"] for b in trend) >= 270
+    assert client.get("/failure-modes/trend", params={"every": "PT0S"}).status_code == 422
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from .. import filters, schemas
+from ..crud import _select_rows
+from db.models import DEFAULT_TENANT, FailureMode
+from db.tenancy import scope_session
+
+
+def _seed(client: TestClient) -> tuple[int, int]:
+    ids = []
+    for version, status in ((1, "approved"), (2, "draft")):
+        fmea_id = client.post(
+            "/fmeas/", json={"asset_id": "QL-ASSET-001", "title": f"Query v{version}", "version": version}
+        ).json()["id"]
+        client.put(f"/fmeas/{fmea_id}", json={"status": status})
+        for severity in range(1, 11):
+            client.post(
+                "/failure-modes/",
+                json={"fmea_id": fmea_id, "name": f"Mode {severity}", "severity": severity, "occurrence": 2, "detection": 11 - severity},
+            )
+        ids.append(fmea_id)
+    return ids[0], ids[1]
+
+
+def test_parse_precedence_and_predicates():
+    query = filters.parse("severity>=8 and (detection<3 or name in ('a b', c)) and not fmea.status=draft order by rpn DESC")
+    assert query.sort_field == "rpn" and query.descending
+    assert query.where == filters.BoolOp("and", (
+        filters.Comparison("severity", ">=", ("8",)),
+        filters.BoolOp("or", (filters.Comparison("detection", "<", ("3",)), filters.Comparison("name", "in", ("a b", "c")))),
+        filters.Not(filters.Comparison("fmea.status", "=", ("draft",))),
+    ))
+    assert filters.parse("supersedes_fmea_id is not null").where == filters.IsNull("supersedes_fmea_id", True)
+    assert filters.parse("") == filters.ParsedQuery(where=None)
+    assert filters.parse("rpn > 5") is filters.parse("rpn > 5")
+
+
+@pytest.mark.parametrize("text, message", [
+    ("severity >=", "expected word"),
+    ("severity = 1 order by rpn, id", "only one sort field"),
+    ("(severity = 1", r"expected \)"),
+    ("secret = 1", "unknown field 'secret'"),
+    ("severity = high", "invalid value for severity"),
+    ("fmea.is_active > true", "only supports = and !="),
+    ("order by severity", "cannot sort by 'severity'"),
+])
+def test_compile_rejects_invalid_queries(text, message):
+    with pytest.raises(filters.FilterError, match=message):
+        filters.compile_query(filters.FAILURE_MODES, text)
+
+
+def test_failure_mode_query_with_join_and_cursor_pages(client: TestClient):
+    approved_id, _ = _seed(client)
+    query = {"q": "severity>=3 and fmea.status=approved and fmea.asset_id='QL-ASSET-001' order by rpn desc", "limit": 3}
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get("/failure-modes/", params={**query, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert len(seen) == 8
+    assert {m["fmea_id"] for m in seen} == {approved_id}
+    rpns = [m["rpn"] for m in seen]
+    assert rpns == sorted(rpns, reverse=True)
+    assert len({m["id"] for m in seen}) == 8
+
+
+def test_fmea_query_and_cursor_validation(client: TestClient):
+    _seed(client)
+    response = client.get("/fmeas/", params={"q": "asset_id=QL-ASSET-001 and version in (2, 3)", "fields": "version,status"})
+    assert response.json() == [{"version": 2, "status": "draft"}]
+
+    first = client.get("/fmeas/", params={"q": "asset_id=QL-ASSET-001 order by created_at", "limit": 1})
+    cursor = first.headers["X-Next-Cursor"]
+    mismatched = client.get("/fmeas/", params={"q": "asset_id=QL-ASSET-001", "cursor": cursor})
+    assert mismatched.status_code == 422
+    assert "different query" in mismatched.json()["detail"]
+    assert client.get("/fmeas/", params={"cursor": "garbage!"}).status_code == 422
+    paged = {"q": "asset_id=QL-ASSET-001 order by created_at", "cursor": cursor}
+    assert client.get("/fmeas/", params={**paged, "skip": 1}).status_code == 422
+    assert client.get("/fmeas/", params=paged).status_code == 200
+    assert client.get("/failure-modes/", params={"q": "severity => 3"}).status_code == 422
+
+
+@pytest.mark.parametrize("query_text", [
+    "severity>=8 and detection>=7 order by rpn desc",
+    "rpn >= 100 order by rpn desc",
+    "order by created_at",
+    "fmea.status = approved order by id",
+])
+def test_catalog_indexes_serve_typical_queries(db_session, query_text):
+    # As an API request runs: row-level security adds the tenant_id the indexes lead with
+    scope_session(db_session, DEFAULT_TENANT)
+    search = filters.Search(filters.compile_query(filters.FAILURE_MODES, query_text), limit=50)
+    stmt = filters.apply(_select_rows(FailureMode, schemas.FailureMode), filters.FAILURE_MODES, search)
+    sql = stmt.compile(dialect=db_session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+    # With sequential scans priced out, any remaining Seq Scan means no usable index exists
+    db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = "\n".join(db_session.execute(text(f"EXPLAIN {sql}")).scalars())
+    assert "Seq Scan" not in plan, plan
@@ -1,7 +1,13 @@
 from __future__ import annotations
 
+from datetime import datetime, timedelta
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .. import crud, documents
 
 
 def test_create_fmea(client: TestClient):
@@ -79,6 +85,36 @@ def test_update_fmea_not_found(client: TestClient):
     assert response.status_code == 404
 
 
+def test_update_fmea_with_empty_payload_returns_row(client: TestClient):
+    fmea_id = client.post("/fmeas/", json={"asset_id": "ASSET-EMPTY-UPD", "title": "Unchanged"}).json()["id"]
+    response = client.put(f"/fmeas/{fmea_id}", json={})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Unchanged"
+
+
+def test_update_and_delete_fmea_with_if_match(client: TestClient):
+    created = client.post("/fmeas/", json={"asset_id": "ASSET-ETAG", "title": "Original"})
+    fmea_id = created.json()["id"]
+    assert created.headers["ETag"] == '"1"' and created.json()["row_version"] == 1
+    assert client.get(f"/fmeas/{fmea_id}").headers["ETag"] == '"1"'
+
+    response = client.put(f"/fmeas/{fmea_id}", json={"title": "Mine"}, headers={"If-Match": '"1"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"2"' and response.json()["row_version"] == 2
+
+    # A second editor still holding version 1 loses instead of overwriting
+    stale = client.put(f"/fmeas/{fmea_id}", json={"title": "Theirs"}, headers={"If-Match": '"1"'})
+    assert stale.status_code == 412
+    assert client.put(f"/fmeas/{fmea_id}", json={"title": "Weak"}, headers={"If-Match": 'W/"2"'}).status_code == 412
+    assert client.get(f"/fmeas/{fmea_id}").json()["title"] == "Mine"
+    assert client.put("/fmeas/999999", json={"title": "Gone"}, headers={"If-Match": '"1"'}).status_code == 412
+
+    # Without If-Match the last write wins, and still bumps the version
+    assert client.put(f"/fmeas/{fmea_id}", json={"title": "Anyone"}).json()["row_version"] == 3
+    assert client.delete(f"/fmeas/{fmea_id}", headers={"If-Match": '"2"'}).status_code == 412
+    assert client.delete(f"/fmeas/{fmea_id}", headers={"If-Match": '"2", "3"'}).status_code == 200
+
+
 def test_delete_fmea(client: TestClient):
     fmea_data = {
         "asset_id": "ASSET-005",
@@ -114,4 +150,104 @@ def test_read_fmeas_by_asset(client: TestClient):
     data = response.json()
     assert isinstance(data, list)
     assert len(data) >= 1
-    assert all(item["asset_id"] == asset_id for item in data)
\ No newline at end of file
+    assert all(item["asset_id"] == asset_id for item in data)
+
+def test_read_fleet_summary(client: TestClient):
+    fmea = client.post("/fmeas/", json={"asset_id": "ASSET-007", "title": "Test FMEA 7", "status": "approved"}).json()
+    client.post("/failure-modes/", json={"fmea_id": fmea["id"], "name": "Seal leak", "severity": 9, "occurrence": 9, "detection": 9})
+
+    response = client.get("/fmeas/summary")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["fmeas_by_status"]["approved"] >= 1
+    assert data["fmeas"] == sum(data["fmeas_by_status"].values())
+    assert data["failure_modes"] >= 1 and data["max_rpn"] == 729
+
+
+def _backdate(db_session: Session, table: str, row_id: int, when: str) -> None:
+    """Pretend a row was written at ``when``, without recording a version for it."""
+    db_session.execute(text("SELECT set_config('fmea.versioning', 'off', true)"))
+    db_session.execute(text(f"UPDATE {table} SET created_at = :when, valid_from = :when WHERE id = :id"), {"when": when, "id": row_id})
+    db_session.execute(text("SELECT set_config('fmea.versioning', 'on', true)"))
+
+
+def test_read_fmea_tree_and_effective_version_as_of(client: TestClient, db_session: Session):
+    v1 = client.post("/fmeas/", json={
+        "asset_id": "ASSET-ASOF", "title": "Pump v1", "status": "approved",
+        "approved_at": "2026-01-01T00:00:00Z", "effective_date": "2026-01-05T00:00:00Z",
+    }).json()
+    mode = client.post("/failure-modes/", json={"fmea_id": v1["id"], "name": "Seal leak", "severity": 5}).json()
+    action = client.post("/actions/", json={"failure_mode_id": mode["id"], "description": "Inspect seal"}).json()
+    v2 = client.post("/fmeas/", json={
+        "asset_id": "ASSET-ASOF", "title": "Pump v2", "version": 2, "status": "approved",
+        "approved_at": "2026-06-01T00:00:00Z", "supersedes_fmea_id": v1["id"],
+    }).json()
+    for table, row_id, when in (
+        ("fmeas", v1["id"], "2026-01-01"), ("failure_modes", mode["id"], "2026-01-01"),
+        ("actions", action["id"], "2026-01-01"), ("fmeas", v2["id"], "2026-06-01"),
+    ):
+        _backdate(db_session, table, row_id, when)
+
+    # Today's edits
+    client.put(f"/failure-modes/{mode['id']}", json={"severity": 9})
+    client.delete(f"/actions/{action['id']}")
+    client.post("/controls/", json={"failure_mode_id": mode["id"], "type": "detection", "description": "Vibration check"})
+    client.put(f"/fmeas/{v1['id']}", json={"status": "superseded"})
+
+    response = client.get(f"/fmeas/{v1['id']}/tree", params={"as_of": "2026-03-01T00:00:00Z"})
+    assert response.status_code == 200
+    then = response.json()
+    assert then["status"] == "approved" and then["as_of"].startswith("2026-03-01")
+    [mode_then] = then["failure_modes"]
+    assert mode_then["severity"] == 5 and mode_then["rpn"] == 50
+    assert [a["description"] for a in mode_then["actions"]] == ["Inspect seal"] and mode_then["controls"] == []
+
+    [mode_now] = client.get(f"/fmeas/{v1['id']}/tree").json()["failure_modes"]
+    assert mode_now["severity"] == 9 and mode_now["actions"] == []
+    assert [c["description"] for c in mode_now["controls"]] == ["Vibration check"]
+    assert client.get(f"/fmeas/{v1['id']}/tree", params={"as_of": "2025-12-01T00:00:00Z"}).status_code == 404
+
+    effective = lambda as_of: client.get("/fmeas/by-asset/ASSET-ASOF/effective", params={"as_of": as_of})
+    # Approved on the 1st, effective from the 5th
+    assert effective("2026-01-03T00:00:00Z").status_code == 404
+    assert effective("2026-03-01T00:00:00Z").json()["id"] == v1["id"]
+    assert effective("2026-07-01T00:00:00Z").json()["id"] == v2["id"]
+    assert client.get("/fmeas/by-asset/ASSET-ASOF/effective").json()["title"] == "Pump v2"
+
+
+
+def _document(db_session: Session, fmea_id: int):
+    return db_session.execute(
+        text("SELECT generation, body, stale_since FROM fmea_documents WHERE fmea_id = :id"), {"id": fmea_id}
+    ).one()
+
+
+def test_current_tree_is_served_from_its_document(client: TestClient, db_session: Session):
+    fmea = client.post("/fmeas/", json={"asset_id": "ASSET-DOC", "title": "Gearbox"}).json()
+    mode = client.post("/failure-modes/", json={"fmea_id": fmea["id"], "name": "Tooth wear", "severity": 6}).json()
+    client.post("/actions/", json={"failure_mode_id": mode["id"], "description": "Oil analysis"})
+    assert _document(db_session, fmea["id"]).body is None
+
+    first = client.get(f"/fmeas/{fmea['id']}/tree")
+    assert first.status_code == 200
+    # Rendered as of the database's clock, which stamped the rows' validity
+    assert datetime.fromisoformat(first.json()["as_of"]) == db_session.scalar(text("SELECT now()"))
+    live = client.get(f"/fmeas/{fmea['id']}/tree", params={"as_of": first.json()["as_of"]}).json()
+    assert first.json() == live
+    generation, body, stale_since = _document(db_session, fmea["id"])
+    assert body == first.content and stale_since is None
+    assert client.get(f"/fmeas/{fmea['id']}/tree").content == first.content
+
+    client.put(f"/failure-modes/{mode['id']}", json={"severity": 8})
+    assert _document(db_session, fmea["id"]).generation == generation + 1
+    # Within the staleness bound the previous render is still served
+    assert documents.read_tree_document(db_session, fmea["id"], staleness=timedelta(hours=1)) == first.content
+    # A render from before the write is not stored over it
+    tenant_id = crud.get_fmea_document_row(db_session, fmea["id"], timedelta(0))["tenant_id"]
+    crud.store_fmea_document(db_session, fmea["id"], tenant_id, generation, b"{}")
+    assert _document(db_session, fmea["id"]).body == first.content
+
+    [current] = client.get(f"/fmeas/{fmea['id']}/tree").json()["failure_modes"]
+    assert current["severity"] == 8 and [a["description"] for a in current["actions"]] == ["Oil analysis"]
+    assert _document(db_session, fmea["id"]).stale_since is None
+    assert client.get("/fmeas/999999/tree").status_code == 404
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import os
+from datetime import datetime, timedelta, timezone
+
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, insert, select, update
+
+from db.models import FMEA, Action, AuditEntry, Control, FailureMode, Job
+from .. import jobs
+
+
+def test_long_operations_answer_202_with_a_job(client: TestClient):
+    fmea = client.post("/fmeas/", json={"asset_id": "JOB-001", "title": "Queued", "version": 1}).json()
+
+    response = client.post(f"/fmeas/{fmea['id']}/clone", params={"title": "Next"})
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["Location"] == f"/jobs/{job['id']}"
+    assert (job["kind"], job["status"], job["params"]["fmea_id"]) == ("clone", "queued", fmea["id"])
+    assert client.get(f"/jobs/{job['id']}").json()["status"] == "queued"
+    assert client.get(f"/jobs/{job['id']}/result").status_code == 409
+
+    cancelled = client.post(f"/jobs/{job['id']}/cancel").json()
+    assert (cancelled["status"], cancelled["cancel_requested"]) == ("cancelled", True)
+    assert [j["id"] for j in client.get("/jobs/", params={"status": "cancelled", "kind": "clone"}).json()] == [job["id"]]
+
+    assert client.post("/jobs/", json={"kind": "export", "params": {"dataset": "actions"}}).status_code == 202
+    assert client.post("/jobs/", json={"kind": "recompute"}).status_code == 422
+    assert client.post("/jobs/", json={"kind": "export", "params": {"dataset": "nope"}}).status_code == 422
+    assert client.get("/jobs/999999").status_code == 404
+    assert client.post("/jobs/999999/cancel").status_code == 404
+
+
+def test_result_of_a_removed_file_is_gone(client: TestClient, db_session, tmp_path):
+    result = {"path": str(tmp_path / "missing.arrow"), "media_type": "application/octet-stream", "filename": "x.arrow"}
+    job_id = db_session.scalar(insert(Job).values(kind="export", status="succeeded", result=result).returning(Job.id))
+    response = client.get(f"/jobs/{job_id}/result")
+    assert response.status_code == 410 and response.json()["detail"]
+
+
+def test_worker_clones_a_tree_and_exports(engine, tmp_path, monkeypatch):
+    monkeypatch.setenv(jobs.RESULTS_DIR_ENV, str(tmp_path))
+    started = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        fmea_id = conn.scalar(insert(FMEA).values(asset_id="JOB-CLONE", title="Pump", version=1).returning(FMEA.id))
+        fm_ids = conn.scalars(
+            insert(FailureMode).returning(FailureMode.id),
+            [{"fmea_id": fmea_id, "name": name, "severity": 7} for name in ("Leak", "Seize")],
+        ).all()
+        conn.execute(insert(Action), [{"failure_mode_id": fm_id, "description": "Inspect", "status": "closed"} for fm_id in fm_ids])
+        conn.execute(insert(Control).values(failure_mode_id=fm_ids[1], type="detection", description="Vibration"))
+        job_ids = conn.scalars(
+            insert(Job).returning(Job.id),
+            [
+                {"kind": "clone", "params": {"fmea_id": fmea_id, "title": "Pump v2"}},
+                {"kind": "clone", "params": {"fmea_id": 999999}},
+                {"kind": "export", "params": {"dataset": "failure-modes", "asset_id": "JOB-CLONE"}},
+            ],
+        ).all()
+
+    worker = jobs.Worker(engine, name="test-worker")
+    try:
+        assert [worker.run_once() for _ in job_ids] == job_ids
+        assert worker.run_once() is None
+        with engine.connect() as conn:
+            clone, missing, export = (conn.execute(select(Job).where(Job.id == job_id)).mappings().one() for job_id in job_ids)
+            assert (clone["status"], clone["progress_done"], clone["progress_total"], clone["attempts"]) == ("succeeded", 6, 6, 1)
+            assert clone["result"]["copied"] == {
+                "failure_modes": 2, "actions": 2, "failure_causes": 0, "failure_effects": 0, "controls": 1,
+            }
+            new = conn.execute(select(FMEA).where(FMEA.id == clone["result"]["fmea_id"])).mappings().one()
+            assert (new["title"], new["version"], new["status"], new["supersedes_fmea_id"]) == ("Pump v2", 2, "draft", fmea_id)
+            copied = conn.execute(
+                select(FailureMode.name, FailureMode.severity, Action.status, Control.description)
+                .join(Action, Action.failure_mode_id == FailureMode.id)
+                .outerjoin(Control, Control.failure_mode_id == FailureMode.id)
+                .where(FailureMode.fmea_id == new["id"])
+                .order_by(FailureMode.name)
+            ).all()
+            assert copied == [("Leak", 7, "closed", None), ("Seize", 7, "closed", "Vibration")]
+            created = conn.execute(
+                select(AuditEntry.table_name, func.count()).where(AuditEntry.action == "create")
+                .where(AuditEntry.occurred_at >= started).group_by(AuditEntry.table_name)
+            ).all()
+            assert dict(created) == {"fmeas": 1, "failure_modes": 2, "actions": 2, "controls": 1}
+
+            assert (missing["status"], missing["error"]) == ("failed", "FMEA 999999 not found")
+
+            assert export["status"] == "succeeded" and export["result"]["rows"] == 4
+            assert os.path.dirname(export["result"]["path"]) == str(tmp_path)
+            assert pq.read_table(export["result"]["path"]).num_rows == 4
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(Job).where(Job.id.in_(job_ids)))
+            conn.execute(delete(FMEA).where(FMEA.asset_id == "JOB-CLONE"))
+
+
+def test_cancellation_and_recovery_of_running_jobs(engine):
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        running, stale, exhausted = conn.scalars(
+            insert(Job).returning(Job.id),
+            [
+                {"kind": "archive", "status": "running", "attempts": 1, "heartbeat_at": now},
+                {"kind": "archive", "status": "running", "attempts": 1, "heartbeat_at": now - timedelta(minutes=5)},
+                {"kind": "archive", "status": "running", "attempts": jobs.MAX_ATTEMPTS, "heartbeat_at": now - timedelta(minutes=5)},
+            ],
+        ).all()
+    try:
+        ctx = jobs.JobContext(engine, running)
+        ctx.progress(10, 100, "working", force=True)
+        with engine.begin() as conn:
+            conn.execute(update(Job).where(Job.id == running).values(cancel_requested=True))
+        # Throttled reports do not touch the database
+        ctx.progress(11)
+        with pytest.raises(jobs.JobCancelled):
+            ctx.progress(12, force=True)
+
+        with engine.begin() as conn:
+            assert jobs.reap(conn) == 2
+        with engine.connect() as conn:
+            rows = dict(conn.execute(select(Job.id, Job.status).where(Job.id.in_([running, stale, exhausted]))).all())
+            assert rows == {running: "running", stale: "queued", exhausted: "failed"}
+            assert conn.scalar(select(Job.progress_done).where(Job.id == running)) == 12
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(Job).where(Job.id.in_([running, stale, exhausted])))
+
+
+def test_expired_jobs_are_deleted_with_their_result_files(engine, tmp_path):
+    old, recent = tmp_path / "old.arrow", tmp_path / "recent.arrow"
+    old.write_bytes(b"x")
+    recent.write_bytes(b"x")
+    now = datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        job_ids = conn.scalars(
+            insert(Job).returning(Job.id),
+            [
+                {"kind": "export", "status": "succeeded", "result": {"path": str(old)}, "finished_at": now - timedelta(days=8)},
+                {"kind": "export", "status": "succeeded", "result": {"path": str(recent)}, "finished_at": now},
+                {"kind": "clone", "status": "failed", "result": None, "finished_at": now - timedelta(days=8)},
+            ],
+        ).all()
+    try:
+        with engine.begin() as conn:
+            assert jobs.expire(conn) == 2
+            assert conn.scalars(select(Job.id).where(Job.id.in_(job_ids))).all() == [job_ids[1]]
+        assert not old.exists() and recent.exists()
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(Job).where(Job.id.in_(job_ids)))
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import psycopg
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from starlette.requests import Request
+
+from db.database import TimedQueuePool, get_session_factory, pool_wait
+from .. import loadcontrol
+
+
+@loadcontrol.statement_timeout(50)
+def _impatient_endpoint() -> None:
+    pass
+
+
+def _request(endpoint) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [], "endpoint": endpoint})
+
+
+def test_route_statement_timeout_applies_to_every_transaction(engine):
+    with get_session_factory()() as session:
+        loadcontrol.prepare_session(session, _request(_impatient_endpoint))
+        for _ in range(2):
+            assert session.scalar(text("SHOW statement_timeout")) == "50ms"
+            with pytest.raises(OperationalError) as raised:
+                session.execute(text("SELECT pg_sleep(1)"))
+            assert isinstance(raised.value.orig, psycopg.errors.QueryCanceled)
+            session.rollback()
+
+    # Undeclared routes keep the connection's default
+    with get_session_factory()() as session:
+        loadcontrol.prepare_session(session, _request(lambda: None))
+        assert session.scalar(text("SHOW statement_timeout")) != "50ms"
+
+
+def test_cancel_stops_the_running_statement_only_while_attached(engine):
+    queries = loadcontrol.RequestQueries()
+    token = loadcontrol._current_queries.set(queries)
+    try:
+        session = get_session_factory()()
+        loadcontrol.prepare_session(session, _request(lambda: None))
+    finally:
+        loadcontrol._current_queries.reset(token)
+
+    errors = []
+
+    def run() -> None:
+        try:
+            session.execute(text("SELECT pg_sleep(10)"))
+        except OperationalError as exc:
+            errors.append(exc.orig)
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    worker = threading.Thread(target=run)
+    worker.start()
+    time.sleep(0.2)
+    queries.cancel()
+    worker.join(5)
+    assert time.perf_counter() - started < 5
+    assert len(errors) == 1 and isinstance(errors[0], psycopg.errors.QueryCanceled)
+    # Closing the session ended its transaction: the pooled connection is no longer ours to cancel
+    assert queries._connection is None
+
+
+def test_admission_sheds_after_a_slow_checkout():
+    admission = loadcontrol.Admission(max_wait=0.1)
+    admission.observe(0.01)
+    admission.admit()
+
+    admission.observe(0.2)
+    with pytest.raises(HTTPException) as raised:
+        admission.admit()
+    assert raised.value.status_code == 503
+    assert raised.value.headers == {"Retry-After": str(loadcontrol.SHED_SECONDS)}
+
+
+def test_pool_wait_counts_only_the_queue(engine):
+    pool = create_engine(engine.url, poolclass=TimedQueuePool, pool_size=1, max_overflow=0, pool_pre_ping=True)
+    try:
+        # Opening the first connection is not a wait
+        waited = pool_wait()
+        held = pool.connect()
+        assert pool_wait() - waited < 0.05
+
+        release = threading.Timer(0.3, held.close)
+        release.start()
+        waited = pool_wait()
+        with pool.connect():
+            assert pool_wait() - waited >= 0.2
+        release.join()
+    finally:
+        pool.dispose()
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from ..loadtest.harness import cleanup, percentile, run_noisy_neighbour, run_scenario
+from ..loadtest.scenarios import SCENARIOS, ScenarioState
+from ..main import app
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.5
+    assert round(percentile(values, 99), 2) == 99.01
+    assert percentile([], 95) == 0.0
+    assert percentile([3.0], 99) == 3.0
+
+
+def test_scenarios_run_against_app(client: TestClient):
+    # ``client`` installs the rolled-back test session; drive the same app in-process
+    async def drive():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as http:
+            reports = []
+            for name in ("dashboard", "authoring", "versioning"):
+                scenario = SCENARIOS[name]
+                state = ScenarioState(run_id=f"test-{name}", seed_fmeas=3, seed_modes_per_fmea=2)
+                await scenario.setup(http, state)
+                reports.append(await run_scenario(http, scenario, state, concurrency=1, operations=3))
+            return reports
+
+    for report in asyncio.run(drive()):
+        assert report.operations == 3
+        assert report.requests >= 3
+        assert report.error_rate == 0.0
+        assert report.sql_statements and report.sql_statements >= report.requests
+
+
+def test_noisy_neighbour_run_keeps_tenants_apart(engine):
+    # Through the real get_db: each request scopes a pooled connection to its tenant
+    quiet_state = ScenarioState(run_id="quiet", tenant_id="plant-quiet", seed_fmeas=3, seed_modes_per_fmea=2)
+    noisy_state = ScenarioState(run_id="noisy", tenant_id="plant-noisy", seed_fmeas=3, seed_modes_per_fmea=2)
+
+    async def drive():
+        transport = httpx.ASGITransport(app=app)
+        async with (
+            httpx.AsyncClient(transport=transport, base_url="http://loadtest", headers={"X-Tenant-ID": "plant-quiet"}) as quiet,
+            httpx.AsyncClient(transport=transport, base_url="http://loadtest", headers={"X-Tenant-ID": "plant-noisy"}) as noisy,
+        ):
+            await SCENARIOS["dashboard"].setup(quiet, quiet_state)
+            await SCENARIOS["authoring"].setup(noisy, noisy_state)
+            return await run_noisy_neighbour(
+                quiet,
+                noisy,
+                SCENARIOS["dashboard"],
+                SCENARIOS["authoring"],
+                quiet_state,
+                noisy_state,
+                concurrency=1,
+                noisy_concurrency=2,
+                operations=5,
+            )
+
+    try:
+        report = asyncio.run(drive())
+    finally:
+        cleanup(quiet_state)
+        cleanup(noisy_state)
+    assert report.leaks == 0
+    assert report.quiet_alone.operations == report.quiet_contended.operations == 5
+    assert report.quiet_contended.error_rate == report.noisy.error_rate == 0.0
+    assert report.p95_ratio > 0
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+
+def _sample(body: str, prefix: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_endpoint_exposes_route_metrics(client: TestClient):
+    fmea_data = {
+        "asset_id": "METRICS-ASSET-001",
+        "title": "Test FMEA for Metrics",
+        "version": 1
+    }
+    fmea_id = client.post("/fmeas/", json=fmea_data).json()["id"]
+    client.get(f"/fmeas/{fmea_id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert 'fmea_http_requests_total{method="GET",route="/fmeas/{fmea_id}",status="200"}' in body
+    assert 'fmea_http_request_duration_seconds_bucket{le="0.005",method="GET",route="/fmeas/{fmea_id}"}' in body
+    # The /metrics request itself is the only one in flight while rendering
+    assert 'fmea_http_requests_in_flight{method="GET"} 1.0' in body
+
+
+def test_metrics_count_sql_per_route(client: TestClient):
+    prefix = 'fmea_db_queries_total{method="GET",route="/fmeas/by-asset/{asset_id}"}'
+    before = _sample(client.get("/metrics").text, prefix)
+
+    client.get("/fmeas/by-asset/METRICS-ASSET-002")
+    client.get("/fmeas/by-asset/METRICS-ASSET-003")
+
+    after = _sample(client.get("/metrics").text, prefix)
+    # Each request scopes its transaction (one set_config) and runs one query
+    assert after - before == 4
+
+
+def test_metrics_status_codes_and_unmatched_routes(client: TestClient):
+    client.get("/fmeas/999999")
+    client.get("/no-such-route")
+
+    body = client.get("/metrics").text
+    assert 'fmea_http_requests_total{method="GET",route="/fmeas/{fmea_id}",status="404"}' in body
+    assert 'fmea_http_requests_total{method="GET",route="<unmatched>",status="404"}' in body
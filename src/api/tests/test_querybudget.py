@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from .. import crud
+from ..querybudget import QueryBudgetExceeded, QueryBudgetMiddleware, normalize_statement, query_budget
+
+
+@pytest.fixture
+def n_plus_one_client(db_session):
+    app = FastAPI()
+    app.add_middleware(QueryBudgetMiddleware)
+
+    @app.get("/n-plus-one")
+    @query_budget(1)
+    def n_plus_one():
+        # One lookup per id instead of a single IN query
+        return [crud.get_fmea(db_session, fmea_id=fmea_id) is None for fmea_id in (999997, 999998, 999999)]
+
+    return TestClient(app)
+
+
+def test_over_budget_request_fails_in_enforce_mode(n_plus_one_client: TestClient, monkeypatch):
+    monkeypatch.setenv("FMEA_QUERY_BUDGET_MODE", "enforce")
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        n_plus_one_client.get("/n-plus-one")
+    report = str(excinfo.value)
+    assert "GET /n-plus-one issued 3 SQL statements (budget 1)" in report
+    assert "crud.get_fmea: 3" in report
+    assert "N+1? 3x SELECT fmeas.id" in report
+
+
+def test_over_budget_request_is_logged_in_warn_mode(n_plus_one_client: TestClient, monkeypatch, caplog):
+    monkeypatch.setenv("FMEA_QUERY_BUDGET_MODE", "warn")
+    with caplog.at_level(logging.WARNING, logger="api.querybudget"):
+        response = n_plus_one_client.get("/n-plus-one")
+    assert response.status_code == 200
+    assert "issued 3 SQL statements (budget 1)" in caplog.text
+
+
+def test_budgets_are_declared_on_all_routes():
+    from ..routers import actions, controls, export, failure_causes, failure_effects, failure_modes, fmeas
+
+    for module in (actions, controls, export, failure_causes, failure_effects, failure_modes, fmeas):
+        for route in module.router.routes:
+            assert hasattr(route.endpoint, "__query_budget__"), route.path
+
+
+def test_normalize_statement_collapses_parameter_lists():
+    statement = "SELECT fmeas.id\nFROM fmeas\nWHERE fmeas.id IN (%(id_1_1)s, %(id_1_2)s)"
+    assert normalize_statement(statement) == "SELECT fmeas.id FROM fmeas WHERE fmeas.id IN (?)"
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .. import crud, schemas, serialization
+
+
+def _seed(client: TestClient) -> tuple[int, int]:
+    fmea_id = client.post("/fmeas/", json={"asset_id": "SER-ASSET-001", "title": "Serialization"}).json()["id"]
+    failure_mode_id = None
+    for i in range(3):
+        failure_mode_id = client.post(
+            "/failure-modes/",
+            json={"fmea_id": fmea_id, "name": f"Mode {i}", "description": None if i else "first",
+                  "severity": i + 1, "occurrence": 2, "detection": 3},
+        ).json()["id"]
+    client.post("/actions/", json={"failure_mode_id": failure_mode_id, "description": "Inspect",
+                                   "due_date": "2030-01-31"})
+    return fmea_id, failure_mode_id
+
+
+def test_rows_encode_like_response_model(client: TestClient, db_session: Session):
+    fmea_id, failure_mode_id = _seed(client)
+    cases = [
+        (schemas.FMEA, crud.get_fmeas_by_asset_id(db_session, "SER-ASSET-001"),
+         crud.get_fmeas_by_asset_id_rows(db_session, "SER-ASSET-001")),
+        (schemas.FailureMode, crud.get_failure_modes_by_fmea(db_session, fmea_id),
+         crud.get_failure_modes_by_fmea_rows(db_session, fmea_id)),
+        (schemas.Action, crud.get_actions_by_failure_mode(db_session, failure_mode_id),
+         crud.get_actions_by_failure_mode_rows(db_session, failure_mode_id)),
+    ]
+    for schema, objects, rows in cases:
+        adapter = TypeAdapter(list[schema])
+        expected = adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+        assert serialization.dump_rows(schema, rows) == expected
+
+
+def test_list_endpoints_serve_rows(client: TestClient):
+    fmea_id, failure_mode_id = _seed(client)
+
+    response = client.get(f"/failure-modes/by-fmea/{fmea_id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    modes = response.json()
+    # The endpoint promises no order
+    assert sorted(m["rpn"] for m in modes) == [6, 12, 18]
+    assert set(modes[0]) == set(schemas.FailureMode.model_fields)
+
+    actions = client.get(f"/actions/by-failure-mode/{failure_mode_id}").json()
+    assert actions[0]["due_date"].startswith("2030-01-31")
+    assert client.get("/fmeas/by-asset/SER-ASSET-001").json()[0]["id"] == fmea_id
+    assert client.get("/failure-modes/by-fmea/999999").json() == []
+
+
+def test_fields_narrow_select_and_response(client: TestClient, engine):
+    fmea_id, failure_mode_id = _seed(client)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(f"/failure-modes/by-fmea/{fmea_id}", params={"fields": "rpn, id,name"})
+        actions = client.get(f"/actions/by-failure-mode/{failure_mode_id}?fields=id,status,due_date,owner").json()
+        fmea = client.get(f"/fmeas/{fmea_id}?fields=title").json()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert [list(m) for m in response.json()] == [["name", "id", "rpn"]] * 3
+    assert set(actions[0]) == {"id", "status", "due_date", "owner"}
+    assert fmea == {"title": "Serialization"}
+    select_lists = [s.split("FROM")[0] for s in statements]
+    assert "failure_modes.fmea_id" not in select_lists[0]
+    assert "actions.notes" not in select_lists[1] and "actions.description" not in select_lists[1]
+    assert "fmeas.description" not in select_lists[2]
+
+
+def test_fields_rejects_unknown_and_caches_row_types(client: TestClient):
+    response = client.get("/fmeas/", params={"fields": "id,secret"})
+    assert response.status_code == 422
+    assert "unknown fields: secret" in response.json()["detail"]
+    assert client.get("/fmeas/", params={"fields": " , "}).status_code == 422
+
+    fields = serialization.parse_fields(schemas.Action, "owner,id")
+    assert fields == ("owner", "id")
+    assert serialization.row_type(schemas.Action, fields) is serialization.row_type(
+        schemas.Action, serialization.parse_fields(schemas.Action, "id,owner,id")
+    )
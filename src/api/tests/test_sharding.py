@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from dataclasses import replace
+from datetime import timedelta
+from typing import Iterator
+
+import psycopg
+import pytest
+from sqlalchemy import create_engine, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+from db.config import load_db_config
+from db.database import make_engine
+from db.models import FMEA, Asset, AuditEntry, Base, FailureMode, Job, WebhookSubscription
+from db.sharding import PRIMARY, FleetSession, Router, tag_ids
+from .. import changefeed, crud, filters, jobs, ratings, schemas, webhooks
+from .test_webhooks import StandIn, stand_in  # noqa: F401 (fixture)
+
+SHARDS = 3
+
+
+@pytest.fixture(scope="module")
+def fleet(engine) -> Iterator[sessionmaker]:
+    """Three scratch databases on the test server, migrated and tagged as a fleet."""
+    config = load_db_config()
+    shards = [replace(config, database=f"{config.database}_shard{slot}") for slot in range(SHARDS)]
+    admin = replace(config, database="postgres").conninfo
+    with psycopg.connect(admin, autocommit=True) as conn:
+        for shard in shards:
+            conn.execute(f'DROP DATABASE IF EXISTS "{shard.database}" WITH (FORCE)')
+            conn.execute(f'CREATE DATABASE "{shard.database}"')
+    engines = [make_engine(shard) for shard in shards]
+    try:
+        for slot, shard_engine in enumerate(engines):
+            Base.metadata.create_all(shard_engine)
+            with shard_engine.begin() as conn:
+                tag_ids(conn, slot)
+        yield sessionmaker(class_=FleetSession, router=Router(SHARDS), engines=engines, expire_on_commit=False)
+    finally:
+        for shard_engine in engines:
+            shard_engine.dispose()
+        with psycopg.connect(admin, autocommit=True) as conn:
+            for shard in shards:
+                conn.execute(f'DROP DATABASE IF EXISTS "{shard.database}" WITH (FORCE)')
+
+
+def _on_shard(session, slot: int, model, row_id: int) -> bool:
+    with session.engines[slot].connect() as conn:
+        return conn.scalar(select(model.id).where(model.id == row_id)) is not None
+
+
+def test_trees_live_on_their_assets_shard(fleet):
+    with fleet() as db:
+        router = db.router
+        fmea = crud.create_fmea(db, schemas.FMEACreate(asset_id="SHARD-PUMP-7", title="Pump"))
+        mode = crud.create_failure_mode(db, schemas.FailureModeCreate(fmea_id=fmea.id, name="Seal leak", severity=7))
+        action = crud.create_action(db, schemas.ActionCreate(failure_mode_id=mode.id, description="Replace seal"))
+
+        slot = router.for_asset("SHARD-PUMP-7")
+        assert {router.for_id(row.id) for row in (fmea, mode, action)} == {slot}
+        assert _on_shard(db, slot, FailureMode, mode.id)
+        assert not any(_on_shard(db, other, FMEA, fmea.id) for other in range(SHARDS) if other != slot)
+
+        assert crud.get_fmea_row(db, fmea.id)["title"] == "Pump"
+        assert [row["name"] for row in crud.get_failure_modes_by_fmea_rows(db, fmea.id)] == ["Seal leak"]
+        assert crud.update_failure_mode(db, mode.id, schemas.FailureModeUpdate(occurrence=9)).occurrence == 9
+        assert crud.delete_action(db, action.id)
+        assert crud.get_actions_by_failure_mode_rows(db, mode.id) == []
+
+
+def test_fleet_reads_merge_every_shard(fleet):
+    with fleet() as db:
+        rpns = {}
+        for n in range(12):
+            fmea = crud.create_fmea(db, schemas.FMEACreate(asset_id=f"SHARD-FLEET-{n}", title=f"Asset {n}", status="approved" if n % 3 else "draft"))
+            mode = crud.create_failure_mode(
+                db, schemas.FailureModeCreate(fmea_id=fmea.id, name=f"Mode {n}", severity=n % 10 + 1, occurrence=5, detection=2)
+            )
+            rpns[mode.id] = mode.rpn
+        assert len({db.router.for_id(mode_id) for mode_id in rpns}) == SHARDS
+
+        query = filters.compile_query(filters.FAILURE_MODES, "name!='x' order by rpn desc")
+        expected = sorted(rpns, key=lambda mode_id: (rpns[mode_id], mode_id), reverse=True)
+        seen, after = [], None
+        while True:
+            search = filters.Search(query=query, limit=5, after=after)
+            rows, cursor = crud.search_failure_modes_rows(db, search, fields=None)
+            seen += [row["id"] for row in rows if row["id"] in rpns]
+            if cursor is None:
+                break
+            after = filters.decode_cursor(query, cursor)
+        assert seen == [mode_id for mode_id in expected if mode_id in seen] and set(seen) == set(rpns)
+
+        summary = crud.get_fleet_summary(db)
+        assert summary["fmeas_by_status"]["draft"] >= 4 and summary["fmeas_by_status"]["approved"] >= 8
+        assert summary["failure_modes"] >= 12 and summary["max_rpn"] >= max(rpns.values())
+
+        assets = [f"SHARD-FLEET-{n}" for n in range(12)]
+        current = crud.get_current_fmeas_rows(db, assets)
+        assert sorted(row["asset_id"] for row in current) == sorted(a for n, a in enumerate(assets) if n % 3)
+
+        trend = crud.get_rating_trend_rows(db, ratings.Window(every=timedelta(days=1)))
+        assert sum(b["failure_modes"] for b in trend) >= 12 and max(b["max_rpn"] for b in trend) == summary["max_rpn"]
+
+
+def test_rollups_merge_every_shards_fmeas(fleet):
+    with fleet() as db:
+        crud.upsert_asset(db, "SHARD-SITE", schemas.AssetUpsert(level="site"))
+        machines = [f"SHARD-MACHINE-{n}" for n in range(6)]
+        for n, machine in enumerate(machines):
+            crud.upsert_asset(db, machine, schemas.AssetUpsert(parent_asset_id="SHARD-SITE", level="machine"))
+            fmea = crud.create_fmea(db, schemas.FMEACreate(asset_id=machine, title=machine, status="approved"))
+            crud.create_failure_mode(
+                db, schemas.FailureModeCreate(fmea_id=fmea.id, name="Wear", severity=9, occurrence=6, detection=n + 1)
+            )
+        assert len({db.router.for_asset(machine) for machine in machines}) > 1
+
+        site = crud.get_asset_rollup_row(db, "SHARD-SITE")
+        assert (site["max_rpn"], site["high_ap_modes"], site["open_actions"]) == (9 * 6 * 6, 6, 0)
+        assert [row["asset_id"] for row in crud.get_asset_children_rollup_rows(db, "SHARD-SITE")] == machines
+
+
+def test_rejected_hierarchy_writes_change_no_shard(fleet):
+    with fleet() as db:
+        crud.upsert_asset(db, "SHARD-MOVE-LINE", schemas.AssetUpsert(level="line"))
+        crud.upsert_asset(db, "SHARD-MOVE-M1", schemas.AssetUpsert(level="machine"))
+        # Only the last shard sees the move as a cycle; the others would accept it
+        with db.engines[-1].begin() as conn:
+            conn.execute(update(Asset).where(Asset.asset_id == "SHARD-MOVE-M1").values(parent_asset_id="SHARD-MOVE-LINE"))
+        with pytest.raises(IntegrityError):
+            crud.upsert_asset(db, "SHARD-MOVE-LINE", schemas.AssetUpsert(parent_asset_id="SHARD-MOVE-M1"))
+        db.rollback()
+
+        for shard_engine in db.engines:
+            with shard_engine.connect() as conn:
+                parent = conn.scalar(select(Asset.parent_asset_id).where(Asset.asset_id == "SHARD-MOVE-LINE"))
+                assert parent is None
+
+
+def test_fleet_reads_reuse_the_sessions_connections(fleet):
+    # One connection per shard, as under a saturated pool: a second checkout would time out
+    engines = [create_engine(e.url, pool_size=1, max_overflow=0, pool_timeout=1) for e in fleet.kw["engines"]]
+    try:
+        with FleetSession(router=Router(SHARDS), engines=engines) as db:
+            db.connection()  # held for the request, as get_db does
+            assert crud.get_fleet_summary(db)["failure_modes"] >= 0
+    finally:
+        for tight in engines:
+            tight.dispose()
+
+
+def test_jobs_run_on_the_shards_of_their_trees(fleet, tmp_path, monkeypatch):
+    monkeypatch.setenv(jobs.RESULTS_DIR_ENV, str(tmp_path))
+    engines = fleet.kw["engines"]
+    with fleet() as db:
+        asset_id = next(a for a in (f"SHARD-JOB-{n}" for n in range(100)) if db.router.for_asset(a) != PRIMARY)
+        fmea = crud.create_fmea(db, schemas.FMEACreate(asset_id=asset_id, title="Gearbox"))
+        mode = crud.create_failure_mode(db, schemas.FailureModeCreate(fmea_id=fmea.id, name="Pitting", severity=6))
+        crud.create_action(db, schemas.ActionCreate(failure_mode_id=mode.id, description="Oil analysis"))
+        slot = db.router.for_id(fmea.id)
+    with engines[PRIMARY].begin() as conn:
+        job_id = conn.scalar(insert(Job).values(kind="clone", status="running").returning(Job.id))
+    ctx = jobs.JobContext(engines[PRIMARY], job_id, engines=engines)
+
+    cloned = jobs.run_clone(ctx, jobs.CloneParams(fmea_id=fmea.id, created_by="shard-cloner"))
+    assert cloned["copied"]["failure_modes"] == 1 and cloned["copied"]["actions"] == 1
+    with engines[slot].connect() as conn:
+        assert conn.scalar(select(FMEA.version).where(FMEA.id == cloned["fmea_id"])) == 2
+    with engines[PRIMARY].connect() as conn:
+        actors = conn.scalars(select(AuditEntry.table_name).where(AuditEntry.actor == "shard-cloner")).all()
+        assert sorted(actors) == ["actions", "failure_modes", "fmeas"]
+
+    exported = jobs.run_export(ctx, jobs.ExportParams(dataset="failure-modes", format="arrow"))
+    total = 0
+    for shard_engine in engines:
+        with shard_engine.connect() as conn:
+            total += conn.scalar(select(func.count()).select_from(FailureMode))
+    assert exported["rows"] == total and total >= 2
+
+    with engines[slot].begin() as conn:
+        conn.execute(update(FMEA.__table__).where(FMEA.id == fmea.id).values(status="superseded"))
+    archived = jobs.run_archive(ctx, jobs.ArchiveParams(older_than_days=0))
+    assert archived["fmeas"] >= 1 and archived["rows"]["failure_modes"] >= 1
+    with engines[slot].connect() as conn:
+        assert conn.scalar(select(FMEA.archived_at).where(FMEA.id == fmea.id)) is not None
+    with engines[PRIMARY].begin() as conn:
+        conn.execute(delete(Job).where(Job.id == job_id))
+
+
+def _asset_on(router: Router, slot: int, prefix: str) -> str:
+    return next(a for a in (f"{prefix}-{n}" for n in range(100)) if router.for_asset(a) == slot)
+
+
+def test_webhooks_fire_from_every_shard(fleet, stand_in: StandIn):
+    engines = fleet.kw["engines"]
+    with fleet() as db:
+        subscription = crud.create_webhook_subscription(
+            db, schemas.WebhookSubscriptionCreate(url=stand_in.url, event_types=["fmea.review"])
+        )
+        fmea_ids = []
+        for slot in range(SHARDS):
+            fmea = crud.create_fmea(db, schemas.FMEACreate(asset_id=_asset_on(db.router, slot, "SHARD-HOOK"), title="Hooked"))
+            crud.update_fmea(db, fmea.id, schemas.FMEAUpdate(status="review"))
+            fmea_ids.append(fmea.id)
+
+        outbox = crud.get_webhook_outbox_rows(db, subscription.id, status="pending")
+        assert sorted(entry["payload"]["fmea_id"] for entry in outbox) == sorted(fmea_ids)
+        # Outbox ids name their shard, so receivers can dedupe on them
+        assert sorted(db.router.for_id(entry["id"]) for entry in outbox) == list(range(SHARDS))
+
+        async def dispatch() -> webhooks.DispatchReport:
+            dispatcher = webhooks.Dispatcher(engines[PRIMARY], engines=engines)
+            try:
+                return await dispatcher.run_once()
+            finally:
+                await dispatcher.aclose()
+
+        report = asyncio.run(dispatch())
+        assert (report.claimed, report.delivered) == (SHARDS, SHARDS)
+        delivered = [event["fmea_id"] for _, body in stand_in.requests for event in json.loads(body)["events"]]
+        assert sorted(delivered) == sorted(fmea_ids)
+
+        assert crud.delete_webhook_subscription(db, subscription.id)
+        for shard_engine in engines:
+            with shard_engine.connect() as conn:
+                assert conn.scalar(select(WebhookSubscription.id).where(WebhookSubscription.id == subscription.id)) is None
+
+
+def test_change_feed_listens_on_every_shard(fleet):
+    config = load_db_config()
+    conninfos = [replace(config, database=e.url.database).conninfo for e in fleet.kw["engines"]]
+    router = Router(SHARDS)
+    asset_ids = [_asset_on(router, slot, "SHARD-FEED") for slot in range(SHARDS)]
+
+    def write() -> None:
+        with fleet() as db:
+            for asset_id in asset_ids:
+                crud.create_fmea(db, schemas.FMEACreate(asset_id=asset_id, title="Watched"))
+
+    async def run() -> set[str]:
+        feed = changefeed.ChangeFeed(*conninfos)
+        try:
+            subscription = await feed.subscribe(changefeed.topics(asset_ids, []))
+            await asyncio.to_thread(write)
+            events = [await asyncio.wait_for(subscription.get(), 5) for _ in asset_ids]
+            return {json.loads(data)["asset_id"] for _, data in events}
+        finally:
+            await feed.close()
+
+    assert asyncio.run(run()) == set(asset_ids)
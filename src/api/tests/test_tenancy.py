@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from fastapi.testclient import TestClient
+
+PLANT_A = {"X-Tenant-ID": "plant-a"}
+PLANT_B = {"X-Tenant-ID": "plant-b"}
+
+
+def _create(client: TestClient, headers: dict[str, str]) -> int:
+    response = client.post("/fmeas/", json={"asset_id": "TENANT-PUMP", "title": "Pump", "version": 1}, headers=headers)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_tenants_only_see_their_own_fmeas(client: TestClient):
+    # Each plant numbers its own asset versions
+    fmea_a, fmea_b = _create(client, PLANT_A), _create(client, PLANT_B)
+    client.post("/failure-modes/", json={"fmea_id": fmea_a, "name": "Seal leak"}, headers=PLANT_A)
+
+    assert client.get(f"/fmeas/{fmea_a}", headers=PLANT_B).status_code == 404
+    assert client.put(f"/fmeas/{fmea_a}", json={"title": "Taken"}, headers=PLANT_B).status_code == 404
+    assert client.delete(f"/fmeas/{fmea_a}", headers=PLANT_B).status_code == 404
+    assert [f["id"] for f in client.get("/fmeas/by-asset/TENANT-PUMP", headers=PLANT_B).json()] == [fmea_b]
+    assert client.get(f"/failure-modes/by-fmea/{fmea_a}", headers=PLANT_B).json() == []
+    # Requests without the header act for the default tenant
+    assert client.get("/fmeas/by-asset/TENANT-PUMP").json() == []
+
+    assert client.get(f"/fmeas/{fmea_a}", headers=PLANT_A).json()["title"] == "Pump"
+    assert len(client.get(f"/failure-modes/by-fmea/{fmea_a}", headers=PLANT_A).json()) == 1
+
+
+def test_malformed_tenant_header_is_rejected(client: TestClient):
+    response = client.get("/fmeas/", headers={"X-Tenant-ID": "plant a'--"})
+    assert response.status_code == 400
+    assert "X-Tenant-ID" in response.json()["detail"]
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, func, insert, select, update
+
+from db.models import FMEA, WebhookOutbox, WebhookSubscription
+from .. import webhooks
+
+
+class StandIn:
+    """Local HTTP receiver answering with the queued status codes, then 200."""
+
+    def __init__(self) -> None:
+        self.requests: list[tuple[dict, bytes]] = []
+        self.statuses: list[int] = []
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stand_in.requests.append((dict(self.headers), body))
+                self.send_response(stand_in.statuses.pop(0) if stand_in.statuses else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hooks"
+
+
+@pytest.fixture
+def stand_in() -> Iterator[StandIn]:
+    receiver = StandIn()
+    thread = threading.Thread(target=receiver.server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield receiver
+    finally:
+        receiver.server.shutdown()
+        receiver.server.server_close()
+
+
+def test_status_transitions_are_enqueued_for_matching_subscriptions(client: TestClient):
+    assert client.post("/webhooks/", json={"url": "http://cmms.local/hook", "event_types": ["fmea.superseded"]}).status_code == 200
+    assert client.post("/webhooks/", json={"url": "http://x", "event_types": ["ratings.changed"]}).status_code == 422
+    subscription = client.post(
+        "/webhooks/", json={"url": "http://mes.local/hook", "event_types": ["fmea.approved", "action.*"], "secret": "s3cret"}
+    ).json()
+    assert "secret" not in subscription
+
+    fmea = client.post("/fmeas/", json={"asset_id": "HOOK-001", "title": "Hooked", "version": 1}).json()
+    client.put(f"/fmeas/{fmea['id']}", json={"status": "review"})
+    client.put(f"/fmeas/{fmea['id']}", json={"status": "approved", "approved_by": "qa"})
+    client.put(f"/fmeas/{fmea['id']}", json={"title": "Renamed"})
+    fm = client.post("/failure-modes/", json={"fmea_id": fmea["id"], "name": "Leak"}).json()
+    action = client.post("/actions/", json={"failure_mode_id": fm["id"], "description": "Fix"}).json()
+    client.put(f"/actions/{action['id']}", json={"status": "closed"})
+
+    outbox = client.get(f"/webhooks/{subscription['id']}/outbox").json()
+    assert [(e["event_type"], e["payload"]["from"], e["payload"]["to"]) for e in outbox] == [
+        ("action.closed", "open", "closed"),
+        ("fmea.approved", "review", "approved"),
+    ]
+    assert outbox[0]["payload"]["asset_id"] == "HOOK-001" and outbox[1]["payload"]["approved_by"] == "qa"
+    assert all(e["status"] == "pending" for e in outbox)
+
+
+def test_build_batches_coalesces_per_entity():
+    def row(row_id, entity, old, new, subscription_id=1):
+        payload = {"event": f"fmea.{new}", "from": old, "to": new}
+        return webhooks.Claimed(row_id, subscription_id, entity, payload, 1, f"http://s{subscription_id}", None)
+
+    plan = webhooks.build_batches(
+        [row(1, "fmea:1", "draft", "review"), row(2, "fmea:2", "draft", "review"), row(3, "fmea:1", "review", "approved"),
+         row(4, "fmea:3", "draft", "review", subscription_id=2)],
+        batch_size=1,
+    )
+    first, second = plan
+    assert [b.events for b in first] == [
+        [{"id": 2, "event": "fmea.review", "from": "draft", "to": "review"}],
+        [{"id": 3, "event": "fmea.approved", "from": "draft", "to": "approved", "coalesced": 2}],
+    ]
+    assert [b.ids for b in first] == [[2], [1, 3]]
+    assert second[0].url == "http://s2" and second[0].ids == [4]
+
+
+def test_dispatcher_retries_with_backoff_then_delivers(engine, stand_in: StandIn):
+    with engine.begin() as conn:
+        subscription_id = conn.scalar(
+            insert(WebhookSubscription).values(url=stand_in.url, event_types=["fmea.*"], secret="s3cret").returning(WebhookSubscription.id)
+        )
+        fmea_id = conn.scalar(insert(FMEA).values(asset_id="HOOK-DISPATCH", title="Dispatch", version=1).returning(FMEA.id))
+    for status in ("review", "approved"):
+        with engine.begin() as conn:
+            conn.execute(update(FMEA).where(FMEA.id == fmea_id).values(status=status))
+
+    def outbox() -> list:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(WebhookOutbox.status, WebhookOutbox.attempts, WebhookOutbox.last_error)
+                .where(WebhookOutbox.subscription_id == subscription_id).order_by(WebhookOutbox.id)
+            ).all()
+
+    async def dispatch() -> webhooks.DispatchReport:
+        dispatcher = webhooks.Dispatcher(engine, concurrency=2)
+        try:
+            return await dispatcher.run_once()
+        finally:
+            await dispatcher.aclose()
+
+    try:
+        stand_in.statuses = [503]
+        failed = asyncio.run(dispatch())
+        assert (failed.claimed, failed.delivered, failed.retried) == (2, 0, 2)
+        assert [(s, a) for s, a, _ in outbox()] == [("pending", 1), ("pending", 1)]
+        assert outbox()[0][2].startswith("HTTP 503")
+        # Backed off: nothing is due yet
+        assert asyncio.run(dispatch()).claimed == 0
+
+        with engine.begin() as conn:
+            conn.execute(update(WebhookOutbox).where(WebhookOutbox.subscription_id == subscription_id).values(next_attempt_at=func.now()))
+        delivered = asyncio.run(dispatch())
+        assert (delivered.claimed, delivered.delivered) == (2, 2)
+        assert [s for s, _, _ in outbox()] == ["delivered", "delivered"]
+    finally:
+        with engine.begin() as conn:
+            conn.execute(delete(WebhookSubscription).where(WebhookSubscription.id == subscription_id))
+            conn.execute(delete(FMEA).where(FMEA.id == fmea_id))
+
+    assert len(stand_in.requests) == 2
+    headers, body = stand_in.requests[-1]
+    assert headers["X-FMEA-Signature"] == webhooks.sign("s3cret", body)
+    (event,) = json.loads(body)["events"]
+    assert (event["event"], event["from"], event["to"], event["coalesced"]) == ("fmea.approved", "draft", "approved", 2)
+    assert event["fmea_id"] == fmea_id and event["asset_id"] == "HOOK-DISPATCH"
@@ -0,0 +1,331 @@
+"""Outbound webhook delivery from the transactional outbox.
+
+Status transitions of FMEAs (``fmea.<status>``, e.g. ``fmea.approved``) and
+actions (``action.<status>``, e.g. ``action.closed``) are written to
+``webhook_outbox`` by a trigger inside the writing transaction, one row per
+matching subscription. An event exists exactly when its change committed, and
+no request waits on a subscriber.
+
+:class:`Dispatcher` delivers them in the background::
+
+    cd src && python -m api.webhooks --concurrency 8
+
+Each cycle claims due rows with ``FOR UPDATE SKIP LOCKED`` and leases them by
+moving ``next_attempt_at`` ahead, so several dispatchers can share the outbox
+and the claims of a crashed one come due again. Claimed events are grouped by
+subscription, pending events for the same entity are coalesced into the newest
+one (keeping the oldest ``from``), and each group is POSTed in batches::
+
+    {"events": [{"id": 17, "event": "fmea.approved", "from": "review", "to": "approved", ...}]}
+
+A 2xx response marks the batch delivered. Any other outcome is retried with
+exponential backoff and jitter; after ``MAX_ATTEMPTS`` the rows are marked
+``dead``. Delivery is at least once, so receivers should dedupe on ``id``.
+
+On a sharded fleet (:mod:`db.sharding`) every shard has a copy of the
+subscriptions and its own outbox, filled by the trees that live there; a
+cycle dispatches every shard's outbox at once. Outbox ids name their shard,
+so they stay unique across the fleet.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Optional, Sequence
+
+import httpx
+from sqlalchemy import func, select, update
+from sqlalchemy.engine import Connection, Engine
+
+from db.models import WebhookOutbox, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+CLAIM_SIZE = 500
+BATCH_SIZE = 100
+MAX_CONCURRENCY = 8
+MAX_ATTEMPTS = 10
+LEASE = timedelta(seconds=60)
+BASE_BACKOFF_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 3600.0
+TIMEOUT_SECONDS = 10.0
+POLL_SECONDS = 1.0
+
+SIGNATURE_HEADER = "X-FMEA-Signature"
+
+# What a subscription may ask for: fmea.<status>, action.<status> or kind.*
+EVENT_TYPE = re.compile(r"^(fmea|action)\.(\*|[a-z_]+)$")
+
+_outbox = WebhookOutbox.__table__
+_subscriptions = WebhookSubscription.__table__
+
+
+@dataclass(frozen=True)
+class Claimed:
+    id: int
+    subscription_id: int
+    entity_key: str
+    payload: dict[str, Any]
+    attempts: int
+    url: str
+    secret: Optional[str]
+
+
+@dataclass
+class Batch:
+    subscription_id: int
+    url: str
+    secret: Optional[str]
+    events: list[dict[str, Any]] = field(default_factory=list)
+    # Every outbox row the batch settles, including coalesced ones
+    ids: list[int] = field(default_factory=list)
+    attempts: int = 0
+
+
+@dataclass
+class DispatchReport:
+    claimed: int = 0
+    delivered: int = 0
+    retried: int = 0
+    dead: int = 0
+
+    def add(self, other: DispatchReport) -> None:
+        self.claimed += other.claimed
+        self.delivered += other.delivered
+        self.retried += other.retried
+        self.dead += other.dead
+
+
+def claim(conn: Connection, limit: int = CLAIM_SIZE, lease: timedelta = LEASE) -> list[Claimed]:
+    """Lease up to ``limit`` due outbox rows, oldest first, and count the attempt."""
+    due = (
+        select(_outbox.c.id)
+        .join(_subscriptions, _subscriptions.c.id == _outbox.c.subscription_id)
+        # Events of a paused subscription wait for it to be reactivated
+        .where(_outbox.c.status == "pending", _outbox.c.next_attempt_at <= func.now(), _subscriptions.c.is_active)
+        .order_by(_outbox.c.next_attempt_at, _outbox.c.id)
+        .limit(limit)
+        .with_for_update(of=_outbox, skip_locked=True)
+        .cte("due")
+    )
+    stmt = (
+        update(_outbox)
+        .where(_outbox.c.id == due.c.id, _subscriptions.c.id == _outbox.c.subscription_id)
+        .values(attempts=_outbox.c.attempts + 1, next_attempt_at=func.now() + lease)
+        .returning(
+            _outbox.c.id,
+            _outbox.c.subscription_id,
+            _outbox.c.entity_key,
+            _outbox.c.payload,
+            _outbox.c.attempts,
+            _subscriptions.c.url,
+            _subscriptions.c.secret,
+        )
+    )
+    rows = [Claimed(**row) for row in conn.execute(stmt).mappings()]
+    return sorted(rows, key=lambda row: row.id)
+
+
+def build_batches(claimed: list[Claimed], batch_size: int = BATCH_SIZE) -> list[list[Batch]]:
+    """Per subscription, its coalesced events split into POST-sized batches (in id order)."""
+    by_subscription: dict[int, dict[str, tuple[dict[str, Any], list[int], int]]] = {}
+    targets: dict[int, Claimed] = {}
+    for row in claimed:
+        targets.setdefault(row.subscription_id, row)
+        entities = by_subscription.setdefault(row.subscription_id, {})
+        event = {"id": row.id, **row.payload}
+        previous = entities.pop(row.entity_key, None)
+        if previous is None:
+            entities[row.entity_key] = (event, [row.id], row.attempts)
+        else:
+            earlier, ids, attempts = previous
+            event["from"] = earlier["from"]
+            event["coalesced"] = len(ids) + 1
+            # Re-inserted, so the entity moves to its newest position
+            entities[row.entity_key] = (event, ids + [row.id], max(attempts, row.attempts))
+
+    plan = []
+    for subscription_id, entities in by_subscription.items():
+        target = targets[subscription_id]
+        batches: list[Batch] = []
+        for event, ids, attempts in entities.values():
+            if not batches or len(batches[-1].events) >= batch_size:
+                batches.append(Batch(subscription_id, target.url, target.secret))
+            batch = batches[-1]
+            batch.events.append(event)
+            batch.ids.extend(ids)
+            batch.attempts = max(batch.attempts, attempts)
+        plan.append(batches)
+    return plan
+
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def backoff(attempts: int) -> timedelta:
+    """Exponential delay before attempt ``attempts + 1``, with jitter to spread retries."""
+    delay = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def record(conn: Connection, outcomes: list[tuple[Batch, Optional[str]]]) -> DispatchReport:
+    """Settle delivered batches and schedule (or bury) failed ones."""
+    report = DispatchReport()
+    delivered = [row_id for batch, error in outcomes if error is None for row_id in batch.ids]
+    if delivered:
+        conn.execute(
+            update(_outbox)
+            .where(_outbox.c.id.in_(delivered))
+            .values(status="delivered", delivered_at=func.now(), last_error=None)
+        )
+        report.delivered = len(delivered)
+    for batch, error in outcomes:
+        if error is None:
+            continue
+        values: dict[str, Any] = {"last_error": error[:1000]}
+        if batch.attempts >= MAX_ATTEMPTS:
+            values["status"] = "dead"
+            report.dead += len(batch.ids)
+        else:
+            values["next_attempt_at"] = func.now() + backoff(batch.attempts)
+            report.retried += len(batch.ids)
+        conn.execute(update(_outbox).where(_outbox.c.id.in_(batch.ids)).values(**values))
+    return report
+
+
+class Dispatcher:
+    """Delivers outbox rows over HTTP with bounded concurrency.
+
+    ``engines`` are every shard's, the primary first; they default to ``engine`` alone.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        client: Optional[httpx.AsyncClient] = None,
+        concurrency: int = MAX_CONCURRENCY,
+        claim_size: int = CLAIM_SIZE,
+        batch_size: int = BATCH_SIZE,
+        engines: Sequence[Engine] = (),
+    ) -> None:
+        self.engine = engine
+        self.engines = tuple(engines) or (engine,)
+        self.client = client or httpx.AsyncClient(timeout=TIMEOUT_SECONDS)
+        self.claim_size = claim_size
+        self.batch_size = batch_size
+        self._slots = asyncio.Semaphore(concurrency)
+
+    def _claim(self, engine: Engine) -> list[Claimed]:
+        with engine.begin() as conn:
+            return claim(conn, self.claim_size)
+
+    def _record(self, engine: Engine, outcomes: list[tuple[Batch, Optional[str]]]) -> DispatchReport:
+        with engine.begin() as conn:
+            return record(conn, outcomes)
+
+    async def _post(self, batch: Batch) -> Optional[str]:
+        """``None`` on success, otherwise what went wrong."""
+        body = json.dumps({"events": batch.events}, separators=(",", ":")).encode()
+        headers = {"Content-Type": "application/json"}
+        if batch.secret:
+            headers[SIGNATURE_HEADER] = sign(batch.secret, body)
+        try:
+            async with self._slots:
+                response = await self.client.post(batch.url, content=body, headers=headers)
+        except httpx.HTTPError as exc:
+            return f"{type(exc).__name__}: {exc}"
+        if response.is_success:
+            return None
+        return f"HTTP {response.status_code}: {response.text[:200]}"
+
+    async def _deliver(self, batches: list[Batch]) -> list[tuple[Batch, Optional[str]]]:
+        # One subscription's batches go in order; after a failure the rest wait for the retry
+        outcomes = []
+        for batch in batches:
+            error = await self._post(batch)
+            if error is not None:
+                return outcomes + [(rest, error) for rest in batches[len(outcomes):]]
+            outcomes.append((batch, None))
+        return outcomes
+
+    async def _dispatch(self, engine: Engine) -> DispatchReport:
+        claimed = await asyncio.to_thread(self._claim, engine)
+        if not claimed:
+            return DispatchReport()
+        plan = build_batches(claimed, self.batch_size)
+        outcomes = [o for group in await asyncio.gather(*(self._deliver(b) for b in plan)) for o in group]
+        report = await asyncio.to_thread(self._record, engine, outcomes)
+        report.claimed = len(claimed)
+        return report
+
+    async def run_once(self) -> DispatchReport:
+        """One cycle over every shard's outbox; the shards share the concurrency limit."""
+        report = DispatchReport()
+        for shard_report in await asyncio.gather(*(self._dispatch(engine) for engine in self.engines)):
+            report.add(shard_report)
+        return report
+
+    async def run(self, stop: Optional[asyncio.Event] = None) -> None:
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            try:
+                report = await self.run_once()
+            except Exception:
+                logger.exception("webhook dispatch cycle failed")
+                report = DispatchReport()
+            if report.claimed:
+                logger.info(
+                    "webhooks: %d delivered, %d retried, %d dead", report.delivered, report.retried, report.dead
+                )
+            if report.claimed < self.claim_size:
+                try:
+                    await asyncio.wait_for(stop.wait(), POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+
+def main(argv: list[str] | None = None) -> int:
+    from db.database import get_engine, get_engines
+
+    parser = argparse.ArgumentParser(prog="python -m api.webhooks", description="Deliver queued webhook events.")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="HTTP requests in flight")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="events per POST")
+    parser.add_argument("--once", action="store_true", help="run a single dispatch cycle and exit")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    async def run() -> None:
+        dispatcher = Dispatcher(
+            get_engine(), concurrency=args.concurrency, batch_size=args.batch_size, engines=get_engines()
+        )
+        try:
+            if args.once:
+                report = await dispatcher.run_once()
+                print(f"{report.claimed} claimed, {report.delivered} delivered, {report.retried} retried, {report.dead} dead")
+            else:
+                await dispatcher.run()
+        finally:
+            await dispatcher.aclose()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
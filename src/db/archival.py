@@ -0,0 +1,143 @@
+"""Move superseded FMEA trees out of the hot tables.
+
+Once an FMEA version has been superseded for longer than the configured age,
+its failure modes and their actions, causes, effects and controls are moved
+to the ``*_archive`` tables and the FMEA header is stamped with
+``archived_at``. The header itself stays in ``fmeas`` so version numbers and
+``supersedes_fmea_id`` links are untouched; only the bulky children leave the
+hot tables and their indexes::
+
+    cd src && python -m db.archival --older-than-days 365 --batch-size 200
+
+Work is done in batches of FMEAs, one transaction each, so an interrupted run
+loses at most the batch in flight and simply resumes where it stopped when run
+again. Candidate FMEAs are claimed with ``FOR UPDATE SKIP LOCKED``, so several
+archivers can run side by side. ``--tenant`` limits a run to one tenant's
+FMEAs (see :mod:`db.tenancy`); by default every tenant is archived.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import Table, delete, func, insert, select, text, update
+from sqlalchemy.engine import Connection, Engine
+
+from .models import ARCHIVE_TABLES, FMEA, VERSIONING_SETTING, Action, Control, FailureCause, FailureEffect, FailureMode
+from .tenancy import scope
+
+DEFAULT_AGE = timedelta(days=365)
+DEFAULT_BATCH_SIZE = 200
+
+# Children first: deleting failure modes would otherwise cascade to rows not yet copied
+_CHILD_TABLES = (Action.__table__, FailureCause.__table__, FailureEffect.__table__, Control.__table__)
+
+
+@dataclass
+class ArchiveReport:
+    batches: int = 0
+    fmeas: int = 0
+    rows: dict[str, int] = field(default_factory=dict)
+
+    def add(self, moved: dict[str, int]) -> None:
+        for table, n in moved.items():
+            self.rows[table] = self.rows.get(table, 0) + n
+
+
+def _move(conn: Connection, hot: Table, criteria) -> int:
+    """``DELETE ... RETURNING`` rows matching ``criteria`` straight into the archive table."""
+    cold = ARCHIVE_TABLES[hot.name]
+    names = [c.name for c in hot.columns]
+    moved = delete(hot).where(criteria).returning(*hot.columns).cte(f"moved_{hot.name}")
+    stmt = insert(cold).from_select(names, select(*(moved.c[n] for n in names)))
+    # SQLAlchemy drops the rowcount of statements whose CTE has RETURNING unless asked to keep it
+    return conn.execute(stmt, execution_options={"preserve_rowcount": True}).rowcount
+
+
+def archive_batch(conn: Connection, cutoff: datetime, batch_size: int = DEFAULT_BATCH_SIZE) -> tuple[list[int], dict[str, int]]:
+    """Archive up to ``batch_size`` FMEAs superseded before ``cutoff`` (caller commits)."""
+    fmea_ids = list(
+        conn.scalars(
+            select(FMEA.id)
+            .where(FMEA.status == "superseded", FMEA.archived_at.is_(None), FMEA.updated_at < cutoff)
+            .order_by(FMEA.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+    )
+    if not fmea_ids:
+        return [], {}
+
+    # Moving rows to the archive is neither a change for change-feed subscribers nor a new version
+    conn.execute(text("SET LOCAL fmea.change_feed = off"))
+    conn.execute(text(f"SET LOCAL {VERSIONING_SETTING} = off"))
+    failure_mode_ids = select(FailureMode.id).where(FailureMode.fmea_id.in_(fmea_ids)).scalar_subquery()
+    moved = {table.name: _move(conn, table, table.c.failure_mode_id.in_(failure_mode_ids)) for table in _CHILD_TABLES}
+    moved["failure_modes"] = _move(conn, FailureMode.__table__, FailureMode.fmea_id.in_(fmea_ids))
+    # Core UPDATE without onupdate columns: updated_at keeps recording the last real edit
+    conn.execute(update(FMEA.__table__).where(FMEA.id.in_(fmea_ids)).values(archived_at=func.now()))
+    return fmea_ids, moved
+
+
+def archive_superseded(
+    engine: Engine,
+    older_than: timedelta = DEFAULT_AGE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batches: Optional[int] = None,
+    progress: Optional[Callable[[ArchiveReport], None]] = None,
+    tenant_id: Optional[str] = None,
+) -> ArchiveReport:
+    """Archive superseded trees (of ``tenant_id`` only, if given) in committed batches until none are left."""
+    cutoff = datetime.now(timezone.utc) - older_than
+    report = ArchiveReport()
+    while max_batches is None or report.batches < max_batches:
+        with engine.begin() as conn:
+            if tenant_id is not None:
+                scope(conn, tenant_id)
+            fmea_ids, moved = archive_batch(conn, cutoff, batch_size)
+        if not fmea_ids:
+            break
+        report.batches += 1
+        report.fmeas += len(fmea_ids)
+        report.add(moved)
+        if progress:
+            progress(report)
+    return report
+
+
+def main(argv: list[str] | None = None) -> int:
+    from .database import get_engine
+
+    parser = argparse.ArgumentParser(prog="python -m db.archival", description="Archive superseded FMEA versions.")
+    parser.add_argument("--older-than-days", type=float, default=DEFAULT_AGE.days, help="superseded at least this long ago")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="FMEAs per transaction")
+    parser.add_argument("--max-batches", type=int, default=None, help="stop after this many batches")
+    parser.add_argument("--tenant", default=None, help="archive this tenant's FMEAs only")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+
+    def progress(report: ArchiveReport) -> None:
+        print(f"\r{report.fmeas} fmeas, {sum(report.rows.values())} rows archived", end="", flush=True)
+
+    report = archive_superseded(
+        get_engine(),
+        older_than=timedelta(days=args.older_than_days),
+        batch_size=args.batch_size,
+        max_batches=args.max_batches,
+        progress=progress,
+        tenant_id=args.tenant,
+    )
+    print()
+    for table, n in report.rows.items():
+        print(f"{table:<16} {n:>12}")
+    print(f"{report.fmeas} fmeas in {report.batches} batches, {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
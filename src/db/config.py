@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from typing import Optional
 
 from dotenv import load_dotenv
+from psycopg.conninfo import make_conninfo
 
 # Load environment variables from a local .env if present
 load_dotenv()
@@ -18,6 +19,17 @@ class DBConfig:
     password: str
     database: str
     sslmode: Optional[str] = None
+    # Server-side default for every statement on the engine's connections (None: the server's own)
+    statement_timeout_ms: Optional[int] = None
+    # Seconds a checkout waits for a free pooled connection before giving up
+    pool_timeout: float = 30.0
+
+    @property
+    def connect_args(self) -> dict:
+        if self.statement_timeout_ms is None:
+            return {}
+        # Sent in the startup packet, so it costs no round trip
+        return {"options": f"-c statement_timeout={self.statement_timeout_ms}"}
 
     @property
     def sqlalchemy_url(self) -> str:
@@ -27,6 +39,18 @@ class DBConfig:
             return f"{base}?sslmode={self.sslmode}"
         return base
 
+    @property
+    def conninfo(self) -> str:
+        # libpq connection string for code that talks to psycopg directly (e.g. COPY)
+        return make_conninfo(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            dbname=self.database,
+            sslmode=self.sslmode,
+        )
+
 
 def load_db_config() -> DBConfig:
     return DBConfig(
@@ -36,4 +60,21 @@ def load_db_config() -> DBConfig:
         password=os.getenv("DB_PASSWORD", "postgres"),
         database=os.getenv("DB_NAME", "fmea_tracker"),
         sslmode=os.getenv("DB_SSLMODE") or None,
+        statement_timeout_ms=int(os.environ["DB_STATEMENT_TIMEOUT_MS"]) if os.getenv("DB_STATEMENT_TIMEOUT_MS") else None,
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "30")),
     )
+
+
+def parse_shard(entry: str, base: DBConfig) -> DBConfig:
+    """``dbname`` or ``host[:port]/dbname``; credentials and settings come from ``base``."""
+    location, _, database = entry.strip().rpartition("/")
+    if not database:
+        raise ValueError(f"shard {entry!r} names no database")
+    host, _, port = location.partition(":")
+    return replace(base, host=host or base.host, port=int(port) if port else base.port, database=database)
+
+
+def load_shard_configs(base: DBConfig) -> list[DBConfig]:
+    """The databases after ``base`` in a sharded fleet, from comma-separated ``DB_SHARDS``."""
+    entries = [entry for entry in os.getenv("DB_SHARDS", "").split(",") if entry.strip()]
+    return [parse_shard(entry, base) for entry in entries]
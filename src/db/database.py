@@ -1,27 +1,141 @@
 from __future__ import annotations
 
+import time
 from contextlib import contextmanager
-from typing import Iterator
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, TypeVar
 
-from sqlalchemy import create_engine
+from sqlalchemy import QueuePool, create_engine, event
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.util.queue import Queue
+
+from . import sharding
+from .config import DBConfig, load_db_config, load_shard_configs
+
+T = TypeVar("T")
+
+_pool_wait: ContextVar[float] = ContextVar("fmea_pool_wait", default=0.0)
+
+
+class _TimedQueue(Queue):
+    def get(self, block: bool = True, timeout: Optional[float] = None):
+        started = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        finally:
+            _pool_wait.set(_pool_wait.get() + time.perf_counter() - started)
+
+
+class TimedQueuePool(QueuePool):
+    """A ``QueuePool`` that adds the time checkouts spend queued for an idle connection to :func:`pool_wait`.
+
+    Opening a new connection and the pre-ping are not part of the wait.
+    """
+
+    _queue_class = _TimedQueue
+
+
+def pool_wait() -> float:
+    """Seconds the current context has spent waiting for pooled connections so far."""
+    return _pool_wait.get()
+
+
+def make_engine(config: DBConfig):
+    return create_engine(
+        config.sqlalchemy_url,
+        poolclass=TimedQueuePool,
+        pool_pre_ping=True,
+        pool_timeout=config.pool_timeout,
+        connect_args=config.connect_args,
+        future=True,
+    )
 
-from .config import load_db_config
 
 # Create SQLAlchemy engine and session factory based on environment configuration
 _config = load_db_config()
-_engine = create_engine(_config.sqlalchemy_url, pool_pre_ping=True, future=True)
-_SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True, expire_on_commit=False)
+_engine = make_engine(_config)
+# With DB_SHARDS set, the DB_NAME database is shard 0 and sessions route between all of them
+_engines = (_engine, *(make_engine(shard) for shard in load_shard_configs(_config)))
+if len(_engines) > 1:
+    _SessionLocal = sessionmaker(
+        class_=sharding.FleetSession, router=sharding.Router(len(_engines)), engines=_engines,
+        autoflush=False, autocommit=False, future=True, expire_on_commit=False,
+    )
+else:
+    _SessionLocal = sessionmaker(bind=_engine, autoflush=False, autocommit=False, future=True, expire_on_commit=False)
 
 
 def get_engine():
     return _engine
 
 
+def get_engines():
+    """Every shard's engine, the primary (:func:`get_engine`) first."""
+    return _engines
+
+
+def get_config():
+    return _config
+
+
 def get_session_factory():
     return _SessionLocal
 
 
+_LOCAL_SETTINGS_KEY = "local_settings"
+
+
+def _send_settings(connection, settings: dict[str, str]) -> None:
+    # One statement for all of them; it counts against query budgets like any other
+    calls = ", ".join("set_config(%s, %s, true)" for _ in settings)
+    params = tuple(part for item in settings.items() for part in item)
+    connection.exec_driver_sql(f"SELECT {calls}", params)
+
+
+def set_local(session: Session, name: str, value) -> None:
+    """Apply server setting ``name`` to the current and every later transaction of ``session``, like ``SET LOCAL``."""
+    set_locals(session, {name: value})
+
+
+def set_locals(session: Session, settings: dict[str, object]) -> None:
+    """:func:`set_local` for several settings, sent in one statement."""
+    settings = {name: str(value) for name, value in settings.items()}
+    session.info.setdefault(_LOCAL_SETTINGS_KEY, {}).update(settings)
+    if session.in_transaction():
+        _send_settings(session.connection(), settings)
+
+
+def get_local(session: Session, name: str) -> Optional[str]:
+    return session.info.get(_LOCAL_SETTINGS_KEY, {}).get(name)
+
+
+@event.listens_for(Session, "after_begin")
+def _apply_local_settings(session: Session, transaction, connection) -> None:
+    settings = session.info.get(_LOCAL_SETTINGS_KEY)
+    if settings:
+        _send_settings(connection, settings)
+
+
+def shard_count(session: Session) -> int:
+    return len(session.engines) if isinstance(session, sharding.FleetSession) else 1
+
+
+def scatter(session: Session, fn: Callable[[Connection], T]) -> list[T]:
+    """``fn(connection)`` on every shard of ``session``, in parallel; results in shard order.
+
+    Each shard runs on the session's own connection to it, in the session's
+    transaction: the request holds one connection per shard at most, and what
+    ``fn`` writes commits or rolls back with the session. An unsharded session
+    runs ``fn`` once on its own connection.
+    """
+    if not isinstance(session, sharding.FleetSession):
+        return [fn(session.connection())]
+    # Checked out (and begun, with the session's settings) here: the session is not thread-safe
+    connections = [session.connection(bind_arguments={"shard_id": slot}) for slot in range(len(session.engines))]
+    return sharding.scatter(connections, fn)
+
+
 @contextmanager
 def get_session() -> Iterator[Session]:
     """Provide a transactional scope around a series of operations."""
@@ -0,0 +1,200 @@
+"""Alembic operations that keep the application writing while a migration runs.
+
+Plain ``ALTER TABLE``/``CREATE INDEX`` on a large, busy table is dangerous in
+two ways: building an index or validating a constraint holds a lock that
+blocks writes for as long as the scan takes, and a DDL statement queued behind
+a long-running query blocks every query that arrives after it. New migrations
+that touch existing tables use these helpers instead (revisions that have
+already been applied are left as they shipped)::
+
+    from db.migration_ops import add_foreign_key, create_index_concurrently, with_lock_retry
+
+    def upgrade() -> None:
+        with_lock_retry(lambda: op.add_column("fmeas", sa.Column("site_id", sa.Integer())))
+        create_index_concurrently("ix_fmeas_site_id", "fmeas", ["site_id"])
+        add_foreign_key("fk_fmeas_site_id_sites", "fmeas", "sites", ["site_id"], ["id"])
+
+``create_index_concurrently``
+    ``CREATE INDEX CONCURRENTLY`` in an autocommit block. An invalid index
+    left behind by an interrupted build is dropped and rebuilt.
+``add_unique_constraint``
+    Builds the unique index concurrently, then attaches it as the
+    constraint (``ADD CONSTRAINT ... USING INDEX``, a brief lock).
+``add_foreign_key`` / ``add_check_constraint``
+    Added ``NOT VALID`` (a brief lock, no scan), then ``VALIDATE CONSTRAINT``
+    in its own transaction, which scans under a lock that lets writes through.
+``with_lock_retry``
+    Runs short DDL under ``lock_timeout`` in a savepoint and retries with
+    backoff when the lock is not granted (or a deadlock with application
+    writes is lost), instead of queueing behind other sessions and stalling
+    them.
+
+``alembic/env.py`` runs each migration in its own transaction with
+``lock_timeout`` set to ``MIGRATION_LOCK_TIMEOUT_MS`` (default 1000), so even
+plain operations fail fast rather than stall traffic. Helpers commit part of a
+migration before the rest runs, so they are idempotent: a migration that
+failed halfway is simply run again.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Sequence, TypeVar
+
+import psycopg
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT_ENV = "MIGRATION_LOCK_TIMEOUT_MS"
+LOCK_RETRIES_ENV = "MIGRATION_LOCK_RETRIES"
+# application_name of migration connections, so their lock waits can be told apart
+APPLICATION_NAME = "fmea-migrate"
+
+T = TypeVar("T")
+
+
+def lock_timeout_ms() -> int:
+    return int(os.getenv(LOCK_TIMEOUT_ENV, "1000"))
+
+
+def connect_options() -> str:
+    """libpq ``options`` for migration connections."""
+    return f"-c lock_timeout={lock_timeout_ms()} -c application_name={APPLICATION_NAME}"
+
+
+@contextmanager
+def _session_lock_timeout(bind: Connection, milliseconds: int) -> Iterator[None]:
+    previous = bind.exec_driver_sql("SHOW lock_timeout").scalar_one()
+    bind.exec_driver_sql(f"SET lock_timeout = {int(milliseconds)}")
+    try:
+        yield
+    finally:
+        bind.exec_driver_sql(f"SET lock_timeout = '{previous}'")
+
+
+def _retryable(exc: OperationalError) -> bool:
+    # A deadlock with application writes is lost like a lock timeout: the savepoint is retried
+    return isinstance(exc.orig, (psycopg.errors.LockNotAvailable, psycopg.errors.DeadlockDetected))
+
+
+def with_lock_retry(
+    operation: Callable[[], T],
+    attempts: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+    backoff: float = 0.5,
+) -> T:
+    """Run ``operation`` under ``lock_timeout``, retrying in a fresh savepoint when the lock is not granted
+    or the operation loses a deadlock."""
+    bind = op.get_bind()
+    attempts = attempts or int(os.getenv(LOCK_RETRIES_ENV, "5"))
+    timeout_ms = lock_timeout_ms() if timeout_ms is None else timeout_ms
+    for attempt in range(1, attempts + 1):
+        savepoint = bind.begin_nested()
+        try:
+            bind.exec_driver_sql(f"SET LOCAL lock_timeout = {int(timeout_ms)}")
+            result = operation()
+        except OperationalError as exc:
+            savepoint.rollback()
+            if not _retryable(exc) or attempt == attempts:
+                raise
+            delay = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+            logger.warning("%s (attempt %d/%d); retrying in %.1fs", type(exc.orig).__name__, attempt, attempts, delay)
+            time.sleep(delay)
+        else:
+            savepoint.commit()
+            return result
+    raise AssertionError("unreachable")
+
+
+def _invalid_index_exists(bind: Connection, name: str) -> bool:
+    return bind.execute(
+        sa.text(
+            """
+SELECT EXISTS (
+  SELECT 1 FROM pg_index i
+  JOIN pg_class c ON c.oid = i.indexrelid
+  WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisvalid
+)
+"""
+        ),
+        {"name": name},
+    ).scalar_one()
+
+
+def create_index_concurrently(name: str, table: str, columns: Sequence, **kw) -> None:
+    """``CREATE INDEX CONCURRENTLY IF NOT EXISTS``, replacing an invalid leftover of the same name."""
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        if _invalid_index_exists(bind, name):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        # The build waits out transactions older than it without blocking anyone: no lock timeout
+        with _session_lock_timeout(bind, 0):
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True, **kw)
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def constraint_exists(bind: Connection, table: str, name: str) -> bool:
+    return bind.execute(
+        sa.text(
+            """
+SELECT EXISTS (
+  SELECT 1 FROM pg_constraint c
+  JOIN pg_class t ON t.oid = c.conrelid
+  WHERE t.relname = :table AND t.relnamespace = current_schema()::regnamespace AND c.conname = :name
+)
+"""
+        ),
+        {"table": table, "name": name},
+    ).scalar_one()
+
+
+def add_unique_constraint(name: str, table: str, columns: Sequence[str]) -> None:
+    """A unique constraint backed by an index built concurrently under the same name."""
+    if constraint_exists(op.get_bind(), table, name):
+        return
+    create_index_concurrently(name, table, columns, unique=True)
+    with_lock_retry(lambda: op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE USING INDEX {name}"))
+
+
+def validate_constraint(name: str, table: str) -> None:
+    """``VALIDATE CONSTRAINT`` in its own transaction; its ``SHARE UPDATE EXCLUSIVE`` lock lets writes through."""
+    bind = op.get_bind()
+    with op.get_context().autocommit_block(), _session_lock_timeout(bind, 0):
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def add_foreign_key(
+    name: str,
+    source: str,
+    referent: str,
+    local_cols: list[str],
+    remote_cols: list[str],
+    validate: bool = True,
+    **kw,
+) -> None:
+    """Add a foreign key ``NOT VALID`` and validate existing rows separately."""
+    if not constraint_exists(op.get_bind(), source, name):
+        with_lock_retry(
+            lambda: op.create_foreign_key(name, source, referent, local_cols, remote_cols, postgresql_not_valid=True, **kw)
+        )
+    if validate:
+        validate_constraint(name, source)
+
+
+def add_check_constraint(name: str, table: str, condition: str, validate: bool = True) -> None:
+    """Add a check constraint ``NOT VALID`` and validate existing rows separately."""
+    if not constraint_exists(op.get_bind(), table, name):
+        with_lock_retry(lambda: op.create_check_constraint(name, table, condition, postgresql_not_valid=True))
+    if validate:
+        validate_constraint(name, table)
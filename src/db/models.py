@@ -3,17 +3,27 @@ from __future__ import annotations
 from datetime import datetime
 
 from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Column,
     DateTime,
     Integer,
     String,
     Text,
+    LargeBinary,
     Boolean,
     ForeignKey,
+    Index,
     UniqueConstraint,
+    PrimaryKeyConstraint,
     CheckConstraint,
     Computed,
+    Table,
+    event,
     func,
+    text,
 )
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSTZRANGE, ExcludeConstraint
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy import ForeignKeyConstraint
 
@@ -22,12 +32,52 @@ class Base(DeclarativeBase):
     pass
 
 
+# Multi-tenancy: every tenant-owned row carries ``tenant_id``, filled in from the
+# ``fmea.tenant_id`` setting of the writing transaction. Row-level security limits
+# the ``fmea_tenant`` role, which API requests switch to, to the rows of the
+# transaction's tenant; table owners (workers, CLIs, migrations) see every tenant.
+# The role that creates the schema is granted ``fmea_tenant``, so the API has to
+# connect as that same role. See db.tenancy.
+TENANT_SETTING = "fmea.tenant_id"
+TENANT_ROLE = "fmea_tenant"
+DEFAULT_TENANT = "default"
+
+CURRENT_TENANT_FUNCTION = DDL(f"""
+CREATE OR REPLACE FUNCTION fmea_current_tenant() RETURNS text
+LANGUAGE sql STABLE PARALLEL SAFE
+AS $$ SELECT coalesce(nullif(current_setting('{TENANT_SETTING}', true), ''), '{DEFAULT_TENANT}') $$
+""")
+TENANT_ROLE_DDL = DDL(f"""
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = '{TENANT_ROLE}') THEN
+    CREATE ROLE {TENANT_ROLE} NOLOGIN;
+  END IF;
+  EXECUTE format('GRANT {TENANT_ROLE} TO %%I', current_user);
+  EXECUTE format('GRANT USAGE ON SCHEMA %%I TO {TENANT_ROLE}', current_schema());
+END
+$$
+""")
+event.listen(Base.metadata, "before_create", CURRENT_TENANT_FUNCTION)
+event.listen(Base.metadata, "before_create", TENANT_ROLE_DDL)
+
+
+def tenant_column() -> Mapped[str]:
+    return mapped_column(String(64), nullable=False, server_default=text("fmea_current_tenant()"))
+
+
+def valid_from_column() -> Mapped[datetime]:
+    """Start of the row's current version; restamped by trigger on every update (see VERSION_TABLES)."""
+    return mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+
 class FMEA(Base):
     __tablename__ = "fmeas"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[str] = tenant_column()
     # Correlate an external asset identifier to the FMEA record
-    asset_id: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    asset_id: Mapped[str] = mapped_column(String(64), nullable=False)
     # Optional human-friendly title/identifier for this FMEA
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -52,13 +102,27 @@ class FMEA(Base):
     supersedes_fmea_id: Mapped[int | None] = mapped_column(
         Integer, ForeignKey("fmeas.id", ondelete="SET NULL"), nullable=True, index=True
     )
+    # Set when the version's failure modes and their children were moved to the *_archive tables
+    archived_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Optimistic concurrency token (the ETag of the row); bumped by every update
+    row_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    valid_from: Mapped[datetime] = valid_from_column()
+
+    __mapper_args__ = {"version_id_col": row_version}
 
     __table_args__ = (
-        UniqueConstraint("asset_id", "version", name="uq_fmea_asset_version"),
+        # Indexes lead with tenant_id, so a tenant's queries range over its own rows only
+        UniqueConstraint("tenant_id", "asset_id", "version", name="uq_fmeas_tenant_asset_version"),
+        # Target of the failure modes' (tenant_id, fmea_id) foreign key
+        UniqueConstraint("tenant_id", "id", name="uq_fmeas_tenant_id"),
         CheckConstraint(
             "status IN ('draft','review','approved','superseded')",
             name="ck_fmeas_status_valid",
         ),
+        # Query-language index catalog (see api.filters.INDEX_CATALOG)
+        Index("ix_fmeas_tenant_status", "tenant_id", "status"),
+        Index("ix_fmeas_tenant_created_at_id", "tenant_id", "created_at", "id"),
+        Index("ix_fmeas_tenant_updated_at_id", "tenant_id", "updated_at", "id"),
     )
 
 
@@ -66,10 +130,9 @@ class FailureMode(Base):
     __tablename__ = "failure_modes"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[str] = tenant_column()
     # Link each failure mode to a specific FMEA record (asset + version)
-    fmea_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("fmeas.id", ondelete="CASCADE"), nullable=False, index=True
-    )
+    fmea_id: Mapped[int] = mapped_column(Integer, nullable=False)
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     severity: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
     occurrence: Mapped[int] = mapped_column(Integer, nullable=False, default=1)
@@ -83,12 +146,27 @@ class FailureMode(Base):
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
+    row_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    valid_from: Mapped[datetime] = valid_from_column()
+
+    __mapper_args__ = {"version_id_col": row_version}
 
     __table_args__ = (
+        # Composite, so a failure mode cannot hang off another tenant's FMEA
+        ForeignKeyConstraint(
+            ["tenant_id", "fmea_id"], ["fmeas.tenant_id", "fmeas.id"],
+            name="fk_failure_modes_tenant_fmea", ondelete="CASCADE",
+        ),
+        UniqueConstraint("tenant_id", "id", name="uq_failure_modes_tenant_id"),
         UniqueConstraint("fmea_id", "name", name="uq_failure_mode_fmea_name"),
+        Index("ix_failure_modes_tenant_fmea_id", "tenant_id", "fmea_id"),
         CheckConstraint("severity BETWEEN 1 AND 10", name="ck_failure_modes_severity_range"),
         CheckConstraint("occurrence BETWEEN 1 AND 10", name="ck_failure_modes_occurrence_range"),
         CheckConstraint("detection BETWEEN 1 AND 10", name="ck_failure_modes_detection_range"),
+        # Query-language index catalog (see api.filters.INDEX_CATALOG)
+        Index("ix_failure_modes_tenant_rpn_id", "tenant_id", "rpn", "id"),
+        Index("ix_failure_modes_tenant_severity_detection", "tenant_id", "severity", "detection"),
+        Index("ix_failure_modes_tenant_created_at_id", "tenant_id", "created_at", "id"),
     )
 
     # Relationship to actions (for convenience; not strictly required for tests)
@@ -121,13 +199,20 @@ class FailureMode(Base):
         )
 
 
+def failure_mode_key(table: str) -> ForeignKeyConstraint:
+    """``(tenant_id, failure_mode_id)`` foreign key of a failure mode's child table."""
+    return ForeignKeyConstraint(
+        ["tenant_id", "failure_mode_id"], ["failure_modes.tenant_id", "failure_modes.id"],
+        name=f"fk_{table}_tenant_failure_mode", ondelete="CASCADE",
+    )
+
+
 class Action(Base):
     __tablename__ = "actions"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    failure_mode_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("failure_modes.id", ondelete="CASCADE"), nullable=False, index=True
-    )
+    tenant_id: Mapped[str] = tenant_column()
+    failure_mode_id: Mapped[int] = mapped_column(Integer, nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     owner: Mapped[str | None] = mapped_column(String(255), nullable=True)
     due_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -139,10 +224,16 @@ class Action(Base):
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
     closed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    row_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="1")
+    valid_from: Mapped[datetime] = valid_from_column()
 
     failure_mode: Mapped[FailureMode] = relationship(back_populates="actions")
 
+    __mapper_args__ = {"version_id_col": row_version}
+
     __table_args__ = (
+        failure_mode_key("actions"),
+        Index("ix_actions_tenant_failure_mode_id", "tenant_id", "failure_mode_id"),
         CheckConstraint(
             "status IN ('open','in_progress','closed','deferred')",
             name="ck_actions_status_valid",
@@ -160,16 +251,21 @@ class FailureCause(Base):
     __tablename__ = "failure_causes"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    failure_mode_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("failure_modes.id", ondelete="CASCADE"), nullable=False, index=True
-    )
+    tenant_id: Mapped[str] = tenant_column()
+    failure_mode_id: Mapped[int] = mapped_column(Integer, nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
+    valid_from: Mapped[datetime] = valid_from_column()
 
     failure_mode: Mapped[FailureMode] = relationship(back_populates="causes")
 
+    __table_args__ = (
+        failure_mode_key("failure_causes"),
+        Index("ix_failure_causes_tenant_failure_mode_id", "tenant_id", "failure_mode_id"),
+    )
+
     def __repr__(self) -> str:  # pragma: no cover
         return f"<FailureCause id={self.id} fm_id={self.failure_mode_id}>"
 
@@ -178,18 +274,20 @@ class FailureEffect(Base):
     __tablename__ = "failure_effects"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    failure_mode_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("failure_modes.id", ondelete="CASCADE"), nullable=False, index=True
-    )
+    tenant_id: Mapped[str] = tenant_column()
+    failure_mode_id: Mapped[int] = mapped_column(Integer, nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
     level: Mapped[str | None] = mapped_column(String(32), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
+    valid_from: Mapped[datetime] = valid_from_column()
 
     failure_mode: Mapped[FailureMode] = relationship(back_populates="effects")
 
     __table_args__ = (
+        failure_mode_key("failure_effects"),
+        Index("ix_failure_effects_tenant_failure_mode_id", "tenant_id", "failure_mode_id"),
         CheckConstraint(
             "level IS NULL OR level IN ('local','next_higher','end_user')",
             name="ck_failure_effects_level_valid",
@@ -204,19 +302,21 @@ class Control(Base):
     __tablename__ = "controls"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    failure_mode_id: Mapped[int] = mapped_column(
-        Integer, ForeignKey("failure_modes.id", ondelete="CASCADE"), nullable=False, index=True
-    )
+    tenant_id: Mapped[str] = tenant_column()
+    failure_mode_id: Mapped[int] = mapped_column(Integer, nullable=False)
     type: Mapped[str] = mapped_column(String(16), nullable=False)  # prevention/detection
     description: Mapped[str] = mapped_column(Text, nullable=False)
     method_ref: Mapped[str | None] = mapped_column(String(255), nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, server_default=func.now()
     )
+    valid_from: Mapped[datetime] = valid_from_column()
 
     failure_mode: Mapped[FailureMode] = relationship(back_populates="controls")
 
     __table_args__ = (
+        failure_mode_key("controls"),
+        Index("ix_controls_tenant_failure_mode_id", "tenant_id", "failure_mode_id"),
         CheckConstraint(
             "type IN ('prevention','detection')",
             name="ck_controls_type_valid",
@@ -226,3 +326,865 @@ class Control(Base):
     def __repr__(self) -> str:  # pragma: no cover
         return f"<Control id={self.id} fm_id={self.failure_mode_id} type={self.type}>"
 
+
+class AuditEntry(Base):
+    """One create/update/delete of a row in one of the six FMEA tables."""
+
+    __tablename__ = "audit_log"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[str] = tenant_column()
+    occurred_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Value of the X-User request header; NULL for unattributed changes
+    actor: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    action: Mapped[str] = mapped_column(String(8), nullable=False)
+    table_name: Mapped[str] = mapped_column(String(64), nullable=False)
+    row_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Whole row for create (after) and delete (before); changed columns only for update
+    before: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    after: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("action IN ('create','update','delete')", name="ck_audit_log_action_valid"),
+        Index("ix_audit_log_table_row", "table_name", "row_id", "occurred_at", "id"),
+        Index("ix_audit_log_tenant_actor_occurred_at", "tenant_id", "actor", "occurred_at", "id"),
+    )
+
+    def __repr__(self) -> str:  # pragma: no cover
+        return f"<AuditEntry id={self.id} {self.action} {self.table_name}#{self.row_id} by {self.actor!r}>"
+
+
+class FailureModeRatingHistory(Base):
+    """A failure mode's ratings from the moment they were set; appended by trigger, never updated."""
+
+    __tablename__ = "failure_mode_rating_history"
+
+    # No FK: the history outlives archival and deletion of the failure mode
+    failure_mode_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[str] = tenant_column()
+    severity: Mapped[int] = mapped_column(Integer, nullable=False)
+    occurrence: Mapped[int] = mapped_column(Integer, nullable=False)
+    detection: Mapped[int] = mapped_column(Integer, nullable=False)
+    rpn: Mapped[int] = mapped_column(Integer, nullable=False)
+    recorded_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # The primary key serves one failure mode's history; rows arrive in time order, so
+        # a BRIN index (a few pages for millions of rows) serves fleet-wide time ranges
+        Index(
+            "ix_failure_mode_rating_history_recorded_at", "recorded_at",
+            postgresql_using="brin", postgresql_with={"autosummarize": "on"},
+        ),
+    )
+
+
+# Ratings are recorded in the writing transaction, whoever the writer is. Inserts
+# (seed COPY, clones) are handled per statement from the transition table; updates
+# per row, and only when a rating changed, so renames and status edits cost nothing.
+RECORD_RATINGS_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION failure_mode_record_ratings() RETURNS trigger AS $$
+BEGIN
+  IF TG_LEVEL = 'STATEMENT' THEN
+    INSERT INTO failure_mode_rating_history (tenant_id, failure_mode_id, severity, occurrence, detection, rpn)
+    SELECT n.tenant_id, n.id, n.severity, n.occurrence, n.detection, n.rpn FROM new_rows n;
+  ELSE
+    INSERT INTO failure_mode_rating_history (tenant_id, failure_mode_id, severity, occurrence, detection, rpn)
+    VALUES (NEW.tenant_id, NEW.id, NEW.severity, NEW.occurrence, NEW.detection, NEW.rpn);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+RECORD_RATINGS_TRIGGERS = (
+    "CREATE TRIGGER failure_modes_record_ratings_insert AFTER INSERT ON failure_modes "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION failure_mode_record_ratings()",
+    "CREATE TRIGGER failure_modes_record_ratings_update AFTER UPDATE OF severity, occurrence, detection "
+    "ON failure_modes FOR EACH ROW "
+    "WHEN ((OLD.severity, OLD.occurrence, OLD.detection) IS DISTINCT FROM (NEW.severity, NEW.occurrence, NEW.detection)) "
+    "EXECUTE FUNCTION failure_mode_record_ratings()",
+)
+
+# plpgsql resolves the history table at call time, so the function can precede it
+event.listen(FailureMode.__table__, "after_create", RECORD_RATINGS_FUNCTION)
+for _statement in RECORD_RATINGS_TRIGGERS:
+    event.listen(FailureMode.__table__, "after_create", DDL(_statement))
+
+
+class AssetCurrentFMEA(Base):
+    """Each asset's current FMEA: its latest approved, active version. Maintained by trigger on ``fmeas``."""
+
+    __tablename__ = "asset_current_fmea"
+
+    tenant_id: Mapped[str] = tenant_column()
+    asset_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    fmea_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        PrimaryKeyConstraint("tenant_id", "asset_id", name="pk_asset_current_fmea"),
+        ForeignKeyConstraint(
+            ["tenant_id", "fmea_id"], ["fmeas.tenant_id", "fmeas.id"],
+            name="fk_asset_current_fmea_tenant_fmea", ondelete="CASCADE",
+        ),
+        Index("ix_asset_current_fmea_fmea_id", "fmea_id"),
+    )
+
+
+# The mapping is recomputed for an asset whenever one of its versions may have become
+# or stopped being current: approved, active versions inserted or deleted (per statement,
+# from the transition table) and updates of status, is_active, version or asset_id (per
+# row). Writers of one asset are serialized, so the last to commit reads every version
+# the others committed and the mapping cannot go back to an older one.
+SYNC_CURRENT_FMEA_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION fmea_sync_current(p_tenant text, p_asset text) RETURNS void AS $$
+DECLARE
+  current record;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtextextended('asset_current_fmea/' || p_tenant || '/' || p_asset, 0));
+  SELECT id, version INTO current FROM fmeas
+   WHERE tenant_id = p_tenant AND asset_id = p_asset AND status = 'approved' AND is_active
+   ORDER BY version DESC LIMIT 1;
+  IF NOT FOUND THEN
+    DELETE FROM asset_current_fmea WHERE tenant_id = p_tenant AND asset_id = p_asset;
+  ELSE
+    INSERT INTO asset_current_fmea AS m (tenant_id, asset_id, fmea_id, version)
+    VALUES (p_tenant, p_asset, current.id, current.version)
+    ON CONFLICT (tenant_id, asset_id) DO UPDATE SET fmea_id = excluded.fmea_id, version = excluded.version, updated_at = now()
+    WHERE (m.fmea_id, m.version) IS DISTINCT FROM (excluded.fmea_id, excluded.version);
+  END IF;
+END;
+$$ LANGUAGE plpgsql
+""")
+REFRESH_CURRENT_FMEA_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION fmeas_refresh_current() RETURNS trigger AS $$
+BEGIN
+  IF TG_LEVEL = 'ROW' THEN
+    PERFORM fmea_sync_current(OLD.tenant_id, OLD.asset_id);
+    IF (NEW.tenant_id, NEW.asset_id) IS DISTINCT FROM (OLD.tenant_id, OLD.asset_id) THEN
+      PERFORM fmea_sync_current(NEW.tenant_id, NEW.asset_id);
+    END IF;
+  ELSE
+    -- In key order, so concurrent bulk writers take the asset locks in the same order
+    PERFORM fmea_sync_current(a.tenant_id, a.asset_id) FROM (
+      SELECT DISTINCT tenant_id, asset_id FROM changed_rows WHERE status = 'approved' AND is_active ORDER BY 1, 2
+    ) a;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+REFRESH_CURRENT_FMEA_TRIGGERS = (
+    "CREATE TRIGGER fmeas_refresh_current_insert AFTER INSERT ON fmeas "
+    "REFERENCING NEW TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmeas_refresh_current()",
+    "CREATE TRIGGER fmeas_refresh_current_delete AFTER DELETE ON fmeas "
+    "REFERENCING OLD TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmeas_refresh_current()",
+    "CREATE TRIGGER fmeas_refresh_current_update AFTER UPDATE OF status, is_active, version, asset_id "
+    "ON fmeas FOR EACH ROW "
+    "WHEN ((OLD.status, OLD.is_active, OLD.version, OLD.asset_id) IS DISTINCT FROM "
+    "(NEW.status, NEW.is_active, NEW.version, NEW.asset_id)) "
+    "EXECUTE FUNCTION fmeas_refresh_current()",
+)
+
+# plpgsql resolves asset_current_fmea at call time, so the functions can precede it
+event.listen(FMEA.__table__, "after_create", SYNC_CURRENT_FMEA_FUNCTION)
+event.listen(FMEA.__table__, "after_create", REFRESH_CURRENT_FMEA_FUNCTION)
+for _statement in REFRESH_CURRENT_FMEA_TRIGGERS:
+    event.listen(FMEA.__table__, "after_create", DDL(_statement))
+
+
+class Asset(Base):
+    """A node of the asset hierarchy (site, line, machine, component), keyed by the ``asset_id`` FMEAs name."""
+
+    __tablename__ = "assets"
+
+    tenant_id: Mapped[str] = tenant_column()
+    asset_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    parent_asset_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    name: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    level: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        PrimaryKeyConstraint("tenant_id", "asset_id", name="pk_assets"),
+        # No cascade: a node with children is moved or emptied before it is deleted
+        ForeignKeyConstraint(
+            ["tenant_id", "parent_asset_id"], ["assets.tenant_id", "assets.asset_id"], name="fk_assets_tenant_parent",
+        ),
+        Index("ix_assets_tenant_parent_asset_id", "tenant_id", "parent_asset_id"),
+        CheckConstraint(
+            "level IS NULL OR level IN ('site','line','machine','component')",
+            name="ck_assets_level_valid",
+        ),
+        # The closure trigger rejects cycles on moves; an insert can only close one on itself
+        CheckConstraint("parent_asset_id IS DISTINCT FROM asset_id", name="ck_assets_not_own_parent"),
+    )
+
+
+class AssetClosure(Base):
+    """Every (ancestor, descendant) pair of the hierarchy, each node its own ancestor at depth 0."""
+
+    __tablename__ = "asset_closure"
+
+    tenant_id: Mapped[str] = tenant_column()
+    ancestor_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    descendant_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    depth: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("tenant_id", "ancestor_id", "descendant_id", name="pk_asset_closure"),
+        ForeignKeyConstraint(
+            ["tenant_id", "ancestor_id"], ["assets.tenant_id", "assets.asset_id"],
+            name="fk_asset_closure_tenant_ancestor", ondelete="CASCADE",
+        ),
+        ForeignKeyConstraint(
+            ["tenant_id", "descendant_id"], ["assets.tenant_id", "assets.asset_id"],
+            name="fk_asset_closure_tenant_descendant", ondelete="CASCADE",
+        ),
+        # A node's path to the root, nearest first
+        Index("ix_asset_closure_tenant_descendant_depth", "tenant_id", "descendant_id", "depth"),
+    )
+
+
+class AssetRollup(Base):
+    """Risk of an asset's current FMEA (``own_*``) and of its whole subtree; maintained by trigger."""
+
+    __tablename__ = "asset_rollups"
+
+    tenant_id: Mapped[str] = tenant_column()
+    asset_id: Mapped[str] = mapped_column(String(64), nullable=False)
+    own_max_rpn: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    own_high_ap_modes: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    own_open_actions: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    max_rpn: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    high_ap_modes: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    open_actions: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        PrimaryKeyConstraint("tenant_id", "asset_id", name="pk_asset_rollups"),
+        ForeignKeyConstraint(
+            ["tenant_id", "asset_id"], ["assets.tenant_id", "assets.asset_id"],
+            name="fk_asset_rollups_tenant_asset", ondelete="CASCADE",
+        ),
+    )
+
+
+# Rollups: an asset's own figures come from its current FMEA (see asset_current_fmea);
+# its subtree figures add those of its children's subtrees. A change to an asset's
+# FMEA recomputes its own figures, then the subtree figures of each node on its path
+# to the root, nearest first, each from its direct children. That is a handful of
+# small aggregates per write, whatever the size of the tree, and a rollup read is
+# one row. Writers lock the path root first, so writers under one root take turns
+# and each recomputes from what the previous one committed.
+#
+# High action priority is the H band of the AIAG-VDA action priority table.
+ASSET_ROLLUP_FUNCTIONS = (
+    """
+CREATE OR REPLACE FUNCTION fmea_high_action_priority(s integer, o integer, d integer) RETURNS boolean
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$
+  SELECT (s >= 9 AND (o >= 6 OR (o >= 4 AND d >= 2) OR (o >= 2 AND d >= 7)))
+      OR (s >= 7 AND (o >= 8 OR (o >= 6 AND d >= 2) OR (o >= 4 AND d >= 7)))
+      OR (s >= 4 AND o >= 8 AND d >= 5)
+$$
+""",
+    """
+CREATE OR REPLACE FUNCTION asset_refresh_rollup(p_tenant text, p_asset text) RETURNS void AS $$
+DECLARE
+  node record;
+BEGIN
+  PERFORM 1 FROM asset_rollups r JOIN asset_closure c ON c.tenant_id = r.tenant_id AND c.ancestor_id = r.asset_id
+   WHERE c.tenant_id = p_tenant AND c.descendant_id = p_asset
+   ORDER BY c.depth DESC FOR UPDATE OF r;
+  IF NOT FOUND THEN
+    RETURN;  -- not in the hierarchy
+  END IF;
+  UPDATE asset_rollups r
+     SET own_max_rpn = s.max_rpn, own_high_ap_modes = s.high_ap_modes, own_open_actions = s.open_actions
+    FROM (
+      SELECT max(m.rpn) AS max_rpn,
+             count(m.id) FILTER (WHERE fmea_high_action_priority(m.severity, m.occurrence, m.detection)) AS high_ap_modes,
+             (SELECT count(*) FROM asset_current_fmea cc
+                JOIN failure_modes mm ON mm.fmea_id = cc.fmea_id
+                JOIN actions a ON a.failure_mode_id = mm.id
+               WHERE cc.tenant_id = p_tenant AND cc.asset_id = p_asset AND a.status IN ('open','in_progress')) AS open_actions
+        FROM asset_current_fmea c JOIN failure_modes m ON m.fmea_id = c.fmea_id
+       WHERE c.tenant_id = p_tenant AND c.asset_id = p_asset
+    ) s
+   WHERE r.tenant_id = p_tenant AND r.asset_id = p_asset;
+  FOR node IN
+    SELECT ancestor_id FROM asset_closure WHERE tenant_id = p_tenant AND descendant_id = p_asset ORDER BY depth
+  LOOP
+    UPDATE asset_rollups r
+       SET max_rpn = greatest(r.own_max_rpn, k.max_rpn),
+           high_ap_modes = r.own_high_ap_modes + coalesce(k.high_ap_modes, 0),
+           open_actions = r.own_open_actions + coalesce(k.open_actions, 0),
+           updated_at = now()
+      FROM (
+        SELECT max(cr.max_rpn) AS max_rpn, sum(cr.high_ap_modes) AS high_ap_modes, sum(cr.open_actions) AS open_actions
+          FROM assets child JOIN asset_rollups cr ON cr.tenant_id = child.tenant_id AND cr.asset_id = child.asset_id
+         WHERE child.tenant_id = p_tenant AND child.parent_asset_id = node.ancestor_id
+      ) k
+     WHERE r.tenant_id = p_tenant AND r.asset_id = node.ancestor_id;
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION assets_maintain_closure() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO asset_closure (tenant_id, ancestor_id, descendant_id, depth)
+    SELECT NEW.tenant_id, NEW.asset_id, NEW.asset_id, 0
+    UNION ALL
+    SELECT tenant_id, ancestor_id, NEW.asset_id, depth + 1
+      FROM asset_closure WHERE tenant_id = NEW.tenant_id AND descendant_id = NEW.parent_asset_id;
+    INSERT INTO asset_rollups (tenant_id, asset_id) VALUES (NEW.tenant_id, NEW.asset_id);
+    -- A new leaf adds nothing to its ancestors until it has a current FMEA, which keeps bulk loads cheap
+    IF EXISTS (SELECT 1 FROM asset_current_fmea WHERE tenant_id = NEW.tenant_id AND asset_id = NEW.asset_id) THEN
+      PERFORM asset_refresh_rollup(NEW.tenant_id, NEW.asset_id);
+    END IF;
+  ELSIF TG_OP = 'UPDATE' THEN
+    IF EXISTS (SELECT 1 FROM asset_closure WHERE tenant_id = NEW.tenant_id
+                AND ancestor_id = NEW.asset_id AND descendant_id = NEW.parent_asset_id) THEN
+      RAISE EXCEPTION USING ERRCODE = 'check_violation',
+        MESSAGE = 'asset ' || NEW.asset_id || ' cannot move under its own subtree';
+    END IF;
+    -- Detach the subtree from its old ancestors, then attach it under the new parent
+    DELETE FROM asset_closure d USING asset_closure sub, asset_closure anc
+     WHERE sub.tenant_id = NEW.tenant_id AND sub.ancestor_id = NEW.asset_id
+       AND anc.tenant_id = NEW.tenant_id AND anc.descendant_id = NEW.asset_id AND anc.depth > 0
+       AND d.tenant_id = NEW.tenant_id AND d.ancestor_id = anc.ancestor_id AND d.descendant_id = sub.descendant_id;
+    INSERT INTO asset_closure (tenant_id, ancestor_id, descendant_id, depth)
+    SELECT NEW.tenant_id, anc.ancestor_id, sub.descendant_id, anc.depth + sub.depth + 1
+      FROM asset_closure anc, asset_closure sub
+     WHERE anc.tenant_id = NEW.tenant_id AND anc.descendant_id = NEW.parent_asset_id
+       AND sub.tenant_id = NEW.tenant_id AND sub.ancestor_id = NEW.asset_id;
+    IF OLD.parent_asset_id IS NOT NULL THEN
+      PERFORM asset_refresh_rollup(OLD.tenant_id, OLD.parent_asset_id);
+    END IF;
+    PERFORM asset_refresh_rollup(NEW.tenant_id, NEW.asset_id);
+  ELSIF OLD.parent_asset_id IS NOT NULL THEN
+    -- The node's closure and rollup rows went with it
+    PERFORM asset_refresh_rollup(OLD.tenant_id, OLD.parent_asset_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION asset_current_fmea_refresh_rollup() RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    PERFORM asset_refresh_rollup(OLD.tenant_id, OLD.asset_id);
+  ELSE
+    PERFORM asset_refresh_rollup(NEW.tenant_id, NEW.asset_id);
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+    """
+CREATE OR REPLACE FUNCTION fmea_risk_refresh_rollup() RETURNS trigger AS $$
+DECLARE
+  fmea_ids integer[];
+BEGIN
+  IF TG_LEVEL = 'ROW' AND TG_TABLE_NAME = 'failure_modes' THEN
+    fmea_ids := ARRAY[NEW.fmea_id];
+  ELSIF TG_LEVEL = 'ROW' THEN
+    fmea_ids := ARRAY(SELECT fmea_id FROM failure_modes WHERE id IN (OLD.failure_mode_id, NEW.failure_mode_id));
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    fmea_ids := ARRAY(SELECT DISTINCT fmea_id FROM changed_rows);
+  ELSE
+    fmea_ids := ARRAY(SELECT DISTINCT m.fmea_id FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id);
+  END IF;
+  -- Only current FMEAs count towards the rollups
+  PERFORM asset_refresh_rollup(c.tenant_id, c.asset_id) FROM (
+    SELECT tenant_id, asset_id FROM asset_current_fmea WHERE fmea_id = ANY (fmea_ids) ORDER BY 1, 2
+  ) c;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""",
+)
+ASSET_ROLLUP_TRIGGERS = {
+    "assets": (
+        "CREATE TRIGGER assets_maintain_closure AFTER INSERT OR DELETE ON assets "
+        "FOR EACH ROW EXECUTE FUNCTION assets_maintain_closure()",
+        "CREATE TRIGGER assets_maintain_closure_move AFTER UPDATE OF parent_asset_id ON assets FOR EACH ROW "
+        "WHEN (OLD.parent_asset_id IS DISTINCT FROM NEW.parent_asset_id) EXECUTE FUNCTION assets_maintain_closure()",
+    ),
+    "asset_current_fmea": (
+        "CREATE TRIGGER asset_current_fmea_refresh_rollup AFTER INSERT OR UPDATE OR DELETE ON asset_current_fmea "
+        "FOR EACH ROW EXECUTE FUNCTION asset_current_fmea_refresh_rollup()",
+    ),
+    "failure_modes": (
+        *(
+            f"CREATE TRIGGER failure_modes_refresh_rollup_{op.lower()} AFTER {op} ON failure_modes "
+            f"REFERENCING {transition} TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmea_risk_refresh_rollup()"
+            for op, transition in (("INSERT", "NEW"), ("DELETE", "OLD"))
+        ),
+        "CREATE TRIGGER failure_modes_refresh_rollup_update AFTER UPDATE OF severity, occurrence, detection "
+        "ON failure_modes FOR EACH ROW "
+        "WHEN ((OLD.severity, OLD.occurrence, OLD.detection) IS DISTINCT FROM (NEW.severity, NEW.occurrence, NEW.detection)) "
+        "EXECUTE FUNCTION fmea_risk_refresh_rollup()",
+    ),
+    "actions": (
+        *(
+            f"CREATE TRIGGER actions_refresh_rollup_{op.lower()} AFTER {op} ON actions "
+            f"REFERENCING {transition} TABLE AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION fmea_risk_refresh_rollup()"
+            for op, transition in (("INSERT", "NEW"), ("DELETE", "OLD"))
+        ),
+        "CREATE TRIGGER actions_refresh_rollup_update AFTER UPDATE OF status, failure_mode_id ON actions FOR EACH ROW "
+        "WHEN ((OLD.status, OLD.failure_mode_id) IS DISTINCT FROM (NEW.status, NEW.failure_mode_id)) "
+        "EXECUTE FUNCTION fmea_risk_refresh_rollup()",
+    ),
+}
+
+# plpgsql resolves the asset tables at call time, so the functions can precede them
+for _statement in ASSET_ROLLUP_FUNCTIONS:
+    event.listen(FMEA.__table__, "after_create", DDL(_statement))
+for _table, _statements in ASSET_ROLLUP_TRIGGERS.items():
+    for _statement in _statements:
+        event.listen(Base.metadata.tables[_table], "after_create", DDL(_statement))
+
+
+def _archive_table(table: Table, parent_column: str) -> Table:
+    """Cold copy of ``table``: same columns, no defaults, generated columns or FKs."""
+    columns = [
+        Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False, nullable=c.nullable)
+        for c in table.columns
+    ]
+    name = f"{table.name}_archive"
+    return Table(
+        name,
+        Base.metadata,
+        *columns,
+        Column("archived_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+        Index(f"ix_{name}_{parent_column}", parent_column),
+    )
+
+
+# Superseded FMEA versions keep their header row in ``fmeas`` (so version numbers
+# and supersedes links stay intact) while the bulky child rows move here; see db.archival.
+ARCHIVE_TABLES: dict[str, Table] = {
+    "failure_modes": _archive_table(FailureMode.__table__, "fmea_id"),
+    "actions": _archive_table(Action.__table__, "failure_mode_id"),
+    "failure_causes": _archive_table(FailureCause.__table__, "failure_mode_id"),
+    "failure_effects": _archive_table(FailureEffect.__table__, "failure_mode_id"),
+    "controls": _archive_table(Control.__table__, "failure_mode_id"),
+}
+
+# Archived rows have no FKs, so deleting an FMEA purges its archived tree explicitly
+PURGE_ARCHIVE_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION fmeas_purge_archive() RETURNS trigger AS $$
+BEGIN
+  IF OLD.archived_at IS NOT NULL THEN
+    DELETE FROM actions_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM failure_causes_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM failure_effects_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM controls_archive WHERE failure_mode_id IN (SELECT id FROM failure_modes_archive WHERE fmea_id = OLD.id);
+    DELETE FROM failure_modes_archive WHERE fmea_id = OLD.id;
+  END IF;
+  RETURN OLD;
+END;
+$$ LANGUAGE plpgsql
+""")
+PURGE_ARCHIVE_TRIGGER = DDL("""
+CREATE TRIGGER fmeas_purge_archive AFTER DELETE ON fmeas
+FOR EACH ROW EXECUTE FUNCTION fmeas_purge_archive()
+""")
+event.listen(FMEA.__table__, "after_create", PURGE_ARCHIVE_FUNCTION)
+event.listen(FMEA.__table__, "after_create", PURGE_ARCHIVE_TRIGGER)
+
+
+# Point-in-time reads: each row of the six FMEA tables is current from its
+# ``valid_from``; when it is updated or deleted, the outgoing version is copied
+# to ``<table>_versions`` with the range ``[valid_from, now())`` it was current
+# for. A tree as of a time is then the hot and archived rows current since
+# before it plus the versions whose range contains it; see api.crud.
+# Writers that move rather than change rows (archival) SET fmea.versioning = off.
+VERSIONING_SETTING = "fmea.versioning"
+
+
+def key_range(column):
+    """``[column, column]``: GiST indexes an integer key with the range opclass Postgres ships."""
+    return func.int4range(column, column, text("'[]'"))
+
+
+def _versions_table(table: Table, *keys: str) -> Table:
+    """Past versions of ``table``'s rows: same columns plus ``valid``, GiST-indexed with each key."""
+    columns = [Column(c.name, c.type, nullable=c.nullable) for c in table.columns]
+    name = f"{table.name}_versions"
+    versions = Table(name, Base.metadata, *columns, Column("valid", TSTZRANGE, nullable=False))
+    # Also the (id, valid) index: a row has one version at any time
+    versions.append_constraint(
+        ExcludeConstraint(
+            (key_range(versions.c.id), "&&"), (versions.c.valid, "&&"), name=f"ex_{name}_id_valid", using="gist"
+        )
+    )
+    for key in keys:
+        Index(f"ix_{name}_{key}_valid", key_range(versions.c[key]), versions.c.valid, postgresql_using="gist")
+    return versions
+
+
+VERSION_TABLES: dict[str, Table] = {
+    "fmeas": _versions_table(FMEA.__table__),
+    "failure_modes": _versions_table(FailureMode.__table__, "fmea_id"),
+    "actions": _versions_table(Action.__table__, "failure_mode_id"),
+    "failure_causes": _versions_table(FailureCause.__table__, "failure_mode_id"),
+    "failure_effects": _versions_table(FailureEffect.__table__, "failure_mode_id"),
+    "controls": _versions_table(Control.__table__, "failure_mode_id"),
+}
+# An asset has a handful of FMEA versions; B-tree on the text key, the range filters the rest
+Index("ix_fmeas_versions_asset_id", VERSION_TABLES["fmeas"].c.asset_id)
+
+STAMP_VALID_FROM_FUNCTION = DDL(f"""
+CREATE OR REPLACE FUNCTION fmea_stamp_valid_from() RETURNS trigger AS $$
+BEGIN
+  -- Never backwards: a transaction that started before the last writer's keeps its start
+  IF current_setting('{VERSIONING_SETTING}', true) IS DISTINCT FROM 'off' THEN
+    NEW.valid_from := greatest(now(), OLD.valid_from);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def record_versions_ddl(table: Table) -> list[str]:
+    """The function and triggers copying ``table``'s outgoing row versions to its versions table."""
+    # Columns by name: the hot and versions tables of a migrated database need not share an order
+    names = ", ".join(c.name for c in table.columns)
+    old = ", ".join(f"o.{c.name}" for c in table.columns)
+    function = f"{table.name}_record_versions"
+    # A trigger with transition tables may only handle one event. Versions current for no
+    # time at all (a row written twice in one transaction) are left out.
+    return [
+        f"""CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('{VERSIONING_SETTING}', true) = 'off' THEN
+    RETURN NULL;
+  END IF;
+  INSERT INTO {table.name}_versions ({names}, valid)
+  SELECT {old}, tstzrange(o.valid_from, now()) FROM old_rows o WHERE o.valid_from < now();
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql""",
+        f"CREATE TRIGGER {table.name}_stamp_valid_from BEFORE UPDATE ON {table.name} "
+        f"FOR EACH ROW EXECUTE FUNCTION fmea_stamp_valid_from()",
+        *(
+            f"CREATE TRIGGER {table.name}_record_versions_{op.lower()} AFTER {op} ON {table.name} "
+            f"REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+            for op in ("UPDATE", "DELETE")
+        ),
+    ]
+
+
+event.listen(FMEA.__table__, "after_create", STAMP_VALID_FROM_FUNCTION)
+for _table in VERSION_TABLES:
+    for _statement in record_versions_ddl(Base.metadata.tables[_table]):
+        event.listen(Base.metadata.tables[_table], "after_create", DDL(_statement))
+
+
+# Change feed: every write to the six FMEA tables NOTIFYs ``CHANGE_CHANNEL`` with
+# one compact JSON event per (statement, FMEA); see api.changefeed. Statement-level
+# triggers over transition tables keep bulk writes to one notification per FMEA.
+# Writers that should stay silent (seed, archival) SET fmea.change_feed = off.
+CHANGE_CHANNEL = "fmea_changes"
+CHANGE_FEED_TABLES = ("fmeas", "failure_modes", "actions", "failure_causes", "failure_effects", "controls")
+# Events list the changed ids up to this many; NOTIFY payloads are capped at 8000 bytes
+CHANGE_FEED_MAX_IDS = 200
+
+NOTIFY_CHANGES_FUNCTION = DDL(f"""
+CREATE OR REPLACE FUNCTION fmea_notify_changes() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('fmea.change_feed', true) = 'off' THEN
+    RETURN NULL;
+  END IF;
+  -- Rows whose FMEA or failure mode is gone were cascade-deleted; the parent's event covers them
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    PERFORM pg_notify('{CHANGE_CHANNEL}', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'tenant_id', c.tenant_id, 'fmea_id', c.id,
+                               'asset_id', c.asset_id, 'ids', json_build_array(c.id), 'count', 1) AS e
+      FROM changed_rows c
+    ) events;
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    PERFORM pg_notify('{CHANGE_CHANNEL}', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'tenant_id', f.tenant_id, 'fmea_id', f.id,
+                               'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= {CHANGE_FEED_MAX_IDS} THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN fmeas f ON f.id = c.fmea_id
+      GROUP BY f.id, f.tenant_id, f.asset_id
+    ) events;
+  ELSE
+    PERFORM pg_notify('{CHANGE_CHANNEL}', e::text) FROM (
+      SELECT json_build_object('table', TG_TABLE_NAME, 'op', lower(TG_OP), 'tenant_id', f.tenant_id, 'fmea_id', f.id,
+                               'asset_id', f.asset_id,
+                               'ids', CASE WHEN count(*) <= {CHANGE_FEED_MAX_IDS} THEN json_agg(c.id ORDER BY c.id) END,
+                               'count', count(*)) AS e
+      FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id JOIN fmeas f ON f.id = m.fmea_id
+      GROUP BY f.id, f.tenant_id, f.asset_id
+    ) events;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def notify_changes_triggers(table: str) -> list[str]:
+    """``CREATE TRIGGER`` statements feeding ``table``'s writes to the change feed."""
+    # A trigger with transition tables may only handle one event
+    return [
+        f"CREATE TRIGGER {table}_notify_{op.lower()} AFTER {op} ON {table} "
+        f"REFERENCING {transition} TABLE AS changed_rows "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION fmea_notify_changes()"
+        for op, transition in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    ]
+
+
+event.listen(FMEA.__table__, "after_create", NOTIFY_CHANGES_FUNCTION)
+for _table in CHANGE_FEED_TABLES:
+    for _statement in notify_changes_triggers(_table):
+        event.listen(Base.metadata.tables[_table], "after_create", DDL(_statement))
+
+
+class FMEADocument(Base):
+    """An FMEA tree pre-rendered as the JSON of its tree endpoint; see api.documents."""
+
+    __tablename__ = "fmea_documents"
+
+    fmea_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    tenant_id: Mapped[str] = tenant_column()
+    # Bumped by every write to the tree; a render is only stored if none came in meanwhile
+    generation: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    body: Mapped[bytes | None] = mapped_column(LargeBinary, nullable=True)
+    rendered_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # First write since the body was rendered; NULL while it is current
+    stale_since: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        PrimaryKeyConstraint("fmea_id", name="pk_fmea_documents"),
+        ForeignKeyConstraint(
+            ["tenant_id", "fmea_id"], ["fmeas.tenant_id", "fmeas.id"],
+            name="fk_fmea_documents_tenant_fmea", ondelete="CASCADE",
+        ),
+    )
+
+
+# Documents go stale in the writing transaction, through the same statement-level
+# triggers as the change feed: one upsert per (statement, FMEA), whatever the write.
+# Rendering is left to the next read, so writers never pay for it.
+INVALIDATE_DOCUMENTS_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION fmea_invalidate_documents() RETURNS trigger AS $$
+DECLARE
+  fmea_ids integer[];
+BEGIN
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    fmea_ids := ARRAY(SELECT id FROM changed_rows);
+  ELSIF TG_TABLE_NAME = 'failure_modes' THEN
+    fmea_ids := ARRAY(SELECT DISTINCT fmea_id FROM changed_rows);
+  ELSE
+    fmea_ids := ARRAY(SELECT DISTINCT m.fmea_id FROM changed_rows c JOIN failure_modes m ON m.id = c.failure_mode_id);
+  END IF;
+  -- Deleted FMEAs are not found, and their documents went with them
+  INSERT INTO fmea_documents AS d (fmea_id, tenant_id, generation, stale_since)
+  SELECT id, tenant_id, 1, now() FROM fmeas WHERE id = ANY (fmea_ids) ORDER BY id
+  ON CONFLICT (fmea_id) DO UPDATE SET generation = d.generation + 1, stale_since = coalesce(d.stale_since, now());
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def invalidate_documents_triggers(table: str) -> list[str]:
+    """``CREATE TRIGGER`` statements marking the documents of the FMEAs ``table``'s writes touch stale."""
+    return [
+        f"CREATE TRIGGER {table}_invalidate_documents_{op.lower()} AFTER {op} ON {table} "
+        f"REFERENCING {transition} TABLE AS changed_rows "
+        f"FOR EACH STATEMENT EXECUTE FUNCTION fmea_invalidate_documents()"
+        for op, transition in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD"))
+    ]
+
+
+event.listen(FMEA.__table__, "after_create", INVALIDATE_DOCUMENTS_FUNCTION)
+for _table in CHANGE_FEED_TABLES:
+    for _statement in invalidate_documents_triggers(_table):
+        event.listen(Base.metadata.tables[_table], "after_create", DDL(_statement))
+
+
+class WebhookSubscription(Base):
+    """An external system (CMMS, MES) notified of lifecycle events by HTTP POST."""
+
+    __tablename__ = "webhook_subscriptions"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[str] = tenant_column()
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    # e.g. 'fmea.approved', 'action.closed'; 'fmea.*' matches every FMEA status
+    event_types: Mapped[list[str]] = mapped_column(ARRAY(String(64)), nullable=False)
+    # Signs each delivery (X-FMEA-Signature: sha256=<hmac of the body>)
+    secret: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, server_default="true")
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class WebhookOutbox(Base):
+    """One event awaiting (or done with) delivery to one subscription; see api.webhooks."""
+
+    __tablename__ = "webhook_outbox"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    tenant_id: Mapped[str] = tenant_column()
+    subscription_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("webhook_subscriptions.id", ondelete="CASCADE"), nullable=False
+    )
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    # 'fmea:<id>' / 'action:<id>'; pending events for one entity are coalesced
+    entity_key: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    status: Mapped[str] = mapped_column(String(16), nullable=False, server_default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    # Also the claim lease: a dispatcher pushes it forward while a delivery is in flight
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    delivered_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        CheckConstraint("status IN ('pending','delivered','dead')", name="ck_webhook_outbox_status_valid"),
+        Index(
+            "ix_webhook_outbox_due", "next_attempt_at", "id", postgresql_where=text("status = 'pending'")
+        ),
+        Index("ix_webhook_outbox_subscription_status", "subscription_id", "status", "id"),
+    )
+
+
+class Job(Base):
+    """A long-running operation queued for the background workers; see api.jobs."""
+
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    # Jobs run in the tenant that queued them
+    tenant_id: Mapped[str] = tenant_column()
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    params: Mapped[dict] = mapped_column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    status: Mapped[str] = mapped_column(String(16), nullable=False, server_default="queued")
+    progress_done: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    progress_total: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    result: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # Set by the API; a running job stops at its next progress report
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default="false")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    worker: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+    started_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    # Refreshed by the worker while the job runs; a stale one means the worker died
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('queued','running','succeeded','failed','cancelled')",
+            name="ck_jobs_status_valid",
+        ),
+        Index("ix_jobs_queued", "id", postgresql_where=text("status = 'queued'")),
+        Index("ix_jobs_running_heartbeat", "heartbeat_at", postgresql_where=text("status = 'running'")),
+        Index("ix_jobs_tenant_id", "tenant_id", "id"),
+    )
+
+
+# Transactional outbox: status transitions enqueue one row per matching subscription
+# in the writing transaction, whoever the writer is
+ENQUEUE_WEBHOOKS_FUNCTION = DDL("""
+CREATE OR REPLACE FUNCTION webhook_enqueue_status_change() RETURNS trigger AS $$
+DECLARE
+  kind text := CASE TG_TABLE_NAME WHEN 'fmeas' THEN 'fmea' ELSE 'action' END;
+  event_type text := kind || '.' || NEW.status;
+  payload jsonb;
+BEGIN
+  IF TG_TABLE_NAME = 'fmeas' THEN
+    payload := jsonb_build_object('fmea_id', NEW.id, 'asset_id', NEW.asset_id, 'version', NEW.version,
+                                  'approved_by', NEW.approved_by, 'updated_by', NEW.updated_by);
+  ELSE
+    SELECT jsonb_build_object('action_id', NEW.id, 'failure_mode_id', NEW.failure_mode_id, 'fmea_id', f.id,
+                              'asset_id', f.asset_id, 'owner', NEW.owner, 'closed_at', NEW.closed_at)
+      INTO payload
+      FROM failure_modes m JOIN fmeas f ON f.id = m.fmea_id
+     WHERE m.id = NEW.failure_mode_id;
+  END IF;
+  payload := payload || jsonb_build_object('event', event_type, 'from', OLD.status, 'to', NEW.status, 'changed_at', now());
+  INSERT INTO webhook_outbox (tenant_id, subscription_id, event_type, entity_key, payload)
+  SELECT s.tenant_id, s.id, event_type, kind || ':' || NEW.id, payload
+    FROM webhook_subscriptions s
+   WHERE s.tenant_id = NEW.tenant_id AND s.is_active
+     AND (event_type = ANY (s.event_types) OR kind || '.*' = ANY (s.event_types));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+
+def enqueue_webhooks_trigger(table: str) -> str:
+    return (
+        f"CREATE TRIGGER {table}_webhook_status AFTER UPDATE OF status ON {table} "
+        f"FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status) "
+        f"EXECUTE FUNCTION webhook_enqueue_status_change()"
+    )
+
+
+# plpgsql resolves webhook_outbox at call time, so the function can precede the table
+event.listen(FMEA.__table__, "after_create", ENQUEUE_WEBHOOKS_FUNCTION)
+event.listen(FMEA.__table__, "after_create", DDL(enqueue_webhooks_trigger("fmeas")))
+event.listen(Action.__table__, "after_create", DDL(enqueue_webhooks_trigger("actions")))
+
+
+# Row-level security on every table with a tenant_id (archive tables included). The
+# policy applies to TENANT_ROLE only; table owners keep seeing all tenants.
+TENANT_TABLES = tuple(t.name for t in Base.metadata.sorted_tables if "tenant_id" in t.c)
+
+
+def tenant_isolation_ddl(table: str) -> list[str]:
+    return [
+        f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY",
+        f"CREATE POLICY tenant_isolation ON {table} TO {TENANT_ROLE} "
+        f"USING (tenant_id = fmea_current_tenant()) WITH CHECK (tenant_id = fmea_current_tenant())",
+        f"GRANT SELECT, INSERT, UPDATE, DELETE ON {table} TO {TENANT_ROLE}",
+    ]
+
+
+for _table in TENANT_TABLES:
+    for _statement in tenant_isolation_ddl(_table):
+        event.listen(Base.metadata.tables[_table], "after_create", DDL(_statement))
+event.listen(
+    Base.metadata,
+    "after_create",
+    DDL(f"""
+DO $$
+BEGIN
+  EXECUTE format('GRANT USAGE ON ALL SEQUENCES IN SCHEMA %%I TO {TENANT_ROLE}', current_schema());
+END
+$$
+"""),
+)
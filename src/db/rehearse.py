@@ -0,0 +1,266 @@
+"""Rehearse the migration chain against a large seeded copy before it runs in production.
+
+Creates a scratch database (``<DB_NAME>_rehearsal``), migrates it to head and
+loads a synthetic fleet with :mod:`db.seed`, downgrades it to ``--from``, then
+applies the migrations after that one at a time::
+
+    cd src && python -m db.rehearse --assets 20000 --from 0007 --hold 5
+
+For every step it reports the wall time, how long the migration itself waited
+for locks (sampled from ``pg_stat_activity``), and the latency of a probe that
+keeps writing to ``fmeas`` and ``failure_modes`` the way the application
+does. A step that blocks writes shows up as a probe latency close to its
+duration. ``--hold`` keeps a read transaction open on the hot tables at the
+start of each step, as a long report query would, to check that DDL gives up
+within ``lock_timeout`` and retries instead of stalling the probe.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Optional
+
+import psycopg
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from .config import DBConfig, load_db_config
+from .migration_ops import APPLICATION_NAME
+from .seed import FleetSpec, seed_fleet
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_FROM = "0007"
+SAMPLE_SECONDS = 0.01
+PROBE_SECONDS = 0.02
+HOT_TABLES = ("fmeas", "failure_modes", "actions")
+
+
+@dataclass
+class StepReport:
+    revision: str
+    description: str
+    seconds: float
+    lock_wait_seconds: float
+    probe_writes: int
+    probe_max_ms: float
+    error: Optional[str] = None
+    # Probe writes that failed (a deadlock with the migration, say) and the first error
+    probe_errors: int = 0
+    probe_error: Optional[str] = None
+
+
+def alembic_config(db: DBConfig) -> Config:
+    cfg = Config(str(REPO_ROOT / "alembic.ini"))
+    cfg.set_main_option("script_location", str(REPO_ROOT / "alembic"))
+    cfg.attributes["db_config"] = db
+    return cfg
+
+
+def pending_steps(cfg: Config, from_revision: str) -> list[tuple[str, str]]:
+    """``(revision, description)`` of each migration after ``from_revision``, oldest first."""
+    script = ScriptDirectory.from_config(cfg)
+    steps = [(rev.revision, rev.doc or "") for rev in script.iterate_revisions("heads", from_revision)]
+    return list(reversed(steps))
+
+
+def recreate_database(db: DBConfig) -> None:
+    admin = replace(db, database="postgres")
+    with psycopg.connect(admin.conninfo, autocommit=True) as conn:
+        conn.execute(f'DROP DATABASE IF EXISTS "{db.database}" WITH (FORCE)')
+        conn.execute(f'CREATE DATABASE "{db.database}"')
+
+
+def database_exists(db: DBConfig) -> bool:
+    admin = replace(db, database="postgres")
+    with psycopg.connect(admin.conninfo) as conn:
+        return conn.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db.database,)).fetchone() is not None
+
+
+class StepObserver:
+    """Background threads watching one migration step: lock sampler, write probe and optional long reader."""
+
+    def __init__(self, conninfo: str, hold: float = 0.0) -> None:
+        self.conninfo = conninfo
+        self.hold = hold
+        self._stop = threading.Event()
+        self._held = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.lock_wait = 0.0
+        self.latencies: list[float] = []
+        self.probe_errors = 0
+        self.probe_error: Optional[str] = None
+
+    def __enter__(self) -> "StepObserver":
+        targets = [self._sample, self._probe]
+        if self.hold:
+            targets.append(self._hold_locks)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self.hold:
+            self._held.wait()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _sample(self) -> None:
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            last = time.perf_counter()
+            while not self._stop.is_set():
+                waiting = conn.execute(
+                    "SELECT EXISTS (SELECT 1 FROM pg_stat_activity "
+                    "WHERE application_name = %s AND wait_event_type = 'Lock')",
+                    (APPLICATION_NAME,),
+                ).fetchone()[0]
+                now = time.perf_counter()
+                if waiting:
+                    self.lock_wait += now - last
+                last = now
+                self._stop.wait(SAMPLE_SECONDS)
+
+    def _probe_failed(self, exc: Exception) -> None:
+        self.probe_errors += 1
+        if self.probe_error is None:
+            self.probe_error = f"{type(exc).__name__}: {exc}".splitlines()[0]
+
+    def _probe(self) -> None:
+        try:
+            with psycopg.connect(self.conninfo, autocommit=True) as conn:
+                fmea_id = conn.execute("SELECT max(id) FROM fmeas").fetchone()[0]
+                failure_mode_id = conn.execute("SELECT max(id) FROM failure_modes").fetchone()[0]
+                writes = (
+                    ("UPDATE fmeas SET title = title WHERE id = %s", fmea_id),
+                    ("UPDATE failure_modes SET name = name WHERE id = %s", failure_mode_id),
+                )
+                n = 0
+                while not self._stop.is_set():
+                    sql, row_id = writes[n % len(writes)]
+                    started = time.perf_counter()
+                    try:
+                        conn.execute(sql, (row_id,))
+                    except psycopg.Error as exc:
+                        # What application writes would hit during this step: counted, and the probe goes on
+                        self._probe_failed(exc)
+                    else:
+                        self.latencies.append(time.perf_counter() - started)
+                    n += 1
+                    self._stop.wait(PROBE_SECONDS)
+        except psycopg.Error as exc:
+            self._probe_failed(exc)
+
+    def _hold_locks(self) -> None:
+        with psycopg.connect(self.conninfo) as conn:
+            for table in HOT_TABLES:
+                conn.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            self._held.set()
+            self._stop.wait(self.hold)
+            conn.rollback()
+
+
+def rehearse_step(cfg: Config, db: DBConfig, revision: str, description: str, hold: float = 0.0) -> StepReport:
+    error = None
+    started = time.perf_counter()
+    with StepObserver(db.conninfo, hold) as observer:
+        try:
+            command.upgrade(cfg, revision)
+        except Exception as exc:  # reported, and the rehearsal stops at this step
+            error = f"{type(exc).__name__}: {exc}".splitlines()[0]
+    if error is None and observer.probe_errors:
+        # The step would have failed application writes: that stops the rehearsal too
+        error = f"{observer.probe_errors} probe writes failed, first: {observer.probe_error}"
+    return StepReport(
+        revision=revision,
+        description=description,
+        seconds=time.perf_counter() - started,
+        lock_wait_seconds=observer.lock_wait,
+        probe_writes=len(observer.latencies),
+        probe_max_ms=max(observer.latencies, default=0.0) * 1000,
+        error=error,
+        probe_errors=observer.probe_errors,
+        probe_error=observer.probe_error,
+    )
+
+
+def rehearse(
+    db: DBConfig,
+    spec: FleetSpec,
+    from_revision: str = DEFAULT_FROM,
+    workers: int = 4,
+    reuse: bool = False,
+    hold: float = 0.0,
+    progress=None,
+) -> list[StepReport]:
+    """Seed ``db`` (unless reusing it), roll it back to ``from_revision`` and time each migration after it."""
+    cfg = alembic_config(db)
+    if not (reuse and database_exists(db)):
+        recreate_database(db)
+        command.upgrade(cfg, "heads")
+        seed_fleet(spec, workers=workers, conninfo=db.conninfo)
+    command.downgrade(cfg, from_revision)
+
+    reports = []
+    for revision, description in pending_steps(cfg, from_revision):
+        report = rehearse_step(cfg, db, revision, description, hold)
+        reports.append(report)
+        if progress:
+            progress(report)
+        if report.error:
+            break
+    return reports
+
+
+def format_report(report: StepReport) -> str:
+    line = (
+        f"{report.revision:<8} {report.seconds:>9.2f}s {report.lock_wait_seconds:>9.2f}s "
+        f"{report.probe_writes:>7} {report.probe_max_ms:>10.1f}  {report.description[:60]}"
+    )
+    return f"{line}\n         FAILED: {report.error}" if report.error else line
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m db.rehearse", description="Time each migration against a seeded scratch database."
+    )
+    parser.add_argument("--database", help="scratch database (default: <DB_NAME>_rehearsal); it is dropped and recreated")
+    parser.add_argument("--from", dest="from_revision", default=DEFAULT_FROM, help="revision to roll back to before rehearsing")
+    parser.add_argument("--assets", type=int, default=20000)
+    parser.add_argument("--modes-per-fmea", type=int, default=FleetSpec.modes_per_fmea)
+    parser.add_argument("--seed", type=int, default=FleetSpec.seed)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--reuse", action="store_true", help="keep an existing scratch database instead of reseeding it")
+    parser.add_argument("--hold", type=float, default=0.0, help="seconds a reader holds locks on the hot tables per step")
+    parser.add_argument("--output", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    base = load_db_config()
+    db = replace(base, database=args.database or f"{base.database}_rehearsal")
+    spec = FleetSpec(seed=args.seed, assets=args.assets, modes_per_fmea=args.modes_per_fmea)
+
+    print(f"Rehearsing migrations after {args.from_revision} on {db.database} ({spec.assets} assets)")
+    print(f"{'step':<8} {'duration':>10} {'lock wait':>10} {'writes':>7} {'max write':>10}  description")
+    reports = rehearse(
+        db,
+        spec,
+        from_revision=args.from_revision,
+        workers=args.workers,
+        reuse=args.reuse,
+        hold=args.hold,
+        progress=lambda report: print(format_report(report), flush=True),
+    )
+    if args.output:
+        Path(args.output).write_text(json.dumps([asdict(r) for r in reports], indent=2))
+    return 1 if any(r.error for r in reports) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
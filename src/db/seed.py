@@ -0,0 +1,358 @@
+"""Deterministic synthetic fleet generator for scale testing.
+
+Generates assets with FMEA version chains (``supersedes_fmea_id``), failure
+modes with realistic rating distributions and their actions, causes, effects
+and controls, then bulk loads them with binary ``COPY`` from several worker
+processes::
+
+    cd src && python -m db.seed --assets 100000 --modes-per-fmea 40 --workers 8
+
+The fleet is split into chunks of assets. Each chunk draws from its own RNG
+seeded with ``(seed, chunk)``, so a given seed always produces the same fleet
+no matter how many workers load it (ids are offset by existing rows). FMEA and failure mode ids are reserved up
+front from their sequences and assigned per chunk, which lets workers write
+child rows without round trips to learn parent ids. The fleet belongs to
+``--tenant`` (``default`` unless given); seeding the same spec into several
+tenants gives each the same assets.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+import psycopg
+
+from .config import load_db_config
+from .models import DEFAULT_TENANT, TENANT_SETTING
+
+FLEET_START = datetime(2018, 1, 1, tzinfo=timezone.utc)
+
+COMPONENTS = (
+    "Pump", "Motor", "Gearbox", "Bearing", "Valve", "Seal", "Coupling", "Conveyor belt", "Compressor",
+    "Heat exchanger", "PLC", "Sensor", "Hydraulic cylinder", "Fan", "Spindle", "Weld head", "Robot arm",
+)
+FAILURES = (
+    "overheating", "vibration", "leakage", "wear", "misalignment", "corrosion", "fatigue crack",
+    "electrical short", "loss of signal", "blockage", "seizure", "cavitation", "loosening", "contamination",
+)
+CAUSES = (
+    "Insufficient lubrication", "Operator error during changeover", "Supplier material defect",
+    "Inadequate preventive maintenance interval", "Thermal cycling", "Ingress of dust and moisture",
+    "Incorrect torque at assembly", "Firmware fault", "Overload beyond rated capacity",
+)
+EFFECTS = (
+    "Unplanned line stop", "Scrap of work in progress", "Reduced throughput", "Safety hazard to operator",
+    "Customer delivery delay", "Secondary damage to adjacent equipment", "Quality escape to customer",
+)
+CONTROLS = (
+    "Vibration monitoring", "Thermographic inspection", "Oil analysis", "Torque audit", "Poka-yoke fixture",
+    "Visual inspection per shift", "Condition-based maintenance alert", "End-of-line functional test",
+)
+ACTIONS = (
+    "Shorten PM interval", "Install condition monitoring sensor", "Update work instruction",
+    "Qualify alternate supplier", "Retrain operators", "Redesign bracket", "Add spare to stores",
+)
+OWNERS = tuple(f"{n}@plant.example.com" for n in ("reliability", "maintenance", "quality", "process", "controls"))
+
+# Weights for ratings 1..10. Severity skews high, occurrence low, detection mid.
+SEVERITY_WEIGHTS = (1, 2, 3, 5, 7, 9, 10, 9, 6, 3)
+OCCURRENCE_WEIGHTS = (8, 12, 14, 13, 10, 7, 5, 3, 2, 1)
+DETECTION_WEIGHTS = (2, 4, 6, 9, 11, 11, 9, 7, 5, 3)
+RATINGS = tuple(range(1, 11))
+
+LATEST_STATUS = (("approved", 60), ("review", 15), ("draft", 25))
+ACTION_STATUS_ACTIVE = (("open", 35), ("in_progress", 25), ("closed", 30), ("deferred", 10))
+ACTION_STATUS_SUPERSEDED = (("open", 2), ("in_progress", 3), ("closed", 85), ("deferred", 10))
+EFFECT_LEVELS = ("local", "next_higher", "end_user", None)
+
+FMEA_COLUMNS = (
+    "id", "asset_id", "title", "description", "version", "is_active", "status", "approved_by", "approved_at",
+    "effective_date", "created_by", "updated_by", "supersedes_fmea_id", "created_at", "updated_at", "valid_from",
+)
+FMEA_TYPES = (
+    "int4", "text", "text", "text", "int4", "bool", "text", "text", "timestamptz",
+    "timestamptz", "text", "text", "int4", "timestamptz", "timestamptz", "timestamptz",
+)
+FAILURE_MODE_COLUMNS = ("id", "fmea_id", "name", "severity", "occurrence", "detection", "created_at", "valid_from")
+FAILURE_MODE_TYPES = ("int4", "int4", "text", "int4", "int4", "int4", "timestamptz", "timestamptz")
+ACTION_COLUMNS = (
+    "failure_mode_id", "description", "owner", "due_date", "status", "notes", "created_at", "closed_at", "valid_from",
+)
+ACTION_TYPES = ("int4", "text", "text", "timestamptz", "text", "text", "timestamptz", "timestamptz", "timestamptz")
+CAUSE_COLUMNS = ("failure_mode_id", "description", "created_at", "valid_from")
+CAUSE_TYPES = ("int4", "text", "timestamptz", "timestamptz")
+EFFECT_COLUMNS = ("failure_mode_id", "description", "level", "created_at", "valid_from")
+EFFECT_TYPES = ("int4", "text", "text", "timestamptz", "timestamptz")
+CONTROL_COLUMNS = ("failure_mode_id", "type", "description", "method_ref", "created_at", "valid_from")
+CONTROL_TYPES = ("int4", "text", "text", "text", "timestamptz", "timestamptz")
+
+
+@dataclass(frozen=True)
+class FleetSpec:
+    seed: int = 42
+    assets: int = 1000
+    max_versions: int = 4
+    modes_per_fmea: int = 40
+    chunk_size: int = 200
+    asset_prefix: str = "SYN"
+    tenant_id: str = DEFAULT_TENANT
+
+    @property
+    def chunks(self) -> int:
+        return (self.assets + self.chunk_size - 1) // self.chunk_size
+
+    def chunk_assets(self, chunk: int) -> range:
+        start = chunk * self.chunk_size
+        return range(start, min(start + self.chunk_size, self.assets))
+
+
+@dataclass(frozen=True)
+class ChunkPlan:
+    chunk: int
+    # Per asset, the number of failure modes of each version (oldest first)
+    modes: tuple[tuple[int, ...], ...]
+
+    @property
+    def fmea_count(self) -> int:
+        return sum(len(v) for v in self.modes)
+
+    @property
+    def failure_mode_count(self) -> int:
+        return sum(sum(v) for v in self.modes)
+
+
+@dataclass
+class ChunkRows:
+    fmeas: list[tuple]
+    failure_modes: list[tuple]
+    actions: list[tuple]
+    failure_causes: list[tuple]
+    failure_effects: list[tuple]
+    controls: list[tuple]
+
+    def counts(self) -> dict[str, int]:
+        return {name: len(rows) for name, rows in vars(self).items()}
+
+
+def _rng(spec: FleetSpec, purpose: str, chunk: int) -> random.Random:
+    return random.Random(f"{spec.seed}:{purpose}:{chunk}")
+
+
+def _weighted(rng: random.Random, options: tuple[tuple[object, int], ...]):
+    return rng.choices([o for o, _ in options], weights=[w for _, w in options])[0]
+
+
+def plan_chunk(spec: FleetSpec, chunk: int) -> ChunkPlan:
+    rng = _rng(spec, "plan", chunk)
+    modes = []
+    for _ in spec.chunk_assets(chunk):
+        versions = rng.randint(1, spec.max_versions)
+        low, high = max(1, spec.modes_per_fmea // 2), max(1, spec.modes_per_fmea * 3 // 2)
+        modes.append(tuple(rng.randint(low, high) for _ in range(versions)))
+    return ChunkPlan(chunk=chunk, modes=tuple(modes))
+
+
+def generate_chunk(spec: FleetSpec, plan: ChunkPlan, fmea_id_base: int, failure_mode_id_base: int) -> ChunkRows:
+    """Build every row of a chunk; ids start at the given bases and are contiguous."""
+    rng = _rng(spec, "rows", plan.chunk)
+    rows = ChunkRows([], [], [], [], [], [])
+    fmea_id = fmea_id_base
+    fm_id = failure_mode_id_base
+
+    for asset_index, version_modes in zip(spec.chunk_assets(plan.chunk), plan.modes):
+        asset_id = f"{spec.asset_prefix}-{asset_index:07d}"
+        component = rng.choice(COMPONENTS)
+        versions = len(version_modes)
+        latest_status = _weighted(rng, LATEST_STATUS)
+        created = FLEET_START + timedelta(days=rng.randint(0, 365 * 3), seconds=rng.randint(0, 86399))
+        previous_id: Optional[int] = None
+
+        for version, mode_count in enumerate(version_modes, start=1):
+            is_latest = version == versions
+            if is_latest:
+                status = latest_status
+            elif version == versions - 1 and latest_status != "approved":
+                # The newest approved version stays in force until its successor is approved
+                status = "approved"
+            else:
+                status = "superseded"
+            approved_at = effective = approved_by = None
+            if status in ("approved", "superseded"):
+                approved_at = created + timedelta(days=rng.randint(5, 60))
+                effective = approved_at + timedelta(days=rng.randint(0, 14))
+                approved_by = rng.choice(OWNERS)
+            author = rng.choice(OWNERS)
+            updated = approved_at or created + timedelta(days=rng.randint(0, 30))
+            rows.fmeas.append(
+                (
+                    fmea_id, asset_id, f"{component} FMEA {asset_id} v{version}",
+                    f"Process FMEA for {component.lower()} on asset {asset_id}, revision {version}.",
+                    version, is_latest or status == "approved", status, approved_by, approved_at,
+                    effective, author, author, previous_id, created, updated, created,
+                )
+            )
+
+            superseded = status == "superseded"
+            for j in range(mode_count):
+                fm_created = created + timedelta(minutes=j)
+                rows.failure_modes.append(
+                    (
+                        fm_id, fmea_id, f"{rng.choice(COMPONENTS)} {rng.choice(FAILURES)} #{j + 1}",
+                        rng.choices(RATINGS, SEVERITY_WEIGHTS)[0],
+                        rng.choices(RATINGS, OCCURRENCE_WEIGHTS)[0],
+                        rng.choices(RATINGS, DETECTION_WEIGHTS)[0],
+                        fm_created, fm_created,
+                    )
+                )
+                for _ in range(rng.choices((0, 1, 2, 3), (30, 40, 20, 10))[0]):
+                    action_status = _weighted(rng, ACTION_STATUS_SUPERSEDED if superseded else ACTION_STATUS_ACTIVE)
+                    due = fm_created + timedelta(days=rng.randint(14, 180))
+                    closed_at = due - timedelta(days=rng.randint(0, 13)) if action_status == "closed" else None
+                    notes = rng.choice((None, None, f"Tracked in CMMS work order WO-{rng.randint(10000, 99999)}."))
+                    rows.actions.append(
+                        (
+                            fm_id, rng.choice(ACTIONS), rng.choice(OWNERS), due, action_status, notes,
+                            fm_created, closed_at, fm_created,
+                        )
+                    )
+                for _ in range(rng.randint(1, 3)):
+                    rows.failure_causes.append((fm_id, rng.choice(CAUSES), fm_created, fm_created))
+                for _ in range(rng.randint(1, 2)):
+                    effect = rng.choice(EFFECTS)
+                    rows.failure_effects.append((fm_id, effect, rng.choice(EFFECT_LEVELS), fm_created, fm_created))
+                for _ in range(rng.randint(1, 2)):
+                    control_type = rng.choice(("prevention", "detection"))
+                    method_ref = rng.choice((None, f"SOP-{rng.randint(100, 999)}"))
+                    rows.controls.append((fm_id, control_type, rng.choice(CONTROLS), method_ref, fm_created, fm_created))
+                fm_id += 1
+
+            previous_id = fmea_id
+            fmea_id += 1
+            created = (effective or updated) + timedelta(days=rng.randint(90, 400))
+
+    return rows
+
+
+def _copy(cur: psycopg.Cursor, table: str, columns: tuple[str, ...], types: tuple[str, ...], rows: list[tuple]) -> None:
+    with cur.copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.set_types(list(types))
+        for row in rows:
+            copy.write_row(row)
+
+
+def load_chunk(conninfo: str, spec: FleetSpec, plan: ChunkPlan, fmea_id_base: int, failure_mode_id_base: int) -> dict[str, int]:
+    """Generate and COPY one chunk in its own transaction."""
+    rows = generate_chunk(spec, plan, fmea_id_base, failure_mode_id_base)
+    with psycopg.connect(conninfo) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = off")
+            # Synthetic bulk loads are not news for change-feed subscribers
+            cur.execute("SET fmea.change_feed = off")
+            # tenant_id columns are left to their default, which reads this setting
+            cur.execute("SELECT set_config(%s, %s, false)", (TENANT_SETTING, spec.tenant_id))
+            _copy(cur, "fmeas", FMEA_COLUMNS, FMEA_TYPES, rows.fmeas)
+            _copy(cur, "failure_modes", FAILURE_MODE_COLUMNS, FAILURE_MODE_TYPES, rows.failure_modes)
+            _copy(cur, "actions", ACTION_COLUMNS, ACTION_TYPES, rows.actions)
+            _copy(cur, "failure_causes", CAUSE_COLUMNS, CAUSE_TYPES, rows.failure_causes)
+            _copy(cur, "failure_effects", EFFECT_COLUMNS, EFFECT_TYPES, rows.failure_effects)
+            _copy(cur, "controls", CONTROL_COLUMNS, CONTROL_TYPES, rows.controls)
+    return rows.counts()
+
+
+def _reserve_ids(cur: psycopg.Cursor, table: str, count: int) -> int:
+    """Advance the id sequence of ``table`` by ``count`` and return the first reserved id."""
+    cur.execute(
+        """
+        SELECT setval(seq, greatest(nextval(seq), (SELECT coalesce(max(id), 0) + 1 FROM {table})) + %s - 1)
+               - %s + 1
+        FROM pg_get_serial_sequence(%s, 'id') AS seq
+        """.format(table=table),
+        (count, count, table),
+    )
+    return cur.fetchone()[0]
+
+
+def _assign_bases(plans: list[ChunkPlan], fmea_base: int, failure_mode_base: int) -> Iterator[tuple[ChunkPlan, int, int]]:
+    for plan in plans:
+        yield plan, fmea_base, failure_mode_base
+        fmea_base += plan.fmea_count
+        failure_mode_base += plan.failure_mode_count
+
+
+def seed_fleet(spec: FleetSpec, workers: int = 4, conninfo: Optional[str] = None, progress=None) -> dict[str, int]:
+    """Generate and load the fleet described by ``spec``; returns row counts per table."""
+    conninfo = conninfo or load_db_config().conninfo
+    plans = [plan_chunk(spec, chunk) for chunk in range(spec.chunks)]
+    with psycopg.connect(conninfo) as conn, conn.cursor() as cur:
+        fmea_base = _reserve_ids(cur, "fmeas", sum(p.fmea_count for p in plans))
+        failure_mode_base = _reserve_ids(cur, "failure_modes", sum(p.failure_mode_count for p in plans))
+    jobs = list(_assign_bases(plans, fmea_base, failure_mode_base))
+
+    totals: dict[str, int] = {}
+
+    def add(counts: dict[str, int]) -> None:
+        for table, n in counts.items():
+            totals[table] = totals.get(table, 0) + n
+        if progress:
+            progress(totals)
+
+    if workers <= 1:
+        for plan, fb, fmb in jobs:
+            add(load_chunk(conninfo, spec, plan, fb, fmb))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(load_chunk, conninfo, spec, plan, fb, fmb) for plan, fb, fmb in jobs]
+            for future in futures:
+                add(future.result())
+
+    with psycopg.connect(conninfo, autocommit=True) as conn:
+        for table in totals:
+            conn.execute(f"ANALYZE {table}")
+    return totals
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m db.seed", description="Load a deterministic synthetic FMEA fleet.")
+    parser.add_argument("--seed", type=int, default=FleetSpec.seed)
+    parser.add_argument("--assets", type=int, default=FleetSpec.assets)
+    parser.add_argument("--max-versions", type=int, default=FleetSpec.max_versions)
+    parser.add_argument("--modes-per-fmea", type=int, default=FleetSpec.modes_per_fmea, help="mean failure modes per FMEA")
+    parser.add_argument("--chunk-size", type=int, default=FleetSpec.chunk_size, help="assets per worker task")
+    parser.add_argument("--asset-prefix", default=FleetSpec.asset_prefix)
+    parser.add_argument("--tenant", default=FleetSpec.tenant_id, help="tenant the fleet belongs to")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    spec = FleetSpec(
+        seed=args.seed,
+        assets=args.assets,
+        max_versions=args.max_versions,
+        modes_per_fmea=args.modes_per_fmea,
+        chunk_size=args.chunk_size,
+        asset_prefix=args.asset_prefix,
+        tenant_id=args.tenant,
+    )
+    started = time.perf_counter()
+
+    def progress(totals: dict[str, int]) -> None:
+        rows = sum(totals.values())
+        rate = rows / (time.perf_counter() - started) * 60
+        print(f"\r{totals.get('fmeas', 0)} fmeas, {rows} rows ({rate / 1e6:.2f}M rows/min)", end="", flush=True)
+
+    totals = seed_fleet(spec, workers=args.workers, progress=progress)
+    elapsed = time.perf_counter() - started
+    print()
+    for table, n in totals.items():
+        print(f"{table:<16} {n:>12}")
+    print(f"{sum(totals.values())} rows in {elapsed:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+"""Spreading the fleet over several Postgres databases, one shard per slot.
+
+FMEA trees are placed by ``asset_id`` on a consistent-hash ring: every asset
+lives on one shard with all of its FMEA versions, failure modes and their
+children, so a tree never spans databases and adding a shard moves only the
+assets the new shard takes over. Row ids carry their shard: the id sequences
+on slot ``n`` hand out ``n + 1, n + 1 + SHARD_SLOTS, ...`` (:func:`tag_ids`),
+so ``/failure-modes/{id}`` and children created under a parent id are routed
+without a lookup. The asset hierarchy is copied to every shard, which rolls
+up its own FMEAs (see :func:`api.crud.upsert_asset`), and so are webhook
+subscriptions, which each shard's outbox trigger matches its status changes
+against (see :mod:`api.webhooks`). Everything else (the job queue, audit
+log) stays on slot 0, the database named by ``DB_NAME``; job workers run
+each job on the shards it covers (see :mod:`api.jobs`).
+
+Sessions from :func:`db.database.get_session_factory` are :class:`FleetSession`
+when ``DB_SHARDS`` lists more databases::
+
+    DB_NAME=fmea_s0 DB_SHARDS=fmea_s1,10.0.0.7:5432/fmea_s2
+
+New objects go to their shard on flush, and a statement runs on the shards
+its ``id``/``fmea_id``/``failure_mode_id``/``asset_id`` criteria point to, or
+on every shard when it has none (results are concatenated). Fleet-wide reads
+that need an order or a total use :func:`scatter` instead, which queries the
+shards in parallel so the slowest shard sets the latency, and merge the
+per-shard results themselves.
+
+Shards are migrated and their sequences tagged with::
+
+    cd src && python -m db.sharding migrate
+
+Sharding has to be set up before data is loaded: ids allocated by an
+untagged sequence do not name their shard, and moving assets between shards
+(rebalancing) is not supported.
+"""
+from __future__ import annotations
+
+import argparse
+import bisect
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Optional, Sequence, TypeVar
+
+from sqlalchemy import Insert, Table, create_engine, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Mapper
+from sqlalchemy.sql import operators, visitors
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+from sqlalchemy.sql.selectable import Subquery
+
+from .models import (
+    ARCHIVE_TABLES, FMEA, VERSION_TABLES, Action, AssetCurrentFMEA, Control, FailureCause, FailureEffect, FailureMode,
+    FailureModeRatingHistory, FMEADocument, WebhookOutbox,
+)
+
+T = TypeVar("T")
+
+# Id stride, and so the most shards a fleet can have
+SHARD_SLOTS = 16
+PRIMARY = 0
+# Ring points per shard; more points even out the share of assets each shard gets
+VNODES = 64
+
+# Tables whose rows live on their asset's shard
+SHARDED_MODELS = (FMEA, FailureMode, Action, FailureCause, FailureEffect, Control)
+SHARDED_TABLES = frozenset(
+    [model.__tablename__ for model in SHARDED_MODELS]
+    + [table.name for table in ARCHIVE_TABLES.values()]
+    + [table.name for table in VERSION_TABLES.values()]
+    + [FailureModeRatingHistory.__tablename__, AssetCurrentFMEA.__tablename__, FMEADocument.__tablename__]
+)
+# Tables whose ids name their shard: the sharded models, and the outboxes so event ids are unique fleet-wide
+TAGGED_MODELS = (*SHARDED_MODELS, WebhookOutbox)
+_PARENT_KEYS = {FMEA: "asset_id", FailureMode: "fmea_id"}
+_ID_COLUMNS = ("id", "fmea_id", "failure_mode_id")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto shard slots."""
+
+    def __init__(self, slots: Sequence[int], vnodes: int = VNODES) -> None:
+        points = sorted((_hash(f"shard-{slot}#{vnode}"), slot) for slot in slots for vnode in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._slots = [slot for _, slot in points]
+
+    def slot_for(self, key: str) -> int:
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._slots[index]
+
+
+class Router:
+    """Which shard a row, an object or a statement belongs to."""
+
+    def __init__(self, shard_count: int) -> None:
+        if not 1 <= shard_count <= SHARD_SLOTS:
+            raise ValueError(f"a fleet has 1 to {SHARD_SLOTS} shards, not {shard_count}")
+        self.shard_count = shard_count
+        self.ring = HashRing(range(shard_count))
+
+    def for_asset(self, asset_id: str) -> int:
+        return self.ring.slot_for(asset_id)
+
+    def for_id(self, row_id: int) -> int:
+        slot = (row_id - 1) % SHARD_SLOTS
+        # An id no shard could have handed out exists nowhere; looking on the primary finds nothing
+        return slot if self.shard_count > 1 and slot < self.shard_count else PRIMARY
+
+    def _for_key(self, column: str, value: Any) -> int:
+        return self.for_asset(value) if column == "asset_id" else self.for_id(value)
+
+    def for_statement(self, statement) -> list[int]:
+        """The shards ``statement`` has to run on."""
+        tables, slots = set(), set()
+        for element in _elements(statement):
+            if isinstance(element, Table):
+                tables.add(element.name)
+            elif isinstance(element, BinaryExpression):
+                key = _routing_key(element)
+                if key is not None:
+                    column, values = key
+                    slots.update(self._for_key(column, value) for value in values if value is not None)
+        if isinstance(statement, Insert) and statement.table.name in SHARDED_TABLES:
+            params = statement.compile().params
+            slots.update(self._for_key(column, params[column]) for column in _ID_COLUMNS + ("asset_id",)
+                         if params.get(column) is not None)
+        if not tables & SHARDED_TABLES:
+            return [PRIMARY]
+        return sorted(slots) if slots else list(range(self.shard_count))
+
+    def shard_chooser(self, mapper: Optional[Mapper], instance: Any, clause=None, **kw) -> int:
+        model = None if mapper is None else mapper.class_
+        if model not in SHARDED_MODELS:
+            return PRIMARY if clause is None else self.for_statement(clause)[0]
+        if instance is None:
+            return PRIMARY
+        if instance.id is not None:
+            return self.for_id(instance.id)
+        parent = _PARENT_KEYS.get(model, "failure_mode_id")
+        return self._for_key(parent, getattr(instance, parent))
+
+    def identity_chooser(self, mapper: Mapper, primary_key, **kw) -> list[int]:
+        if mapper.class_ in SHARDED_MODELS:
+            return [self.for_id(primary_key[0])]
+        return [PRIMARY]
+
+    def execute_chooser(self, orm_context) -> list[int]:
+        return self.for_statement(orm_context.statement)
+
+
+def _elements(statement) -> Iterator[Any]:
+    # visitors.iterate does not follow a column to the subquery it comes from
+    # (``UPDATE ... FROM (SELECT ...) AS old``), so subqueries are walked too
+    pending, seen = [statement], set()
+    while pending:
+        for element in visitors.iterate(pending.pop()):
+            yield element
+            source = getattr(element, "table", None)
+            if isinstance(source, Subquery) and id(source) not in seen:
+                seen.add(id(source))
+                pending.append(source.element)
+
+
+def _routing_key(expression: BinaryExpression) -> Optional[tuple[str, list]]:
+    """``(column, values)`` for ``column = value`` / ``column IN (...)`` on a sharded table."""
+    column, value = expression.left, expression.right
+    table = getattr(column, "table", None)
+    if (
+        not isinstance(table, Table)
+        or table.name not in SHARDED_TABLES
+        or column.key not in _ID_COLUMNS + ("asset_id",)
+        or not isinstance(value, BindParameter)
+    ):
+        return None
+    if expression.operator is operators.eq:
+        return column.key, [value.effective_value]
+    if expression.operator is operators.in_op:
+        return column.key, list(value.effective_value)
+    return None
+
+
+class FleetSession(ShardedSession):
+    """A session over every shard, routing each statement and flush with a :class:`Router`."""
+
+    def __init__(self, router: Router, engines: Sequence[Engine], **kw) -> None:
+        super().__init__(
+            shard_chooser=router.shard_chooser,
+            identity_chooser=router.identity_chooser,
+            execute_chooser=router.execute_chooser,
+            shards=dict(enumerate(engines)),
+            **kw,
+        )
+        self.router = router
+        self.engines = tuple(engines)
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, **kw):
+        # Session.connection() and friends name nothing to route on: the primary
+        if shard_id is None and mapper is None and instance is None:
+            shard_id = PRIMARY if clause is None else self.router.for_statement(clause)[0]
+        return super().get_bind(mapper, shard_id=shard_id, instance=instance, clause=clause, **kw)
+
+
+def scatter(connections: Sequence[Connection], fn: Callable[[Connection], T]) -> list[T]:
+    """``fn(connection)`` on every connection at once, one thread each; results in connection order."""
+    # Each task runs in a copy of the caller's context, so query budgets count shard statements
+    with ThreadPoolExecutor(max_workers=len(connections), thread_name_prefix="fmea-scatter") as pool:
+        futures = [pool.submit(contextvars.copy_context().run, fn, conn) for conn in connections]
+        return [future.result() for future in futures]
+
+
+def tag_ids(conn: Connection, slot: int) -> None:
+    """Make the id sequences on shard ``slot`` hand out ids that name it (idempotent)."""
+    for model in TAGGED_MODELS:
+        table = model.__tablename__
+        sequence = conn.scalar(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": table})
+        sources = [f"(SELECT max(id) FROM {table})", f"(SELECT last_value FROM {sequence})"]
+        if table in ARCHIVE_TABLES:
+            sources.append(f"(SELECT max(id) FROM {ARCHIVE_TABLES[table].name})")
+        last = conn.scalar(text(f"SELECT greatest({', '.join(sources)})"))
+        start = last + 1 + (slot - last) % SHARD_SLOTS
+        conn.execute(text(f"ALTER SEQUENCE {sequence} INCREMENT BY {SHARD_SLOTS} RESTART WITH {start}"))
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    from alembic import command
+
+    from .config import load_db_config, load_shard_configs
+    from .rehearse import alembic_config
+
+    parser = argparse.ArgumentParser(prog="python -m db.sharding", description=__doc__.split("\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="migrate every shard to head and tag its id sequences")
+    locate = commands.add_parser("locate", help="print the shard an asset lives on")
+    locate.add_argument("asset_id")
+    args = parser.parse_args(argv)
+
+    primary = load_db_config()
+    shards = [primary, *load_shard_configs(primary)]
+    router = Router(len(shards))
+    if args.command == "locate":
+        slot = router.for_asset(args.asset_id)
+        print(f"{args.asset_id}: shard {slot} ({shards[slot].host}:{shards[slot].port}/{shards[slot].database})")
+        return 0
+    for slot, shard in enumerate(shards):
+        command.upgrade(alembic_config(shard), "head")
+        if len(shards) > 1:
+            engine = create_engine(shard.sqlalchemy_url)
+            with engine.begin() as conn:
+                tag_ids(conn, slot)
+            engine.dispose()
+        print(f"shard {slot}: {shard.host}:{shard.port}/{shard.database} at head")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,62 @@
+"""Scoping database work to one tenant (plant).
+
+Tenant-owned tables carry ``tenant_id`` and row-level security policies for
+the ``fmea_tenant`` role (see ``db.models``). Work is scoped to a tenant by
+switching to that role and setting ``fmea.tenant_id`` for the transaction;
+both are transaction-local ``set_config`` calls on the pooled connection, so
+scoping costs one statement per transaction and never a new connection::
+
+    with engine.begin() as conn:
+        scope(conn, "plant-07")
+        conn.execute(select(FMEA))   # plant-07's FMEAs only
+
+Sessions use :func:`scope_session`, which applies the same settings at the
+start of each of the session's transactions, in the one ``set_config``
+statement the session sends for all its settings (it counts against API
+query budgets). Rows inserted in a scoped
+transaction get its tenant through the ``tenant_id`` column default.
+Unscoped connections (workers, CLIs) keep seeing every tenant and write to
+``DEFAULT_TENANT``.
+
+The API, the workers and the migrations must connect as the same role
+(``DB_USER``): migration 0015 grants ``fmea_tenant`` to the role that runs it,
+and unscoped work sees every tenant only because that role owns the tables. A
+deployment that connects the API as another role has to run
+``GRANT fmea_tenant TO <role>`` itself, or every scoped transaction fails with
+``permission denied to set role``.
+"""
+from __future__ import annotations
+
+import re
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from .database import get_local, set_locals
+from .models import DEFAULT_TENANT, TENANT_ROLE, TENANT_SETTING
+
+_TENANT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_.-]{0,63}")
+
+
+def validate_tenant_id(value: str) -> str:
+    if not _TENANT_ID.fullmatch(value):
+        raise ValueError("tenant id must be 1-64 letters, digits, '.', '_' or '-'")
+    return value
+
+
+def scope(conn: Connection, tenant_id: str) -> None:
+    """Limit the rest of ``conn``'s current transaction to ``tenant_id``."""
+    conn.exec_driver_sql(
+        "SELECT set_config('role', %s, true), set_config(%s, %s, true)",
+        (TENANT_ROLE, TENANT_SETTING, validate_tenant_id(tenant_id)),
+    )
+
+
+def scope_session(session: Session, tenant_id: str) -> None:
+    """Limit every transaction ``session`` begins to ``tenant_id``."""
+    set_locals(session, {"role": TENANT_ROLE, TENANT_SETTING: validate_tenant_id(tenant_id)})
+
+
+def session_tenant(session: Session) -> str:
+    """The tenant ``session`` is scoped to (``DEFAULT_TENANT`` when unscoped)."""
+    return get_local(session, TENANT_SETTING) or DEFAULT_TENANT
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, update
+
+from db.archival import archive_batch
+from db.models import ARCHIVE_TABLES, FMEA, Action, Control, FailureCause, FailureEffect, FailureMode
+
+
+def _tree(db_session, version: int, status: str) -> FMEA:
+    fmea = FMEA(asset_id="ARCH-ASSET", title=f"v{version}", version=version, status=status)
+    db_session.add(fmea)
+    db_session.flush()
+    for i in range(2):
+        fm = FailureMode(fmea_id=fmea.id, name=f"Mode {i}", severity=9, occurrence=2, detection=3)
+        db_session.add(fm)
+        db_session.flush()
+        db_session.add_all([
+            Action(failure_mode_id=fm.id, description="Act", notes="long text"),
+            FailureCause(failure_mode_id=fm.id, description="Cause"),
+            FailureEffect(failure_mode_id=fm.id, description="Effect", level="local"),
+            Control(failure_mode_id=fm.id, type="detection", description="Control"),
+        ])
+    db_session.flush()
+    return fmea
+
+
+def _count(db_session, table, **where) -> int:
+    stmt = select(func.count()).select_from(table)
+    for column, value in where.items():
+        stmt = stmt.where(table.c[column] == value)
+    return db_session.scalar(stmt)
+
+
+def test_archive_batch_moves_superseded_children_and_resumes(db_session):
+    old = _tree(db_session, 1, "superseded")
+    current = _tree(db_session, 2, "approved")
+    current.supersedes_fmea_id = old.id
+    db_session.flush()
+    old_updated_at = old.updated_at
+    conn = db_session.connection()
+
+    cutoff = datetime.now(timezone.utc) + timedelta(minutes=1)
+    fmea_ids, moved = archive_batch(conn, cutoff, batch_size=10)
+
+    assert fmea_ids == [old.id]
+    assert moved == {"actions": 2, "failure_causes": 2, "failure_effects": 2, "controls": 2, "failure_modes": 2}
+    assert _count(db_session, FailureMode.__table__, fmea_id=old.id) == 0
+    assert _count(db_session, FailureMode.__table__, fmea_id=current.id) == 2
+    assert _count(db_session, ARCHIVE_TABLES["failure_modes"], fmea_id=old.id) == 2
+    assert db_session.scalar(select(ARCHIVE_TABLES["failure_modes"].c.rpn).limit(1)) == 54
+    assert db_session.scalar(select(ARCHIVE_TABLES["actions"].c.notes).limit(1)) == "long text"
+
+    db_session.expire_all()
+    assert old.archived_at is not None and old.updated_at == old_updated_at
+    assert current.supersedes_fmea_id == old.id
+
+    # Nothing left to do: a rerun is a no-op
+    assert archive_batch(conn, cutoff, batch_size=10) == ([], {})
+
+
+def test_archive_respects_age_and_delete_purges_archive(db_session):
+    old = _tree(db_session, 1, "superseded")
+    conn = db_session.connection()
+    conn.execute(update(FMEA.__table__).where(FMEA.id == old.id).values(updated_at=func.now() - timedelta(days=30)))
+
+    assert archive_batch(conn, datetime.now(timezone.utc) - timedelta(days=60)) == ([], {})
+    assert archive_batch(conn, datetime.now(timezone.utc) - timedelta(days=7))[0] == [old.id]
+
+    db_session.delete(old)
+    db_session.flush()
+    for table in ARCHIVE_TABLES.values():
+        assert _count(db_session, table) == 0, table.name
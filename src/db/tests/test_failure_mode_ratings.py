@@ -1,10 +1,10 @@
 from __future__ import annotations
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
 from sqlalchemy.exc import IntegrityError
 
-from db.models import FMEA, FailureMode
+from db.models import FMEA, FailureMode, FailureModeRatingHistory
 
 
 def test_default_ratings_and_rpn(db_session):
@@ -71,3 +71,25 @@ def test_rating_bounds_enforced(db_session):
     with pytest.raises(IntegrityError):
         db_session.flush()
     db_session.rollback()
+
+
+def test_rating_changes_are_appended_to_history(db_session):
+    conn = db_session.connection()
+    fmea_id = conn.scalar(insert(FMEA).values(asset_id="asset-HIST", title="History", version=1).returning(FMEA.id))
+    # A multi-row insert is recorded by one statement-level trigger call
+    ids = conn.scalars(
+        insert(FailureMode).values([
+            {"fmea_id": fmea_id, "name": "Seal leak", "severity": 4},
+            {"fmea_id": fmea_id, "name": "Bearing wear", "severity": 6},
+        ]).returning(FailureMode.id)
+    ).all()
+    conn.execute(update(FailureMode).where(FailureMode.id == ids[0]).values(occurrence=3))
+    # Renames and no-op rating writes are not rating changes
+    conn.execute(update(FailureMode).where(FailureMode.id == ids[0]).values(name="Shaft seal leak", severity=4))
+
+    history = conn.execute(
+        select(FailureModeRatingHistory.failure_mode_id, FailureModeRatingHistory.rpn)
+        .where(FailureModeRatingHistory.failure_mode_id.in_(ids))
+        .order_by(FailureModeRatingHistory.id)
+    ).all()
+    assert history == [(ids[0], 40), (ids[1], 60), (ids[0], 120)]
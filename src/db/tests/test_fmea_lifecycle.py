@@ -3,10 +3,10 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 
 import pytest
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
 from sqlalchemy.exc import IntegrityError
 
-from db.models import FMEA
+from db.models import FMEA, AssetCurrentFMEA
 
 
 def test_fmea_lifecycle_defaults_and_insert(db_session):
@@ -90,3 +90,20 @@ def test_fmea_approval_fields(db_session):
     got = db_session.execute(select(FMEA).where(FMEA.id == f.id)).scalar_one()
     assert got.status == "approved"
     assert got.approved_by and got.approved_at and got.effective_date
+
+
+def test_bulk_writes_keep_the_current_fmea_per_asset(db_session):
+    db_session.execute(insert(FMEA), [
+        {"asset_id": asset, "title": f"{asset} v{version}", "version": version, "status": status}
+        for asset in ("A-CUR-1", "A-CUR-2")
+        for version, status in ((1, "approved"), (2, "approved"), (3, "review"))
+    ])
+    current = select(AssetCurrentFMEA.asset_id, AssetCurrentFMEA.version).order_by(AssetCurrentFMEA.asset_id)
+    assert db_session.execute(current.where(AssetCurrentFMEA.asset_id.like("A-CUR-%"))).all() == [
+        ("A-CUR-1", 2), ("A-CUR-2", 2)
+    ]
+
+    db_session.execute(update(FMEA).where(FMEA.asset_id == "A-CUR-2", FMEA.version == 3).values(status="approved"))
+    db_session.execute(update(FMEA).where(FMEA.asset_id == "A-CUR-1").values(status="superseded"))
+    assert db_session.execute(current.where(AssetCurrentFMEA.asset_id.like("A-CUR-%"))).all() == [("A-CUR-2", 3)]
+
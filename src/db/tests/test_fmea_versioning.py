@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
+
 import pytest
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.exc import IntegrityError
 
-from db.models import FMEA, FailureMode
+from db.models import FMEA, VERSION_TABLES, Action, FailureMode
 
 
 def test_fmea_version_uniqueness(db_session):
@@ -64,3 +66,34 @@ def test_failure_mode_unique_per_fmea(db_session):
     # Same name but under different FMEA (version) should be allowed
     db_session.add(FailureMode(fmea_id=fmea2.id, name="Overheating", severity=4))
     db_session.flush()
+
+
+def test_outgoing_row_versions_are_kept_with_their_validity(db_session):
+    then = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    fmea = FMEA(asset_id="asset-asof", title="Pump", version=1, valid_from=then)
+    db_session.add(fmea)
+    db_session.flush()
+    fm = FailureMode(fmea_id=fmea.id, name="Seal leak", severity=4, valid_from=then)
+    db_session.add(fm)
+    db_session.flush()
+    action = Action(failure_mode_id=fm.id, description="Inspect", valid_from=then)
+    db_session.add(action)
+    db_session.flush()
+
+    fm.severity = 8
+    db_session.flush()
+    # A second write in the same transaction leaves no version current for no time at all
+    fm.name = "Seal leak (primary)"
+    db_session.flush()
+    db_session.delete(action)
+    db_session.flush()
+
+    now = db_session.scalar(select(func.now()))
+    modes = VERSION_TABLES["failure_modes"]
+    [(severity, valid)] = db_session.execute(select(modes.c.severity, modes.c.valid).where(modes.c.id == fm.id)).all()
+    assert severity == 4 and (valid.lower, valid.upper) == (then, now)
+    db_session.refresh(fm)
+    assert fm.valid_from == now
+    actions = VERSION_TABLES["actions"]
+    assert db_session.scalar(select(actions.c.description).where(actions.c.id == action.id)) == "Inspect"
+
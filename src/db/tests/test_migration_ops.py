@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+
+import psycopg
+import pytest
+import sqlalchemy as sa
+from alembic import op
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from db import migration_ops
+from db.config import load_db_config
+from db.models import FMEA
+from db.rehearse import StepObserver, alembic_config, pending_steps, rehearse
+from db.seed import FleetSpec
+
+
+@contextmanager
+def _migration(engine):
+    with engine.connect() as conn:
+        context = MigrationContext.configure(conn)
+        with Operations.context(context), context.begin_transaction():
+            yield conn
+
+
+@pytest.fixture()
+def scratch_tables(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE mops_parent (id int PRIMARY KEY)"))
+        conn.execute(text("CREATE TABLE mops_child (id int PRIMARY KEY, parent_id int, rating int)"))
+    try:
+        yield
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS mops_child, mops_parent"))
+
+
+def _validated(conn, name: str) -> bool:
+    return conn.execute(text("SELECT convalidated FROM pg_constraint WHERE conname = :n"), {"n": name}).scalar_one()
+
+
+def test_lock_retry_waits_out_a_long_reader(engine, scratch_tables):
+    held, release = threading.Event(), threading.Event()
+
+    def reader() -> None:
+        with psycopg.connect(load_db_config().conninfo) as conn:
+            conn.execute("SELECT * FROM mops_child")
+            held.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    held.wait(5)
+    try:
+        with _migration(engine):
+            with pytest.raises(OperationalError) as raised:
+                migration_ops.with_lock_retry(
+                    lambda: op.add_column("mops_child", sa.Column("note", sa.Text())), attempts=1, timeout_ms=50
+                )
+            assert isinstance(raised.value.orig, psycopg.errors.LockNotAvailable)
+
+            threading.Timer(0.3, release.set).start()
+            migration_ops.with_lock_retry(
+                lambda: op.add_column("mops_child", sa.Column("note", sa.Text())), attempts=10, timeout_ms=50, backoff=0.05
+            )
+    finally:
+        release.set()
+        thread.join()
+    with engine.connect() as conn:
+        assert "note" in {c["name"] for c in sa.inspect(conn).get_columns("mops_child")}
+
+
+def test_lock_retry_retries_a_lost_deadlock(engine, scratch_tables, caplog):
+    held = threading.Event()
+
+    def writer() -> None:
+        with psycopg.connect(load_db_config().conninfo) as conn:
+            conn.execute("LOCK mops_child")
+            held.set()
+            time.sleep(0.3)
+            # A deadlock: the migration, waiting longer, loses first and retries; the
+            # retry closes the cycle again, which this side then loses
+            with pytest.raises(psycopg.errors.DeadlockDetected):
+                conn.execute("LOCK mops_parent")
+
+    thread = threading.Thread(target=writer)
+    with _migration(engine) as conn:
+        conn.execute(text("LOCK mops_parent"))
+        thread.start()
+        held.wait(5)
+        migration_ops.with_lock_retry(lambda: conn.execute(text("LOCK mops_child")), timeout_ms=5000, backoff=0.05)
+    thread.join()
+    assert "DeadlockDetected" in caplog.text
+
+
+def test_constraints_are_added_not_valid_and_validated_separately(engine, scratch_tables):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO mops_parent VALUES (1)"))
+        conn.execute(text("INSERT INTO mops_child VALUES (1, 1, 5), (2, 2, 11)"))
+
+    with _migration(engine) as conn:
+        with pytest.raises(IntegrityError):
+            migration_ops.add_check_constraint("ck_mops_rating", "mops_child", "rating BETWEEN 1 AND 10")
+        # Added but not validated: new rows are checked, the bad old row is still there
+        assert _validated(conn, "ck_mops_rating") is False
+        migration_ops.add_foreign_key("fk_mops_parent", "mops_child", "mops_parent", ["parent_id"], ["id"], validate=False)
+        assert _validated(conn, "fk_mops_parent") is False
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE mops_child SET rating = 10, parent_id = 1 WHERE id = 2"))
+    # Running the migration again picks up where it failed
+    with _migration(engine) as conn:
+        migration_ops.add_check_constraint("ck_mops_rating", "mops_child", "rating BETWEEN 1 AND 10")
+        migration_ops.add_foreign_key("fk_mops_parent", "mops_child", "mops_parent", ["parent_id"], ["id"])
+        assert _validated(conn, "ck_mops_rating") and _validated(conn, "fk_mops_parent")
+
+
+def test_concurrent_index_build_replaces_an_invalid_leftover(engine, scratch_tables):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO mops_child VALUES (1, NULL, 3), (2, NULL, 3)"))
+
+    with _migration(engine):
+        with pytest.raises(IntegrityError):
+            migration_ops.create_index_concurrently("ux_mops_rating", "mops_child", ["rating"], unique=True)
+    with engine.connect() as conn:
+        assert migration_ops._invalid_index_exists(conn, "ux_mops_rating")
+        conn.execute(text("DELETE FROM mops_child WHERE id = 2"))
+        conn.commit()
+
+    with _migration(engine) as conn:
+        migration_ops.create_index_concurrently("ux_mops_rating", "mops_child", ["rating"], unique=True)
+        assert not migration_ops._invalid_index_exists(conn, "ux_mops_rating")
+        assert conn.execute(text("SELECT to_regclass('ux_mops_rating') IS NOT NULL")).scalar_one()
+
+
+def test_failed_probe_writes_are_recorded(engine):
+    with engine.begin() as conn:
+        conn.execute(sa.insert(FMEA).values(asset_id="PROBE-001", title="probe"))
+        # The probe rewrites the newest FMEA unchanged, which this check now refuses
+        conn.execute(text("ALTER TABLE fmeas ADD CONSTRAINT ck_probe_refused CHECK (title <> 'probe') NOT VALID"))
+    try:
+        with StepObserver(load_db_config().conninfo) as observer:
+            time.sleep(0.2)
+        assert observer.probe_errors > 0 and observer.probe_error.startswith("CheckViolation")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE fmeas DROP CONSTRAINT ck_probe_refused"))
+            conn.execute(text("DELETE FROM fmeas WHERE asset_id = 'PROBE-001'"))
+
+
+def test_rehearsal_reports_each_step():
+    config = load_db_config()
+    db = replace(config, database=f"{config.database}_rehearsal_test")
+    spec = FleetSpec(assets=5, modes_per_fmea=2, chunk_size=5, asset_prefix="REHEARSE")
+    try:
+        reports = rehearse(db, spec, from_revision="0012", workers=1)
+        steps = [revision for revision, _ in pending_steps(alembic_config(db), "0012")]
+        assert [r.revision for r in reports] == steps and steps[0] == "0013"
+        assert all(r.error is None and r.seconds > 0 for r in reports)
+        with psycopg.connect(db.conninfo) as conn:
+            assert conn.execute("SELECT version_num FROM alembic_version").fetchone() == (steps[-1],)
+            assert conn.execute("SELECT count(*) FROM fmeas").fetchone()[0] > 0
+    finally:
+        with psycopg.connect(replace(config, database="postgres").conninfo, autocommit=True) as conn:
+            conn.execute(f'DROP DATABASE IF EXISTS "{db.database}" WITH (FORCE)')
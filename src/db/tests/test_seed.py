@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from sqlalchemy import func, insert, select, text
+
+from db.models import FMEA, FailureMode, Action
+from db.seed import FleetSpec, generate_chunk, plan_chunk, seed_fleet
+
+SPEC = FleetSpec(seed=7, assets=30, max_versions=4, modes_per_fmea=4, chunk_size=10, asset_prefix="SEEDTEST")
+
+
+def test_generation_is_deterministic_per_seed():
+    plan = plan_chunk(SPEC, 1)
+    assert plan == plan_chunk(SPEC, 1)
+    assert generate_chunk(SPEC, plan, 1, 1) == generate_chunk(SPEC, plan, 1, 1)
+
+    other = FleetSpec(seed=8, assets=30, max_versions=4, modes_per_fmea=4, chunk_size=10)
+    assert generate_chunk(other, plan_chunk(other, 1), 1, 1).failure_modes != generate_chunk(SPEC, plan, 1, 1).failure_modes
+
+
+def test_generated_rows_respect_check_constraints():
+    plan = plan_chunk(SPEC, 0)
+    rows = generate_chunk(SPEC, plan, 1000, 5000)
+    assert len(rows.fmeas) == plan.fmea_count
+    assert len(rows.failure_modes) == plan.failure_mode_count
+
+    assert {r[6] for r in rows.fmeas} <= {"draft", "review", "approved", "superseded"}
+    for fm in rows.failure_modes:
+        assert all(1 <= rating <= 10 for rating in fm[3:6])
+    assert len({(fm[1], fm[2]) for fm in rows.failure_modes}) == len(rows.failure_modes)
+    assert {a[4] for a in rows.actions} <= {"open", "in_progress", "closed", "deferred"}
+    assert {e[2] for e in rows.failure_effects} <= {"local", "next_higher", "end_user", None}
+    assert {c[1] for c in rows.controls} <= {"prevention", "detection"}
+
+    # Version chains: each version supersedes the previous one of the same asset
+    by_id = {r[0]: r for r in rows.fmeas}
+    for fmea in rows.fmeas:
+        prior = by_id.get(fmea[12])
+        if fmea[4] == 1:
+            assert fmea[12] is None
+        else:
+            assert prior[1] == fmea[1] and prior[4] == fmea[4] - 1
+
+
+def test_seed_fleet_loads_with_copy(engine):
+    try:
+        totals = seed_fleet(SPEC, workers=2)
+        with engine.connect() as conn:
+            fmeas = conn.scalar(select(func.count()).select_from(FMEA).where(FMEA.asset_id.like("SEEDTEST-%")))
+            modes = conn.scalar(
+                select(func.count()).select_from(FailureMode).join(FMEA).where(FMEA.asset_id.like("SEEDTEST-%"))
+            )
+            rpn_ok = conn.scalar(
+                select(func.bool_and(FailureMode.rpn == FailureMode.severity * FailureMode.occurrence * FailureMode.detection))
+            )
+            # Seeded rows have been current since they were created
+            backdated = conn.scalar(
+                select(func.bool_and((FMEA.valid_from == FMEA.created_at) & (FailureMode.valid_from == FailureMode.created_at)))
+                .select_from(FailureMode).join(FMEA).where(FMEA.asset_id.like("SEEDTEST-%"))
+            )
+            closed_without_date = conn.scalar(
+                select(func.count()).select_from(Action).where(Action.status == "closed", Action.closed_at.is_(None))
+            )
+        assert fmeas == totals["fmeas"]
+        assert modes == totals["failure_modes"]
+        assert rpn_ok
+        assert backdated
+        assert closed_without_date == 0
+
+        # Sequences continue after the explicitly assigned ids
+        with engine.begin() as conn:
+            new_id = conn.scalar(insert(FMEA).values(asset_id="SEEDTEST-NEW", title="x").returning(FMEA.id))
+            assert new_id > conn.scalar(text("SELECT max(id) FROM fmeas WHERE asset_id <> 'SEEDTEST-NEW'"))
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM fmeas WHERE asset_id LIKE 'SEEDTEST-%'"))
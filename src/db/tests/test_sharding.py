@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from collections import Counter
+
+from sqlalchemy import insert, select, text, update
+
+from db.models import FMEA, AuditEntry, FailureMode, Job
+from db.sharding import SHARD_SLOTS, HashRing, Router, tag_ids
+
+
+def test_adding_a_shard_only_moves_assets_onto_it():
+    assets = [f"PUMP-{n:05d}" for n in range(6000)]
+    before, after = HashRing(range(3)), HashRing(range(4))
+    moved = [a for a in assets if before.slot_for(a) != after.slot_for(a)]
+
+    assert all(after.slot_for(a) == 3 for a in moved)
+    # About a quarter of the fleet moves, and each shard gets a fair share
+    assert 0.15 < len(moved) / len(assets) < 0.35
+    assert min(Counter(after.slot_for(a) for a in assets).values()) > len(assets) / 4 * 0.6
+
+
+def test_statements_go_to_the_shards_their_keys_name():
+    router = Router(3)
+    on_1, on_2 = 2, SHARD_SLOTS + 3
+    assert router.for_statement(select(FMEA).where(FMEA.id == on_1)) == [1]
+    assert router.for_statement(select(FailureMode.name).where(FailureMode.fmea_id.in_([on_1, on_2]))) == [1, 2]
+    assert router.for_statement(select(FMEA).where(FMEA.asset_id == "PUMP-1")) == [router.for_asset("PUMP-1")]
+    # The key may sit in a subquery, as in crud's UPDATE ... FROM (SELECT ... FOR UPDATE) AS old
+    old = select(FMEA.__table__).where(FMEA.__table__.c.id == on_2).subquery("old")
+    assert router.for_statement(update(FMEA).where(FMEA.id == old.c.id).values(title="x")) == [2]
+
+    assert router.for_statement(select(FailureMode).where(FailureMode.rpn > 100)) == [0, 1, 2]
+    assert router.for_statement(select(Job).where(Job.id == on_1)) == [0]
+    assert router.for_statement(insert(AuditEntry.__table__).values(row_id=on_1)) == [0]
+    assert router.for_statement(text("SELECT 1")) == [0]
+    # Ids from a slot past the last shard were never handed out
+    assert Router(2).for_id(3) == 0 and Router(1).for_id(on_2) == 0
+
+
+def test_tagged_sequences_hand_out_ids_naming_their_shard(db_session):
+    conn = db_session.connection()
+    existing = conn.scalar(insert(FMEA).values(asset_id="SHARD-SEQ", title="t", version=1).returning(FMEA.id))
+    tag_ids(conn, 5)
+    ids = [
+        conn.scalar(insert(FMEA).values(asset_id="SHARD-SEQ", title="t", version=v).returning(FMEA.id))
+        for v in (2, 3)
+    ]
+    assert ids[0] > existing and ids[1] - ids[0] == SHARD_SLOTS
+    assert {Router(SHARD_SLOTS).for_id(i) for i in ids} == {5}
+    fmea_id = ids[0]
+    mode_id = conn.scalar(insert(FailureMode).values(fmea_id=fmea_id, name="Leak").returning(FailureMode.id))
+    assert (mode_id - 1) % SHARD_SLOTS == 5
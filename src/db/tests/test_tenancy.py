@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import psycopg
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+
+from db.models import DEFAULT_TENANT, FMEA, FailureMode
+from db.tenancy import scope, scope_session, session_tenant, validate_tenant_id
+
+
+def _fmea(conn, asset_id: str, **values) -> int:
+    return conn.scalar(insert(FMEA).values(asset_id=asset_id, title=asset_id, version=1, **values).returning(FMEA.id))
+
+
+def test_scoped_transactions_see_and_write_their_tenant_only(db_session):
+    conn = db_session.connection()
+    # Unscoped writers (workers, CLIs) write to the default tenant and see everyone
+    shared = _fmea(conn, "TEN-SHARED")
+    plant_b = _fmea(conn, "TEN-B", tenant_id="plant-b")
+    assert conn.scalar(select(FMEA.tenant_id).where(FMEA.id == shared)) == DEFAULT_TENANT
+
+    # Scoped for the rest of the transaction
+    scope(conn, "plant-a")
+    own = _fmea(conn, "TEN-A")
+    # The same asset and version may exist once per tenant
+    _fmea(conn, "TEN-B")
+    visible = set(conn.scalars(select(FMEA.id).where(FMEA.asset_id.like("TEN-%"))))
+    assert own in visible and shared not in visible and plant_b not in visible
+    assert conn.scalar(select(FMEA.tenant_id).where(FMEA.id == own)) == "plant-a"
+
+    with pytest.raises(ProgrammingError) as raised, conn.begin_nested():
+        _fmea(conn, "TEN-SPOOF", tenant_id="plant-b")
+    assert isinstance(raised.value.orig, psycopg.errors.InsufficientPrivilege)
+
+
+def test_children_cannot_reference_another_tenants_parent(db_session):
+    conn = db_session.connection()
+    fmea_id = _fmea(conn, "TEN-FK", tenant_id="plant-a")
+    with pytest.raises(IntegrityError), conn.begin_nested():
+        conn.execute(insert(FailureMode).values(fmea_id=fmea_id, name="Leak", tenant_id="plant-b"))
+    conn.execute(insert(FailureMode).values(fmea_id=fmea_id, name="Leak", tenant_id="plant-a"))
+
+
+def test_session_scope_applies_to_every_transaction(db_session):
+    _fmea(db_session.connection(), "TEN-SESSION", tenant_id="plant-c")
+    scope_session(db_session, "plant-c")
+    assert session_tenant(db_session) == "plant-c"
+    assert db_session.scalar(text("SELECT fmea_current_tenant()")) == "plant-c"
+    assert db_session.scalars(select(FMEA.asset_id)).all() == ["TEN-SESSION"]
+
+    with pytest.raises(ValueError):
+        validate_tenant_id("plant c; DROP TABLE fmeas")